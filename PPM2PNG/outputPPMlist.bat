@@ -1,3 +1,3 @@
-dir > ppm_files.txt
-echo Remeber to clean up export list before running the converter
+dir /b > ppm_files.txt
+echo Non-PPM files in the list are skipped; or run: python ppm2png.py . to convert the whole folder
 pause
\ No newline at end of file
@@ -1,44 +1,1075 @@
-from PIL import Image
+import argparse
+import contextlib
+import glob
+import hashlib
+import importlib.util
+import io
+import itertools
+import json
+import mmap
 import os # Import the os module for path manipulation
+import re
+import struct
+import sys
+import time
+import zlib
+from array import array
 
-def convert_ppm_to_png_from_list(filename_list_path, output_dir="output_pngs"):
+try:
+    from PIL import Image, ImageChops, features
+except ImportError:
+    Image = None  # Only needed for --decoder pillow and --verify-against-pillow
+
+# Shared modules live in the repository root. When run as a script that
+# folder is not importable, so they are loaded by location rather than by
+# adding it to sys.path
+def _load_shared_module(name):
+    """Import a module from the repository root; returns None if it is missing."""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        pass
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), name + '.py')
+    if not os.path.exists(path):
+        return None
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module  # pool workers unpickle by name
+    spec.loader.exec_module(module)
+    return module
+
+
+# Directory walking and read-ahead (required)
+source_tree = _load_shared_module('source_tree')
+if source_tree is None:
+    raise ImportError("ppm2png.py needs source_tree.py from the repository root")
+
+# Per-stage timings (optional: without stage_metrics.py stages are not measured)
+stage_metrics = _load_shared_module('stage_metrics')
+
+if stage_metrics:
+    from stage_metrics import stage
+else:
+    def stage(name, item=None):
+        return contextlib.nullcontext()
+
+# Default list of PPM filenames and output directory
+DEFAULT_LIST = "ppm_files.txt"
+DEFAULT_OUTPUT_DIR = "converted_images"
+
+# Filenames read ahead of the converter from the list file or directory
+LIST_QUEUE_SIZE = 256
+
+# Record of converted frames, kept in the output directory, so frames
+# whose PNG is current can be skipped on the next run
+MANIFEST_NAME = '.ppm2png_manifest.json'
+MANIFEST_VERSION = 2
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Frames kept in flight per worker process, so workers never wait for work
+# while the list is still only read a little ahead
+POOL_TASKS_PER_WORKER = 2
+
+# Decoders: the built-in memory-mapped PNM reader, or Pillow
+DECODERS = ('native', 'pillow')
+
+# Netpbm formats the native reader handles: magic -> (channels, binary)
+PNM_FORMATS = {b'P2': (1, False), b'P3': (3, False), b'P5': (1, True), b'P6': (3, True)}
+
+# A header field, after any whitespace and comments
+PNM_HEADER_FIELD = re.compile(rb'(?:\s|#[^\r\n]*)*(\d+)')
+PNM_SAMPLE = re.compile(rb'\d+')
+
+# Rows already encoded are dropped from the mapping in steps of this many
+# bytes, so the resident size of a frame stays at a few rows too
+PNM_RELEASE_BYTES = 4 * 1024 * 1024
+
+# PNG row filters the writer can apply; 'adaptive' picks the best of the
+# others for each row (Paeth is left out: it does not vectorize in Python)
+PNG_FILTERS = ('none', 'sub', 'up', 'average', 'adaptive')
+PNG_FILTER_TYPES = {'none': 0, 'sub': 1, 'up': 2, 'average': 3}
+DEFAULT_PNG_FILTER = 'adaptive'
+DEFAULT_COMPRESS_LEVEL = 6
+
+# Named encoding profiles: zlib level and row filter. On a 1080p RGB
+# render (benchmarks/bench_ppm2png_profiles.py), fast is ~6x quicker than
+# balanced for ~15% larger files, smallest ~3x slower for ~10% smaller
+# ones. zlib's default strategy is used throughout: on the same frames
+# Z_FILTERED was no smaller at level 9 and Z_RLE made level 1 ~30% larger
+PROFILES = {
+    'fast': {'level': 1, 'png_filter': 'sub'},
+    'balanced': {'level': 6, 'png_filter': 'adaptive'},
+    'smallest': {'level': 9, 'png_filter': 'adaptive'},
+}
+DEFAULT_PROFILE = 'balanced'
+
+# Extra products made from the same decode: previews are downscaled in
+# strips of about this many source rows as the frame streams past
+PREVIEW_STRIP_ROWS = 64
+WEBP_QUALITY = 90
+
+# Compressed bytes collected before an IDAT chunk is written
+PNG_IDAT_SIZE = 256 * 1024
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Cost of a filtered byte when choosing a filter: its magnitude as a signed byte
+FILTER_COST = bytes(min(value, 256 - value) for value in range(256))
+
+
+class PNMImage:
     """
-    Converts PPM image files to PNG format, where the PPM filenames are listed in a text file.
+    Memory-mapped reader for binary (P5/P6) and ASCII (P2/P3) PGM/PPM files.
+
+    Binary rows are handed out as zero-copy memoryview slices of the
+    mapping, so reading a frame costs no more memory than one row
+    however large it is. 16-bit samples are big-endian, as PNG wants
+    them. Samples with a maxval other than 255 or 65535 are rescaled to
+    8 or 16 bits the way Pillow does.
+
+    A frame already in memory can be passed as `data` instead of being
+    mapped; `path` then only names it in messages.
+
+    Usage:
+        with PNMImage(path) as image:
+            for row in image.rows():
+                ...
+    """
+
+    def __init__(self, path, data=None):
+        self.path = path
+        self._file = None
+        self._data = None
+        self._rows = None
+        try:
+            if data is not None:
+                self._data = data if isinstance(data, bytes) else bytes(data)
+            else:
+                self._file = open(path, 'rb')
+                if os.fstat(self._file.fileno()).st_size >= 2:
+                    self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self._data is None or len(self._data) < 2:
+                raise ValueError("not a PGM/PPM file (too short)")
+            self._parse_header()
+        except Exception:
+            self.close()
+            raise
+
+    def _parse_header(self):
+        magic = self._data[:2]
+        if magic not in PNM_FORMATS:
+            raise ValueError(f"not a P2/P3/P5/P6 file (magic {magic!r})")
+        self.channels, self.binary = PNM_FORMATS[magic]
+        fields = []
+        position = 2
+        for _ in range(3):
+            match = PNM_HEADER_FIELD.match(self._data, position)
+            if match is None:
+                raise ValueError("malformed header")
+            fields.append(int(match.group(1)))
+            position = match.end()
+        self.width, self.height, self.maxval = fields
+        if self.width < 1 or self.height < 1 or not 0 < self.maxval < 65536:
+            raise ValueError(f"invalid header ({self.width}x{self.height}, maxval {self.maxval})")
+        if position >= len(self._data) or not self._data[position:position + 1].isspace():
+            raise ValueError("malformed header")
+        self.offset = position + 1  # exactly one whitespace byte before the raster
+
+        self.bit_depth = 8 if self.maxval < 256 else 16
+        self.sample_bytes = self.bit_depth // 8
+        self.row_bytes = self.width * self.channels * self.sample_bytes
+        if self.binary and len(self._data) < self.offset + self.height * self.row_bytes:
+            raise ValueError(f"truncated raster (expected {self.height * self.row_bytes} bytes)")
+
+        self._scale = None
+        if self.maxval not in (255, 65535):
+            top = (1 << self.bit_depth) - 1
+            # Round half to even, like Pillow; out-of-range samples saturate
+            self._scale = [min(top, round(value * top / self.maxval))
+                           for value in range(1 << self.bit_depth)]
+            if self.bit_depth == 8:
+                self._scale = bytes(self._scale)
+
+    def _rescale(self, row):
+        """Rescale a row of samples to the full 8- or 16-bit range."""
+        if self.bit_depth == 8:
+            return bytes(row).translate(self._scale)
+        samples = array('H', bytes(row))
+        if sys.byteorder == 'little':
+            samples.byteswap()
+        samples = array('H', [self._scale[value] for value in samples])
+        if sys.byteorder == 'little':
+            samples.byteswap()
+        return samples.tobytes()
+
+    def _ascii_rows(self):
+        samples = (int(match.group()) for match in PNM_SAMPLE.finditer(self._data, self.offset))
+        per_row = self.width * self.channels
+        top = (1 << self.bit_depth) - 1
+        for _ in range(self.height):
+            values = list(itertools.islice(samples, per_row))
+            if len(values) < per_row:
+                raise ValueError("truncated raster")
+            if self._scale is not None:
+                values = [self._scale[min(value, top)] for value in values]
+            if self.bit_depth == 8:
+                yield bytes(min(value, 255) for value in values)
+            else:
+                row = array('H', [min(value, 65535) for value in values])
+                if sys.byteorder == 'little':
+                    row.byteswap()
+                yield row.tobytes()
+
+    def _binary_rows(self):
+        mapped = isinstance(self._data, mmap.mmap)
+        can_release = mapped and hasattr(mmap, 'MADV_DONTNEED')
+        if mapped and hasattr(mmap, 'MADV_SEQUENTIAL'):
+            self._data.madvise(mmap.MADV_SEQUENTIAL)
+        released = 0
+        view = memoryview(self._data)
+        try:
+            for y in range(self.height):
+                start = self.offset + y * self.row_bytes
+                with view[start:start + self.row_bytes] as row:
+                    yield row if self._scale is None else self._rescale(row)
+                if can_release and start - released >= PNM_RELEASE_BYTES:
+                    # Pages before this row are done with; the file backs them
+                    end = start - start % mmap.PAGESIZE
+                    self._data.madvise(mmap.MADV_DONTNEED, released, end - released)
+                    released = end
+        finally:
+            view.release()
+
+    def rows(self):
+        """
+        Return an iterator over the image rows top to bottom, as PNG-ready
+        sample bytes.
+
+        Rows of binary files with a maxval of 255 or 65535 are memoryview
+        slices of the mapping and are only valid until the next row is
+        requested or the image is closed.
+        """
+        if self._rows is not None:
+            self._rows.close()
+        self._rows = self._binary_rows() if self.binary else self._ascii_rows()
+        return self._rows
+
+    def sha256(self):
+        """Return the hex SHA-256 of the whole file."""
+        return hashlib.sha256(self._data).hexdigest()
+
+    def close(self):
+        """Release the mapping and the file."""
+        if self._rows is not None:
+            self._rows.close()  # releases the row views still exported
+            self._rows = None
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._data = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class PNGWriter:
+    """
+    Streaming PNG encoder: rows are filtered and deflated as they arrive.
+
+    Only the previous row and the pending compressed output are kept, so
+    memory stays at a few rows whatever the image size. Filters work on
+    whole rows at once, treating each row as one big integer and doing
+    the per-byte arithmetic with SIMD-within-a-register masks.
+
+    Usage:
+        with open(path, 'wb') as f:
+            writer = PNGWriter(f, width, height, channels=3, bit_depth=8)
+            for row in rows:
+                writer.write_row(row)
+            writer.close()
+    """
+
+    def __init__(self, fileobj, width, height, channels, bit_depth=8,
+                 level=DEFAULT_COMPRESS_LEVEL, png_filter=DEFAULT_PNG_FILTER,
+                 strategy=zlib.Z_DEFAULT_STRATEGY):
+        if png_filter not in PNG_FILTERS:
+            raise ValueError(f"unknown PNG filter: {png_filter}")
+        self.fileobj = fileobj
+        self.height = height
+        self.png_filter = png_filter
+        self.row_bytes = width * channels * bit_depth // 8
+        self.bpp = max(1, channels * bit_depth // 8)
+        self.rows_written = 0
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS, 9, strategy)
+        self._pending = []
+        self._pending_size = 0
+        self._previous = 0
+
+        n = self.row_bytes
+        self._high = int.from_bytes(b'\x80' * n, 'big')
+        self._low = int.from_bytes(b'\x7f' * n, 'big')
+        self._even = int.from_bytes(b'\xfe' * n, 'big')
+
+        color_type = 2 if channels == 3 else 0
+        fileobj.write(PNG_SIGNATURE)
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, bit_depth, color_type, 0, 0, 0))
+
+    def _chunk(self, kind, data):
+        self.fileobj.write(struct.pack('>I', len(data)))
+        self.fileobj.write(kind)
+        self.fileobj.write(data)
+        self.fileobj.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind))))
+
+    def _subtract(self, a, b):
+        """Bytewise (a - b) mod 256 of two row integers."""
+        return ((a | self._high) - (b & self._low)) ^ ((a ^ ~b) & self._high)
+
+    def _filtered(self, current):
+        """Return {filter type: filtered row integer} for the configured filter."""
+        left = current >> (8 * self.bpp)
+        candidates = {
+            'none': lambda: current,
+            'sub': lambda: self._subtract(current, left),
+            'up': lambda: self._subtract(current, self._previous),
+            'average': lambda: self._subtract(
+                current,
+                (left & self._previous) + (((left ^ self._previous) & self._even) >> 1)
+            ),
+        }
+        if self.png_filter != 'adaptive':
+            return {PNG_FILTER_TYPES[self.png_filter]: candidates[self.png_filter]()}
+        return {PNG_FILTER_TYPES[name]: make() for name, make in candidates.items()}
+
+    def write_row(self, row):
+        """Filter and compress one row of big-endian sample bytes."""
+        if len(row) != self.row_bytes:
+            raise ValueError(f"row is {len(row)} bytes, expected {self.row_bytes}")
+        current = int.from_bytes(row, 'big')
+        best = None
+        for filter_type, value in self._filtered(current).items():
+            data = value.to_bytes(self.row_bytes, 'big')
+            if best is None:
+                best = (filter_type, data)
+                if self.png_filter != 'adaptive':
+                    break
+                best_cost = sum(data.translate(FILTER_COST))
+            else:
+                cost = sum(data.translate(FILTER_COST))
+                if cost < best_cost:
+                    best, best_cost = (filter_type, data), cost
+        self._previous = current
+        self._compress(bytes((best[0],)))
+        self._compress(best[1])
+        self.rows_written += 1
+
+    def _compress(self, data):
+        output = self._compressor.compress(data)
+        if output:
+            self._pending.append(output)
+            self._pending_size += len(output)
+            if self._pending_size >= PNG_IDAT_SIZE:
+                self._flush_idat()
+
+    def _flush_idat(self):
+        if self._pending:
+            self._chunk(b'IDAT', b''.join(self._pending))
+            self._pending = []
+            self._pending_size = 0
+
+    def close(self):
+        """Finish the compressed stream and write the end of the file."""
+        if self.rows_written != self.height:
+            raise ValueError(f"wrote {self.rows_written} of {self.height} rows")
+        self._pending.append(self._compressor.flush())
+        self._flush_idat()
+        self._chunk(b'IEND', b'')
+
+
+class PreviewBuilder:
+    """
+    Builds a downscaled copy of a frame from its rows as they stream past.
+
+    Rows are gathered into strips of a multiple of the reduction factor
+    and box-reduced with Pillow strip by strip, so only the small image
+    and one strip are held. The integer reduction is followed by a final
+    resize to the exact width. With no target width the full-size image
+    is assembled (e.g. for WebP). 16-bit frames are reduced to 8 bits.
+    Needs Pillow.
+    """
+
+    def __init__(self, width, height, channels, bit_depth, target_width=None):
+        self.width = width
+        self.height = height
+        self.mode = 'RGB' if channels == 3 else 'L'
+        self.wide = bit_depth == 16
+        self.target_width = min(target_width or width, width)
+        self.factor = max(1, width // self.target_width)
+        self.strip_rows = self.factor * max(1, PREVIEW_STRIP_ROWS // self.factor)
+        self.canvas = Image.new(self.mode, (-(-width // self.factor), -(-height // self.factor)))
+        self._strip = bytearray()
+        self._rows = 0
+        self._y = 0
+
+    def write_row(self, row):
+        """Add one row of PNG-ready sample bytes."""
+        # Keep the high byte of each big-endian 16-bit sample
+        self._strip += bytes(row[::2]) if self.wide else row
+        self._rows += 1
+        if self._rows == self.strip_rows:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        strip = Image.frombytes(self.mode, (self.width, self._rows), bytes(self._strip))
+        if self.factor > 1:
+            strip = strip.reduce(self.factor)
+        self.canvas.paste(strip, (0, self._y))
+        self._y += strip.height
+        self._strip = bytearray()
+        self._rows = 0
+
+    def image(self):
+        """Return the finished image."""
+        self._flush()
+        return _resize_to_width(self.canvas, self.target_width, self.width, self.height)
+
+
+def _resize_to_width(image, target_width, source_width, source_height):
+    """Finish a box-reduced preview at exactly `target_width` wide."""
+    if image.width == target_width:
+        return image
+    height = max(1, round(source_height * target_width / source_width))
+    return image.resize((target_width, height), Image.LANCZOS)
+
+
+def _atomic_write(path, write):
+    """Call write(temp_path), then move the result to `path`; clean up on failure."""
+    temp_path = path + '.tmp'
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _save_image(image, path, profile=DEFAULT_PROFILE):
+    """Save a Pillow image as PNG (with the profile's zlib level) or WebP, by suffix."""
+    if path.endswith('.webp'):
+        _atomic_write(path, lambda temp: image.save(temp, 'WEBP', quality=WEBP_QUALITY))
+    else:
+        level = PROFILES[profile]['level']
+        _atomic_write(path, lambda temp: image.save(temp, 'PNG', compress_level=level))
+
+
+def output_paths_for(png_path, previews=(), webp=False):
+    """
+    Return every file a frame is converted to: the PNG first, then each
+    preview as <name>.<width>w.png, then the WebP copies when requested.
+    """
+    base = os.path.splitext(png_path)[0]
+    paths = [png_path] + [f"{base}.{width}w.png" for width in previews]
+    if webp:
+        paths += [base + '.webp'] + [f"{base}.{width}w.webp" for width in previews]
+    return paths
+
+
+def encode_png(image, out, profile=DEFAULT_PROFILE, sinks=()):
+    """
+    Encode a PNMImage as PNG to a binary file-like object, row by row.
+
+    Every row is also handed to `sinks` (e.g. PreviewBuilders), so further
+    products come from the same single read of the frame.
+    """
+    writer = PNGWriter(out, image.width, image.height, image.channels,
+                       image.bit_depth, **PROFILES[profile])
+    for row in image.rows():
+        writer.write_row(row)
+        for sink in sinks:
+            sink.write_row(row)
+    writer.close()
+
+
+def write_png(image, png_path, profile=DEFAULT_PROFILE, sinks=()):
+    """
+    Encode a PNMImage to a PNG file row by row (see encode_png).
+
+    The PNG is written to a temporary name and moved into place when
+    complete, so a failed frame never leaves a partial PNG behind.
+    """
+    def write(temp_path):
+        with open(temp_path, 'wb') as f:
+            encode_png(image, f, profile, sinks)
+
+    _atomic_write(png_path, write)
+
+
+def _pillow_rgb16_reference(image):
+    """
+    Decode a 16-bit PPM with Pillow, channel by channel, at full precision.
+
+    Pillow opens 16-bit PPMs as 8-bit RGB, so each channel is split out
+    into a PGM, which Pillow decodes as 16-bit 'I'.
+
+    Args:
+        image: Open PNMImage of a 16-bit P3 or P6 file
+
+    Returns:
+        List of three 'I' mode images
+    """
+    channels = []
+    for channel in range(3):
+        if image.binary:
+            raster = image._data[image.offset:image.offset + image.height * image.row_bytes]
+            samples = array('H', raster)[channel::3].tobytes()  # byte order is kept
+            pgm = b'P5 %d %d %d\n' % (image.width, image.height, image.maxval) + samples
+        else:
+            samples = PNM_SAMPLE.findall(image._data, image.offset)
+            pgm = b'P2 %d %d %d\n' % (image.width, image.height, image.maxval)
+            pgm += b' '.join(samples[channel::3])
+        with Image.open(io.BytesIO(pgm)) as plane:
+            channels.append(plane.convert('I'))
+    return channels
+
+
+def verify_against_pillow(ppm_path, png_path):
+    """
+    Check that Pillow decodes the PNG to exactly the same pixels as the PPM.
+
+    Pillow reads 16-bit RGB PNGs as 8-bit RGB by taking the high byte of
+    each sample, but rounds 16-bit RGB PPMs to 8 bits, so for those the
+    PNG is compared with the high bytes of Pillow's 16-bit decode of each
+    channel instead.
+
+    Returns:
+        str: A description of the mismatch, or None if the images match
+    """
+    with Image.open(png_path) as actual:
+        actual.load()
+        with PNMImage(ppm_path) as image:
+            if image.channels == 3 and image.bit_depth == 16:
+                high_bytes = [Image.frombytes('L', plane.size, plane.tobytes('raw', 'I;16B')[::2])
+                              for plane in _pillow_rgb16_reference(image)]
+                expected = Image.merge('RGB', high_bytes)
+            else:
+                expected = Image.open(ppm_path)
+        with expected:
+            if expected.size != actual.size:
+                return f"size {actual.size} does not match {expected.size}"
+            if expected.mode in ('L', 'RGB') and actual.mode == expected.mode:
+                extrema = ImageChops.difference(expected, actual).getextrema()
+                if expected.mode == 'L':
+                    extrema = [extrema]
+                largest = max(high for _, high in extrema)
+                if largest:
+                    return f"pixels differ from Pillow's decode by up to {largest}"
+            elif expected.convert('I').tobytes() != actual.convert('I').tobytes():
+                return "pixels differ from Pillow's decode"
+    return None
+
+
+def iter_list_file(filename_list_path, output_dir):
+    """
+    Yield (ppm_path, png_path) for each PPM filename listed in a text file.
 
     Args:
         filename_list_path (str): The path to the text file containing the list of PPM filenames.
-        output_dir (str, optional): The directory where the converted PNG images will be saved.
-                                    Defaults to "output_pngs".
+        output_dir (str): The directory where the converted PNG images will be saved.
+    """
+    with open(filename_list_path, 'r') as f:
+        for line in f:
+            ppm_filename = line.strip()  # Remove leading/trailing whitespace and newline characters.
+            if ppm_filename:  # Ensure the line is not empty
+                # Construct the full path to the PPM file (adjust as needed if not in the same directory)
+                yield ppm_filename, png_path_for(ppm_filename, output_dir)
+
+
+def is_glob(source):
+    """Return True if `source` is a glob pattern rather than a path."""
+    return any(char in source for char in '*?[')
+
+
+def iter_source_files(source, output_dir):
+    """
+    Yield (ppm_path, png_path) for every file in a directory tree or glob.
+
+    Files are not filtered by name: whether they are PGM/PPM is decided
+    later from their magic bytes. Output paths keep each file's path
+    relative to the directory (or, for a glob, to the directory part
+    before the first wildcard).
+
+    Args:
+        source (str): Directory to walk, or glob pattern (`**` recurses)
+        output_dir (str): The directory where the converted PNG images will be saved.
+    """
+    output_root = os.path.abspath(output_dir)
+    if is_glob(source):
+        parts = source.replace('\\', '/').split('/')
+        static = list(itertools.takewhile(lambda part: not is_glob(part), parts[:-1]))
+        root = '/'.join(static) or '.'
+        paths = (path for path in glob.iglob(source, recursive=True) if os.path.isfile(path))
+    else:
+        root = source
+        paths = (str(path) for path in source_tree.iter_source_files(source, skip_dirs=[output_root]))
+    for path in paths:
+        if os.path.abspath(path).startswith(output_root + os.sep):
+            continue  # never pick up our own output
+        yield path, png_path_for(os.path.relpath(path, root), output_dir)
+
+
+def is_pnm_file(path):
+    """Return True if the file starts with a P2/P3/P5/P6 magic number."""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(3)
+    except OSError:
+        return False
+    return head[:2] in PNM_FORMATS and head[2:3].isspace()
+
+
+def png_path_for(ppm_filename, output_dir):
+    """Return the PNG path a listed PPM file is converted to."""
+    png_filename = os.path.splitext(ppm_filename)[0] + ".png" # {Link: Vultr Docs states the os.path.splitext() function is used to extract the file extension from the filename https://docs.vultr.com/python/examples/get-the-file-name-from-the-file-path}.
+    return os.path.join(output_dir, png_filename) # {Link: According to Vultr Docs, the os.path.join() function can be used to join one or more path components https://docs.vultr.com/python/examples/get-the-file-name-from-the-file-path}.
+
+
+def file_sha256(path):
+    """Return the hex SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(output_dir=DEFAULT_OUTPUT_DIR):
+    """
+    Load the conversion manifest from the output directory.
+
+    Returns:
+        dict: Absolute source path -> manifest entry (empty if the manifest
+        is missing, unreadable or from another manifest version)
     """
     try:
-        # Create the output directory if it doesn't exist
-        os.makedirs(output_dir, exist_ok=True) # {Link: According to HackerNoon, the os module allows you to interact with the operating system https://hackernoon.com/how-to-read-text-file-in-python}.
+        with open(os.path.join(output_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get('version') != MANIFEST_VERSION:
+        return {}
+    return data.get('files', {})
+
 
-        with open(filename_list_path, 'r') as f:
-            for line in f:
-                ppm_filename = line.strip()  # Remove leading/trailing whitespace and newline characters.
+def save_manifest(entries, output_dir=DEFAULT_OUTPUT_DIR):
+    """Atomically write the conversion manifest to the output directory."""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': MANIFEST_VERSION, 'files': entries}, f, indent=1, sort_keys=True)
+    os.replace(temp_path, manifest_path)
 
-                if ppm_filename:  # Ensure the line is not empty
-                    # Construct the full path to the PPM file (adjust as needed if not in the same directory)
-                    ppm_path = ppm_filename
 
-                    # Construct the output PNG filename
-                    png_filename = os.path.splitext(ppm_filename)[0] + ".png" # {Link: Vultr Docs states the os.path.splitext() function is used to extract the file extension from the filename https://docs.vultr.com/python/examples/get-the-file-name-from-the-file-path}.
-                    png_path = os.path.join(output_dir, png_filename) # {Link: According to Vultr Docs, the os.path.join() function can be used to join one or more path components https://docs.vultr.com/python/examples/get-the-file-name-from-the-file-path}.
+def is_up_to_date(entry, ppm_path, outputs):
+    """
+    Check whether a frame's outputs are current, so the frame can be skipped.
+
+    Every output must exist. Frames converted to the same outputs before
+    have a manifest entry: the frame is current if the source's size and
+    mtime still match it, or failing that if its hash does (e.g. the
+    renderer rewrote an identical frame), in which case the recorded
+    mtime is refreshed in place so the next run skips the hash. Frames
+    with no entry are current if all their outputs are newer than the
+    source.
 
-                    try:
-                        with Image.open(ppm_path) as img:
-                            img.save(png_path)
-                        print(f"Successfully converted {ppm_path} to {png_path}")
-                    except FileNotFoundError:
-                        print(f"Error: PPM file not found at {ppm_path}")
-                    except Exception as e:
-                        print(f"Error converting {ppm_path}: {e}")
+    Args:
+        entry (dict): The frame's manifest entry, or None
+        ppm_path (str): The source frame
+        outputs (list): Paths the frame is converted to (see output_paths_for)
+
+    Returns:
+        bool: True if the frame can be skipped
+    """
+    try:
+        oldest_output = min(os.stat(path).st_mtime_ns for path in outputs)
+        ppm_stat = os.stat(ppm_path)
+    except OSError:
+        return False
+    if not entry or entry.get('outputs') != outputs:
+        return oldest_output > ppm_stat.st_mtime_ns
+    if entry.get('size') != ppm_stat.st_size:
+        return False
+    if entry.get('mtime_ns') == ppm_stat.st_mtime_ns:
+        return True
+    if file_sha256(ppm_path) != entry.get('sha256'):
+        return False
+    entry['mtime_ns'] = ppm_stat.st_mtime_ns
+    return True
+
+
+def record_conversion(entries, ppm_path, outputs, sha256):
+    """Record a successful conversion to `outputs` in the manifest."""
+    stat = os.stat(ppm_path)
+    entries[os.path.abspath(ppm_path)] = {
+        'outputs': outputs,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': sha256,
+    }
+
+
+def convert_frame(ppm_path, png_path, decoder='native', verify=False, profile=DEFAULT_PROFILE,
+                  previews=(), webp=False):
+    """
+    Convert one PPM file to PNG, plus any previews and WebP copies.
 
+    Every product comes from a single decode of the frame. Runs in the
+    worker processes, so it never raises: errors are returned and the
+    rest of the batch carries on. The source is hashed for the manifest
+    while it is still in the page cache.
+
+    Args:
+        ppm_path (str): The PPM file to convert.
+        png_path (str): Where to save the PNG.
+        decoder (str, optional): One of DECODERS. Defaults to 'native'.
+        verify (bool, optional): Check the PNG against Pillow's decode of the PPM.
+        profile (str, optional): One of PROFILES. Defaults to 'balanced'.
+        previews (tuple, optional): Widths of downscaled PNG previews to write.
+        webp (bool, optional): Also write WebP copies of the frame and previews.
+
+    Returns:
+        tuple: (ppm_path, png_path, source bytes, source SHA-256,
+        error message or None)
+    """
+    try:
+        size = os.path.getsize(ppm_path)
+        os.makedirs(os.path.dirname(png_path) or '.', exist_ok=True)
+        paths = output_paths_for(png_path, previews, webp)
+        preview_paths = paths[1:1 + len(previews)]
+        if decoder == 'native':
+            with stage('open', ppm_path):
+                image = PNMImage(ppm_path)
+            with image:
+                builders = [PreviewBuilder(image.width, image.height, image.channels,
+                                           image.bit_depth, width) for width in previews]
+                if webp:
+                    builders.append(PreviewBuilder(image.width, image.height,
+                                                   image.channels, image.bit_depth))
+                # Rows are read from the mapping as they are encoded
+                with stage('encode', ppm_path):
+                    write_png(image, png_path, profile, builders)
+                with stage('hash', ppm_path):
+                    sha256 = image.sha256()
+            products = [builder.image() for builder in builders]
+        else:
+            with Image.open(ppm_path) as img:
+                level = PROFILES[profile]['level']
+                with stage('decode', ppm_path):
+                    img.load()
+                # 16-bit grayscale opens as mode I, which PNG cannot store as such
+                full = img.convert('I;16') if img.mode == 'I' else img
+                with stage('encode', ppm_path):
+                    _atomic_write(png_path, lambda temp: full.save(temp, 'PNG', compress_level=level))
+                products = []
+                if previews or webp:
+                    # Previews are 8-bit, like the native ones
+                    small = img if img.mode in ('L', 'RGB') else (
+                        img.point(lambda value: value * (1 / 256)).convert('L')
+                        if img.mode.startswith('I') else img.convert('RGB'))
+                    for width in previews:
+                        width = min(width, img.width)
+                        reduced = small.reduce(max(1, img.width // width))
+                        products.append(_resize_to_width(reduced, width, img.width, img.height))
+                    if webp:
+                        products.append(small.copy())
+            with stage('hash', ppm_path):
+                sha256 = file_sha256(ppm_path)
+        with stage('previews', ppm_path):
+            for product, path in zip(products, preview_paths):
+                _save_image(product, path, profile)
+            if webp:
+                for product, path in zip(products[-1:] + products[:len(previews)],
+                                         paths[1 + len(previews):]):
+                    _save_image(product, path)
+        if verify:
+            with stage('verify', ppm_path):
+                mismatch = verify_against_pillow(ppm_path, png_path)
+            if mismatch:
+                return ppm_path, png_path, 0, None, mismatch
+        if stage_metrics:
+            stage_metrics.count('files')
+            stage_metrics.count('bytes', size)
+        return ppm_path, png_path, size, sha256, None
     except FileNotFoundError:
-        print(f"Error: Filename list file not found at {filename_list_path}")
+        return ppm_path, png_path, 0, None, f"PPM file not found at {ppm_path}"
+    except Exception as e:
+        return ppm_path, png_path, 0, None, f"{type(e).__name__}: {e}"
+
+
+def _convert_frame_worker(ppm_path, png_path, **options):
+    """Process-pool entry point: convert_frame's result plus the worker's stage totals."""
+    return convert_frame(ppm_path, png_path, **options), (
+        stage_metrics.collect() if stage_metrics else None)
+
+
+def convert_frames_parallel(tasks, jobs=None, **options):
+    """
+    Convert frames on a process pool, yielding results as they complete.
+
+    Frames are submitted as they arrive from `tasks`, with at most
+    POOL_TASKS_PER_WORKER per worker in flight.
+
+    Args:
+        tasks: Iterable of (ppm_path, png_path) tuples
+        jobs (int, optional): Number of worker processes (None = CPU count)
+        **options: Passed on to convert_frame (decoder, verify, profile, ...)
+
+    Yields:
+        tuple: The result of convert_frame for each frame
+    """
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    max_pending = (jobs or os.cpu_count() or 1) * POOL_TASKS_PER_WORKER
+
+    def collect(future):
+        try:
+            result, totals = future.result()
+        except Exception as e:
+            # The worker process itself died (e.g. BrokenProcessPool)
+            ppm_path, png_path = futures[future]
+            return ppm_path, png_path, 0, None, f"{type(e).__name__}: {e}"
+        if stage_metrics:
+            stage_metrics.merge(totals)
+        return result
+
+    def drain():
+        finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for future in finished:
+            yield collect(future)
+            del futures[future]
+
+    pool_options = stage_metrics.pool_options() if stage_metrics else {}
+    with ProcessPoolExecutor(max_workers=jobs, **pool_options) as executor:
+        futures = {}
+        for ppm_path, png_path in tasks:
+            future = executor.submit(_convert_frame_worker, ppm_path, png_path, **options)
+            futures[future] = (ppm_path, png_path)
+            if len(futures) >= max_pending:
+                yield from drain()
+        while futures:
+            yield from drain()
+
+
+def convert_frames(frames, output_dir, jobs=1, force=False, **options):
+    """
+    Convert a stream of frames, skipping those already up to date.
+
+    Files that are not PGM/PPM by their magic bytes and frames whose PNG
+    is current (see is_up_to_date) never reach the converter; both checks
+    run in this process as the frames arrive, so an unchanged frame costs
+    two stats. Results are reported in completion order, and a frame
+    that fails is reported without stopping the batch.
+
+    Args:
+        frames: Iterable of (ppm_path, png_path) tuples
+        output_dir (str): The directory holding the PNGs and the manifest
+        jobs (int, optional): As for convert_ppm_to_png_from_list
+        force (bool, optional): Convert every frame, even if up to date.
+        **options: Passed on to convert_frame (decoder, verify, profile, ...)
+
+    Returns:
+        tuple: (frames converted, frames failed, frames skipped)
+    """
+    converted = failed = skipped = ignored = 0
+    total_bytes = 0
+    start_time = time.perf_counter()
+
+    # Create the output directory if it doesn't exist
+    os.makedirs(output_dir, exist_ok=True) # {Link: According to HackerNoon, the os module allows you to interact with the operating system https://hackernoon.com/how-to-read-text-file-in-python}.
+    entries = load_manifest(output_dir)
+
+    def outputs_of(png_path):
+        return output_paths_for(png_path, options.get('previews', ()), options.get('webp', False))
+
+    def pending():
+        nonlocal skipped, ignored
+        discovered = stage_metrics.timed_iter('discover', frames) if stage_metrics else frames
+        for ppm_path, png_path in discovered:
+            entry = entries.get(os.path.abspath(ppm_path))
+            with stage('check', ppm_path):
+                current = not force and is_up_to_date(entry, ppm_path, outputs_of(png_path))
+            if current:
+                skipped += 1
+            elif os.path.isfile(ppm_path) and not is_pnm_file(ppm_path):
+                ignored += 1
+            else:
+                yield ppm_path, png_path
+
+    try:
+        if jobs == 1:
+            results = (convert_frame(ppm_path, png_path, **options)
+                       for ppm_path, png_path in pending())
+        else:
+            results = convert_frames_parallel(pending(), jobs, **options)
+
+        for ppm_path, png_path, size, sha256, error in results:
+            if error is None:
+                converted += 1
+                total_bytes += size
+                record_conversion(entries, ppm_path, outputs_of(png_path), sha256)
+                print(f"Successfully converted {ppm_path} to {png_path}")
+            else:
+                failed += 1
+                print(f"Error converting {ppm_path}: {error}")
+
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
+    finally:
+        with stage('manifest', output_dir):
+            save_manifest(entries, output_dir)
+
+    elapsed = max(time.perf_counter() - start_time, 1e-9)
+    print(f"\n{'='*50}")
+    print(f"Converted {converted}/{converted + failed} frames "
+          f"({total_bytes / 1024 / 1024:.1f} MB) in {elapsed:.2f}s")
+    print(f"Skipped {skipped} up-to-date frames, ignored {ignored} non-PPM files")
+    print(f"Throughput: {converted / elapsed:.1f} frames/s, "
+          f"{total_bytes / 1024 / 1024 / elapsed:.1f} MB/s")
+    print(f"{'='*50}")
+    return converted, failed, skipped
+
+
+def convert_ppm_to_png_from_list(filename_list_path, output_dir="output_pngs", jobs=1,
+                                 decoder='native', verify=False, force=False,
+                                 profile=DEFAULT_PROFILE, previews=(), webp=False):
+    """
+    Converts PPM image files to PNG format, where the PPM filenames are listed in a text file.
+
+    The list is streamed rather than loaded. Lines that name non-PPM files
+    (by their magic bytes) are ignored, and frames whose PNG is up to date
+    are skipped.
+
+    Args:
+        filename_list_path (str): The path to the text file containing the list of PPM filenames.
+        output_dir (str, optional): The directory where the converted PNG images will be saved.
+                                    Defaults to "output_pngs".
+        jobs (int, optional): Number of worker processes; 1 converts in this
+                              process, None uses one per CPU. Defaults to 1.
+        decoder (str, optional): 'native' streams frames through PNMImage and
+                                 PNGWriter; 'pillow' uses Image.open().save().
+        verify (bool, optional): Check each PNG against Pillow's decode of its PPM.
+        force (bool, optional): Reconvert frames even if their PNG is up to date.
+        profile (str, optional): Encoding profile, one of PROFILES. Defaults to 'balanced'.
+        previews (tuple, optional): Widths of downscaled previews to write next
+                                    to each PNG, from the same decode.
+        webp (bool, optional): Also write WebP copies of each frame and preview
+                               (needs Pillow with WebP support).
+
+    Returns:
+        tuple: (frames converted, frames failed, frames skipped), or None if
+        the list could not be read
+    """
+    if not os.path.isfile(filename_list_path):
+        print(f"Error: Filename list file not found at {filename_list_path}")
+        return None
+    frames = source_tree.discover_in_background(
+        iter_list_file(filename_list_path, output_dir), LIST_QUEUE_SIZE, name='ppm-discovery')
+    return convert_frames(frames, output_dir, jobs, force, decoder=decoder, verify=verify,
+                          profile=profile, previews=tuple(previews), webp=webp)
+
+
+def convert_ppm_files(source, output_dir=DEFAULT_OUTPUT_DIR, jobs=1, decoder='native',
+                      verify=False, force=False, profile=DEFAULT_PROFILE, previews=(), webp=False):
+    """
+    Convert every PGM/PPM file in a directory tree or matching a glob.
+
+    Files are recognised by their magic bytes, whatever they are named,
+    and the directory is walked on a background thread while frames are
+    converted. PNGs mirror the source layout under `output_dir`.
+
+    Args:
+        source (str): Directory to walk, or glob pattern (`**` recurses)
+        output_dir, jobs, decoder, verify, force, profile, previews, webp:
+            As for convert_ppm_to_png_from_list
+
+    Returns:
+        tuple: (frames converted, frames failed, frames skipped), or None if
+        `source` is not a directory and matches nothing
+    """
+    if not is_glob(source) and not os.path.isdir(source):
+        print(f"Error: directory not found at {source}")
+        return None
+    frames = source_tree.discover_in_background(
+        iter_source_files(source, output_dir), LIST_QUEUE_SIZE, name='ppm-discovery')
+    return convert_frames(frames, output_dir, jobs, force, decoder=decoder, verify=verify,
+                          profile=profile, previews=tuple(previews), webp=webp)
+
+
+def parse_args(argv=None):
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Batch convert PPM images to PNG.")
+    parser.add_argument(
+        'source', nargs='?', default=DEFAULT_LIST,
+        help="text file with one PPM filename per line, a directory to search, or a "
+             f"quoted glob such as 'renders/**/*' (default: {DEFAULT_LIST})"
+    )
+    parser.add_argument(
+        '-o', '--output-dir', default=DEFAULT_OUTPUT_DIR,
+        help=f"directory the PNG images are saved to (default: {DEFAULT_OUTPUT_DIR})"
+    )
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=0,
+        help="number of worker processes (default: 0 = one per CPU, 1 = serial)"
+    )
+    parser.add_argument(
+        '--decoder', choices=DECODERS, default='native',
+        help="'native' memory-maps P2/P3/P5/P6 files and writes PNGs row by row; "
+             "'pillow' decodes whole images with Pillow (default: native)"
+    )
+    parser.add_argument(
+        '--verify-against-pillow', action='store_true',
+        help="check every PNG decodes to the same pixels as Pillow's decode of its PPM"
+    )
+    parser.add_argument(
+        '-f', '--force', action='store_true',
+        help="reconvert frames whose PNG is already up to date"
+    )
+    parser.add_argument(
+        '-p', '--profile', choices=PROFILES, default=DEFAULT_PROFILE,
+        help="encoding profile: 'fast' (zlib level 1, sub filter), 'balanced' (level 6, "
+             "adaptive filter) or 'smallest' (level 9, adaptive filter) (default: balanced)"
+    )
+    parser.add_argument(
+        '--preview', type=int, action='append', default=[], metavar='WIDTH',
+        help="also write a preview WIDTH pixels wide as <name>.<WIDTH>w.png, from the "
+             "same decode (repeatable; needs Pillow)"
+    )
+    parser.add_argument(
+        '--webp', action='store_true',
+        help="also write WebP copies of each frame and preview (needs Pillow with WebP)"
+    )
+    if stage_metrics:
+        stage_metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+    if Image is None and (args.decoder == 'pillow' or args.verify_against_pillow
+                          or args.preview or args.webp):
+        parser.error("--decoder pillow, --verify-against-pillow, --preview and --webp "
+                     "need Pillow (pip install Pillow)")
+    if args.webp and not features.check('webp'):
+        parser.error("--webp needs Pillow built with WebP support")
+    if any(width < 1 for width in args.preview):
+        parser.error("--preview widths must be positive")
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 or greater")
+    args.jobs = args.jobs or None
+    return args
+
 
 # Example Usage
 
@@ -48,5 +1079,24 @@ def convert_ppm_to_png_from_list(filename_list_path, output_dir="output_pngs"):
 #    another_image.ppm
 #    my_cool_picture.ppm
 
-# 2. Call the function with the path to your filename list file
-convert_ppm_to_png_from_list("ppm_files.txt", output_dir="converted_images")
+# 2. Run the script (or call convert_ppm_to_png_from_list with the path to your filename list file)
+#    python ppm2png.py ppm_files.txt -o converted_images -j 4
+#
+#    Or point it at a render folder (or a glob) to convert every PPM in it:
+#    python ppm2png.py renders/ -o converted_images
+if __name__ == '__main__':
+    args = parse_args()
+    options = dict(output_dir=args.output_dir, jobs=args.jobs, decoder=args.decoder,
+                   verify=args.verify_against_pillow, force=args.force, profile=args.profile,
+                   previews=tuple(dict.fromkeys(args.preview)), webp=args.webp)
+    if stage_metrics:
+        stage_metrics.enable_from_args('ppm2png', args)
+    try:
+        if os.path.isdir(args.source) or is_glob(args.source):
+            result = convert_ppm_files(args.source, **options)
+        else:
+            result = convert_ppm_to_png_from_list(args.source, **options)
+    finally:
+        if stage_metrics:
+            stage_metrics.finish()
+    sys.exit(0 if result and not result[1] else 1)
@@ -0,0 +1,447 @@
+"""
+Round-trip tests for the native PGM/PPM reader and PNG writer.
+
+Every frame is generated from known samples, converted with write_png and
+decoded again with Pillow, which must give exactly the source pixels.
+Pillow only exposes the high byte of 16-bit RGB PNGs, so for those the
+full samples are also checked by unfiltering the PNG's IDAT stream here.
+Previews and WebP copies are checked for size, mode and colour, and
+batches run on the process pool must give the same PNGs as serial ones.
+Discovery from list files, folders and globs and the skip manifest are
+tested on small frame trees.
+
+Run with: python -m pytest PPM2PNG
+"""
+
+import io
+import os
+import random
+import struct
+import zlib
+
+import pytest
+
+import ppm2png
+
+Image = pytest.importorskip('PIL.Image')
+
+# (magic, channels, binary) for every format the native decoder reads
+FORMATS = [('P2', 1, False), ('P3', 3, False), ('P5', 1, True), ('P6', 3, True)]
+
+# 8- and 16-bit at full range, plus maxvals that have to be rescaled
+MAXVALS = [255, 65535, 100, 1000]
+
+# Odd widths catch filter and row-length mistakes at the right edge
+SIZES = [(1, 1), (3, 2), (7, 5), (33, 9)]
+
+
+def make_pnm(magic, channels, binary, width, height, maxval, seed=0):
+    """Return (file bytes, rows of sample values) for a random PGM/PPM frame."""
+    rng = random.Random(seed)
+    rows = [[rng.randint(0, maxval) for _ in range(width * channels)] for _ in range(height)]
+    header = f"{magic}\n# test frame\n{width} {height}\n{maxval}\n".encode('ascii')
+    if binary:
+        sample_format = '>%dB' if maxval < 256 else '>%dH'
+        raster = b''.join(struct.pack(sample_format % len(row), *row) for row in rows)
+    else:
+        raster = b'\n'.join(b' '.join(b'%d' % value for value in row) for row in rows) + b'\n'
+    return header + raster, rows
+
+
+def scaled(rows, maxval):
+    """Scale samples to the full 8- or 16-bit range, the way Pillow does."""
+    top = 255 if maxval < 256 else 65535
+    return [[round(value / maxval * top) for value in row] for row in rows]
+
+
+def paeth(left, up, up_left):
+    estimate = left + up - up_left
+    distances = abs(estimate - left), abs(estimate - up), abs(estimate - up_left)
+    if distances[0] <= distances[1] and distances[0] <= distances[2]:
+        return left
+    return up if distances[1] <= distances[2] else up_left
+
+
+def png_samples(png):
+    """Decode a 16-bit PNG to rows of sample values, independently of ppm2png."""
+    position = len(ppm2png.PNG_SIGNATURE)
+    compressed = b''
+    while position < len(png):
+        length, kind = struct.unpack('>I4s', png[position:position + 8])
+        body = png[position + 8:position + 8 + length]
+        if kind == b'IHDR':
+            width, height, bit_depth, color_type = struct.unpack('>IIBB', body[:10])
+        elif kind == b'IDAT':
+            compressed += body
+        position += 12 + length
+    assert bit_depth == 16
+    bpp = {0: 2, 2: 6}[color_type]
+    stride = width * bpp
+    data = zlib.decompress(compressed)
+    previous = bytearray(stride)
+    rows = []
+    for y in range(height):
+        filter_type = data[y * (stride + 1)]
+        row = bytearray(data[y * (stride + 1) + 1:(y + 1) * (stride + 1)])
+        for x in range(stride):
+            left = row[x - bpp] if x >= bpp else 0
+            up_left = previous[x - bpp] if x >= bpp else 0
+            predictor = (0, left, previous[x], (left + previous[x]) // 2,
+                         paeth(left, previous[x], up_left))[filter_type]
+            row[x] = (row[x] + predictor) & 0xFF
+        rows.append(list(struct.unpack('>%dH' % (stride // 2), row)))
+        previous = row
+    return rows
+
+
+def pillow_rows(png, channels):
+    """Decode a PNG with Pillow to rows of sample values."""
+    with Image.open(io.BytesIO(png)) as image:
+        width, _ = image.size
+        # getdata is deprecated from Pillow 12 in favour of get_flattened_data
+        pixels = list(getattr(image, 'get_flattened_data', image.getdata)())
+    if channels == 3:
+        pixels = [sample for pixel in pixels for sample in pixel]
+    per_row = width * channels
+    return [pixels[start:start + per_row] for start in range(0, len(pixels), per_row)]
+
+
+def convert(tmp_path, data, profile=ppm2png.DEFAULT_PROFILE):
+    """Write a frame to disk, convert it with write_png and return the paths."""
+    ppm_path = tmp_path / 'frame.pnm'
+    png_path = tmp_path / 'frame.png'
+    ppm_path.write_bytes(data)
+    with ppm2png.PNMImage(str(ppm_path)) as image:
+        ppm2png.write_png(image, str(png_path), profile)
+    return ppm_path, png_path
+
+
+@pytest.mark.parametrize('magic,channels,binary', FORMATS)
+@pytest.mark.parametrize('maxval', MAXVALS)
+@pytest.mark.parametrize('width,height', SIZES)
+@pytest.mark.parametrize('profile', sorted(ppm2png.PROFILES))
+def test_round_trip_is_pixel_exact(tmp_path, magic, channels, binary, maxval, width, height,
+                                   profile):
+    data, rows = make_pnm(magic, channels, binary, width, height, maxval, seed=width * maxval)
+    ppm_path, png_path = convert(tmp_path, data, profile)
+    png = png_path.read_bytes()
+    expected = scaled(rows, maxval)
+
+    if channels == 3 and maxval > 255:
+        assert pillow_rows(png, channels) == [[value >> 8 for value in row] for row in expected]
+        assert png_samples(png) == expected
+    else:
+        assert pillow_rows(png, channels) == expected
+
+    assert ppm2png.verify_against_pillow(str(ppm_path), str(png_path)) is None
+
+
+@pytest.mark.parametrize('magic,channels,binary', FORMATS)
+def test_matches_pillows_own_decode(tmp_path, magic, channels, binary):
+    data, _ = make_pnm(magic, channels, binary, 17, 6, 255, seed=7)
+    ppm_path, png_path = convert(tmp_path, data)
+    with Image.open(ppm_path) as expected, Image.open(png_path) as actual:
+        assert actual.mode == expected.mode
+        assert actual.tobytes() == expected.tobytes()
+
+
+@pytest.mark.parametrize('png_filter', ppm2png.PNG_FILTERS)
+@pytest.mark.parametrize('maxval', [255, 65535])
+def test_every_filter_round_trips(png_filter, maxval):
+    data, rows = make_pnm('P6', 3, True, 9, 7, maxval, seed=3)
+    out = io.BytesIO()
+    with ppm2png.PNMImage('<test>', data=data) as image:
+        writer = ppm2png.PNGWriter(out, image.width, image.height, image.channels,
+                                   image.bit_depth, png_filter=png_filter)
+        for row in image.rows():
+            writer.write_row(row)
+        writer.close()
+    if maxval > 255:
+        assert png_samples(out.getvalue()) == rows
+    else:
+        assert pillow_rows(out.getvalue(), 3) == rows
+
+
+def test_verify_reports_a_changed_pixel(tmp_path):
+    data, _ = make_pnm('P6', 3, True, 4, 4, 65535, seed=1)
+    ppm_path, png_path = convert(tmp_path, data)
+    tampered = bytearray(data)
+    tampered[-2] ^= 0x80  # high byte of the last sample
+    ppm_path.write_bytes(bytes(tampered))
+    assert ppm2png.verify_against_pillow(str(ppm_path), str(png_path)) is not None
+
+
+@pytest.mark.parametrize('data,message', [
+    (b'P', 'too short'),
+    (b'P7 1 1 255\n\0', 'magic'),
+    (b'P6 2 2 255\n\0\0\0', 'truncated'),
+    (b'P5 1 1 0\n\0', 'invalid header'),
+])
+def test_rejects_malformed_files(data, message):
+    with pytest.raises(ValueError, match=message):
+        ppm2png.PNMImage('<test>', data=data)
+
+
+# --- Previews and WebP -------------------------------------------------------
+
+def block_frame(width, height, maxval=255):
+    """A P6 frame of four flat quadrants, so downscaling keeps exact colors."""
+    colors = [(200, 10, 10), (10, 200, 10), (10, 10, 200), (250, 250, 0)]
+    top = 255 if maxval < 256 else 65535
+    rows = []
+    for y in range(height):
+        row = []
+        for x in range(width):
+            color = colors[(y >= height // 2) * 2 + (x >= width // 2)]
+            row.extend(value * top // 255 for value in color)
+        rows.append(row)
+    header = f"P6\n{width} {height}\n{maxval}\n".encode('ascii')
+    sample_format = '>%dB' if maxval < 256 else '>%dH'
+    return header + b''.join(struct.pack(sample_format % len(row), *row) for row in rows)
+
+
+def test_output_paths_for_previews_and_webp():
+    assert ppm2png.output_paths_for('out/f.png', (320, 64), webp=True) == [
+        'out/f.png', 'out/f.320w.png', 'out/f.64w.png',
+        'out/f.webp', 'out/f.320w.webp', 'out/f.64w.webp',
+    ]
+    assert ppm2png.output_paths_for('f.png') == ['f.png']
+
+
+@pytest.mark.parametrize('decoder', ppm2png.DECODERS)
+@pytest.mark.parametrize('maxval', [255, 65535])
+def test_previews_and_webp_come_from_one_decode(tmp_path, decoder, maxval):
+    from PIL import features
+    if not features.check('webp'):
+        pytest.skip("Pillow was built without WebP")
+    ppm_path = tmp_path / 'frame.ppm'
+    ppm_path.write_bytes(block_frame(160, 96, maxval))
+    png_path = tmp_path / 'out' / 'frame.png'
+    result = ppm2png.convert_frame(str(ppm_path), str(png_path), decoder=decoder,
+                                   previews=(40, 30, 500), webp=True)
+    assert result[-1] is None
+
+    sizes = {'frame.png': (160, 96), 'frame.40w.png': (40, 24), 'frame.30w.png': (30, 18),
+             'frame.500w.png': (160, 96), 'frame.webp': (160, 96), 'frame.40w.webp': (40, 24),
+             'frame.30w.webp': (30, 18), 'frame.500w.webp': (160, 96)}
+    assert sorted(path.name for path in png_path.parent.iterdir()) == sorted(sizes)
+    for name, size in sizes.items():
+        with Image.open(png_path.parent / name) as image:
+            assert image.size == size
+            if name == 'frame.png':
+                continue
+            # Previews are always 8-bit
+            assert image.mode == 'RGB'
+            corner = image.getpixel((2, 2))
+            tolerance = 8 if name.endswith('.webp') else 0
+            assert all(abs(a - b) <= tolerance for a, b in zip(corner, (200, 10, 10)))
+            corner = image.getpixel((size[0] - 3, size[1] - 3))
+            assert all(abs(a - b) <= tolerance for a, b in zip(corner, (250, 250, 0)))
+
+
+def test_preview_builder_streams_in_strips():
+    width, height = 50, ppm2png.PREVIEW_STRIP_ROWS * 2 + 7
+    builder = ppm2png.PreviewBuilder(width, height, 1, 8, target_width=10)
+    for y in range(height):
+        builder.write_row(bytes([y % 256]) * width)
+    image = builder.image()
+    assert image.size == (10, round(height / 5))
+    assert image.mode == 'L'
+    # Box reduction by 5: each preview row averages five source rows
+    assert image.getpixel((0, 0)) == 2
+    assert image.getpixel((0, 1)) == 7
+
+
+# --- Process pool ------------------------------------------------------------
+
+def write_frames(directory, count, width=9, height=5):
+    """Write `count` distinct P6 frames; returns {path: rows}."""
+    directory.mkdir(parents=True, exist_ok=True)
+    frames = {}
+    for i in range(count):
+        data, rows = make_pnm('P6', 3, True, width, height, 255, seed=100 + i)
+        path = directory / f'frame{i:03d}.ppm'
+        path.write_bytes(data)
+        frames[str(path)] = rows
+    return frames
+
+
+def test_pool_converts_every_frame_and_reports_failures(tmp_path):
+    frames = write_frames(tmp_path / 'in', 7)
+    broken = tmp_path / 'in' / 'broken.ppm'
+    broken.write_bytes(b'P6 4 4 255\n\0\0\0')
+    tasks = [(path, str(tmp_path / 'out' / (os.path.basename(path)[:-4] + '.png')))
+             for path in list(frames) + [str(broken), str(tmp_path / 'missing.ppm')]]
+
+    results = {ppm_path: (png_path, size, sha256, error)
+               for ppm_path, png_path, size, sha256, error
+               in ppm2png.convert_frames_parallel(iter(tasks), jobs=2)}
+
+    assert sorted(results) == sorted(ppm_path for ppm_path, _ in tasks)
+    for ppm_path, rows in frames.items():
+        png_path, size, sha256, error = results[ppm_path]
+        assert error is None
+        assert size == os.path.getsize(ppm_path)
+        assert sha256 == ppm2png.file_sha256(ppm_path)
+        with open(png_path, 'rb') as f:
+            assert pillow_rows(f.read(), 3) == rows
+    assert 'truncated' in results[str(broken)][3]
+    assert 'not found' in results[str(tmp_path / 'missing.ppm')][3]
+
+
+def test_pool_reads_tasks_only_a_little_ahead(tmp_path):
+    frames = write_frames(tmp_path / 'in', 20, width=3, height=2)
+    jobs = 2
+    taken = []
+
+    def tasks():
+        for path in frames:
+            taken.append(path)
+            yield path, path[:-4] + '.png'
+
+    results = ppm2png.convert_frames_parallel(tasks(), jobs=jobs)
+    next(results)
+    # The first result arrives once the in-flight limit is reached
+    assert len(taken) <= jobs * ppm2png.POOL_TASKS_PER_WORKER
+    assert len(list(results)) == len(frames) - 1
+
+
+@pytest.mark.parametrize('jobs', [1, 3])
+def test_batch_output_does_not_depend_on_jobs(tmp_path, monkeypatch, jobs):
+    frames = write_frames(tmp_path / 'in', 6)
+    monkeypatch.chdir(tmp_path)
+    names = [os.path.relpath(path, tmp_path) for path in frames]
+    (tmp_path / 'frames.txt').write_text('\n'.join(names) + '\n', encoding='utf-8')
+    assert ppm2png.convert_ppm_to_png_from_list('frames.txt', 'out', jobs=jobs) == (6, 0, 0)
+    for name, rows in zip(names, frames.values()):
+        with open(os.path.join('out', name[:-4] + '.png'), 'rb') as f:
+            assert pillow_rows(f.read(), 3) == rows
+
+
+# --- Discovery: list files, folders and globs ---------------------------------
+
+def test_list_file_skips_blank_lines(tmp_path):
+    list_path = tmp_path / 'frames.txt'
+    list_path.write_text('a/one.ppm\n\n  two.pgm  \n\n', encoding='utf-8')
+    assert list(ppm2png.iter_list_file(str(list_path), 'out')) == [
+        ('a/one.ppm', os.path.join('out', 'a/one.png')),
+        ('two.pgm', os.path.join('out', 'two.png')),
+    ]
+
+
+def make_render_tree(root):
+    """Frames at several depths, a non-frame, and an earlier output inside the tree."""
+    write_frames(root, 1)
+    write_frames(root / 'shot1', 2)
+    write_frames(root / 'shot1' / 'takes', 1)
+    (root / 'notes.txt').write_text('not a frame', encoding='utf-8')
+    (root / 'pngs').mkdir()
+    (root / 'pngs' / 'old.ppm').write_bytes(make_pnm('P5', 1, True, 2, 2, 255)[0])
+
+
+def discovered(source, output_dir, root):
+    return sorted((os.path.relpath(ppm_path, root).replace(os.sep, '/'),
+                   os.path.relpath(png_path, output_dir).replace(os.sep, '/'))
+                  for ppm_path, png_path in ppm2png.iter_source_files(source, output_dir))
+
+
+def test_folder_discovery_mirrors_the_tree_and_skips_the_output_dir(tmp_path):
+    make_render_tree(tmp_path)
+    output_dir = str(tmp_path / 'pngs')
+    assert discovered(str(tmp_path), output_dir, tmp_path) == [
+        ('frame000.ppm', 'frame000.png'),
+        ('notes.txt', 'notes.png'),  # left for the magic-byte check
+        ('shot1/frame000.ppm', 'shot1/frame000.png'),
+        ('shot1/frame001.ppm', 'shot1/frame001.png'),
+        ('shot1/takes/frame000.ppm', 'shot1/takes/frame000.png'),
+    ]
+
+
+@pytest.mark.parametrize('pattern,expected', [
+    ('shot1/*.ppm', [('shot1/frame000.ppm', 'frame000.png'),
+                     ('shot1/frame001.ppm', 'frame001.png')]),
+    ('shot1/**/*.ppm', [('shot1/frame000.ppm', 'frame000.png'),
+                        ('shot1/frame001.ppm', 'frame001.png'),
+                        ('shot1/takes/frame000.ppm', 'takes/frame000.png')]),
+    ('**/frame000.*', [('frame000.ppm', 'frame000.png'),
+                       ('shot1/frame000.ppm', 'shot1/frame000.png'),
+                       ('shot1/takes/frame000.ppm', 'shot1/takes/frame000.png')]),
+])
+def test_glob_discovery_is_relative_to_the_fixed_part(tmp_path, monkeypatch, pattern, expected):
+    make_render_tree(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    assert discovered(pattern, 'pngs', tmp_path) == expected
+
+
+def test_missing_folder_is_reported(tmp_path, capsys):
+    assert ppm2png.convert_ppm_files(str(tmp_path / 'missing'), str(tmp_path / 'out')) is None
+    assert 'directory not found' in capsys.readouterr().out
+
+
+# --- Skip manifest -------------------------------------------------------------
+
+def converted_frames(capsys):
+    out = capsys.readouterr().out
+    return sorted(line.split()[2] for line in out.splitlines()
+                  if line.startswith('Successfully converted'))
+
+
+def test_up_to_date_frames_are_skipped_and_changed_ones_reconverted(tmp_path, capsys):
+    source, output_dir = tmp_path / 'renders', tmp_path / 'pngs'
+    frames = list(write_frames(source, 3))
+    (source / 'notes.txt').write_text('not a frame', encoding='utf-8')
+
+    def run(**kwargs):
+        return ppm2png.convert_ppm_files(str(source), str(output_dir), **kwargs)
+
+    assert run() == (3, 0, 0)
+    assert converted_frames(capsys) == sorted(frames)
+    assert run() == (0, 0, 3)
+    assert converted_frames(capsys) == []
+
+    # New content: reconverted
+    changed = make_pnm('P6', 3, True, 9, 5, 255, seed=999)
+    with open(frames[0], 'wb') as f:
+        f.write(changed[0])
+    # Same content written again (a touch): skipped after a hash check,
+    # and the manifest's mtime is refreshed so the next run needs no hash
+    with open(frames[1], 'rb') as f:
+        same = f.read()
+    with open(frames[1], 'wb') as f:
+        f.write(same)
+    os.utime(frames[1], ns=(os.stat(frames[1]).st_atime_ns,
+                            os.stat(frames[1]).st_mtime_ns + 10**9))
+    # A deleted output: reconverted
+    os.remove(ppm2png.png_path_for('frame002.ppm', str(output_dir)))
+
+    assert run() == (2, 0, 1)
+    assert converted_frames(capsys) == [frames[0], frames[2]]
+    with open(output_dir / 'frame000.png', 'rb') as f:
+        assert pillow_rows(f.read(), 3) == changed[1]
+    entry = ppm2png.load_manifest(str(output_dir))[os.path.abspath(frames[1])]
+    assert entry['mtime_ns'] == os.stat(frames[1]).st_mtime_ns
+
+    assert run() == (0, 0, 3)
+    assert run(force=True) == (3, 0, 0)
+
+
+def test_asking_for_previews_reconverts_frames_without_them(tmp_path):
+    source, output_dir = tmp_path / 'renders', tmp_path / 'pngs'
+    write_frames(source, 2, width=40, height=20)
+    assert ppm2png.convert_ppm_files(str(source), str(output_dir)) == (2, 0, 0)
+    assert ppm2png.convert_ppm_files(str(source), str(output_dir), previews=(10,)) == (2, 0, 0)
+    assert (output_dir / 'frame001.10w.png').exists()
+    assert ppm2png.convert_ppm_files(str(source), str(output_dir), previews=(10,)) == (0, 0, 2)
+
+
+def test_frames_without_a_manifest_entry_are_compared_by_mtime(tmp_path):
+    ppm_path = tmp_path / 'a.ppm'
+    png_path = tmp_path / 'a.png'
+    ppm_path.write_bytes(b'P5 1 1 255\n\0')
+    png_path.write_bytes(b'png')
+    os.utime(ppm_path, ns=(0, 10**18))
+    os.utime(png_path, ns=(0, 2 * 10**18))
+    assert ppm2png.is_up_to_date(None, str(ppm_path), [str(png_path)])
+    os.utime(png_path, ns=(0, 10**18 - 1))
+    assert not ppm2png.is_up_to_date(None, str(ppm_path), [str(png_path)])
+    assert not ppm2png.is_up_to_date(None, str(ppm_path), [str(png_path), str(tmp_path / 'x')])
@@ -1,21 +1,1472 @@
-# Script for backing up Redmine
+#!/usr/bin/env python3
+"""
+Redmine Backup Archiver
 
-import os
+Script for backing up Redmine: packs the files in a source directory into
+a dated, compressed tar archive in a destination directory. Each archive
+gets a snapshot manifest next to it, so later runs can be incremental or
+differential and a restore can replay the chain.
+
+Compression runs on a thread pool. The tar stream is cut into fixed-size
+blocks that are compressed independently (zlib and zstd release the GIL
+while they work) and written back in order, each block as one member of a
+standard multi-member gzip file (or one frame of a zstd file), which
+`tar xzf`, gunzip and zstd read as usual.
+
+With --seekable the block boundaries are also recorded in a seek index
+next to the archive, so `archiver.py list ARCHIVE` and
+`archiver.py extract ARCHIVE PATH...` can get at one file by seeking
+straight to the blocks that hold it.
+
+Files are hashed as tarfile reads them, so every archive carries a
+SHA-256 manifest (as its last member and as a detached <name>.sha256)
+without reading the sources twice; `archiver.py verify ARCHIVE` checks an
+archive against it in one streaming pass.
+"""
+
+import argparse
+import contextlib
 import datetime
 import glob
+import gzip
+import hashlib
+import io
+import json
+import os
+import random
+import sys
 import tarfile
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from compression import zstd  # Python 3.14+
+except ImportError:
+    zstd = None
+
+try:
+    import stage_metrics
+    from stage_metrics import stage
+except ImportError:
+    # Without stage_metrics.py next to this script, stages are not measured
+    stage_metrics = None
+
+    def stage(name, item=None):
+        return contextlib.nullcontext()
+
+# Default source and destination of the Redmine backup
+SRC = "C:/Users/SCiPnet/Downloads"
+DST = "C:/Users/SCiPnet/Desktop/Redmine"
+ARCHIVE_PREFIX = "Redmine-"
+
+# Compression formats, their archive suffixes and default levels
+COMPRESSIONS = ('gzip', 'zstd')
+ARCHIVE_SUFFIXES = {'gzip': '.tar.gz', 'zstd': '.tar.zst'}
+DEFAULT_LEVELS = {'gzip': 6, 'zstd': 3}
+
+# Backup modes and the suffix each adds to the default archive name
+BACKUP_MODES = ('full', 'incremental', 'differential')
+MODE_SUFFIXES = {'full': '', 'incremental': '-incr', 'differential': '-diff'}
+
+# Snapshot manifests stored next to the archives
+SNAPSHOT_SUFFIX = '.snapshot.json'
+SNAPSHOT_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Backends: tar archives, or the deduplicating chunk store
+BACKENDS = ('tar', 'chunks')
+
+# Chunk store: directory under the backup destination, content-defined
+# chunk sizes (average 2**CHUNK_AVERAGE_BITS), read size, bytes hashed per
+# step of the boundary search, per-snapshot index suffix and chunk file
+# suffix per compression
+CHUNK_STORE_DIR = 'chunks'
+CHUNK_MIN_SIZE = 16 * 1024
+CHUNK_AVERAGE_BITS = 16
+CHUNK_MAX_SIZE = 256 * 1024
+CHUNK_MASK = ((1 << CHUNK_AVERAGE_BITS) - 1) << (32 - CHUNK_AVERAGE_BITS)
+CHUNK_READ_SIZE = 4 * 1024 * 1024
+CHUNK_SCAN_BLOCK = 16 * 1024
+CHUNK_INDEX_SUFFIX = '.chunks.json'
+CHUNK_SUFFIXES = {'gzip': '.z', 'zstd': '.zst'}
+GEAR_SEED = 0x67656172
+
+# Sidecar index of a seekable archive (stored as <name><suffix>)
+SEEK_INDEX_SUFFIX = '.seek.json'
+
+# Checksum manifest, in `sha256sum` format: added as the last member of
+# every tar archive and written next to it as <name><suffix>
+MANIFEST_NAME = '.archive-manifest.sha256'
+MANIFEST_SUFFIX = '.sha256'
+
+# Uncompressed bytes per independently compressed block, and blocks queued
+# or in progress per worker thread
+BLOCK_SIZE = 1024 * 1024
+BLOCKS_PER_WORKER = 2
+
+
+def compress_gzip_block(block, level):
+    """Compress one block as a complete gzip member."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(block) + compressor.flush()
+
+
+def compress_zstd_block(block, level):
+    """Compress one block as a complete zstd frame."""
+    return zstd.compress(block, level=level)
+
+
+BLOCK_COMPRESSORS = {
+    'gzip': compress_gzip_block,
+    'zstd': compress_zstd_block,
+}
+
+
+class ParallelCompressWriter:
+    """
+    Write-only file object that compresses blocks on a thread pool.
+
+    Data is buffered into blocks of `block_size` bytes; each full block is
+    handed to a worker thread and the compressed blocks are written to
+    `fileobj` in their original order. At most BLOCKS_PER_WORKER blocks
+    per worker are in flight, so memory use stays bounded however large
+    the archive gets.
+
+    tell() reports the uncompressed position, which is what tarfile needs.
+    block_lengths lists the compressed length of every block written, so
+    block i holds uncompressed bytes [i * block_size, (i + 1) * block_size)
+    and starts at sum(block_lengths[:i]) in the output.
+
+    Usage:
+        with open(path, 'wb') as raw, ParallelCompressWriter(raw, 'gzip', 6) as out:
+            with tarfile.open(fileobj=out, mode='w') as tar:
+                tar.add(...)
+    """
+
+    def __init__(self, fileobj, compression='gzip', level=None, jobs=None,
+                 block_size=BLOCK_SIZE):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"unknown compression: {compression}")
+        if compression == 'zstd' and zstd is None:
+            raise RuntimeError("zstd output needs Python 3.14+ (compression.zstd)")
+        self.fileobj = fileobj
+        self.compression = compression
+        self.level = DEFAULT_LEVELS[compression] if level is None else level
+        self.jobs = jobs or os.cpu_count() or 1
+        self.block_size = block_size
+        self.raw_size = 0
+        self.compressed_size = 0
+        self.block_lengths = []
+        self.closed = False
+        self._compress = BLOCK_COMPRESSORS[compression]
+        self._buffer = bytearray()
+        self._pending = deque()
+        self._executor = ThreadPoolExecutor(max_workers=self.jobs,
+                                            thread_name_prefix='compress')
+
+    def write(self, data):
+        """Buffer data, submitting every full block for compression."""
+        if self.closed:
+            raise ValueError("write to closed file")
+        self._buffer += data
+        self.raw_size += len(data)
+        while len(self._buffer) >= self.block_size:
+            self._submit(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+        return len(data)
+
+    def _submit(self, block):
+        """Queue one block, writing finished blocks while too many are queued."""
+        self._pending.append(self._executor.submit(self._compress_block, block))
+        while len(self._pending) > self.jobs * BLOCKS_PER_WORKER:
+            self._write_next()
+
+    def _compress_block(self, block):
+        """Worker thread: compress one block."""
+        with stage('compress'):
+            return self._compress(block, self.level)
+
+    def _write_next(self):
+        """Wait for the oldest queued block and write it out."""
+        # Time spent here is the tar stream waiting on the compression threads
+        with stage('compress_wait'):
+            data = self._pending.popleft().result()
+        self.fileobj.write(data)
+        self.compressed_size += len(data)
+        self.block_lengths.append(len(data))
+
+    def tell(self):
+        """Return the number of uncompressed bytes written so far."""
+        return self.raw_size
+
+    def flush(self):
+        """Flush the underlying file (buffered data stays until its block is full)."""
+        self.fileobj.flush()
+
+    def close(self):
+        """Compress the last partial block, write everything out and stop the pool."""
+        if self.closed:
+            return
+        try:
+            # An empty archive still gets one (empty) member, so it is valid
+            if self._buffer or not self.compressed_size and not self._pending:
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+            while self._pending:
+                self._write_next()
+            self.fileobj.flush()
+        finally:
+            self.closed = True
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def archive_path_for(dst, archive_name, compression='gzip'):
+    """Return the path of the archive for a compression format."""
+    return os.path.join(dst, archive_name + ARCHIVE_SUFFIXES[compression])
+
+
+def file_sha256(path):
+    """Return the hex SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class HashingReader:
+    """
+    File wrapper that computes the SHA-256 of everything read through it.
+
+    Handed to tarfile.addfile, it lets the archive writer checksum each
+    file in the same pass that copies it into the archive. With
+    `expected_size`, a file that shrinks while it is read is padded with
+    zero bytes up to that size (counted in `missing`), so the tar member
+    whose header is already written still gets all of its data.
+    """
+
+    def __init__(self, fileobj, expected_size=None):
+        self.fileobj = fileobj
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.expected_size = expected_size
+        self.missing = 0
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        if self.expected_size is not None and 0 < size and len(data) < size:
+            padding = min(size, self.expected_size - self.size) - len(data)
+            if padding > 0:
+                data += bytes(padding)
+                self.missing += padding
+        self.digest.update(data)
+        self.size += len(data)
+        return data
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+
+def scan_source(src, previous_files=None, skip_dirs=(), hash_changed=True):
+    """
+    Walk `src` and describe every file in it.
+
+    A file is only hashed when its size or mtime differs from
+    `previous_files`, so an unchanged tree costs one stat per file.
+
+    Args:
+        src: Directory to scan
+        previous_files: 'files' map of the base snapshot, if any
+        skip_dirs: Directories to leave out (e.g. the backup destination)
+        hash_changed: Hash new and modified files here; if False their
+                      sha256 is left as None for the archive writer to fill
+                      in, and any size or mtime change counts as changed
+
+    Returns:
+        Tuple of (files, changed, directories): files maps relative path ->
+        {size, mtime_ns, sha256}; changed lists the relative paths that are
+        new or whose content changed; directories lists relative paths of
+        all directories
+    """
+    previous_files = previous_files or {}
+    skip_dirs = {os.path.abspath(directory) for directory in skip_dirs}
+    files = {}
+    changed = []
+    directories = []
+    for directory, dirnames, filenames in os.walk(src):
+        dirnames[:] = sorted(name for name in dirnames
+                             if os.path.abspath(os.path.join(directory, name)) not in skip_dirs)
+        relative_dir = os.path.relpath(directory, src).replace(os.sep, '/')
+        prefix = '' if relative_dir == '.' else relative_dir + '/'
+        if prefix:
+            directories.append(relative_dir)
+        for name in sorted(filenames):
+            path = os.path.join(directory, name)
+            relative_path = prefix + name
+            try:
+                stat = os.stat(path)
+                entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+                old = previous_files.get(relative_path)
+                if old and old['size'] == entry['size'] and old['mtime_ns'] == entry['mtime_ns']:
+                    entry['sha256'] = old['sha256']
+                else:
+                    entry['sha256'] = file_sha256(path) if hash_changed else None
+            except OSError as e:
+                print(f"Warning: cannot read {path}: {e}")
+                continue
+            files[relative_path] = entry
+            if not old or entry['sha256'] is None or old['sha256'] != entry['sha256']:
+                changed.append(relative_path)
+    return files, changed, directories
+
+
+def snapshot_path_for(dst, archive_name):
+    """Return the path of the snapshot manifest stored next to an archive."""
+    return os.path.join(dst, archive_name + SNAPSHOT_SUFFIX)
+
+
+def load_snapshots(dst):
+    """
+    Load every snapshot manifest in the backup directory.
+
+    Returns:
+        List of snapshot dicts, oldest first
+    """
+    snapshots = []
+    for path in glob.glob(os.path.join(glob.escape(dst), "*" + SNAPSHOT_SUFFIX)):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: skipping unreadable snapshot {path}: {e}")
+            continue
+        if snapshot.get('version') == SNAPSHOT_VERSION:
+            snapshots.append(snapshot)
+    snapshots.sort(key=lambda snapshot: snapshot['created'])
+    return snapshots
+
+
+def save_snapshot(snapshot, dst):
+    """Atomically write a snapshot manifest next to its archive."""
+    path = snapshot_path_for(dst, snapshot['name'])
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, indent=1, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def default_archive_name(dst, suffix=''):
+    """Return Redmine-<date><suffix>, with the time added if that name is taken."""
+    archive_name = ARCHIVE_PREFIX + str(datetime.date.today()) + suffix
+    # Keep earlier backups from the same day
+    if os.path.exists(snapshot_path_for(dst, archive_name)):
+        archive_name += datetime.datetime.now().strftime("-%H%M%S")
+    return archive_name
+
+
+def find_base_snapshot(snapshots, mode):
+    """
+    Pick the snapshot a new backup is taken against.
+
+    Only tar snapshots are considered; chunk store snapshots do not chain.
+
+    Returns:
+        The latest snapshot for 'incremental', the latest full snapshot for
+        'differential', None for 'full' or when there is nothing to build on
+    """
+    snapshots = [snapshot for snapshot in snapshots if snapshot.get('backend', 'tar') == 'tar']
+    if mode == 'incremental':
+        return snapshots[-1] if snapshots else None
+    if mode == 'differential':
+        fulls = [snapshot for snapshot in snapshots if snapshot['mode'] == 'full']
+        return fulls[-1] if fulls else None
+    return None
+
+
+class _FileShrank(Exception):
+    """A file got shorter while write_archive was copying it in."""
+
+    def __init__(self, relative_path, missing):
+        super().__init__(relative_path)
+        self.relative_path = relative_path
+        self.missing = missing
+
+
+def write_archive(archive_path, src, members, compression='gzip', level=None, jobs=None,
+                  block_size=BLOCK_SIZE, files=None, seekable=False):
+    """
+    Write the given members of `src` to a compressed tar archive.
+
+    Each file is hashed while tarfile copies it in, and the checksums are
+    appended as a MANIFEST_NAME member and written to a detached manifest.
+
+    Args:
+        archive_path: Archive to create
+        src: Directory the members are relative to
+        members: Relative paths to add; directories are added without
+                 their contents
+        compression, level, jobs, block_size: As for create_archive
+        files: Snapshot 'files' map; the sha256 of every archived file is
+               updated in place
+        seekable: Also write a seek index (see write_seek_index); always
+                  uses the block writer, even with one job
+
+    Files that vanish or cannot be read after the scan are skipped with a
+    warning and removed from `members` and `files`. A file that shrinks
+    while it is copied cannot be taken back out of the stream once its
+    header is written, so the archive is started again without it and it
+    is removed the same way; the next backup archives it again. The
+    archive is written under a temporary name and only moved into place
+    once it is complete.
+
+    Returns:
+        Tuple of (uncompressed bytes, compressed bytes, threads used)
+    """
+    if level is None:
+        level = DEFAULT_LEVELS[compression]
+    skipped = []
+    temp_path = archive_path + '.tmp'
+    while True:
+        try:
+            manifest, out, tar, compressed_size, entries = _write_tar(
+                temp_path, src, [member for member in members if member not in skipped],
+                compression, level, jobs, block_size, files, seekable, skipped)
+        except _FileShrank as e:
+            print(f"Warning: skipping {e.relative_path}: it shrank by {e.missing} bytes while "
+                  f"being archived; starting the archive again without it")
+            skipped.append(e.relative_path)
+            continue
+        break
+    os.replace(temp_path, archive_path)
+
+    for relative_path in skipped:
+        if relative_path in members:
+            members.remove(relative_path)
+        if files:
+            files.pop(relative_path, None)
+    with stage('manifest', archive_path), open(manifest_path_for(archive_path), 'wb') as f:
+        f.write(manifest)
+    if seekable:
+        with stage('seek_index', archive_path):
+            write_seek_index(archive_path, compression, block_size, out.block_lengths, entries)
+    raw_size = out.raw_size if out is not None else tar.offset
+    return raw_size, compressed_size, 1 if out is None else out.jobs
+
+
+def _write_tar(temp_path, src, members, compression, level, jobs, block_size, files, seekable,
+               skipped):
+    """
+    One attempt of write_archive: write `members` to `temp_path`.
+
+    Members that cannot be read are appended to `skipped`. The temporary
+    file is removed if the attempt fails, including with _FileShrank.
+
+    Returns:
+        Tuple of (manifest bytes, block writer or None, closed TarFile,
+        compressed bytes, seek index entries)
+    """
+    entries = {}
+    checksums = {}
+    raw = open(temp_path, 'wb')
+    try:
+        if compression == 'gzip' and jobs == 1 and not seekable:
+            out = None
+            tar = tarfile.open(fileobj=raw, mode='w:gz', compresslevel=level)
+        else:
+            out = ParallelCompressWriter(raw, compression, level, jobs, block_size)
+            tar = tarfile.open(fileobj=out, mode='w')
+        try:
+            for relative_path in members:
+                print("  Adding %s..." % relative_path)
+                path = os.path.join(src, relative_path)
+                try:
+                    member = tar.gettarinfo(path, arcname=relative_path)
+                    if member is None:
+                        print(f"Warning: cannot archive {path}: unsupported file type")
+                        skipped.append(relative_path)
+                        continue
+                    if not member.isreg():
+                        tar.addfile(member)
+                        continue
+                    with stage('add', relative_path), open(path, 'rb') as f:
+                        # Sized from the open file, so a file that changed
+                        # since the scan is archived as it is now
+                        member = tar.gettarinfo(arcname=relative_path, fileobj=f)
+                        # Pads a file that shrinks, keeping the tar readable
+                        # until the attempt is abandoned below
+                        reader = HashingReader(f, member.size)
+                        tar.addfile(member, reader)
+                        stat = os.fstat(f.fileno())
+                except OSError as e:
+                    print(f"Warning: skipping {relative_path}: {e}")
+                    skipped.append(relative_path)
+                    continue
+                if reader.missing:
+                    raise _FileShrank(relative_path, reader.missing)
+                checksums[relative_path] = reader.hexdigest()
+                if stage_metrics:
+                    stage_metrics.count('files')
+                    stage_metrics.count('bytes', member.size)
+                if files and relative_path in files:
+                    files[relative_path].update(sha256=checksums[relative_path], size=member.size,
+                                                mtime_ns=stat.st_mtime_ns)
+                if seekable:
+                    # The data ends where the member's 512-byte padding ends
+                    padded = -(-member.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+                    entries[relative_path] = {
+                        'offset': tar.offset - padded,
+                        'size': member.size,
+                        'sha256': checksums[relative_path],
+                    }
+            manifest = format_manifest(checksums)
+            info = tarfile.TarInfo(MANIFEST_NAME)
+            info.size = len(manifest)
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(manifest))
+        finally:
+            tar.close()
+            if out is not None:
+                out.close()
+        compressed_size = raw.tell()
+        raw.close()
+    except BaseException:
+        raw.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return manifest, out, tar, compressed_size, entries
+
+
+def sidecar_path_for(archive_path, suffix):
+    """Return the file next to an archive named <archive name><suffix>."""
+    for archive_suffix in ARCHIVE_SUFFIXES.values():
+        if archive_path.endswith(archive_suffix):
+            return archive_path[:-len(archive_suffix)] + suffix
+    return archive_path + suffix
+
+
+def seek_index_path_for(archive_path):
+    """Return the sidecar seek index of an archive."""
+    return sidecar_path_for(archive_path, SEEK_INDEX_SUFFIX)
+
+
+def manifest_path_for(archive_path):
+    """Return the detached checksum manifest of an archive."""
+    return sidecar_path_for(archive_path, MANIFEST_SUFFIX)
+
+
+def format_manifest(checksums):
+    """Render {path: sha256} as `sha256sum` output, as bytes."""
+    return ''.join(f"{digest}  {path}\n" for path, digest in checksums.items()).encode('utf-8')
+
+
+def parse_manifest(data):
+    """Parse `sha256sum` output (bytes) into {path: sha256}."""
+    checksums = {}
+    for line in data.decode('utf-8').splitlines():
+        if line.strip():
+            digest, path = line.split(None, 1)
+            checksums[path.lstrip('*')] = digest
+    return checksums
+
+
+def verify_archive(archive_path):
+    """
+    Check an archive against its checksum manifest in one streaming pass.
+
+    The archive is decompressed and read front to back, hashing each file
+    in HASH_CHUNK_SIZE pieces, so memory use does not grow with file
+    sizes. The manifest stored in the archive is used, or the detached one
+    if the archive has none; if both exist they must agree. A truncated or
+    corrupted stream is reported as such.
+
+    Args:
+        archive_path: Archive to verify
+
+    Returns:
+        True if every file matches the manifest, False otherwise
+    """
+    print(f"Verifying {archive_path}...")
+    start = time.perf_counter()
+    computed = {}
+    embedded = None
+    raw_size = 0
+    problems = []
+    try:
+        # tarfile's own stream mode stops after the first gzip member, so
+        # decompress with gzip/zstd, which read all members (or frames)
+        if archive_path.endswith(ARCHIVE_SUFFIXES['zstd']):
+            if zstd is None:
+                raise RuntimeError("zstd archives need Python 3.14+ (compression.zstd)")
+            stream = zstd.open(archive_path, 'rb')
+        else:
+            stream = gzip.open(archive_path, 'rb')
+        with stream, tarfile.open(fileobj=stream, mode='r|') as tar:
+            for member in tar:
+                if not member.isreg():
+                    continue
+                f = tar.extractfile(member)
+                if member.name == MANIFEST_NAME:
+                    embedded = parse_manifest(f.read())
+                    continue
+                with stage('verify', member.name):
+                    digest = hashlib.sha256()
+                    for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                        digest.update(chunk)
+                computed[member.name] = digest.hexdigest()
+                raw_size += member.size
+    except (tarfile.TarError, EOFError, OSError, zlib.error, RuntimeError) as e:
+        problems.append(f"archive is truncated or corrupt: {e}")
+    elapsed = max(time.perf_counter() - start, 1e-9)
+
+    detached = None
+    if os.path.exists(manifest_path_for(archive_path)):
+        with open(manifest_path_for(archive_path), 'rb') as f:
+            detached = parse_manifest(f.read())
+    manifest = embedded if embedded is not None else detached
+    if embedded is not None and detached is not None and embedded != detached:
+        problems.append(f"{manifest_path_for(archive_path)} does not match the manifest "
+                        "stored in the archive")
+
+    matched = 0
+    if manifest is None:
+        print("Warning: no checksum manifest found; only the archive stream was checked")
+    else:
+        for path, digest in manifest.items():
+            if path not in computed:
+                problems.append(f"{path}: missing from the archive")
+            elif computed[path] != digest:
+                problems.append(f"{path}: checksum mismatch")
+            else:
+                matched += 1
+        for path in computed.keys() - manifest.keys():
+            problems.append(f"{path}: not in the manifest")
+
+    for problem in problems:
+        print(f"✗ {problem}")
+    print(f"\n{'='*50}")
+    print("Verification " + ("failed!" if problems else "passed!"))
+    print(f"Files: {len(computed)} read, {matched} matched the manifest")
+    print(f"Size: {raw_size / 1e6:.1f} MB ({os.path.getsize(archive_path) / 1e6:.1f} MB compressed)")
+    print(f"Time: {elapsed:.2f}s, {raw_size / 1e6 / elapsed:.1f} MB/s")
+    print(f"{'='*50}")
+    return not problems
+
+
+def write_seek_index(archive_path, compression, block_size, block_lengths, entries):
+    """
+    Write the seek index of an archive made by ParallelCompressWriter.
+
+    For each regular file it records the compressed offset of the block
+    holding the file's first byte, how far into that block's uncompressed
+    data the file starts, its size and its SHA-256, so extract_member can
+    seek straight to it and decompress only the blocks it spans.
+    """
+    block_offsets = [0]
+    for length in block_lengths:
+        block_offsets.append(block_offsets[-1] + length)
+
+    members = {}
+    for path, entry in entries.items():
+        block = entry['offset'] // block_size
+        members[path] = {
+            'block': block,
+            'compressed_offset': block_offsets[block] if block < len(block_lengths) else None,
+            'skip': entry['offset'] - block * block_size,
+            'size': entry['size'],
+            'sha256': entry['sha256'],
+        }
+
+    index_path = seek_index_path_for(archive_path)
+    temp_path = index_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': SNAPSHOT_VERSION,
+            'archive': os.path.basename(archive_path),
+            'compression': compression,
+            'block_size': block_size,
+            'blocks': [[offset, length] for offset, length in zip(block_offsets, block_lengths)],
+            'members': members,
+        }, f, separators=(',', ':'))
+    os.replace(temp_path, index_path)
+    return index_path
+
+
+def load_seek_index(archive_path):
+    """Load the seek index of an archive (raises FileNotFoundError if it has none)."""
+    with open(seek_index_path_for(archive_path), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def decompress_block(data, compression):
+    """Decompress one block written by ParallelCompressWriter."""
+    if compression == 'zstd':
+        if zstd is None:
+            raise RuntimeError("zstd archives need Python 3.14+ (compression.zstd)")
+        return zstd.decompress(data)
+    return zlib.decompress(data, 31)
+
+
+def extract_member(archive_path, path, out, index=None):
+    """
+    Copy one file out of a seekable archive without reading the rest.
+
+    Only the blocks the file spans are read and decompressed, one at a
+    time, so the cost is proportional to the file's size.
+
+    Args:
+        archive_path: Archive with a seek index
+        path: Archived path of the file
+        out: Binary file object the contents are written to
+        index: Already loaded seek index (optional)
+
+    Returns:
+        Number of bytes written
+
+    Raises:
+        KeyError: If the path is not a file in the archive
+        ValueError: If the extracted data does not match its checksum
+    """
+    index = index or load_seek_index(archive_path)
+    entry = index['members'][path]
+    blocks = index['blocks']
+    remaining = entry['size']
+    skip = entry['skip']
+    digest = hashlib.sha256()
+    with open(archive_path, 'rb') as f:
+        block = entry['block']
+        while remaining > 0:
+            offset, length = blocks[block]
+            f.seek(offset)
+            data = decompress_block(f.read(length), index['compression'])
+            piece = data[skip:skip + remaining]
+            digest.update(piece)
+            out.write(piece)
+            remaining -= len(piece)
+            skip = 0
+            block += 1
+    if entry['sha256'] and digest.hexdigest() != entry['sha256']:
+        raise ValueError(f"{path} does not match its checksum")
+    return entry['size']
+
+
+def list_archive(archive_path):
+    """
+    Print the files of a seekable archive from its seek index.
+
+    Returns:
+        Number of files listed, or None if the archive has no seek index
+    """
+    try:
+        index = load_seek_index(archive_path)
+    except FileNotFoundError:
+        print(f"✗ {archive_path} has no seek index; create it with --seekable")
+        return None
+    members = index['members']
+    for path, entry in members.items():
+        print(f"{entry['size']:>12}  {path}")
+    total = sum(entry['size'] for entry in members.values())
+    print(f"{len(members)} files, {total / 1024 / 1024:.2f} MB in {len(index['blocks'])} blocks")
+    return len(members)
+
+
+def extract_files(archive_path, paths, output_dir='.'):
+    """
+    Extract single files from a seekable archive into `output_dir`.
+
+    Args:
+        archive_path: Archive with a seek index
+        paths: Archived paths of the files to extract
+        output_dir: Directory the files are restored under (keeping their paths)
+
+    Returns:
+        Number of files extracted, or None if the archive has no seek index
+    """
+    try:
+        index = load_seek_index(archive_path)
+    except FileNotFoundError:
+        print(f"✗ {archive_path} has no seek index; create it with --seekable")
+        return None
+
+    extracted = 0
+    start_time = time.perf_counter()
+    for path in paths:
+        path = path.replace(os.sep, '/')
+        if path not in index['members']:
+            print(f"✗ {path}: not a file in {archive_path}")
+            continue
+        target = os.path.normpath(os.path.join(output_dir, path))
+        if not os.path.abspath(target).startswith(os.path.abspath(output_dir) + os.sep):
+            print(f"✗ {path}: refusing to write outside {output_dir}")
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            with open(target, 'wb') as out:
+                size = extract_member(archive_path, path, out, index)
+        except Exception as e:
+            print(f"✗ {path}: {e}")
+            continue
+        print(f"✓ {path} ({size} bytes) -> {target}")
+        extracted += 1
+    print(f"Extracted {extracted}/{len(paths)} files in {time.perf_counter() - start_time:.3f}s")
+    return extracted
+
+
+def create_archive(src=SRC, dst=DST, archive_name=None, compression='gzip', level=None,
+                   jobs=None, block_size=BLOCK_SIZE, mode='full', seekable=False):
+    """
+    Back up `src` to a tar archive plus a snapshot manifest in `dst`.
+
+    A full backup archives everything. An incremental backup archives only
+    the files added or changed since the latest snapshot of any kind, a
+    differential one those changed since the latest full snapshot. Either
+    way the snapshot records the whole tree (files with path, size, mtime
+    and hash, and directories), the members archived and the files and
+    directories deleted since the base, so restore_backup can replay the
+    chain. New directories are archived even when empty. Without a base snapshot a full backup is taken.
+
+    Args:
+        src: Directory to back up
+        dst: Directory the archive is written to (created if missing)
+        archive_name: Archive name without suffix (default: Redmine-<date>,
+                      with -incr or -diff for partial backups)
+        compression: One of COMPRESSIONS
+        level: Compression level (default: DEFAULT_LEVELS[compression])
+        jobs: Compression threads (None = CPU count); 1 with gzip uses
+              tarfile's own single-stream gzip
+        block_size: Uncompressed bytes per compressed block
+        mode: One of BACKUP_MODES
+        seekable: Write a seek index next to the archive, so single files
+                  can be listed and extracted without decompressing it all
+
+    Returns:
+        Path of the written archive
+    """
+    if not os.path.exists(dst):
+        os.makedirs(dst)
+
+    base = find_base_snapshot(load_snapshots(dst), mode)
+    if mode != 'full' and base is None:
+        print(f"No snapshot to build a {mode} backup on; taking a full backup.")
+        mode = 'full'
+
+    if archive_name is None:
+        archive_name = default_archive_name(dst, MODE_SUFFIXES[mode])
+
+    print(f"Scanning {src}...")
+    with stage('scan', src):
+        files, changed, directories = scan_source(
+            src, base['files'] if base else None, skip_dirs=[dst], hash_changed=False
+        )
+    if mode == 'full':
+        members = directories + list(files)
+    else:
+        # Snapshots written before directories were recorded have none, so
+        # every directory is archived again once; that only costs a header
+        new_directories = sorted(set(directories) - set(base.get('directories', ())))
+        members = new_directories + changed
+
+    archive_path = archive_path_for(dst, archive_name, compression)
+    print("Compressing files to %s" % archive_path)
+
+    start = time.perf_counter()
+    raw_size, compressed_size, threads = write_archive(
+        archive_path, src, members, compression, level, jobs, block_size,
+        files=files, seekable=seekable
+    )
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    # After the write: a file skipped there is no longer in `files`, so a
+    # restore removes any older copy of it instead of keeping a stale one
+    deleted = sorted(set(base['files']) - set(files)) if base else []
+    deleted_directories = (sorted(set(base.get('directories', ())) - set(directories))
+                           if base else [])
+
+    with stage('snapshot', archive_name):
+        save_snapshot({
+            'version': SNAPSHOT_VERSION,
+            'name': archive_name,
+            'created': datetime.datetime.now().isoformat(),
+            'mode': mode,
+            'base': base['name'] if base else None,
+            'archive': os.path.basename(archive_path),
+            'files': files,
+            'directories': directories,
+            'archived': members,
+            'deleted': deleted,
+            'deleted_directories': deleted_directories,
+        }, dst)
+
+    print(f"\n{'='*50}")
+    print(f"Archive complete!")
+    print(f"Archive: {archive_path}")
+    print(f"Checksums: {manifest_path_for(archive_path)}")
+    if seekable:
+        print(f"Seek index: {seek_index_path_for(archive_path)}")
+    print(f"Mode: {mode}" + (f" (base: {base['name']})" if base else ""))
+    print(f"Files archived: {sum(1 for member in members if member in files)}"
+          f"/{len(files)}, deleted since base: {len(deleted)}")
+    print(f"Size: {raw_size / 1e6:.1f} MB -> {compressed_size / 1e6:.1f} MB "
+          f"({compressed_size / max(raw_size, 1):.1%})")
+    print(f"Time: {elapsed:.2f}s with {threads} thread(s), {raw_size / 1e6 / elapsed:.1f} MB/s")
+    print(f"{'='*50}")
+    return archive_path
+
+
+def _make_gear_table(seed=GEAR_SEED):
+    """Build the gear hash table; a fixed seed keeps chunk boundaries stable."""
+    rng = random.Random(seed)
+    return tuple(rng.getrandbits(32) for _ in range(256))
+
+
+GEAR = _make_gear_table()
+
+# The gear hash as arithmetic on big integers (see gear_hash_mask_bits):
+# byte j of GEAR[b] for each b, as bytes.translate tables; the bytes a
+# hash depends on; and, per byte of a 32-bit hash, the CHUNK_MASK bits it holds
+GEAR_BYTES = tuple(bytes((value >> (8 * j)) & 0xFF for value in GEAR) for j in range(4))
+GEAR_WINDOW = 32
+GEAR_MASK_BYTES = tuple((j, bytes(value & (CHUNK_MASK >> (8 * j)) for value in range(256)))
+                        for j in range(4) if (CHUNK_MASK >> (8 * j)) & 0xFF)
+
+
+def gear_hash_mask_bits(window, skip=0):
+    """
+    Return, for every byte of `window`, the CHUNK_MASK bits of the gear
+    hash after that byte, as one byte each (zero where a chunk may end).
+
+    The hash after byte i is h_i = sum(GEAR[window[i - age]] << age) for
+    age 0..31, modulo 2**32, the hash starting from zero at window[0]. It
+    is computed for the whole window at once in C: the table values are
+    laid out as 64-bit little-endian lanes of one big integer, which is
+    then added to itself shifted by 1, 2, 4, 8 and 16 lanes (and as many
+    bits), leaving each lane with its 32 shifted predecessors summed in.
+    Every sum is below 2**64, so no lane carries into the next.
+
+    Args:
+        window: Bytes to hash
+        skip: Leading bytes whose results are not needed (history only)
+    """
+    count = len(window)
+    lanes = bytearray(8 * count)
+    for j, table in enumerate(GEAR_BYTES):
+        lanes[j::8] = window.translate(table)
+    hashes = int.from_bytes(lanes, 'little')
+    age = 1
+    while age < GEAR_WINDOW:
+        hashes += hashes << (65 * age)
+        age *= 2
+    hashes = hashes.to_bytes(8 * (count + GEAR_WINDOW), 'little')
+    masked = 0
+    for j, table in GEAR_MASK_BYTES:
+        masked |= int.from_bytes(hashes[8 * skip + j:8 * count:8].translate(table), 'little')
+    return masked.to_bytes(count - skip, 'little')
+
+
+def find_chunk_boundary(data, start):
+    """
+    Return the end of the content-defined chunk starting at `start`.
+
+    A gear rolling hash (h = (h << 1) + GEAR[byte], 32 bits) is run from
+    CHUNK_MIN_SIZE bytes into the chunk; the chunk ends after the first
+    byte where the top CHUNK_AVERAGE_BITS bits of the hash are zero, or at
+    CHUNK_MAX_SIZE. Because the hash only depends on the last 32 bytes,
+    an insertion early in a file moves the boundaries after it along with
+    the data, and the chunks after the edit dedupe against the old ones.
+
+    The first CHUNK_MIN_SIZE bytes are skipped without hashing, and the
+    rest is hashed CHUNK_SCAN_BLOCK bytes at a time by
+    gear_hash_mask_bits, each block starting with the 31 bytes before it
+    as history, rather than byte by byte in Python.
+
+    Args:
+        data: Buffer holding at least CHUNK_MAX_SIZE bytes from `start`,
+              or the rest of the file
+        start: Offset of the chunk in `data`
+    """
+    limit = min(len(data), start + CHUNK_MAX_SIZE)
+    position = start + CHUNK_MIN_SIZE
+    if position >= limit:
+        return limit
+    block_start = position
+    while block_start < limit:
+        block_end = min(limit, block_start + CHUNK_SCAN_BLOCK)
+        history = min(GEAR_WINDOW - 1, block_start - position)
+        mask_bits = gear_hash_mask_bits(data[block_start - history:block_end], history)
+        hit = mask_bits.find(0)
+        if hit >= 0:
+            return block_start + hit + 1
+        block_start = block_end
+    return limit
+
+
+def iter_file_chunks(f):
+    """Yield the content-defined chunks of a binary file object."""
+    buffer = b''
+    offset = 0
+    eof = False
+    while True:
+        # Keep a full maximum-size chunk in the buffer until end of file
+        while not eof and len(buffer) - offset < CHUNK_MAX_SIZE:
+            data = f.read(CHUNK_READ_SIZE)
+            if data:
+                buffer = buffer[offset:] + data
+                offset = 0
+            else:
+                eof = True
+        if offset >= len(buffer):
+            return
+        end = find_chunk_boundary(buffer, offset)
+        yield buffer[offset:end]
+        offset = end
+
+
+class ChunkStore:
+    """
+    Content-addressed store of compressed chunks.
+
+    Each unique chunk is kept once, as <root>/<xx>/<sha256><suffix>, where
+    the suffix names its compression. The ids already in the store are
+    listed once when it is opened, so checking a chunk costs no I/O.
+
+    Usage:
+        store = ChunkStore(os.path.join(dst, CHUNK_STORE_DIR))
+        chunk_id = store.put(data)
+        assert store.get(chunk_id) == data
+    """
+
+    def __init__(self, root, compression='gzip', level=None):
+        if compression == 'zstd' and zstd is None:
+            raise RuntimeError("zstd chunks need Python 3.14+ (compression.zstd)")
+        self.root = root
+        self.compression = compression
+        self.level = DEFAULT_LEVELS[compression] if level is None else level
+        self.new_chunks = 0
+        self.new_bytes = 0
+        self.stored_bytes = 0
+        self.reused_chunks = 0
+        self.reused_bytes = 0
+        self.known = set()
+        if os.path.isdir(root):
+            for fan_out in os.scandir(root):
+                if fan_out.is_dir():
+                    self.known.update(name.split('.', 1)[0] for name in os.listdir(fan_out.path)
+                                      if not name.endswith('.tmp'))
+
+    def _path(self, chunk_id, compression):
+        """Return the file of a chunk stored with a given compression."""
+        return os.path.join(self.root, chunk_id[:2], chunk_id + CHUNK_SUFFIXES[compression])
+
+    def put(self, data):
+        """
+        Store a chunk unless it is already present.
+
+        Returns:
+            The chunk id (hex SHA-256 of the data)
+        """
+        chunk_id = hashlib.sha256(data).hexdigest()
+        if chunk_id in self.known:
+            self.reused_chunks += 1
+            self.reused_bytes += len(data)
+            return chunk_id
+
+        if self.compression == 'zstd':
+            compressed = zstd.compress(data, level=self.level)
+        else:
+            compressed = zlib.compress(data, self.level)
+        path = self._path(chunk_id, self.compression)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(temp_path, path)
+
+        self.known.add(chunk_id)
+        self.new_chunks += 1
+        self.new_bytes += len(data)
+        self.stored_bytes += len(compressed)
+        return chunk_id
+
+    def stored_size(self, chunk_id):
+        """
+        Return the compressed size of a chunk on disk.
+
+        Raises:
+            FileNotFoundError: If the chunk is not in the store
+        """
+        for compression in COMPRESSIONS:
+            path = self._path(chunk_id, compression)
+            if os.path.exists(path):
+                return os.path.getsize(path)
+        raise FileNotFoundError(f"chunk {chunk_id} is missing from {self.root}")
+
+    def get(self, chunk_id):
+        """
+        Read and decompress a chunk, checking it against its id.
+
+        Raises:
+            FileNotFoundError: If the chunk is not in the store
+            ValueError: If the stored chunk is corrupt
+        """
+        for compression in COMPRESSIONS:
+            path = self._path(chunk_id, compression)
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                compressed = f.read()
+            if compression == 'zstd':
+                if zstd is None:
+                    raise RuntimeError("zstd chunks need Python 3.14+ (compression.zstd)")
+                data = zstd.decompress(compressed)
+            else:
+                data = zlib.decompress(compressed)
+            if hashlib.sha256(data).hexdigest() != chunk_id:
+                raise ValueError(f"chunk {chunk_id} is corrupt")
+            return data
+        raise FileNotFoundError(f"chunk {chunk_id} is missing from {self.root}")
+
+
+def chunk_index_path_for(dst, archive_name):
+    """Return the path of a chunk backup's per-snapshot index."""
+    return os.path.join(dst, archive_name + CHUNK_INDEX_SUFFIX)
+
+
+def create_chunk_backup(src=SRC, dst=DST, archive_name=None, compression='gzip', level=None):
+    """
+    Back up `src` into the deduplicating chunk store in `dst`.
+
+    Files are split into content-defined chunks; each unique chunk is
+    stored once, compressed, in <dst>/chunks. The snapshot gets a small
+    index (<name>.chunks.json) listing the chunk ids of every file. Files
+    whose size and mtime match the previous chunk snapshot reuse its
+    chunk lists without being read. Every chunk snapshot is complete on
+    its own, so any of them can be restored directly.
+
+    Args:
+        src: Directory to back up
+        dst: Directory holding the chunk store and snapshots
+        archive_name: Snapshot name (default: Redmine-<date>-chunks)
+        compression: Chunk compression, one of COMPRESSIONS
+        level: Compression level (default: DEFAULT_LEVELS[compression])
+
+    Returns:
+        Path of the snapshot index
+    """
+    if not os.path.exists(dst):
+        os.makedirs(dst)
+
+    snapshots = [snapshot for snapshot in load_snapshots(dst)
+                 if snapshot.get('backend') == 'chunks']
+    base = snapshots[-1] if snapshots else None
+    base_chunks = {}
+    if base:
+        with open(os.path.join(dst, base['archive']), 'r', encoding='utf-8') as f:
+            base_chunks = json.load(f)['files']
+
+    if archive_name is None:
+        archive_name = default_archive_name(dst, '-chunks')
+
+    print(f"Scanning {src}...")
+    with stage('scan', src):
+        files, changed, directories = scan_source(
+            src, base['files'] if base else None, skip_dirs=[dst], hash_changed=False
+        )
+    changed_set = set(changed)
+
+    store = ChunkStore(os.path.join(dst, CHUNK_STORE_DIR), compression, level)
+    print(f"Storing chunks in {store.root}")
+    start = time.perf_counter()
+    file_chunks = {}
+    chunked_bytes = 0
+    for relative_path, entry in list(files.items()):
+        if relative_path not in changed_set and relative_path in base_chunks:
+            file_chunks[relative_path] = base_chunks[relative_path]
+            continue
+        print("  Chunking %s..." % relative_path)
+        # The file is hashed as it is chunked rather than read once more in the scan
+        try:
+            with stage('chunk', relative_path), open(os.path.join(src, relative_path), 'rb') as f:
+                reader = HashingReader(f)
+                file_chunks[relative_path] = [store.put(chunk)
+                                              for chunk in iter_file_chunks(reader)]
+        except OSError as e:
+            print(f"Warning: cannot read {relative_path}: {e}")
+            del files[relative_path]
+            file_chunks.pop(relative_path, None)
+            if relative_path in changed_set:
+                changed.remove(relative_path)
+            continue
+        entry['sha256'] = reader.hexdigest()
+        entry['size'] = reader.size
+        chunked_bytes += entry['size']
+        if stage_metrics:
+            stage_metrics.count('files')
+            stage_metrics.count('bytes', entry['size'])
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    deleted = sorted(set(base['files']) - set(files)) if base else []
+
+    index_path = chunk_index_path_for(dst, archive_name)
+    temp_path = index_path + '.tmp'
+    with stage('index', index_path), open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': SNAPSHOT_VERSION, 'directories': directories,
+                   'files': file_chunks}, f, separators=(',', ':'))
+    os.replace(temp_path, index_path)
+
+    with stage('snapshot', archive_name):
+        save_snapshot({
+            'version': SNAPSHOT_VERSION,
+            'name': archive_name,
+            'created': datetime.datetime.now().isoformat(),
+            'mode': 'full',
+            'backend': 'chunks',
+            'base': base['name'] if base else None,
+            'archive': os.path.basename(index_path),
+            'files': files,
+            'archived': changed,
+            'deleted': deleted,
+        }, dst)
+
+    logical_bytes = sum(entry['size'] for entry in files.values())
+    # What this snapshot alone costs in the store: each chunk it uses once,
+    # however many files or earlier snapshots share it
+    referenced = {chunk_id for chunk_ids in file_chunks.values() for chunk_id in chunk_ids}
+    referenced_bytes = sum(store.stored_size(chunk_id) for chunk_id in referenced)
+    print(f"\n{'='*50}")
+    print(f"Chunk backup complete!")
+    print(f"Index: {index_path}")
+    print(f"Files: {len(files)} ({len(changed)} chunked, {len(files) - len(changed)} "
+          f"unchanged), deleted since base: {len(deleted)}")
+    print(f"Chunks: {store.new_chunks} new, {store.reused_chunks} reused "
+          f"({len(store.known)} in store)")
+    print(f"Chunked data: {store.new_bytes / 1e6:.1f} MB new -> {store.stored_bytes / 1e6:.1f} MB "
+          f"stored, {store.reused_bytes / 1e6:.1f} MB reused")
+    print(f"Snapshot size: {logical_bytes / 1e6:.1f} MB in {len(referenced)} distinct chunks, "
+          f"{referenced_bytes / 1e6:.1f} MB stored")
+    print(f"Dedup ratio: {logical_bytes / max(referenced_bytes, 1):.2f}x "
+          f"(snapshot size / stored size of its chunks)")
+    print(f"Time: {elapsed:.2f}s, {chunked_bytes / 1e6 / elapsed:.1f} MB/s chunked")
+    print(f"{'='*50}")
+    return index_path
+
+
+def restore_chunk_snapshot(dst, snapshot, target):
+    """
+    Rebuild every file of a chunk snapshot from the chunk store.
+
+    Each file is checked against the SHA-256 in the snapshot and gets its
+    recorded mtime back.
+
+    Returns:
+        Number of files restored
+    """
+    with open(os.path.join(dst, snapshot['archive']), 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    store = ChunkStore(os.path.join(dst, CHUNK_STORE_DIR))
+
+    for relative_path in index['directories']:
+        os.makedirs(os.path.join(target, relative_path), exist_ok=True)
+    for relative_path, chunk_ids in index['files'].items():
+        entry = snapshot['files'][relative_path]
+        path = os.path.join(target, relative_path)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        digest = hashlib.sha256()
+        with open(path, 'wb') as f:
+            for chunk_id in chunk_ids:
+                data = store.get(chunk_id)
+                digest.update(data)
+                f.write(data)
+        if digest.hexdigest() != entry['sha256']:
+            raise ValueError(f"restored {relative_path} does not match its snapshot hash")
+        os.utime(path, ns=(entry['mtime_ns'], entry['mtime_ns']))
+    return len(index['files'])
+
+
+def snapshot_chain(snapshots, name=None):
+    """
+    Return the snapshots to replay, full backup first, to restore `name`
+    (default: the latest snapshot).
+    """
+    by_name = {snapshot['name']: snapshot for snapshot in snapshots}
+    if name is None:
+        if not snapshots:
+            raise ValueError("no snapshots found")
+        snapshot = snapshots[-1]
+    elif name in by_name:
+        snapshot = by_name[name]
+    else:
+        raise ValueError(f"no snapshot named {name}")
+
+    chain = [snapshot]
+    while chain[-1]['mode'] != 'full':
+        base = chain[-1]['base']
+        if base not in by_name:
+            raise ValueError(f"snapshot {chain[-1]['name']} needs missing base {base}")
+        chain.append(by_name[base])
+    chain.reverse()
+    return chain
+
+
+def restore_backup(dst=DST, target=None, snapshot_name=None):
+    """
+    Restore a backup by replaying its full archive and then each
+    incremental or differential archive on top of it, deleting the files
+    and directories each one recorded as deleted. Chunk store snapshots are rebuilt
+    directly from the store.
+
+    Args:
+        dst: Directory holding the archives and snapshots
+        target: Directory to restore into (created if missing)
+        snapshot_name: Snapshot to restore (default: the latest)
+
+    Returns:
+        Number of files in the restored snapshot
+    """
+    chain = snapshot_chain(load_snapshots(dst), snapshot_name)
+    os.makedirs(target, exist_ok=True)
+    target_root = os.path.abspath(target)
+
+    if chain[-1].get('backend') == 'chunks':
+        print(f"Rebuilding chunk snapshot {chain[-1]['name']}...")
+        restore_chunk_snapshot(dst, chain[-1], target)
+        chain = chain[-1:]
+
+    for snapshot in chain:
+        if snapshot.get('backend') == 'chunks':
+            continue
+        archive_path = os.path.join(dst, snapshot['archive'])
+        print(f"Replaying {snapshot['mode']} backup {snapshot['archive']}...")
+        # Only what the snapshot lists, which leaves out the checksum manifest
+        archived = set(snapshot['archived'])
+        with tarfile.open(archive_path, 'r:*') as tar:
+            tar.extractall(target, filter='data',
+                           members=[m for m in tar if m.name in archived])
+        for relative_path in snapshot['deleted']:
+            path = os.path.abspath(os.path.join(target, relative_path))
+            if path.startswith(target_root + os.sep) and os.path.isfile(path):
+                os.remove(path)
+                print(f"  Removed {relative_path}")
+        # Deepest first, so a removed tree empties from the bottom up
+        for relative_path in sorted(snapshot.get('deleted_directories', ()), reverse=True):
+            path = os.path.abspath(os.path.join(target, relative_path))
+            if path.startswith(target_root + os.sep) and os.path.isdir(path):
+                try:
+                    os.rmdir(path)
+                except OSError as e:
+                    print(f"Warning: cannot remove directory {relative_path}: {e}")
+                    continue
+                print(f"  Removed {relative_path}/")
+
+    print(f"\n{'='*50}")
+    print(f"Restore complete!")
+    print(f"Snapshot: {chain[-1]['name']} ({len(chain)} archive(s) replayed)")
+    print(f"Files: {len(chain[-1]['files'])}")
+    print(f"Restored to: {target_root}")
+    print(f"{'='*50}")
+    return len(chain[-1]['files'])
 
-date = str(datetime.date.today())
-src = "C:/Users/SCiPnet/Downloads"
-dst = "C:/Users/SCiPnet/Desktop/Redmine"
 
-archive_name = "Redmine-"+date
+def parse_args(argv=None):
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Back up Redmine to a compressed tar archive.")
+    commands = parser.add_subparsers(dest='command', metavar='{list,extract,verify}')
+    list_parser = commands.add_parser(
+        'list', help="list the files of an archive written with --seekable"
+    )
+    list_parser.add_argument('archive', help="archive to list")
+    extract_parser = commands.add_parser(
+        'extract', help="extract single files from an archive written with --seekable"
+    )
+    extract_parser.add_argument('archive', help="archive to extract from")
+    extract_parser.add_argument('paths', nargs='+', metavar='PATH',
+                                help="archived path of a file to extract")
+    extract_parser.add_argument('-o', '--output', default='.', metavar='DIR',
+                                help="directory to extract into (default: .)")
+    verify_parser = commands.add_parser(
+        'verify', help="check an archive against its checksum manifest"
+    )
+    verify_parser.add_argument('archive', help="archive to verify")
+    parser.add_argument('--src', default=SRC, help=f"directory to back up (default: {SRC})")
+    parser.add_argument('--dst', default=DST, help=f"directory for the archive (default: {DST})")
+    parser.add_argument(
+        '--name', default=None,
+        help=f"archive name without suffix (default: {ARCHIVE_PREFIX}<date>)"
+    )
+    parser.add_argument(
+        '--mode', choices=BACKUP_MODES, default='full',
+        help="'incremental' archives files changed since the last backup, "
+             "'differential' those changed since the last full one (default: full)"
+    )
+    parser.add_argument(
+        '--backend', choices=BACKENDS, default='tar',
+        help="'chunks' stores files as deduplicated, content-defined chunks in "
+             f"DST/{CHUNK_STORE_DIR} instead of writing a tar archive (default: tar)"
+    )
+    parser.add_argument(
+        '--compression', choices=COMPRESSIONS, default='gzip',
+        help="archive compression; zstd needs Python 3.14+ (default: gzip)"
+    )
+    parser.add_argument(
+        '--level', type=int, default=None,
+        help="compression level (default: 6 for gzip, 3 for zstd)"
+    )
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=0,
+        help="compression threads (default: 0 = one per CPU; 1 with gzip = "
+             "single-stream tarfile gzip)"
+    )
+    parser.add_argument(
+        '--seekable', action='store_true',
+        help="also write a seek index next to the archive, so the list and "
+             "extract commands can get at single files without decompressing it all"
+    )
+    parser.add_argument(
+        '--restore', default=None, metavar='DIR',
+        help="instead of backing up, restore the backups in --dst into DIR"
+    )
+    parser.add_argument(
+        '--snapshot', default=None, metavar='NAME',
+        help="with --restore, the snapshot to restore (default: the latest)"
+    )
+    if stage_metrics:
+        stage_metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.seekable and args.backend == 'chunks':
+        parser.error("--seekable only applies to the tar backend")
+    if args.compression == 'zstd' and zstd is None:
+        parser.error("zstd output needs Python 3.14+ (compression.zstd)")
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 or greater")
+    args.jobs = args.jobs or None
+    return args
 
-if os.path.exists(dst) == False:
-    os.mkdir(dst)
 
-print("Compressing files to %s.tar.gz" % archive_name)
-tar = tarfile.open(dst+"/"+archive_name+".tar.gz", "w:gz")
-for file_name in glob.glob(os.path.join(src, "*")):
-    print("  Adding %s..." % file_name)
-    tar.add(dst)
+if __name__ == '__main__':
+    args = parse_args()
+    if stage_metrics:
+        stage_metrics.enable_from_args('archiver', args)
+    status = 0
+    try:
+        if args.command == 'list':
+            list_archive(args.archive)
+        elif args.command == 'extract':
+            extract_files(args.archive, args.paths, args.output)
+        elif args.command == 'verify':
+            status = 0 if verify_archive(args.archive) else 1
+        elif args.restore:
+            restore_backup(args.dst, args.restore, args.snapshot)
+        elif args.backend == 'chunks':
+            create_chunk_backup(args.src, args.dst, args.name, args.compression, args.level)
+        else:
+            create_archive(args.src, args.dst, args.name, args.compression, args.level,
+                           args.jobs, mode=args.mode, seekable=args.seekable)
+    finally:
+        if stage_metrics:
+            stage_metrics.finish()
+    sys.exit(status)
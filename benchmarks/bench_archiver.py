@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Archiver Compression Benchmark
+
+Builds a deterministic corpus (compressible text plus incompressible
+bytes) and archives it with archiver.create_archive: tarfile's own
+single-stream gzip (the path the script always used), the parallel block
+gzip at several thread counts, and zstd when compression.zstd is
+available. Each archive is read back with tarfile to check it.
+
+Usage:
+    python benchmarks/bench_archiver.py [--size-mb N] [--level L]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import archiver  # noqa: E402
+
+
+WORDS = ("redmine issue journal attachment project tracker status priority "
+         "assigned author version wiki changeset repository custom field").split()
+
+
+def write_corpus(directory, size_mb, seed=1234):
+    """Write about `size_mb` MB of files (3/4 text, 1/4 random) and return the count."""
+    rng = random.Random(seed)
+    target = size_mb * 1024 * 1024
+    written = 0
+    count = 0
+    while written < target:
+        path = Path(directory) / f"dir{count % 8}" / f"file{count:05d}.dat"
+        path.parent.mkdir(exist_ok=True)
+        if count % 4 == 3:
+            data = rng.randbytes(256 * 1024)
+        else:
+            data = ' '.join(rng.choice(WORDS) for _ in range(60000)).encode('ascii')
+        path.write_bytes(data)
+        written += len(data)
+        count += 1
+    return count
+
+
+def run_case(src, dst, name, compression, level, jobs):
+    """Archive `src` once, check the result and return (seconds, archive bytes)."""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        path = archiver.create_archive(src, dst, name, compression, level, jobs)
+    elapsed = time.perf_counter() - start
+    if compression == 'gzip':
+        with tarfile.open(path, 'r:gz') as tar:
+            members = len(tar.getmembers())
+        if not members:
+            raise RuntimeError(f"{path} has no members")
+    return elapsed, os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark archiver compression.")
+    parser.add_argument('--size-mb', type=int, default=128, help="corpus size in MB (default: 128)")
+    parser.add_argument('--level', type=int, default=6, help="gzip level (default: 6)")
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    cases = [('tarfile w:gz (1 thread)', 'gzip', 1)]
+    for jobs in sorted({2, 4, cpus}):
+        if jobs <= cpus:
+            cases.append((f"parallel gzip ({jobs} threads)", 'gzip', jobs))
+    if archiver.zstd is not None:
+        cases.append((f"parallel zstd ({cpus} threads)", 'zstd', cpus))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp) / 'src'
+        dst = Path(tmp) / 'dst'
+        src.mkdir()
+        files = write_corpus(src, args.size_mb)
+        print(f"Corpus: {files} files, {args.size_mb} MB, {cpus} CPU(s)")
+
+        results = []
+        for i, (label, compression, jobs) in enumerate(cases):
+            level = args.level if compression == 'gzip' else None
+            elapsed, size = run_case(src, dst, f"bench{i}", compression, level, jobs)
+            results.append((label, elapsed, size))
+
+    raw = args.size_mb * 1024 * 1024
+    print(f"\n{'case':<30}{'seconds':>10}{'MB/s':>10}{'ratio':>8}{'speedup':>9}")
+    for label, elapsed, size in results:
+        print(f"{label:<30}{elapsed:>10.2f}{raw / 1e6 / elapsed:>10.1f}"
+              f"{size / raw:>8.1%}{results[0][1] / elapsed:>8.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Pandoc Backend Benchmark
+
+Compares the per-file pandoc path of rtf_to_markdown.convert_rtf_with_pandoc
+(one pandoc process per document) with the long-lived pandoc server backend
+on a set of small generated RTF documents.
+
+Usage:
+    python benchmarks/bench_pandoc_backend.py [--files N]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import rtf_to_markdown  # noqa: E402
+
+
+SAMPLE_RTF = r"""{\rtf1\ansi\deff0{\fonttbl{\f0 Arial;}}
+\f0\fs24 Document %d\par
+Some body text for a short RTF export.\par
+\trowd\cellx2000\cellx4000 Name\cell Value\cell\row
+\trowd\cellx2000\cellx4000 Row %d\cell %d\cell\row
+}"""
+
+
+def write_corpus(directory, count):
+    """Write `count` small RTF files and return their paths."""
+    paths = []
+    for i in range(count):
+        path = Path(directory) / f"doc{i:04d}.rtf"
+        path.write_text(SAMPLE_RTF % (i, i, i), encoding='ascii')
+        paths.append(path)
+    return paths
+
+
+def time_conversions(paths, server_url=None):
+    """Convert every path and return (elapsed seconds, failures)."""
+    failures = 0
+    start = time.perf_counter()
+    for path in paths:
+        if rtf_to_markdown.convert_rtf_with_pandoc(path, server_url) is None:
+            failures += 1
+    return time.perf_counter() - start, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pandoc backends.")
+    parser.add_argument('--files', type=int, default=100, help="number of documents (default: 100)")
+    args = parser.parse_args()
+
+    if not rtf_to_markdown.ensure_pandoc_installed():
+        print("pandoc is not available; nothing to benchmark.")
+        return 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_corpus(tmp, args.files)
+
+        results = [('subprocess', *time_conversions(paths))]
+
+        server = rtf_to_markdown.start_pandoc_server()
+        if server is None:
+            return 1
+        with server:
+            results.append(('server', *time_conversions(paths, server.url)))
+
+    print(f"\n{'backend':<12}{'seconds':>10}{'files/s':>10}{'ms/file':>10}{'failed':>8}")
+    for name, elapsed, failures in results:
+        print(f"{name:<12}{elapsed:>10.2f}{args.files / elapsed:>10.1f}"
+              f"{elapsed * 1000 / args.files:>10.2f}{failures:>8}")
+    print(f"\nSpeedup: {results[0][1] / results[1][1]:.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
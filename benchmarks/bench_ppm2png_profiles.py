@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+PPM2PNG Encoding Profile Benchmark
+
+Renders deterministic synthetic frames (smooth gradients with hard-edged
+shapes and light noise, like a typical render) and encodes each one with
+every ppm2png encoding profile through the streaming PNG writer, next to
+Pillow's default PNG save when Pillow is installed. Reports encode time
+and output size per profile.
+
+Usage:
+    python benchmarks/bench_ppm2png_profiles.py [--width W] [--height H] [--runs N]
+"""
+
+import argparse
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'PPM2PNG'))
+
+import ppm2png  # noqa: E402
+
+
+def write_frame(path, width, height, channels=3, wide=False, seed=1234):
+    """Write a synthetic P5/P6 frame and return its size in bytes."""
+    rng = random.Random(seed)
+    top = 65535 if wide else 255
+    shapes = [(rng.randrange(width), rng.randrange(height), rng.randrange(width // 8 + 1),
+               [rng.randrange(top + 1) for _ in range(channels)]) for _ in range(24)]
+    with open(path, 'wb') as f:
+        f.write(b'P%d %d %d %d\n' % (6 if channels == 3 else 5, width, height, top))
+        for y in range(height):
+            row = []
+            for x in range(width):
+                pixel = [(x * top // width + y * top // height + c * top // 3) // 2
+                         for c in range(channels)]
+                for cx, cy, radius, color in shapes:
+                    if abs(x - cx) < radius and abs(y - cy) < radius:
+                        pixel = color
+                        break
+                noise = rng.randrange(-top // 64, top // 64 + 1)
+                row.extend(min(top, max(0, value + noise)) for value in pixel)
+            if wide:
+                f.write(b''.join(value.to_bytes(2, 'big') for value in row))
+            else:
+                f.write(bytes(row))
+    return os.path.getsize(path)
+
+
+def encode(path, profile):
+    """Encode a frame with a profile in memory and return (seconds, PNG bytes)."""
+    out = io.BytesIO()
+    start = time.perf_counter()
+    with ppm2png.PNMImage(path) as image:
+        writer = ppm2png.PNGWriter(out, image.width, image.height, image.channels,
+                                   image.bit_depth, **ppm2png.PROFILES[profile])
+        for row in image.rows():
+            writer.write_row(row)
+        writer.close()
+    return time.perf_counter() - start, out.tell()
+
+
+def encode_pillow(path):
+    """Save a frame with Pillow's default PNG settings and return (seconds, bytes)."""
+    out = io.BytesIO()
+    start = time.perf_counter()
+    with ppm2png.Image.open(path) as image:
+        if image.mode == 'I':
+            image = image.convert('I;16')
+        image.save(out, 'PNG')
+    return time.perf_counter() - start, out.tell()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ppm2png encoding profiles.")
+    parser.add_argument('--width', type=int, default=1920, help="frame width (default: 1920)")
+    parser.add_argument('--height', type=int, default=1080, help="frame height (default: 1080)")
+    parser.add_argument('--runs', type=int, default=3, help="runs per case (default: 3)")
+    args = parser.parse_args()
+
+    frames = [('RGB 8-bit', 3, False), ('gray 16-bit', 1, True)]
+    with tempfile.TemporaryDirectory() as directory:
+        for label, channels, wide in frames:
+            path = os.path.join(directory, 'frame.pnm')
+            raw = write_frame(path, args.width, args.height, channels, wide)
+            cases = [(name, lambda name=name: encode(path, name)) for name in ppm2png.PROFILES]
+            if ppm2png.Image is not None:
+                cases.append(('pillow default', lambda: encode_pillow(path)))
+
+            print(f"\n{label}, {args.width}x{args.height}, {raw / 1e6:.1f} MB raw")
+            print(f"{'profile':<16}{'median s':>10}{'MB/s':>8}{'PNG MB':>9}{'ratio':>8}")
+            for name, run in cases:
+                results = [run() for _ in range(args.runs)]
+                seconds = statistics.median(elapsed for elapsed, _ in results)
+                size = results[0][1]
+                print(f"{name:<16}{seconds:>10.2f}{raw / 1e6 / seconds:>8.1f}"
+                      f"{size / 1e6:>9.2f}{size / raw:>8.1%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+RTF Converter Startup Benchmark
+
+Measures how long rtf_to_markdown.py takes to start and probe its
+toolchain, with a cold probe cache and with a warm one, next to the cost
+of the eager pypandoc/striprtf imports and pandoc version probe the
+script used to pay on every start.
+
+Usage:
+    python benchmarks/bench_rtf_startup.py [--runs N]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parent.parent / 'rtf_to_markdown.py'
+
+EAGER_STARTUP = (
+    "import pypandoc\n"
+    "from striprtf.striprtf import rtf_to_text\n"
+    "pypandoc.get_pandoc_version()\n"
+)
+
+
+def time_command(command, runs, env=None, before_each=None):
+    """Run a command `runs` times and return the wall times in milliseconds."""
+    times = []
+    for _ in range(runs):
+        if before_each:
+            before_each()
+        start = time.perf_counter()
+        subprocess.run(command, env=env, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark rtf_to_markdown startup.")
+    parser.add_argument('--runs', type=int, default=10, help="runs per case (default: 10)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ)
+        env['XDG_CACHE_HOME'] = cache_dir
+        env['LOCALAPPDATA'] = cache_dir
+        check = [sys.executable, str(SCRIPT), '--check', '--non-interactive']
+
+        cache_file = Path(cache_dir) / 'rtf_to_markdown' / 'toolchain.json'
+        cases = [
+            ('interpreter only', time_command([sys.executable, '-c', 'pass'], args.runs)),
+            ('eager imports + pandoc probe',
+             time_command([sys.executable, '-c', EAGER_STARTUP], args.runs)),
+            ('startup, cold probe cache',
+             time_command(check, args.runs, env, lambda: cache_file.unlink(missing_ok=True))),
+            ('startup, warm probe cache', time_command(check, args.runs, env)),
+        ]
+
+    print(f"\n{'case':<32}{'median ms':>12}{'min ms':>10}")
+    for name, times in cases:
+        print(f"{name:<32}{statistics.median(times):>12.1f}{min(times):>10.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,545 @@
+#!/usr/bin/env python3
+"""
+Converter Benchmark Suite
+
+Generates deterministic synthetic corpora and measures every converter's
+entry point on them:
+
+- rtf_to_markdown.convert_rtf_to_markdown on plain RTFs, RTFs with tables
+  and RTFs with embedded \\pict images (auto and stream converters)
+- code_to_markdown.convert_file_to_markdown on a mixed-size source tree,
+  with and without outlines
+- archiver.create_archive (single-stream and parallel gzip),
+  create_chunk_backup and verify_archive on a directory tree
+- ppm2png.convert_frame on PPM/PGM frames of several resolutions and bit
+  depths, per encoding profile and with the Pillow decoder
+
+Each case runs in a fresh interpreter so its peak RSS is its own. Per
+case the suite reports files/s, MB/s, per-file latency percentiles (per
+run for the archiver cases, whose unit of work is a whole archive) and
+peak RSS. Results can be written to JSON and compared against a stored
+baseline; throughput drops or RSS growth beyond --tolerance count as
+regressions and make the exit code 1. Everything runs offline.
+
+Usage:
+    python benchmarks/bench_suite.py [--cases PATTERN ...] [--scale X]
+                                     [--output results.json]
+                                     [--baseline baseline.json] [--tolerance PCT]
+    python benchmarks/bench_suite.py --list
+"""
+
+import argparse
+import contextlib
+import datetime
+import fnmatch
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'PPM2PNG'))
+
+RESULTS_VERSION = 1
+DEFAULT_SEED = 1234
+DEFAULT_TOLERANCE = 10.0  # percent
+PERCENTILES = (50, 90, 99)
+
+WORDS = ("render frame archive backup journal markdown export table picture "
+         "converter stream buffer project version source module release").split()
+
+
+# --- Corpus generators -------------------------------------------------------
+#
+# Every generator takes a directory, a scale factor and a seed, writes its
+# files there and is fully deterministic for a given (scale, seed).
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _rtf_paragraphs(rng, count):
+    parts = []
+    for i in range(count):
+        style = rng.choice([r'\b ', r'\i ', r'\ul ', ''])
+        parts.append(r'{%s%s}\par' % (style, _text(rng, rng.randint(20, 120))))
+        if i % 7 == 0:
+            parts.append(r'Caf\'e9 \u33616? na\u239?ve\par')  # hex and unicode escapes
+    return '\n'.join(parts)
+
+
+def _rtf_table(rng, rows, columns):
+    cells = ''.join(r'\cellx%d' % (1500 * (c + 1)) for c in range(columns))
+    lines = []
+    for _ in range(rows):
+        values = ''.join(r'\intbl %s\cell ' % _text(rng, rng.randint(1, 4)) for _ in range(columns))
+        lines.append(r'\trowd%s %s\row' % (cells, values))
+    return '\n'.join(lines)
+
+
+def _rtf_picture(rng, size):
+    data = rng.randbytes(size).hex()
+    lines = '\n'.join(data[i:i + 128] for i in range(0, len(data), 128))
+    return r'{\*\shppict{\pict\pngblip\picw64\pich64 %s}}' % lines
+
+
+def make_rtf_corpus(directory, scale=1.0, seed=DEFAULT_SEED, kind='plain'):
+    """Write RTF documents: 'plain', 'tables' (plus tables) or 'pict' (plus pictures)."""
+    rng = random.Random(f"{seed}-rtf-{kind}")
+    count = max(2, int({'plain': 120, 'tables': 60, 'pict': 30}[kind] * scale))
+    for i in range(count):
+        body = [_rtf_paragraphs(rng, rng.randint(5, 60))]
+        if kind == 'tables':
+            body.append(_rtf_table(rng, rng.randint(3, 40), rng.randint(2, 6)))
+        if kind == 'pict':
+            for _ in range(rng.randint(1, 4)):
+                body.append(_rtf_picture(rng, rng.randint(2, 200) * 1024))
+        document = (r'{\rtf1\ansi\deff0{\fonttbl{\f0 Arial;}}' + '\n\\f0\\fs22 '
+                    + '\n'.join(body) + '\n}')
+        Path(directory, f"doc{i:04d}.rtf").write_text(document, encoding='ascii')
+
+
+_PYTHON_BLOCK = '''
+class Widget{n}:
+    """Widget number {n}."""
+
+    def __init__(self, value={n}):
+        self.value = value
+
+    def scaled(self, factor):
+        return [self.value * factor for _ in range({n} % 7 + 1)]
+
+
+def helper_{n}(items, limit={n}):
+    """Return the items below the limit (`{word}`)."""
+    return [item for item in items if item < limit]
+'''
+
+_JAVA_BLOCK = '''
+    /** Handles {word} number {n}. */
+    public int handle{n}(int value, String label) {{
+        if (value > {n}) {{
+            return value / 2;
+        }}
+        return label.length() + value;
+    }}
+'''
+
+_JS_BLOCK = '''
+export function step{n}(items) {{
+  // {word} pass {n}
+  return items.map((item) => item * {n}).filter((item) => item % 3 !== 0);
+}}
+'''
+
+
+def _source_text(rng, suffix, size):
+    blocks = []
+    total = 0
+    n = 0
+    while total < size:
+        word = rng.choice(WORDS)
+        if suffix == '.py':
+            block = _PYTHON_BLOCK.format(n=n, word=word)
+        elif suffix == '.java':
+            block = _JAVA_BLOCK.format(n=n, word=word)
+        elif suffix == '.js':
+            block = _JS_BLOCK.format(n=n, word=word)
+        else:
+            block = _text(rng, 40) + '\n'
+        blocks.append(block)
+        total += len(block)
+        n += 1
+    text = ''.join(blocks)
+    if suffix == '.java':
+        text = 'public class Generated {\n' + text + '}\n'
+    return text
+
+
+def make_source_tree(directory, scale=1.0, seed=DEFAULT_SEED):
+    """Write a nested tree of source files: mostly small, some medium, a few large."""
+    rng = random.Random(f"{seed}-source")
+    count = max(10, int(300 * scale))
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.6:
+            size = rng.randint(200, 2048)
+        elif roll < 0.95:
+            size = rng.randint(10 * 1024, 100 * 1024)
+        else:
+            size = rng.randint(1024 * 1024, 2 * 1024 * 1024)
+        suffix = rng.choice(['.py', '.py', '.java', '.js', '.txt'])
+        path = Path(directory, f"pkg{i % 6}", f"sub{i % 3}", f"file{i:04d}{suffix}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(_source_text(rng, suffix, size), encoding='utf-8')
+
+
+def make_archive_tree(directory, scale=1.0, seed=DEFAULT_SEED):
+    """Write a directory tree to back up: 3/4 compressible text, 1/4 random bytes."""
+    rng = random.Random(f"{seed}-archive")
+    target = int(40 * 1024 * 1024 * scale)
+    written = 0
+    i = 0
+    while written < target:
+        path = Path(directory, f"dir{i % 8}", f"sub{i % 5}", f"item{i:05d}.dat")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        size = int(rng.lognormvariate(10, 1.5)) + 1
+        size = min(size, 4 * 1024 * 1024)
+        if i % 4 == 3:
+            data = rng.randbytes(size)
+        else:
+            data = (_text(rng, size // 6 + 1).encode('ascii') + b'\n')[:size]
+        path.write_bytes(data)
+        written += len(data)
+        i += 1
+
+
+def make_ppm_frames(directory, scale=1.0, seed=DEFAULT_SEED, width=640, height=480,
+                    channels=3, wide=False, count=20):
+    """
+    Write synthetic render frames: a diagonal gradient with solid blocks
+    and light noise, as P6 (channels=3) or P5, 8-bit or 16-bit (wide).
+    """
+    rng = random.Random(f"{seed}-ppm-{width}x{height}-{channels}-{wide}")
+    count = max(2, int(count * scale))
+    row_bytes = width * channels
+    ramp = bytes((x * 255 // max(1, width - 1)) for x in range(width) for _ in range(channels))
+    ramp = ramp + ramp  # so any rotation of it is a plain slice
+    low_bits = bytes(value & 0x07 for value in range(256))
+    for i in range(count):
+        blocks = [(rng.randrange(width), rng.randrange(height), rng.randint(8, width // 6),
+                   bytes(rng.randrange(256) for _ in range(channels))) for _ in range(12)]
+        path = Path(directory, f"frame{i:04d}.{'ppm' if channels == 3 else 'pgm'}")
+        with open(path, 'wb') as f:
+            f.write(b'P%d\n%d %d\n%d\n' % (6 if channels == 3 else 5, width, height,
+                                            65535 if wide else 255))
+            for y in range(height):
+                shift = (y * channels * width // height + i * channels) % row_bytes
+                shift -= shift % channels
+                row = bytearray(ramp[shift:shift + row_bytes])
+                for bx, by, size, color in blocks:
+                    if by <= y < by + size:
+                        end = min(width, bx + size)
+                        row[bx * channels:end * channels] = color * (end - bx)
+                noise = rng.randbytes(row_bytes).translate(low_bits)
+                row = (int.from_bytes(row, 'big') ^ int.from_bytes(noise, 'big')).to_bytes(row_bytes, 'big')
+                if wide:
+                    # High byte from the pattern, low byte random: real 16-bit detail
+                    low = rng.randbytes(row_bytes)
+                    row = bytes(value for pair in zip(row, low) for value in pair)
+                f.write(row)
+
+
+CORPORA = {
+    'rtf-plain': lambda d, s, seed: make_rtf_corpus(d, s, seed, 'plain'),
+    'rtf-tables': lambda d, s, seed: make_rtf_corpus(d, s, seed, 'tables'),
+    'rtf-pict': lambda d, s, seed: make_rtf_corpus(d, s, seed, 'pict'),
+    'source-tree': make_source_tree,
+    'archive-tree': make_archive_tree,
+    'ppm-640x480-rgb8': lambda d, s, seed: make_ppm_frames(d, s, seed, 640, 480, 3, False, 40),
+    'ppm-1920x1080-rgb8': lambda d, s, seed: make_ppm_frames(d, s, seed, 1920, 1080, 3, False, 8),
+    'ppm-1920x1080-gray16': lambda d, s, seed: make_ppm_frames(d, s, seed, 1920, 1080, 1, True, 6),
+    'ppm-3840x2160-rgb16': lambda d, s, seed: make_ppm_frames(d, s, seed, 3840, 2160, 3, True, 2),
+}
+
+
+# --- Entry point runners -----------------------------------------------------
+#
+# Each runner takes the corpus directory and a scratch directory, and
+# returns a list of (files, bytes of input, seconds) per unit of work.
+
+def _files(corpus):
+    return sorted(path for path in Path(corpus).rglob('*') if path.is_file())
+
+
+def _timed(items, convert):
+    samples = []
+    for path in items:
+        start = time.perf_counter()
+        convert(path)
+        samples.append((1, path.stat().st_size, time.perf_counter() - start))
+    return samples
+
+
+def run_rtf(corpus, scratch, mode):
+    import rtf_to_markdown
+    rtf_to_markdown.probe_toolchain()  # warm the toolchain probe outside the timings
+
+    def convert(path):
+        if rtf_to_markdown.convert_rtf_to_markdown(path, scratch, mode=mode) is None:
+            raise RuntimeError(f"conversion of {path} failed")
+    return _timed(_files(corpus), convert)
+
+
+def run_code(corpus, scratch, outline):
+    import code_to_markdown
+    cache = os.path.join(scratch, 'outline-cache') if outline else None
+    return _timed(_files(corpus), lambda path: code_to_markdown.convert_file_to_markdown(
+        path, scratch, outline_cache=cache))
+
+
+def run_archive(corpus, scratch, backend='tar', jobs=1, verify=False, runs=3):
+    import archiver
+    files = _files(corpus)
+    total = sum(path.stat().st_size for path in files)
+    samples = []
+    for run in range(runs):
+        dst = os.path.join(scratch, f"run{run}")
+        if verify:
+            archive = archiver.create_archive(corpus, dst, 'bench', jobs=jobs)
+            start = time.perf_counter()
+            if not archiver.verify_archive(archive):
+                raise RuntimeError("verification failed")
+        else:
+            start = time.perf_counter()
+            if backend == 'chunks':
+                archiver.create_chunk_backup(corpus, dst, 'bench')
+            else:
+                archiver.create_archive(corpus, dst, 'bench', jobs=jobs)
+        samples.append((len(files), total, time.perf_counter() - start))
+    return samples
+
+
+def run_ppm(corpus, scratch, decoder='native', profile='balanced'):
+    import ppm2png
+
+    def convert(path):
+        error = ppm2png.convert_frame(str(path), os.path.join(scratch, path.stem + '.png'),
+                                      decoder, profile=profile)[-1]
+        if error:
+            raise RuntimeError(error)
+    return _timed(_files(corpus), convert)
+
+
+def _have(module):
+    import importlib.util
+    return importlib.util.find_spec(module) is not None
+
+
+# name -> (corpus, runner, keyword arguments, requirement check or None)
+CASES = {
+    'rtf-auto-plain': ('rtf-plain', run_rtf, {'mode': 'auto'}, None),
+    'rtf-auto-tables': ('rtf-tables', run_rtf, {'mode': 'auto'}, None),
+    'rtf-auto-pict': ('rtf-pict', run_rtf, {'mode': 'auto'}, None),
+    'rtf-stream-plain': ('rtf-plain', run_rtf, {'mode': 'stream'}, None),
+    'rtf-stream-tables': ('rtf-tables', run_rtf, {'mode': 'stream'}, None),
+    'rtf-stream-pict': ('rtf-pict', run_rtf, {'mode': 'stream'}, None),
+    'code-markdown': ('source-tree', run_code, {'outline': False}, None),
+    'code-markdown-outline': ('source-tree', run_code, {'outline': True}, None),
+    'archive-gzip': ('archive-tree', run_archive, {'jobs': 1}, None),
+    'archive-gzip-parallel': ('archive-tree', run_archive, {'jobs': None}, None),
+    'archive-chunks': ('archive-tree', run_archive, {'backend': 'chunks'}, None),
+    'archive-verify': ('archive-tree', run_archive, {'jobs': None, 'verify': True}, None),
+    'ppm-640x480-rgb8': ('ppm-640x480-rgb8', run_ppm, {}, None),
+    'ppm-1080p-rgb8': ('ppm-1920x1080-rgb8', run_ppm, {}, None),
+    'ppm-1080p-rgb8-fast': ('ppm-1920x1080-rgb8', run_ppm, {'profile': 'fast'}, None),
+    'ppm-1080p-rgb8-smallest': ('ppm-1920x1080-rgb8', run_ppm, {'profile': 'smallest'}, None),
+    'ppm-1080p-rgb8-pillow': ('ppm-1920x1080-rgb8', run_ppm, {'decoder': 'pillow'},
+                              lambda: _have('PIL') or "Pillow is not installed"),
+    'ppm-1080p-gray16': ('ppm-1920x1080-gray16', run_ppm, {}, None),
+    'ppm-4k-rgb16': ('ppm-3840x2160-rgb16', run_ppm, {}, None),
+}
+
+
+# --- Measurement -------------------------------------------------------------
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (ru_maxrss is KB on Linux)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_case(name, corpus):
+    """Run one case in this process and return its result dict."""
+    _, runner, kwargs, _ = CASES[name]
+    with tempfile.TemporaryDirectory() as scratch:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start_rss = peak_rss_mb()
+            start = time.perf_counter()
+            samples = runner(corpus, scratch, **kwargs)
+            elapsed = time.perf_counter() - start
+    latencies = [seconds * 1000 for _, _, seconds in samples]
+    total_files = sum(files for files, _, _ in samples)
+    total_bytes = sum(size for _, size, _ in samples)
+    busy = max(sum(seconds for _, _, seconds in samples), 1e-9)
+    return {
+        'files': total_files,
+        'samples': len(samples),
+        'bytes': total_bytes,
+        'seconds': round(elapsed, 4),
+        'files_per_s': round(total_files / busy, 2),
+        'mb_per_s': round(total_bytes / 1024 / 1024 / busy, 2),
+        'latency_ms': {f"p{pct}": round(percentile(latencies, pct), 3) for pct in PERCENTILES}
+                      | {'max': round(max(latencies), 3)},
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'startup_rss_mb': round(start_rss, 1),
+    }
+
+
+def run_case_in_child(name, corpus):
+    """Run a case in a fresh interpreter, so peak RSS is measured per case."""
+    completed = subprocess.run(
+        [sys.executable, __file__, '--run-case', name, '--corpus', corpus],
+        capture_output=True, text=True, stdin=subprocess.DEVNULL,
+    )
+    if completed.returncode != 0:
+        lines = completed.stderr.strip().splitlines() or ['no output']
+        return {'error': lines[-1]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def environment():
+    """Describe the machine and toolchain, for reading results side by side."""
+    import rtf_to_markdown
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        toolchain = rtf_to_markdown.probe_toolchain()
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'pandoc': bool(toolchain.get('pandoc_path')),
+        'striprtf': rtf_to_markdown.STRIPRTF_AVAILABLE,
+        'pillow': _have('PIL'),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print each case against the baseline and return the names that regressed."""
+    regressions = []
+    print(f"\n{'case':<26}{'files/s':>10}{'vs base':>9}{'MB/s':>9}{'p90 ms':>10}"
+          f"{'vs base':>9}{'RSS MB':>8}{'vs base':>9}")
+    for name, result in results.items():
+        base = baseline.get('cases', {}).get(name)
+        if 'error' in result or 'skipped' in result:
+            continue
+
+        def change(key, sub=None):
+            if not base or 'files_per_s' not in base:
+                return None
+            old = base[key][sub] if sub else base[key]
+            new = result[key][sub] if sub else result[key]
+            return (new - old) / old * 100 if old else None
+
+        def cell(value):
+            return f"{value:+.1f}%" if value is not None else "new"
+
+        speed, latency, rss = change('files_per_s'), change('latency_ms', 'p90'), change('peak_rss_mb')
+        regressed = (speed is not None and speed < -tolerance) or (rss is not None and rss > tolerance)
+        print(f"{name:<26}{result['files_per_s']:>10.1f}{cell(speed):>9}{result['mb_per_s']:>9.1f}"
+              f"{result['latency_ms']['p90']:>10.1f}{cell(latency):>9}{result['peak_rss_mb']:>8.1f}"
+              f"{cell(rss):>9}" + ("  REGRESSION" if regressed else ""))
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def print_results(results):
+    print(f"\n{'case':<26}{'files':>7}{'files/s':>10}{'MB/s':>9}{'p50 ms':>9}{'p90 ms':>9}"
+          f"{'p99 ms':>9}{'RSS MB':>8}")
+    for name, result in results.items():
+        if 'error' in result:
+            print(f"{name:<26}  error: {result['error']}")
+        elif 'skipped' in result:
+            print(f"{name:<26}  skipped: {result['skipped']}")
+        else:
+            latency = result['latency_ms']
+            print(f"{name:<26}{result['files']:>7}{result['files_per_s']:>10.1f}"
+                  f"{result['mb_per_s']:>9.1f}{latency['p50']:>9.1f}{latency['p90']:>9.1f}"
+                  f"{latency['p99']:>9.1f}{result['peak_rss_mb']:>8.1f}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every converter on synthetic corpora.")
+    parser.add_argument('--cases', nargs='+', default=['*'], metavar='PATTERN',
+                        help="cases to run, as glob patterns (default: all)")
+    parser.add_argument('--list', action='store_true', help="list the cases and exit")
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help="corpus size multiplier (default: 1.0)")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED,
+                        help=f"corpus seed (default: {DEFAULT_SEED})")
+    parser.add_argument('--output', metavar='JSON', help="write the results to this file")
+    parser.add_argument('--baseline', metavar='JSON', help="compare against stored results")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, metavar='PCT',
+                        help="files/s drop or peak RSS growth counted as a regression "
+                             f"(default: {DEFAULT_TOLERANCE:g}%%)")
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    parser.add_argument('--corpus', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    if args.run_case:
+        print(json.dumps(run_case(args.run_case, args.corpus)))
+        return 0
+    if args.list:
+        for name, (corpus, _, kwargs, _) in CASES.items():
+            print(f"{name:<26}{corpus:<24}{kwargs or ''}")
+        return 0
+
+    names = [name for name in CASES if any(fnmatch.fnmatch(name, p) for p in args.cases)]
+    if not names:
+        print(f"No cases match {' '.join(args.cases)}; see --list")
+        return 2
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='bench-corpora-') as corpora:
+        generated = {}
+        for name in names:
+            corpus, _, _, requirement = CASES[name]
+            problem = requirement() if requirement else True
+            if problem is not True:
+                results[name] = {'skipped': problem}
+                continue
+            if corpus not in generated:
+                print(f"Generating {corpus} corpus...")
+                generated[corpus] = os.path.join(corpora, corpus)
+                os.makedirs(generated[corpus])
+                CORPORA[corpus](generated[corpus], args.scale, args.seed)
+            print(f"Running {name}...")
+            results[name] = run_case_in_child(name, generated[corpus])
+
+    print_results(results)
+    report = {
+        'version': RESULTS_VERSION,
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'scale': args.scale,
+        'seed': args.seed,
+        'environment': environment(),
+        'cases': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1)
+        print(f"\nResults written to {args.output}")
+
+    status = 1 if any('error' in result for result in results.values()) else 0
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if (baseline.get('scale'), baseline.get('seed')) != (args.scale, args.seed):
+            print("Warning: the baseline was run with a different --scale or --seed")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:g}%: "
+                  + ', '.join(regressions))
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
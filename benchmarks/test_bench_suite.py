@@ -0,0 +1,154 @@
+"""
+Tests for the converter benchmark suite in bench_suite.py.
+
+The corpus generators must be deterministic for a (scale, seed), every
+kind of case must run to a complete result on a tiny corpus, and the
+command line must write results, compare them against a baseline and
+turn a regression into exit code 1.
+
+Run with: python -m pytest benchmarks
+"""
+
+import hashlib
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import bench_suite
+
+SCALE = 0.01
+
+
+@pytest.fixture(autouse=True)
+def isolated_toolchain(tmp_path, monkeypatch):
+    """Keep the toolchain probe cache of the RTF cases out of the user's home directory."""
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    monkeypatch.setenv('LOCALAPPDATA', str(tmp_path / 'cache'))
+
+
+def tree_digest(directory):
+    """Map each file under a directory to the SHA-256 of its contents."""
+    return {path.relative_to(directory).as_posix(): hashlib.sha256(path.read_bytes()).hexdigest()
+            for path in sorted(Path(directory).rglob('*')) if path.is_file()}
+
+
+def run_suite(*args):
+    return subprocess.run([sys.executable, bench_suite.__file__, *map(str, args)],
+                          capture_output=True, text=True, stdin=subprocess.DEVNULL)
+
+
+# --- Corpora ------------------------------------------------------------------
+
+@pytest.mark.parametrize('corpus', ['rtf-tables', 'rtf-pict', 'source-tree', 'archive-tree',
+                                    'ppm-640x480-rgb8'])
+def test_corpora_are_deterministic(tmp_path, corpus):
+    for name, seed in (('a', 1), ('b', 1), ('c', 2)):
+        (tmp_path / name).mkdir()
+        bench_suite.CORPORA[corpus](tmp_path / name, SCALE, seed)
+    first = tree_digest(tmp_path / 'a')
+    assert first
+    assert tree_digest(tmp_path / 'b') == first
+    assert tree_digest(tmp_path / 'c') != first
+
+
+@pytest.mark.parametrize('channels,wide', [(3, False), (1, True)])
+def test_ppm_frames_have_valid_headers(tmp_path, channels, wide):
+    bench_suite.make_ppm_frames(tmp_path, 1.0, width=60, height=10, channels=channels,
+                                wide=wide, count=2)
+    frames = sorted(tmp_path.iterdir())
+    assert len(frames) == 2
+    header = b'P%d\n60 10\n%d\n' % (6 if channels == 3 else 5, 65535 if wide else 255)
+    for frame in frames:
+        data = frame.read_bytes()
+        assert data.startswith(header)
+        assert len(data) == len(header) + 60 * 10 * channels * (2 if wide else 1)
+
+
+# --- Measurement --------------------------------------------------------------
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 11))
+    assert [bench_suite.percentile(values, pct) for pct in (1, 50, 90, 99, 100)] == [1, 5, 9, 10, 10]
+    assert bench_suite.percentile([7.0], 99) == 7.0
+
+
+@pytest.mark.parametrize('name', ['rtf-stream-tables', 'code-markdown-outline',
+                                  'archive-gzip-parallel', 'archive-chunks', 'archive-verify',
+                                  'ppm-640x480-rgb8'])
+def test_each_runner_measures_its_corpus(tmp_path, name):
+    corpus_name = bench_suite.CASES[name][0]
+    corpus = tmp_path / corpus_name
+    corpus.mkdir()
+    bench_suite.CORPORA[corpus_name](corpus, SCALE, bench_suite.DEFAULT_SEED)
+    files = len(tree_digest(corpus))
+
+    result = bench_suite.run_case(name, str(corpus))
+
+    runs = 3 if name.startswith('archive') else 1
+    assert result['files'] == files * runs
+    assert result['samples'] == (runs if name.startswith('archive') else files)
+    assert result['bytes'] == runs * sum(path.stat().st_size for path in corpus.rglob('*')
+                                         if path.is_file())
+    assert result['files_per_s'] > 0 and result['mb_per_s'] > 0
+    latency = result['latency_ms']
+    assert latency['p50'] <= latency['p90'] <= latency['p99'] <= latency['max']
+    assert result['peak_rss_mb'] >= result['startup_rss_mb'] > 0
+
+
+def test_compare_flags_throughput_drops_and_rss_growth(capsys):
+    def result(files_per_s, rss):
+        return {'files_per_s': files_per_s, 'mb_per_s': 1.0, 'peak_rss_mb': rss,
+                'latency_ms': {'p50': 1.0, 'p90': 2.0, 'p99': 3.0, 'max': 4.0}}
+
+    baseline = {'cases': {'steady': result(100, 50), 'slower': result(100, 50),
+                          'bigger': result(100, 50), 'failed': result(100, 50)}}
+    results = {'steady': result(95, 54), 'slower': result(80, 50), 'bigger': result(120, 60),
+               'fresh': result(10, 500), 'failed': {'error': 'boom'}}
+
+    assert bench_suite.compare(results, baseline, tolerance=10) == ['slower', 'bigger']
+    out = capsys.readouterr().out
+    assert 'fresh' in out and 'new' in out
+    assert 'failed' not in out
+
+
+# --- Command line -------------------------------------------------------------
+
+def test_results_and_baseline_round_trip(tmp_path):
+    results_file = tmp_path / 'results.json'
+    completed = run_suite('--cases', 'code-markdown', 'rtf-stream-plain', '--scale', SCALE,
+                          '--output', results_file)
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+
+    report = json.loads(results_file.read_text(encoding='utf-8'))
+    assert report['version'] == bench_suite.RESULTS_VERSION
+    assert (report['scale'], report['seed']) == (SCALE, bench_suite.DEFAULT_SEED)
+    assert set(report['cases']) == {'code-markdown', 'rtf-stream-plain'}
+    assert all('files_per_s' in case for case in report['cases'].values())
+
+    # Against itself only run-to-run noise: nothing regresses with a wide tolerance
+    completed = run_suite('--cases', 'code-markdown', '--scale', SCALE,
+                          '--baseline', results_file, '--tolerance', 1000)
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    assert 'REGRESSION' not in completed.stdout
+
+    # A baseline a thousand times faster makes this run a regression
+    report['cases']['code-markdown']['files_per_s'] *= 1000
+    results_file.write_text(json.dumps(report), encoding='utf-8')
+    completed = run_suite('--cases', 'code-markdown', '--scale', SCALE,
+                          '--baseline', results_file)
+    assert completed.returncode == 1
+    assert 'code-markdown' in completed.stdout and 'REGRESSION' in completed.stdout
+    assert '1 regression(s)' in completed.stdout
+
+
+def test_list_and_unknown_cases():
+    completed = run_suite('--list')
+    assert completed.returncode == 0
+    assert [line.split()[0] for line in completed.stdout.splitlines()] == list(bench_suite.CASES)
+
+    completed = run_suite('--cases', 'no-such-case*')
+    assert completed.returncode == 2
+    assert 'No cases match' in completed.stdout
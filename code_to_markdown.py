@@ -2,130 +2,1413 @@
 """
 Code to Markdown Converter
 
-This script searches the current directory for .java and .py files
-and converts them to markdown format with proper syntax highlighting.
+This script searches a directory tree (by default the script's own
+directory) for source files in any language of its registry and converts
+them to markdown format with proper syntax highlighting, mirroring the tree
+in the output directory.
 """
 
+import argparse
+import ast
+import codecs
+import contextlib
+import hashlib
+import json
+import mmap
 import os
-import glob
+import re
+import sys
+import time
 from pathlib import Path
 from datetime import datetime
 
+import source_tree
+from source_tree import WATCH_INTERVAL, TreeWatcher, discover_in_background
+
+try:
+    import stage_metrics
+    from stage_metrics import stage
+except ImportError:
+    # Without stage_metrics.py next to this script, stages are not measured
+    stage_metrics = None
+
+    def stage(name, item=None):
+        return contextlib.nullcontext()
+
+# Files converted when no --include pattern is given (None = every file
+# the language registry recognises)
+DEFAULT_INCLUDE = None
+
+# Worker pool: files handed to a worker per task, and tasks in flight per worker
+POOL_BATCH_SIZE = 32
+POOL_TASKS_PER_WORKER = 4
+
+# Bundle mode: shard formats, default shard size and the rough
+# bytes-per-token ratio used to turn a token budget into a byte budget
+BUNDLE_FORMATS = ('md', 'jsonl')
+DEFAULT_SHARD_BYTES = 16 * 1024 * 1024
+BYTES_PER_TOKEN = 4
+SIZE_SUFFIXES = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+# Source ingestion: bytes sniffed for binary content, size from which files
+# are memory-mapped instead of read, and the size of each copied slice
+SNIFF_BYTES = 8192
+MMAP_THRESHOLD = 1024 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+BACKTICK_RUN = re.compile(rb'`+')
+
+# What to do with files over the --max-file-size cap
+OVERSIZE_POLICIES = ('skip', 'truncate')
+
+# Outlines: per-hash cache directory (under the output directory), cache
+# format version and the repo-wide symbol index
+OUTLINE_CACHE_DIR = '.outline_cache'
+OUTLINE_VERSION = 1
+SYMBOL_INDEX_NAME = 'symbols-index.jsonl'
+
+# Java scanner: comments, string/char literals, braces, semicolons,
+# newlines and words; declarations are recognised in the joined words
+JAVA_TOKEN = re.compile(
+    r'//[^\n]*|/\*.*?\*/|"""(?:\\.|.)*?"""|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\''
+    r'|[{};]|\n|[ \t\r\f]+|[^\s{};"\'/]+|/',
+    re.S
+)
+JAVA_TYPE_DECLARATION = re.compile(r'(?:^|\s)(class|interface|enum|record|@interface)\s+(\w+)')
+JAVA_TYPE_KINDS = {'class': 'class', 'interface': 'interface', 'enum': 'enum',
+                   'record': 'record', '@interface': 'annotation'}
+JAVA_METHOD_DECLARATION = re.compile(r'(\w+)\s*\((?:[^()]|\([^()]*\))*\)(?:\s*throws\s[\w\s.,<>]+)?\s*$')
+JAVA_KEYWORDS = {'if', 'for', 'while', 'switch', 'catch', 'synchronized', 'try',
+                 'else', 'do', 'return', 'new', 'throw', 'assert'}
+
+
+# Language registry: fence tag, file extensions, exact file names and
+# shebang interpreters. Add entries with register_language().
+LANGUAGES = (
+    ('python', ('.py', '.pyw', '.pyi'), ('SConstruct', 'SConscript'),
+     ('python', 'python2', 'python3', 'pypy', 'pypy3')),
+    ('java', ('.java',), (), ()),
+    ('kotlin', ('.kt', '.kts'), (), ()),
+    ('scala', ('.scala', '.sc'), (), ('scala',)),
+    ('groovy', ('.groovy', '.gradle'), ('Jenkinsfile',), ('groovy',)),
+    ('c', ('.c', '.h'), (), ()),
+    ('cpp', ('.cc', '.cpp', '.cxx', '.c++', '.hh', '.hpp', '.hxx', '.ipp', '.inl'), (), ()),
+    ('csharp', ('.cs', '.csx'), (), ()),
+    ('objectivec', ('.m', '.mm'), (), ()),
+    ('swift', ('.swift',), (), ()),
+    ('go', ('.go',), (), ()),
+    ('rust', ('.rs',), (), ()),
+    ('zig', ('.zig',), (), ()),
+    ('javascript', ('.js', '.mjs', '.cjs', '.jsx'), (), ('node', 'nodejs')),
+    ('typescript', ('.ts', '.mts', '.cts', '.tsx'), (), ('deno', 'ts-node')),
+    ('ruby', ('.rb', '.rake', '.gemspec'), ('Rakefile', 'Gemfile'), ('ruby',)),
+    ('php', ('.php',), (), ('php',)),
+    ('perl', ('.pl', '.pm'), (), ('perl',)),
+    ('lua', ('.lua',), (), ('lua', 'luajit')),
+    ('r', ('.r',), (), ('rscript',)),
+    ('julia', ('.jl',), (), ('julia',)),
+    ('dart', ('.dart',), (), ()),
+    ('haskell', ('.hs', '.lhs'), (), ('runghc', 'runhaskell')),
+    ('ocaml', ('.ml', '.mli'), (), ('ocaml',)),
+    ('fsharp', ('.fs', '.fsi', '.fsx'), (), ()),
+    ('elixir', ('.ex', '.exs'), (), ('elixir',)),
+    ('erlang', ('.erl', '.hrl'), (), ('escript',)),
+    ('clojure', ('.clj', '.cljs', '.cljc', '.edn'), (), ()),
+    ('lisp', ('.lisp', '.cl', '.el'), (), ('sbcl',)),
+    ('bash', ('.sh', '.bash'), ('.bashrc', '.bash_profile'), ('sh', 'bash', 'dash', 'ksh')),
+    ('zsh', ('.zsh',), ('.zshrc',), ('zsh',)),
+    ('fish', ('.fish',), (), ('fish',)),
+    ('powershell', ('.ps1', '.psm1', '.psd1'), (), ('pwsh',)),
+    ('batch', ('.bat', '.cmd'), (), ()),
+    ('sql', ('.sql',), (), ()),
+    ('html', ('.html', '.htm'), (), ()),
+    ('css', ('.css',), (), ()),
+    ('scss', ('.scss',), (), ()),
+    ('xml', ('.xml', '.xsd', '.xsl', '.svg'), (), ()),
+    ('json', ('.json',), (), ()),
+    ('yaml', ('.yaml', '.yml'), (), ()),
+    ('toml', ('.toml',), ('Pipfile',), ()),
+    ('ini', ('.ini', '.cfg'), (), ()),
+    ('protobuf', ('.proto',), (), ()),
+    ('graphql', ('.graphql', '.gql'), (), ()),
+    ('terraform', ('.tf', '.tfvars'), (), ()),
+    ('makefile', ('.mk',), ('Makefile', 'GNUmakefile', 'makefile'), ('make',)),
+    ('cmake', ('.cmake',), ('CMakeLists.txt',), ()),
+    ('dockerfile', (), ('Dockerfile', 'Containerfile'), ()),
+    ('awk', ('.awk',), (), ('awk', 'gawk')),
+    ('tcl', ('.tcl',), (), ('tclsh',)),
+    ('vim', ('.vim',), ('.vimrc',), ()),
+)
+
+# Lookup tables built from the registry: lower-cased extension, exact file
+# name and shebang interpreter to fence tag
+EXTENSION_TAGS = {}
+FILENAME_TAGS = {}
+INTERPRETER_TAGS = {}
+
+# Bytes read from an extensionless file to look for a shebang
+SHEBANG_BYTES = 256
+SHEBANG_VERSION = re.compile(r'[\d.]+$')
+
+
+def register_language(tag, extensions=(), filenames=(), interpreters=()):
+    """
+    Add a language to the registry, or more names for an existing one.
+
+    Later registrations win, so a custom entry can take over an extension.
+
+    Args:
+        tag: Markdown fence tag, e.g. 'python'
+        extensions: File extensions including the dot, e.g. ('.py',)
+        filenames: Exact file names, e.g. ('Makefile',)
+        interpreters: Shebang interpreter names, e.g. ('python3',)
+    """
+    for extension in extensions:
+        EXTENSION_TAGS[extension.lower()] = tag
+    for filename in filenames:
+        FILENAME_TAGS[filename] = tag
+    for interpreter in interpreters:
+        INTERPRETER_TAGS[interpreter] = tag
+
+
+for _language in LANGUAGES:
+    register_language(*_language)
+
 
 def get_language_tag(file_extension):
     """Return the appropriate markdown language tag for syntax highlighting."""
-    language_map = {
-        '.py': 'python',
-        '.java': 'java'
-    }
-    return language_map.get(file_extension, '')
+    return EXTENSION_TAGS.get(file_extension.lower(), '')
 
 
-def convert_file_to_markdown(file_path, output_dir='markdown_output'):
+def shebang_language(head):
     """
-    Convert a code file to markdown format.
+    Return the fence tag for a shebang line, or '' if there is none.
+
+    Handles '#!/usr/bin/python3', '#!/usr/bin/env python3.12' and
+    '#!/usr/bin/env -S node --flags'.
 
     Args:
-        file_path: Path to the code file
-        output_dir: Directory to save markdown files
+        head: The first bytes of the file
     """
-    file_path = Path(file_path)
+    if not head.startswith(b'#!'):
+        return ''
+    words = bytes(head[2:]).split(b'\n', 1)[0].decode('utf-8', 'replace').split()
+    if words and words[0].endswith('/env'):
+        words = [word for word in words[1:] if not word.startswith('-') and '=' not in word]
+    if not words:
+        return ''
+    interpreter = words[0].rsplit('/', 1)[-1]
+    return (INTERPRETER_TAGS.get(interpreter)
+            or INTERPRETER_TAGS.get(SHEBANG_VERSION.sub('', interpreter), ''))
 
-    # Read the source file
+
+def detect_language(file_path, head=b''):
+    """
+    Return the fence tag for a file: by exact name, then by extension,
+    then by the shebang in `head`.
+
+    Args:
+        file_path: Path of the file
+        head: The first bytes of the file (only used when name and
+              extension are not recognised)
+    """
+    name = os.path.basename(file_path)
+    tag = FILENAME_TAGS.get(name)
+    if tag is None:
+        tag = EXTENSION_TAGS.get(os.path.splitext(name)[1].lower())
+    if tag is None:
+        tag = shebang_language(head)
+    return tag
+
+
+def is_registered_source(file_path):
+    """
+    Check whether the registry recognises a file.
+
+    Extensionless files are recognised by their shebang, which costs one
+    small read; everything else is a table lookup.
+    """
+    name = os.path.basename(file_path)
+    if name in FILENAME_TAGS:
+        return True
+    extension = os.path.splitext(name)[1]
+    if extension:
+        return extension.lower() in EXTENSION_TAGS
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            code_content = f.read()
-    except Exception as e:
-        print(f"Error reading {file_path}: {e}")
+        with open(file_path, 'rb') as f:
+            return bool(shebang_language(f.read(SHEBANG_BYTES)))
+    except OSError:
+        return False
+
+
+class SourceFile:
+    """
+    Read-only view of a source file that avoids copying its contents.
+
+    Small files are read in one call; files of MMAP_THRESHOLD bytes or more
+    are memory-mapped. Either way the data is exposed through a memoryview,
+    so the body can be handed to the output slice by slice without ever
+    becoming one Python string. On open, the first SNIFF_BYTES are checked
+    for NUL bytes to reject binaries cheaply, and the size cap is applied.
+
+    Call scan() before writing: it validates UTF-8 and finds the longest
+    run of backticks in the same pass, which sets `fence` to a code fence
+    the contents cannot close.
+
+    Contents already in memory can be passed as `data`; `file_path` then
+    only names the file (e.g. for language detection).
+
+    Usage:
+        with SourceFile(path, max_bytes=2 * 1024 * 1024) as source:
+            if source.skip_reason is None and source.scan():
+                source.copy_to(out)
+    """
+
+    def __init__(self, file_path, max_bytes=None, oversize='skip', data=None):
+        if oversize not in OVERSIZE_POLICIES:
+            raise ValueError(f"unknown oversize policy: {oversize}")
+        self.path = Path(file_path)
+        self.size = 0
+        self.length = 0
+        self.truncated = False
+        self.skip_reason = None
+        self.fence = '```'
+        self._file = None
+        self._data = b''
+        self._view = memoryview(self._data)
+
+        if data is None:
+            self._file = open(self.path, 'rb')
+            self.size = os.fstat(self._file.fileno()).st_size
+        else:
+            self.size = len(data)
+        if max_bytes is not None and self.size > max_bytes and oversize == 'skip':
+            self.skip_reason = f"{self.size} bytes is over the {max_bytes} byte limit"
+            return
+
+        try:
+            if data is not None:
+                self._data = data if isinstance(data, bytes) else bytes(data)
+            elif self.size >= MMAP_THRESHOLD:
+                self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            elif self.size:
+                self._data = self._file.read()
+        except Exception:
+            self.close()
+            raise
+        self._view = memoryview(self._data)
+        self.size = self.length = len(self._data)
+
+        if self._data.find(b'\0', 0, SNIFF_BYTES) != -1:
+            self.skip_reason = "binary file"
+            return
+
+        if max_bytes is not None and self.size > max_bytes:
+            self.length = self._truncation_point(max_bytes)
+            self.truncated = True
+
+    def _truncation_point(self, max_bytes):
+        """Cut at the last line break within the cap, or failing that at a character boundary."""
+        newline = self._data.rfind(b'\n', 0, max_bytes)
+        if newline >= 0:
+            return newline + 1
+        end = max_bytes
+        while end > 0 and self._view[end] & 0xC0 == 0x80:
+            end -= 1
+        return end
+
+    def scan(self):
+        """
+        Validate the contents as UTF-8 and size the code fence, in one pass.
+
+        Returns:
+            True if the file is text, False (with skip_reason set) if not
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        longest_run = 0
+        carry = 0  # backticks at the end of the previous chunk
+        try:
+            for chunk in self.chunks():
+                decoder.decode(chunk)
+                run = 0
+                for match in BACKTICK_RUN.finditer(chunk):
+                    run = match.end() - match.start()
+                    if match.start() == 0:
+                        run += carry
+                    longest_run = max(longest_run, run)
+                carry = run if run and chunk[-1] == 0x60 else 0
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError as e:
+            self.skip_reason = f"not UTF-8 text ({e.reason})"
+            return False
+        self.fence = '`' * max(3, longest_run + 1)
+        return True
+
+    def chunks(self, chunk_size=COPY_CHUNK_SIZE):
+        """Yield the (possibly truncated) contents as memoryview slices."""
+        for start in range(0, self.length, chunk_size):
+            yield self._view[start:min(start + chunk_size, self.length)]
+
+    def copy_to(self, out):
+        """Write the (possibly truncated) contents to a binary file object."""
+        for chunk in self.chunks():
+            out.write(chunk)
+
+    def sha256(self):
+        """Return the hex SHA-256 of the whole file."""
+        digest = hashlib.sha256()
+        for start in range(0, self.size, COPY_CHUNK_SIZE):
+            digest.update(self._view[start:start + COPY_CHUNK_SIZE])
+        return digest.hexdigest()
+
+    def head(self):
+        """Return the first bytes of the file, for shebang detection."""
+        return bytes(self._view[:SHEBANG_BYTES])
+
+    def text(self):
+        """Return the (possibly truncated) contents as a string."""
+        return str(self._view[:self.length], 'utf-8')
+
+    def close(self):
+        """Release the view, the mapping and the file."""
+        self._view.release()
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._data = b''
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def outline_python(text):
+    """
+    Outline Python source with the ast module.
+
+    Returns:
+        List of symbol dicts (name, kind, start, end), or [] if the file
+        does not parse
+    """
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return []
+
+    symbols = []
+
+    def visit(body, prefix, in_class):
+        for node in body:
+            if isinstance(node, ast.ClassDef):
+                kind = 'class'
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                kind = 'method' if in_class else 'function'
+                if isinstance(node, ast.AsyncFunctionDef):
+                    kind = f"async {kind}"
+            else:
+                continue
+            name = f"{prefix}{node.name}"
+            symbols.append({'name': name, 'kind': kind,
+                            'start': node.lineno, 'end': node.end_lineno})
+            visit(node.body, f"{name}.", kind == 'class')
+
+    visit(tree.body, '', False)
+    return symbols
+
+
+def outline_java(text):
+    """
+    Outline Java source with a brace-tracking scanner.
+
+    Comments and string literals are skipped; the text between two
+    statement boundaries is classified when a '{' opens a block. Type
+    declarations (class, interface, enum, record, @interface) are found at
+    any depth, methods and constructors directly inside a type body.
+
+    Returns:
+        List of symbol dicts (name, kind, start, end)
+    """
+    symbols = []
+    stack = []  # (symbol dict or None, is a type body)
+    statement = []
+    statement_line = None
+    line = 1
+
+    for match in JAVA_TOKEN.finditer(text):
+        token = match.group()
+        if token.startswith(('//', '/*')):
+            line += token.count('\n')
+            continue
+        if token[0] in '"\'':
+            line += token.count('\n')
+            token = '""'
+        elif token == '\n':
+            line += 1
+            continue
+        elif token[0].isspace():
+            continue
+
+        if token == '{':
+            declaration = ' '.join(statement)
+            symbol = None
+            is_type = False
+            type_match = JAVA_TYPE_DECLARATION.search(declaration)
+            in_type_body = bool(stack) and stack[-1][1]
+            if type_match and 'new ' not in declaration:
+                symbol = {'name': type_match.group(2), 'kind': JAVA_TYPE_KINDS[type_match.group(1)]}
+                is_type = True
+            elif in_type_body and '=' not in declaration and 'new ' not in declaration:
+                method_match = JAVA_METHOD_DECLARATION.search(declaration)
+                if method_match and method_match.group(1) not in JAVA_KEYWORDS:
+                    name = method_match.group(1)
+                    owner = stack[-1][0]
+                    kind = 'constructor' if owner and owner['name'].rsplit('.', 1)[-1] == name else 'method'
+                    symbol = {'name': name, 'kind': kind}
+            if symbol is not None:
+                owners = [entry[0]['name'] for entry in stack if entry[0] is not None]
+                if owners:
+                    symbol['name'] = f"{owners[-1]}.{symbol['name']}"
+                symbol['start'] = statement_line or line
+                symbol['end'] = line
+                symbols.append(symbol)
+            stack.append((symbol, is_type))
+            statement = []
+            statement_line = None
+        elif token == '}':
+            if stack:
+                symbol, _ = stack.pop()
+                if symbol is not None:
+                    symbol['end'] = line
+            statement = []
+            statement_line = None
+        elif token == ';':
+            statement = []
+            statement_line = None
+        else:
+            if statement_line is None:
+                statement_line = line
+            statement.append(token)
+
+    symbols.sort(key=lambda symbol: symbol['start'])
+    return symbols
+
+
+# Outline builders by fence tag
+OUTLINERS = {
+    'python': outline_python,
+    'java': outline_java,
+}
+
+
+def outline_cache_path(cache_dir, sha256):
+    """Return the cache file for a content hash (fanned out by its first byte)."""
+    return Path(cache_dir) / sha256[:2] / f"{sha256}.json"
+
+
+def get_outline(source, language_tag, cache_dir, cache_keys=None):
+    """
+    Return the symbol outline of an open SourceFile, parsing it only if
+    the outline cache has no entry for its content hash.
+
+    Args:
+        source: Scanned SourceFile
+        language_tag: Fence tag of the file
+        cache_dir: Directory of the outline cache, or None to always parse
+        cache_keys: Optional set that receives the content hash of the
+                    cache entry used, for prune_outline_cache
+
+    Returns:
+        List of symbol dicts, or None if the language has no outliner or
+        the file was truncated
+    """
+    outliner = OUTLINERS.get(language_tag)
+    if outliner is None or source.truncated:
         return None
+    if cache_dir is None:
+        return outliner(source.text())
+
+    sha256 = source.sha256()
+    if cache_keys is not None:
+        cache_keys.add(sha256)
+    cache_file = outline_cache_path(cache_dir, sha256)
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get('version') == OUTLINE_VERSION and cached.get('language') == language_tag:
+            return cached['symbols']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    symbols = outliner(source.text())
+
+    # Write atomically: several worker processes may share the cache
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': OUTLINE_VERSION, 'language': language_tag,
+                       'symbols': symbols}, f)
+        os.replace(temp_file, cache_file)
+    except OSError as e:
+        print(f"Warning: could not cache outline of {source.path}: {e}")
+    return symbols
 
-    # Get the language tag
-    language_tag = get_language_tag(file_path.suffix)
 
+def prune_outline_cache(cache_dir, cache_keys):
+    """
+    Remove outline cache entries whose content hash was not used.
+
+    Called after a full run, so outlines of files that were edited or
+    deleted do not pile up; temp files left by killed workers go too.
+
+    Args:
+        cache_dir: Directory of the outline cache
+        cache_keys: Content hashes of the entries to keep
+
+    Returns:
+        Number of files removed
+    """
+    removed = 0
+    try:
+        fan_out = [entry for entry in os.scandir(cache_dir) if entry.is_dir()]
+    except FileNotFoundError:
+        return 0
+    for directory in fan_out:
+        for entry in os.scandir(directory.path):
+            name = entry.name
+            if name.endswith('.json') and name[:-len('.json')] in cache_keys:
+                continue
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except OSError as e:
+                print(f"Warning: could not prune {entry.path}: {e}")
+        try:
+            os.rmdir(directory.path)  # only succeeds once it is empty
+        except OSError:
+            pass
+    return removed
+
+
+def render_outline(symbols):
+    """Render an outline as a Markdown section."""
+    if not symbols:
+        return "## Outline\n\n*No symbols found.*\n\n"
+    rows = [f"| `{symbol['name']}` | {symbol['kind']} | {symbol['start']}-{symbol['end']} |"
+            for symbol in symbols]
+    return "## Outline\n\n| Symbol | Kind | Lines |\n|---|---|---|\n" + "\n".join(rows) + "\n\n"
+
+
+def code_markdown_parts(source, language_tag, outline=None):
+    """
+    Return the Markdown that goes around the code of a scanned SourceFile.
+
+    Args:
+        source: Scanned SourceFile
+        language_tag: Fence tag of the file
+        outline: Symbols for an outline section, or None for no section
+
+    Returns:
+        Tuple of (header, footer) strings; the code itself goes between them
+    """
     # Get current date and time
     current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-    # Create markdown content
-    markdown_content = f"""**File Type:** {language_tag.capitalize()}
+    outline_section = render_outline(outline) if outline is not None else ''
+    header = f"""**File Type:** {language_tag.capitalize()}
 **Converted on:** {current_datetime}
 
 ---
 
-## Code
+{outline_section}## Code
 
-```{language_tag}
-{code_content}
-```
+{source.fence}{language_tag}
 """
+    footer = f"\n{source.fence}\n"
+    if source.truncated:
+        footer += f"\n*Truncated: showing the first {source.length} of {source.size} bytes.*\n"
+    return header, footer
+
+
+def markdown_path_for(file_path, output_dir):
+    """Return the markdown file for a source file: its full name plus '.md'."""
+    return Path(output_dir) / f"{Path(file_path).name}.md"
+
+
+def output_key(output_file):
+    """
+    Return the key two output files collide under.
+
+    Case is ignored, since Foo.c and foo.c would overwrite each other on
+    Windows and macOS, where converted trees are often copied to.
+    """
+    return os.path.normpath(str(output_file)).casefold()
 
-    # Create output directory if it doesn't exist
-    output_path = Path(output_dir)
-    output_path.mkdir(exist_ok=True)
 
-    # Create output filename with language type
-    output_file = output_path / f"{file_path.stem}_{language_tag}.md"
+def convert_file_to_markdown(file_path, output_dir='markdown_output', max_bytes=None,
+                             oversize='skip', outline_cache=None, symbols=None,
+                             cache_keys=None):
+    """
+    Convert a code file to markdown format.
+
+    The code is copied from the source (read or memory-mapped, see
+    SourceFile) to the output in slices, never as one Python string.
+
+    Args:
+        file_path: Path to the code file
+        output_dir: Directory to save markdown files
+        max_bytes: Optional size cap for source files
+        oversize: What to do with files over the cap, one of OVERSIZE_POLICIES
+        outline_cache: Outline cache directory; when given, an outline
+                       section is added for languages in OUTLINERS
+        symbols: Optional list that receives the outline's symbols
+        cache_keys: Optional set that receives the outline cache key used
+    """
+    file_path = Path(file_path)
 
-    # Write markdown file
+    # Open the source file and check it is text
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(markdown_content)
-        print(f"✓ Converted: {file_path.name} -> {output_file}")
-        return output_file
+        with stage('open', file_path):
+            source = SourceFile(file_path, max_bytes, oversize)
     except Exception as e:
-        print(f"✗ Error writing {output_file}: {e}")
+        print(f"Error reading {file_path}: {e}")
         return None
 
+    with source:
+        if source.skip_reason is None:
+            with stage('scan', file_path):
+                source.scan()
+        if source.skip_reason is not None:
+            print(f"- Skipped {file_path.name}: {source.skip_reason}")
+            return None
+
+        # Get the language tag
+        language_tag = detect_language(file_path, source.head())
+
+        # Outline the file if requested (cached by content hash)
+        outline = None
+        if outline_cache is not None:
+            with stage('outline', file_path):
+                outline = get_outline(source, language_tag, outline_cache, cache_keys)
+            if outline is not None and symbols is not None:
+                symbols.extend(outline)
+
+        # Create the markdown around the code
+        header, footer = code_markdown_parts(source, language_tag, outline)
+
+        # Create output directory if it doesn't exist
+        output_path = Path(output_dir)
+        output_path.mkdir(parents=True, exist_ok=True)
+
+        # Name the output after the full source name, so foo.c and foo.h stay apart
+        output_file = markdown_path_for(file_path, output_path)
+
+        # Write markdown file
+        try:
+            with stage('write', output_file), open(output_file, 'wb') as f:
+                f.write(header.encode('utf-8'))
+                source.copy_to(f)
+                f.write(footer.encode('utf-8'))
+            print(f"✓ Converted: {file_path.name} -> {output_file}")
+            if stage_metrics:
+                stage_metrics.count('files')
+                stage_metrics.count('bytes', source.size)
+            return output_file
+        except Exception as e:
+            print(f"✗ Error writing {output_file}: {e}")
+            return None
+
+
+def parse_size(text):
+    """Parse a byte count such as '4096', '512K', '64M' or '1G'."""
+    text = text.strip().upper().rstrip('B')
+    multiplier = SIZE_SUFFIXES.get(text[-1:], 1)
+    if text[-1:] in SIZE_SUFFIXES:
+        text = text[:-1]
+    value = int(float(text) * multiplier)
+    if value <= 0:
+        raise ValueError("size must be positive")
+    return value
+
 
-def find_and_convert_code_files():
+class BundleWriter:
     """
-    Find all .java and .py files in the current directory and convert them.
+    Stream many converted files into a few large shard files.
+
+    Each file becomes one record: a Markdown section ('md') or a JSON line
+    ('jsonl') with path, language, size, hash and content. A new shard is
+    started when the next record would take the current one past the byte
+    budget. Alongside the shards, an index (<prefix>-index.jsonl) records
+    the shard, byte offset and length of every record, so a consumer can
+    seek straight to one file's section. With an outline cache, records
+    also carry the file's symbol outline.
+
+    Usage:
+        with BundleWriter(output_dir, 'jsonl', max_bytes=64 * 1024 * 1024) as bundle:
+            bundle.add_file(path, 'src/app.py')
+    """
+
+    def __init__(self, output_dir, bundle_format='md', max_bytes=DEFAULT_SHARD_BYTES,
+                 max_tokens=None, prefix='bundle', max_file_bytes=None, oversize='skip',
+                 outline_cache=None):
+        if bundle_format not in BUNDLE_FORMATS:
+            raise ValueError(f"unknown bundle format: {bundle_format}")
+        self.output_dir = Path(output_dir)
+        self.bundle_format = bundle_format
+        self.max_bytes = max_bytes
+        if max_tokens:
+            self.max_bytes = min(max_bytes, max_tokens * BYTES_PER_TOKEN)
+        self.prefix = prefix
+        self.max_file_bytes = max_file_bytes
+        self.oversize = oversize
+        self.outline_cache = outline_cache
+        self.shards = []
+        self.records = 0
+        self.source_bytes = 0
+        self._shard = None
+        self._shard_size = 0
+        self._header_size = 0
+        self._converted_on = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._remove_previous_bundle()
+        self.index_path = self.output_dir / f"{prefix}-index.jsonl"
+        self._index = open(self.index_path, 'w', encoding='utf-8', newline='\n')
+
+    def _remove_previous_bundle(self):
+        """Delete shards of an earlier run so none are left over."""
+        for bundle_format in BUNDLE_FORMATS:
+            for old_shard in self.output_dir.glob(f"{self.prefix}-[0-9]*.{bundle_format}"):
+                old_shard.unlink()
+
+    def _open_shard(self):
+        """Close the current shard and start the next one."""
+        if self._shard is not None:
+            self._shard.close()
+        path = self.output_dir / f"{self.prefix}-{len(self.shards):05d}.{self.bundle_format}"
+        self._shard = open(path, 'wb')
+        self.shards.append(path)
+        header = b''
+        if self.bundle_format == 'md':
+            header = (f"**Bundle:** {path.name}\n"
+                      f"**Converted on:** {self._converted_on}\n\n---\n\n").encode('utf-8')
+        self._shard.write(header)
+        self._shard_size = self._header_size = len(header)
+
+    def _render(self, relative_path, language_tag, source, sha256, outline=None):
+        """
+        Render one file as a shard record.
+
+        Returns:
+            (head, tail) bytes; for 'md' records the code itself is copied
+            from the source between the two, for 'jsonl' it is in the head
+        """
+        if self.bundle_format == 'jsonl':
+            record = {
+                'path': relative_path,
+                'language': language_tag,
+                'size': source.size,
+                'sha256': sha256,
+                'content': source.text(),
+            }
+            if source.truncated:
+                record['truncated_to'] = source.length
+            if outline is not None:
+                record['symbols'] = outline
+            return (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'), b''
+
+        head = f"""## {relative_path}
+
+**File Type:** {language_tag.capitalize()}
+**Size:** {source.size} bytes
+**SHA-256:** {sha256}
+
+{render_outline(outline) if outline is not None else ''}{source.fence}{language_tag}
+"""
+        tail = f"\n{source.fence}\n\n"
+        if source.truncated:
+            tail += f"*Truncated: showing the first {source.length} of {source.size} bytes.*\n\n"
+        return head.encode('utf-8'), tail.encode('utf-8')
+
+    def add_file(self, file_path, relative_path, symbols=None, cache_keys=None):
+        """
+        Append one source file to the bundle.
+
+        Args:
+            file_path: Path to the code file
+            relative_path: Path recorded in the bundle and index
+            symbols: Optional list that receives the outline's symbols
+            cache_keys: Optional set that receives the outline cache key used
+
+        Returns:
+            True if the file was added, False if it was skipped or unreadable
+        """
+        file_path = Path(file_path)
+        try:
+            source = SourceFile(file_path, self.max_file_bytes, self.oversize)
+        except Exception as e:
+            print(f"Error reading {file_path}: {e}")
+            return False
+
+        with source:
+            if source.skip_reason is None:
+                source.scan()
+            if source.skip_reason is not None:
+                print(f"- Skipped {relative_path}: {source.skip_reason}")
+                return False
+
+            language_tag = detect_language(file_path, source.head())
+            sha256 = source.sha256()
+            outline = None
+            if self.outline_cache is not None:
+                outline = get_outline(source, language_tag, self.outline_cache, cache_keys)
+                if outline is not None and symbols is not None:
+                    symbols.extend(outline)
+            head, tail = self._render(relative_path, language_tag, source, sha256, outline)
+            body_length = source.length if self.bundle_format == 'md' else 0
+            length = len(head) + body_length + len(tail)
+
+            # Roll over unless the shard is still empty (one oversized file
+            # gets a shard of its own rather than being split)
+            if self._shard is None or (self._shard_size > self._header_size and
+                                       self._shard_size + length > self.max_bytes):
+                self._open_shard()
+
+            offset = self._shard_size
+            self._shard.write(head)
+            if body_length:
+                source.copy_to(self._shard)
+            self._shard.write(tail)
+            self._shard_size += length
+            self.records += 1
+            self.source_bytes += source.length
+
+        self._index.write(json.dumps({
+            'path': relative_path,
+            'shard': self.shards[-1].name,
+            'offset': offset,
+            'length': length,
+            'language': language_tag,
+            'size': source.size,
+            'sha256': sha256,
+        }) + '\n')
+        return True
+
+    def close(self):
+        """Finish the current shard and the index."""
+        if self._shard is not None:
+            self._shard.close()
+            self._shard = None
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def iter_source_files(root, include=DEFAULT_INCLUDE, exclude=(), max_depth=None, skip_dirs=()):
     """
-    # Get the directory where this script is located
-    script_dir = Path(__file__).parent
-    os.chdir(script_dir)
+    Find code files under `root` (see source_tree.iter_source_files).
 
-    print(f"Searching for code files in: {script_dir}\n")
+    Without `include` patterns, every file the language registry
+    recognises is yielded.
+    """
+    return source_tree.iter_source_files(root, include, exclude, max_depth, skip_dirs,
+                                         accept=is_registered_source)
 
-    # Find all Java and Python files
-    patterns = ['*.java', '*.py']
-    code_files = []
 
-    for pattern in patterns:
-        files = list(script_dir.glob(pattern))
-        code_files.extend(files)
+def _convert_code_batch(batch, max_bytes, oversize, outline_cache):
+    """
+    Process-pool entry point: convert a batch of files.
+
+    Files are sent in batches so that small sources are not dominated by
+    the cost of one pool round trip each. Exceptions are caught per file.
+
+    Returns:
+        Tuple of (list of (file_path, output_file or None, source bytes,
+        symbols, error message or None), set of outline cache keys used,
+        stage totals for the parent or None)
+    """
+    results = []
+    cache_keys = set()
+    for file_path, output_dir in batch:
+        symbols = []
+        try:
+            result = convert_file_to_markdown(
+                file_path, output_dir, max_bytes, oversize, outline_cache, symbols, cache_keys
+            )
+            size = os.path.getsize(file_path) if result else 0
+            results.append((file_path, result, size, symbols, None))
+        except Exception as e:
+            results.append((file_path, None, 0, [], f"{type(e).__name__}: {e}"))
+    return results, cache_keys, stage_metrics.collect() if stage_metrics else None
+
+
+def convert_code_files_parallel(tasks, jobs=None, max_bytes=None, oversize='skip',
+                                outline_cache=None, cache_keys=None):
+    """
+    Convert code files on a process pool, yielding results as they complete.
+
+    Tasks are grouped into batches of POOL_BATCH_SIZE and submitted as they
+    arrive from `tasks`, with at most POOL_TASKS_PER_WORKER batches per
+    worker in flight, so a lazily discovered file list is never held in
+    full and conversion starts with the first files.
+
+    Args:
+        tasks: Iterable of (file_path, output_dir) tuples
+        jobs: Number of worker processes (None = CPU count)
+        max_bytes: Optional size cap for source files
+        oversize: What to do with files over the cap, one of OVERSIZE_POLICIES
+        outline_cache: Outline cache directory, or None for no outlines
+        cache_keys: Optional set that receives the outline cache keys used
+
+    Yields:
+        Tuple of (file_path, output_file or None, source bytes, symbols,
+        error message or None)
+    """
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    max_pending = (jobs or os.cpu_count() or 1) * POOL_TASKS_PER_WORKER
+
+    def collect(future):
+        try:
+            results, used_keys, totals = future.result()
+        except Exception as e:
+            # The worker process itself died (e.g. BrokenProcessPool)
+            error = f"{type(e).__name__}: {e}"
+            return [(file_path, None, 0, [], error) for file_path, _ in futures[future]]
+        if cache_keys is not None:
+            cache_keys.update(used_keys)
+        if stage_metrics:
+            stage_metrics.merge(totals)
+        return results
+
+    def drain(return_when):
+        finished, _ = wait(futures, return_when=return_when)
+        for future in finished:
+            yield from collect(future)
+            del futures[future]
+
+    pool_options = stage_metrics.pool_options() if stage_metrics else {}
+    with ProcessPoolExecutor(max_workers=jobs, **pool_options) as executor:
+        futures = {}
+        batch = []
+        for task in tasks:
+            batch.append(task)
+            if len(batch) < POOL_BATCH_SIZE:
+                continue
+            futures[executor.submit(_convert_code_batch, batch, max_bytes, oversize, outline_cache)] = batch
+            batch = []
+            if len(futures) >= max_pending:
+                yield from drain(FIRST_COMPLETED)
+        if batch:
+            futures[executor.submit(_convert_code_batch, batch, max_bytes, oversize, outline_cache)] = batch
+        while futures:
+            yield from drain(FIRST_COMPLETED)
+
+
+def find_and_convert_code_files(root=None, output_dir=None, include=DEFAULT_INCLUDE,
+                                exclude=(), max_depth=None, bundle_format=None,
+                                shard_bytes=DEFAULT_SHARD_BYTES, shard_tokens=None,
+                                max_file_bytes=None, oversize='skip', jobs=1, outline=False):
+    """
+    Find all matching code files under a directory tree and convert them.
+
+    Conversion starts with the first file found while the rest of the tree
+    is still being walked.
+
+    Args:
+        root: Directory to search (default: the script's directory)
+        output_dir: Output directory (default: markdown_output under root);
+                    the source tree is mirrored inside it
+        include: Glob patterns of files to convert, or None for every
+                 language in the registry
+        exclude: Glob patterns of files and directories to skip
+        max_depth: Deepest directory level to search (0 = root only, None = all)
+        bundle_format: None for one markdown file per source file, or one of
+                       BUNDLE_FORMATS to stream everything into shards
+        shard_bytes: Byte budget per shard in bundle mode
+        shard_tokens: Optional token budget per shard in bundle mode
+        max_file_bytes: Optional size cap for source files
+        oversize: What to do with files over the cap, one of OVERSIZE_POLICIES
+        jobs: Number of worker processes (None = CPU count); 1 converts
+              serially in this process. Bundle mode always writes from
+              this process.
+        outline: Add a symbol outline to each Python and Java file (cached
+                 by content hash under the output directory, where entries
+                 no file used are pruned after the run) and write a
+                 repo-wide symbol index
+
+    Returns:
+        Dict mapping each converted source path to its markdown file
+        (empty in bundle mode)
+    """
+    source_root = Path(root or Path(__file__).parent).resolve()
+    output_root = Path(output_dir).resolve() if output_dir else source_root / 'markdown_output'
+
+    print(f"Searching for code files in: {source_root}\n")
 
     # Exclude this script itself
-    script_name = Path(__file__).name
-    code_files = [f for f in code_files if f.name != script_name]
+    script_path = Path(__file__).resolve()
+
+    found_files = iter_source_files(
+        source_root, include, exclude, max_depth, skip_dirs=[output_root]
+    )
+
+    outline_cache = output_root / OUTLINE_CACHE_DIR if outline else None
+    cache_keys = set()
+
+    bundle = None
+    if bundle_format:
+        bundle = BundleWriter(output_root, bundle_format, shard_bytes, shard_tokens,
+                              max_file_bytes=max_file_bytes, oversize=oversize,
+                              outline_cache=outline_cache)
+
+    # Repo-wide symbol index, one JSON line per symbol
+    symbol_index = None
+    symbol_count = 0
+    if outline:
+        output_root.mkdir(parents=True, exist_ok=True)
+        symbol_index = open(output_root / SYMBOL_INDEX_NAME, 'w', encoding='utf-8', newline='\n')
 
-    if not code_files:
-        print("No .java or .py files found in the current directory.")
-        return
+    def index_symbols(relative_path, symbols):
+        """Append one file's symbols to the symbol index."""
+        nonlocal symbol_count
+        if symbol_index is None:
+            return
+        path = relative_path.as_posix()
+        for symbol in symbols:
+            symbol_index.write(json.dumps({'path': path, **symbol}) + '\n')
+        symbol_count += len(symbols)
 
-    print(f"Found {len(code_files)} file(s) to convert:\n")
+    counts = {'found': 0, 'collisions': 0}
 
-    # Convert each file
+    # Output file key -> source that claimed it, so no two sources share an output
+    claimed = {}
+
+    def claim(file_path, relative_path):
+        """Reserve a source's output file; report an error if another source has it."""
+        output_file = markdown_path_for(file_path, output_root / relative_path.parent)
+        owner = claimed.setdefault(output_key(output_file), relative_path)
+        if owner != relative_path:
+            print(f"✗ {relative_path}: output {output_file} would overwrite the output of {owner}")
+            counts['collisions'] += 1
+            return False
+        return True
+
+    def pending_files():
+        """Yield (file, path relative to the source root) for each discovered file."""
+        discovered = discover_in_background(found_files, name='code-discovery')
+        if stage_metrics:
+            discovered = stage_metrics.timed_iter('discover', discovered)
+        for file_path in discovered:
+            if file_path.resolve() == script_path:
+                continue
+            counts['found'] += 1
+            yield file_path, file_path.relative_to(source_root)
+
+    # Convert each file as soon as it is discovered
+    outputs = {}
     converted_count = 0
-    for file_path in sorted(code_files):
-        result = convert_file_to_markdown(file_path)
-        if result:
-            converted_count += 1
+    source_bytes = 0
+    start = time.perf_counter()
+    try:
+        if bundle:
+            for file_path, relative_path in pending_files():
+                symbols = []
+                with stage('bundle', file_path):
+                    added = bundle.add_file(file_path, relative_path.as_posix(), symbols,
+                                            cache_keys)
+                if added:
+                    converted_count += 1
+                    index_symbols(relative_path, symbols)
+            source_bytes = bundle.source_bytes
+        elif jobs == 1:
+            for file_path, relative_path in pending_files():
+                if not claim(file_path, relative_path):
+                    continue
+                file_output_dir = output_root / relative_path.parent
+                symbols = []
+                result = convert_file_to_markdown(
+                    file_path, file_output_dir, max_file_bytes, oversize, outline_cache, symbols,
+                    cache_keys
+                )
+                if result:
+                    outputs[str(file_path)] = result
+                    converted_count += 1
+                    source_bytes += os.path.getsize(file_path)
+                    index_symbols(relative_path, symbols)
+        else:
+            print(f"Converting with {jobs or os.cpu_count()} worker process(es)...\n")
+            tasks = ((file_path, output_root / relative_path.parent)
+                     for file_path, relative_path in pending_files()
+                     if claim(file_path, relative_path))
+            results = convert_code_files_parallel(
+                tasks, jobs, max_file_bytes, oversize, outline_cache, cache_keys
+            )
+            for file_path, result, size, symbols, error in results:
+                if error:
+                    print(f"✗ {file_path.relative_to(source_root)}: {error}")
+                elif result:
+                    outputs[str(file_path)] = result
+                    converted_count += 1
+                    source_bytes += size
+                    index_symbols(file_path.relative_to(source_root), symbols)
+    finally:
+        if bundle:
+            bundle.close()
+        if symbol_index:
+            symbol_index.close()
+    elapsed = max(time.perf_counter() - start, 1e-9)
+
+    # Drop outlines of files that were edited or deleted since the last run
+    pruned = prune_outline_cache(outline_cache, cache_keys) if outline_cache else 0
+
+    if not counts['found']:
+        print("No matching code files found.")
+        return outputs
 
     print(f"\n{'='*50}")
     print(f"Conversion complete!")
-    print(f"Files converted: {converted_count}/{len(code_files)}")
-    print(f"Output directory: {Path('markdown_output').absolute()}")
+    print(f"Converted {converted_count}/{counts['found']} files "
+          f"({source_bytes / 1e6:.1f} MB) in {elapsed:.2f}s")
+    print(f"Throughput: {converted_count / elapsed:.1f} files/s, "
+          f"{source_bytes / 1e6 / elapsed:.2f} MB/s")
+    if counts['collisions']:
+        print(f"✗ Not converted (output name collisions): {counts['collisions']}")
+    if bundle:
+        print(f"Shards written: {len(bundle.shards)}")
+        print(f"Index: {bundle.index_path}")
+    if symbol_index:
+        print(f"Symbols indexed: {symbol_count} ({output_root / SYMBOL_INDEX_NAME})")
+    if pruned:
+        print(f"Stale outlines pruned: {pruned}")
+    print(f"Output directory: {output_root}")
     print(f"{'='*50}")
+    return outputs
+
+
+def update_symbol_index(output_root, updated, removed=()):
+    """
+    Rewrite the symbol index with new symbols for some files.
+
+    Args:
+        output_root: Output directory holding SYMBOL_INDEX_NAME
+        updated: Dict mapping relative source path -> its new symbol list
+        removed: Relative source paths whose symbols are dropped
+    """
+    index_path = Path(output_root) / SYMBOL_INDEX_NAME
+    replaced = set(updated) | set(removed)
+    temp_path = index_path.with_suffix('.tmp')
+    with open(temp_path, 'w', encoding='utf-8', newline='\n') as out:
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if json.loads(line)['path'] not in replaced:
+                        out.write(line)
+        except FileNotFoundError:
+            pass
+        for path, symbols in updated.items():
+            for symbol in symbols:
+                out.write(json.dumps({'path': path, **symbol}) + '\n')
+    os.replace(temp_path, index_path)
+
+
+def watch_and_convert_code_files(root=None, output_dir=None, include=DEFAULT_INCLUDE,
+                                 exclude=(), max_depth=None, max_file_bytes=None,
+                                 oversize='skip', jobs=1, outline=False,
+                                 interval=WATCH_INTERVAL):
+    """
+    Convert a tree once, then keep its markdown up to date until Ctrl+C.
+
+    Only files that changed are reconverted, in this process, so a single
+    edit is picked up without paying interpreter start-up or a full run;
+    the outputs of deleted files are removed. Stale outlines are pruned by
+    the first run only; the cache is not swept again while watching.
+
+    Args:
+        interval: Seconds between looks at the tree (see TreeWatcher)
+        Others as for find_and_convert_code_files
+    """
+    source_root = Path(root or Path(__file__).parent).resolve()
+    output_root = Path(output_dir).resolve() if output_dir else source_root / 'markdown_output'
+    script_path = str(Path(__file__).resolve())
+    outline_cache = output_root / OUTLINE_CACHE_DIR if outline else None
+
+    # Snapshot before the first run so edits made during it are not missed
+    watcher = TreeWatcher(source_root, include, exclude, max_depth, skip_dirs=[output_root],
+                          interval=interval, accept=is_registered_source)
+    outputs = find_and_convert_code_files(
+        source_root, output_root, include, exclude, max_depth,
+        max_file_bytes=max_file_bytes, oversize=oversize, jobs=jobs, outline=outline
+    )
+
+    print(f"\nWatching {source_root} for changes ({watcher.backend}); press Ctrl+C to stop.")
+    try:
+        for changed, removed in watcher.batches():
+            start = time.perf_counter()
+            updated_symbols = {}
+            removed_paths = []
+            for path in removed:
+                relative_path = Path(path).relative_to(source_root).as_posix()
+                removed_paths.append(relative_path)
+                output_file = outputs.pop(path, None)
+                if output_file and output_file.exists():
+                    output_file.unlink()
+                    print(f"- Removed: {output_file}")
+
+            converted_count = 0
+            for path in changed:
+                if path == script_path:
+                    continue
+                relative_path = Path(path).relative_to(source_root)
+                key = output_key(markdown_path_for(path, output_root / relative_path.parent))
+                owner = next((other for other, output_file in outputs.items()
+                              if other != path and output_key(output_file) == key), None)
+                if owner:
+                    print(f"✗ {relative_path}: output would overwrite the output of "
+                          f"{Path(owner).relative_to(source_root)}")
+                    continue
+                symbols = []
+                result = convert_file_to_markdown(
+                    path, output_root / relative_path.parent, max_file_bytes, oversize,
+                    outline_cache, symbols
+                )
+                previous = outputs.pop(path, None)
+                if previous and previous != result and previous.exists():
+                    previous.unlink()
+                if result:
+                    outputs[path] = result
+                    converted_count += 1
+                    updated_symbols[relative_path.as_posix()] = symbols
+                else:
+                    removed_paths.append(relative_path.as_posix())
+
+            if outline:
+                update_symbol_index(output_root, updated_symbols, removed_paths)
+            elapsed = time.perf_counter() - start
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Updated {converted_count} "
+                  f"file(s), removed {len(removed)} in {elapsed * 1000:.0f} ms")
+    except KeyboardInterrupt:
+        print("\nWatch stopped.")
+
+
+def parse_args(argv=None):
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Convert code files to Markdown.")
+    parser.add_argument(
+        'root', nargs='?', default=None,
+        help="directory to search (default: the script's directory)"
+    )
+    parser.add_argument(
+        '-o', '--output-dir', default=None,
+        help="output directory; mirrors the source tree (default: ROOT/markdown_output)"
+    )
+    parser.add_argument(
+        '--include', action='append', default=None, metavar='GLOB',
+        help="glob of files to convert, matched against name or relative path; "
+             "repeatable (default: every language in the registry, including "
+             "extensionless scripts with a known shebang)"
+    )
+    parser.add_argument(
+        '--exclude', action='append', default=[], metavar='GLOB',
+        help="glob of files or directories to skip; repeatable"
+    )
+    parser.add_argument(
+        '--max-depth', type=int, default=None,
+        help="deepest directory level to search (0 = ROOT only; default: unlimited)"
+    )
+    parser.add_argument(
+        '--bundle', choices=BUNDLE_FORMATS, default=None,
+        help="stream all files into a few large shards (concatenated Markdown or "
+             "JSONL) plus an offset index, instead of one file per source"
+    )
+    parser.add_argument(
+        '--shard-bytes', type=parse_size, default=DEFAULT_SHARD_BYTES, metavar='SIZE',
+        help="roll over to a new shard at this size, e.g. 512K or 64M (default: 16M)"
+    )
+    parser.add_argument(
+        '--shard-tokens', type=int, default=None, metavar='N',
+        help=f"roll over at roughly N tokens (estimated as {BYTES_PER_TOKEN} bytes per token)"
+    )
+    parser.add_argument(
+        '--max-file-size', type=parse_size, default=None, metavar='SIZE',
+        help="size cap for source files, e.g. 256K or 2M (default: no cap)"
+    )
+    parser.add_argument(
+        '--oversize', choices=OVERSIZE_POLICIES, default='skip',
+        help="skip files over --max-file-size, or truncate them at a line break "
+             "(default: skip)"
+    )
+    parser.add_argument(
+        '--outline', action='store_true',
+        help="add a symbol outline to each Python and Java file and write "
+             f"{SYMBOL_INDEX_NAME}; outlines are cached by content hash"
+    )
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=0,
+        help="number of worker processes (default: 0 = one per CPU, 1 = serial)"
+    )
+    parser.add_argument(
+        '-w', '--watch', action='store_true',
+        help="after converting, keep running and reconvert files as they change "
+             "(uses the 'watchdog' package if installed, otherwise polls)"
+    )
+    parser.add_argument(
+        '--watch-interval', type=float, default=WATCH_INTERVAL, metavar='SECONDS',
+        help=f"how often --watch looks for changes (default: {WATCH_INTERVAL})"
+    )
+    parser.add_argument(
+        '-n', '--non-interactive', action='store_true',
+        help="never wait for Enter at the end (implied when stdin is not a terminal)"
+    )
+    if stage_metrics:
+        stage_metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+    args.interactive = not args.non_interactive and not args.watch and sys.stdin.isatty()
+    if args.watch and args.bundle:
+        parser.error("--watch cannot be combined with --bundle")
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 or greater")
+    args.jobs = args.jobs or None
+    return args
 
 
 if __name__ == '__main__':
+    args = parse_args()
+    if stage_metrics:
+        stage_metrics.enable_from_args('code_to_markdown', args)
     try:
-        find_and_convert_code_files()
+        if args.watch:
+            watch_and_convert_code_files(
+                root=args.root, output_dir=args.output_dir,
+                include=args.include or DEFAULT_INCLUDE, exclude=args.exclude,
+                max_depth=args.max_depth, max_file_bytes=args.max_file_size,
+                oversize=args.oversize, jobs=args.jobs, outline=args.outline,
+                interval=args.watch_interval
+            )
+        else:
+            find_and_convert_code_files(
+                root=args.root, output_dir=args.output_dir,
+                include=args.include or DEFAULT_INCLUDE, exclude=args.exclude,
+                max_depth=args.max_depth, bundle_format=args.bundle,
+                shard_bytes=args.shard_bytes, shard_tokens=args.shard_tokens,
+                max_file_bytes=args.max_file_size, oversize=args.oversize,
+                jobs=args.jobs, outline=args.outline
+            )
     except Exception as e:
         print("\n" + "="*50)
         print(f"ERROR: An unexpected error occurred:")
         print(f"    {type(e).__name__}: {e}")
         print("="*50)
     finally:
-        print("\nPress Enter to exit...")
-        input()
+        if stage_metrics:
+            stage_metrics.finish()
+        if args.interactive:
+            print("\nPress Enter to exit...")
+            input()
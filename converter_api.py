@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+"""
+Converter Library API
+
+Importable access to the RTF to Markdown, code to Markdown and PPM to PNG
+converters, for programs that embed them (e.g. an upload service) rather
+than run the scripts. Every function takes its input as bytes, a path or
+a binary file-like object, and returns the result or writes it to a
+file-like `out`. Nothing is printed or prompted for, and results never
+go to disk; the one file touched is the per-user toolchain cache of
+rtf_to_markdown (see probe_toolchain), written the first time an RTF
+conversion looks for pandoc. A conversion that fails raises
+ConversionError.
+
+AsyncConverter runs the same conversions from asyncio code in one
+long-lived process. Parsing and encoding go to a bounded process pool and
+pandoc runs as an asyncio subprocess. Semaphores cap the conversions in
+flight and the pandoc processes running, so callers over the limit wait
+for a slot (backpressure) instead of queueing unbounded work and memory.
+
+Usage:
+    from converter_api import AsyncConverter, convert_rtf
+
+    markdown = convert_rtf(rtf_bytes)
+
+    async with AsyncConverter(jobs=4) as converter:
+        png = await converter.convert_ppm(ppm_bytes)
+        markdown = await converter.convert_code(source_bytes, 'main.py', outline=True)
+"""
+
+import asyncio
+import codecs
+import contextlib
+import functools
+import importlib.util
+import inspect
+import io
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import code_to_markdown
+import rtf_to_markdown
+
+
+def _load_ppm2png():
+    """
+    Import PPM2PNG/ppm2png.py by its location.
+
+    ppm2png lives in its own folder next to its README and helper batch
+    file; loading it from there leaves the embedding program's sys.path
+    alone.
+    """
+    if 'ppm2png' in sys.modules:
+        return sys.modules['ppm2png']
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'PPM2PNG', 'ppm2png.py')
+    spec = importlib.util.spec_from_file_location('ppm2png', path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['ppm2png'] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules['ppm2png']
+        raise
+    return module
+
+
+ppm2png = _load_ppm2png()
+
+# RTF converter choices: those of the script, minus 'both' (one result per call)
+RTF_CONVERTERS = ('auto', 'pypandoc', 'striprtf', 'stream')
+
+# Conversions an AsyncConverter keeps in flight per worker process; further
+# callers wait for a slot
+ASYNC_TASKS_PER_WORKER = 2
+
+# Name given to in-memory sources in messages and for language detection
+UNNAMED_SOURCE = '<memory>'
+
+
+class ConversionError(Exception):
+    """A conversion failed; the message says why."""
+
+
+def _is_path(source):
+    return isinstance(source, (str, os.PathLike))
+
+
+def read_source(source):
+    """
+    Return the contents of a source as bytes.
+
+    Args:
+        source: bytes-like object, path, or binary file-like object
+
+    Raises:
+        TypeError: For any other kind of source
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    if _is_path(source):
+        with open(source, 'rb') as f:
+            return f.read()
+    if hasattr(source, 'read'):
+        data = source.read()
+        if isinstance(data, str):
+            raise TypeError("file-like sources must be opened in binary mode")
+        return data
+    raise TypeError(f"unsupported source: {type(source).__name__}")
+
+
+@contextlib.contextmanager
+def _open_source(source):
+    """
+    Yield a seekable binary file object reading the source.
+
+    Raises:
+        ConversionError: If the source cannot be opened or read
+    """
+    if hasattr(source, 'read') and hasattr(source, 'seekable') and source.seekable():
+        yield source
+        return
+    try:
+        f = open(source, 'rb') if _is_path(source) else io.BytesIO(read_source(source))
+    except OSError as e:
+        raise ConversionError(f"cannot read {source}: {e}") from e
+    with f:
+        yield f
+
+
+async def _read_in_thread(source):
+    """read_source on a worker thread, with read errors as ConversionError."""
+    try:
+        return await asyncio.to_thread(read_source, source)
+    except OSError as e:
+        raise ConversionError(f"cannot read {source}: {e}") from e
+
+
+def _timestamp():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+# --- RTF to Markdown ---------------------------------------------------------
+
+def _rtf_text(converter, f, pictures=None):
+    """
+    Run one RTF converter on a binary file object and return cleaned text.
+
+    Raises:
+        ConversionError: If the converter is unavailable or fails
+    """
+    start = f.tell()
+    try:
+        if converter == 'stream':
+            text = io.StringIO()
+            rtf_to_markdown.convert_rtf_streaming(f, text, pictures=pictures, warnings=[])
+            return text.getvalue()
+        if converter == 'pypandoc':
+            pandoc_path = rtf_to_markdown.probe_toolchain()['pandoc_path']
+            if not pandoc_path:
+                raise ConversionError("pandoc is not installed")
+            text = rtf_to_markdown.run_pandoc(f.read(), pandoc_path)
+        else:
+            content = f.read().decode('utf-8', errors='ignore')
+            text = rtf_to_markdown.striprtf_convert(content)
+        return rtf_to_markdown.clean_markdown(text)
+    except ConversionError:
+        raise
+    except Exception as e:
+        raise ConversionError(f"{converter}: {type(e).__name__}: {e}") from e
+    finally:
+        f.seek(start)
+
+
+def _rtf_document(converter, text, header):
+    """Wrap converted text the way the script writes it."""
+    prefix = rtf_to_markdown.markdown_header(converter, _timestamp()) if header else ''
+    return f"{prefix}{text}\n"
+
+
+def convert_rtf(source, converter='auto', pictures=None, header=True, out=None):
+    """
+    Convert an RTF document to Markdown.
+
+    'auto' chooses as the script does: pandoc for documents with tables,
+    the streaming converter for documents with pictures, striprtf for the
+    rest, with the streaming converter as the fallback.
+
+    Args:
+        source: The RTF document as bytes, a path or a binary file-like object
+        converter: One of RTF_CONVERTERS
+        pictures: Dict that receives pictures extracted by the streaming
+                  converter as name -> bytes; the Markdown links to them
+                  by name. Without it pictures are dropped, as is any
+                  picture whose data cannot be decoded.
+        header: Start with the header the script writes (file type,
+                conversion time and converter)
+        out: Text file-like object to write the Markdown to instead of
+             returning it. The streaming converter writes to it as it
+             decodes, so a failure part-way leaves partial output.
+
+    Returns:
+        The Markdown, or None if it was written to `out`
+
+    Raises:
+        ConversionError: If no converter succeeded
+    """
+    if converter not in RTF_CONVERTERS:
+        raise ValueError(f"unknown RTF converter: {converter}")
+    errors = []
+    with _open_source(source) as f:
+        for name in rtf_to_markdown.select_converters(f, converter):
+            if name == 'stream' and out is not None:
+                if header:
+                    out.write(rtf_to_markdown.markdown_header(name, _timestamp()))
+                try:
+                    rtf_to_markdown.convert_rtf_streaming(f, out, pictures=pictures,
+                                                          warnings=[])
+                except Exception as e:
+                    raise ConversionError(f"stream: {type(e).__name__}: {e}") from e
+                out.write('\n')
+                return None
+            try:
+                text = _rtf_text(name, f, pictures)
+            except ConversionError as e:
+                errors.append(str(e))
+                continue
+            document = _rtf_document(name, text, header)
+            if out is None:
+                return document
+            out.write(document)
+            return None
+    raise ConversionError("no RTF converter succeeded" + (f" ({'; '.join(errors)})" if errors else ""))
+
+
+def _rtf_worker(source, converter, keep_pictures):
+    """Process-pool entry point: (text, pictures or None) from one converter."""
+    pictures = {} if keep_pictures else None
+    with _open_source(source) as f:
+        return _rtf_text(converter, f, pictures), pictures
+
+
+# --- Code to Markdown --------------------------------------------------------
+
+def convert_code(source, filename=None, max_bytes=None, oversize='skip', outline=False,
+                 symbols=None, out=None):
+    """
+    Convert a source file to Markdown, as the code_to_markdown script does.
+
+    Args:
+        source: The code as bytes, a path or a binary file-like object
+        filename: Name to detect the language by (default: the path's own
+                  name; in-memory sources without one are recognised by
+                  their shebang only)
+        max_bytes: Optional size cap
+        oversize: What to do over the cap, one of code_to_markdown.OVERSIZE_POLICIES
+        outline: Add a symbol outline for languages that have an outliner
+        symbols: Optional list that receives the outline's symbols
+        out: Text file-like object to write the Markdown to instead of
+             returning it; the code is copied to it in slices
+
+    Returns:
+        The Markdown, or None if it was written to `out`
+
+    Raises:
+        ConversionError: If the source is binary, not UTF-8 or over the cap
+    """
+    try:
+        if _is_path(source):
+            document = code_to_markdown.SourceFile(source, max_bytes, oversize)
+            filename = filename or os.fspath(source)
+        else:
+            filename = filename or UNNAMED_SOURCE
+            document = code_to_markdown.SourceFile(filename, max_bytes, oversize,
+                                                   data=read_source(source))
+    except OSError as e:
+        raise ConversionError(f"cannot read {filename or source}: {e}") from e
+
+    with document:
+        if document.skip_reason is None:
+            document.scan()
+        if document.skip_reason is not None:
+            raise ConversionError(f"{os.path.basename(filename)}: {document.skip_reason}")
+
+        language_tag = code_to_markdown.detect_language(filename, document.head())
+        symbol_outline = None
+        if outline:
+            symbol_outline = code_to_markdown.get_outline(document, language_tag, None)
+            if symbol_outline is not None and symbols is not None:
+                symbols.extend(symbol_outline)
+        header, footer = code_to_markdown.code_markdown_parts(document, language_tag, symbol_outline)
+
+        if out is None:
+            return header + document.text() + footer
+        out.write(header)
+        # Slices may split a character; the scan has already checked the UTF-8
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        for chunk in document.chunks():
+            out.write(decoder.decode(chunk))
+        out.write(decoder.decode(b'', final=True) + footer)
+        return None
+
+
+def _code_worker(source, filename, max_bytes, oversize, outline):
+    """Process-pool entry point: (Markdown, symbols) for one source."""
+    symbols = []
+    return convert_code(source, filename, max_bytes, oversize, outline, symbols), symbols
+
+
+# --- PPM to PNG --------------------------------------------------------------
+
+def convert_ppm(source, profile=ppm2png.DEFAULT_PROFILE, out=None):
+    """
+    Convert a PGM/PPM image (P2, P3, P5 or P6) to PNG.
+
+    The frame is encoded row by row with ppm2png's PNGWriter; a path is
+    memory-mapped rather than read.
+
+    Args:
+        source: The image as bytes, a path or a binary file-like object
+        profile: Encoding profile, one of ppm2png.PROFILES
+        out: Binary file-like object to write the PNG to as it is encoded,
+             instead of returning it
+
+    Returns:
+        The PNG as bytes, or None if it was written to `out`
+
+    Raises:
+        ConversionError: If the image cannot be read or is malformed
+    """
+    if profile not in ppm2png.PROFILES:
+        raise ValueError(f"unknown profile: {profile}")
+    target = io.BytesIO() if out is None else out
+    try:
+        if _is_path(source):
+            image = ppm2png.PNMImage(source)
+        else:
+            image = ppm2png.PNMImage(UNNAMED_SOURCE, data=read_source(source))
+        with image:
+            ppm2png.encode_png(image, target, profile)
+    except (OSError, ValueError) as e:
+        raise ConversionError(f"{type(e).__name__}: {e}") from e
+    return target.getvalue() if out is None else None
+
+
+# --- asyncio -----------------------------------------------------------------
+
+class AsyncConverter:
+    """
+    Run conversions concurrently from asyncio code.
+
+    CPU-bound work runs on a process pool of `jobs` workers (or on an
+    executor you pass in), so the event loop stays responsive and every
+    conversion reuses the same workers instead of starting an
+    interpreter. At most `max_pending` conversions are in flight; further
+    callers wait for a slot, so a burst of uploads cannot queue unbounded
+    work. Sources are only read once a slot is free. Paths are passed to
+    the workers as they are, so large files are read there and never
+    pickled. pandoc conversions run as asyncio subprocesses, at most
+    `max_pandoc` at a time.
+
+    Usage:
+        async with AsyncConverter(jobs=4) as converter:
+            results = await asyncio.gather(*(converter.convert_ppm(data) for data in uploads))
+    """
+
+    def __init__(self, jobs=None, max_pending=None, max_pandoc=None, executor=None):
+        """
+        Args:
+            jobs: Worker processes (None = CPU count); ignored with `executor`
+            max_pending: Conversions in flight (default: jobs * ASYNC_TASKS_PER_WORKER)
+            max_pandoc: pandoc processes at a time (default: jobs)
+            executor: concurrent.futures executor to use instead of a new
+                      process pool; it is left running on close
+        """
+        jobs = jobs or os.cpu_count() or 1
+        self._own_executor = executor is None
+        self._executor = executor or ProcessPoolExecutor(max_workers=jobs)
+        self._slots = asyncio.Semaphore(max_pending or jobs * ASYNC_TASKS_PER_WORKER)
+        self._pandoc_slots = asyncio.Semaphore(max_pandoc or jobs)
+
+    async def _payload(self, source):
+        """What to hand a worker: a path as is, anything else read into bytes."""
+        if _is_path(source):
+            return os.fspath(source)
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return bytes(source)
+        read = getattr(source, 'read', None)
+        if read is not None and inspect.iscoroutinefunction(read):
+            return await read()  # e.g. an asyncio.StreamReader
+        return await _read_in_thread(source)
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args))
+
+    async def _pandoc(self, data):
+        """Convert RTF bytes with a pandoc subprocess; returns cleaned text."""
+        pandoc_path = (await asyncio.to_thread(rtf_to_markdown.probe_toolchain))['pandoc_path']
+        if not pandoc_path:
+            raise ConversionError("pypandoc: pandoc is not installed")
+        async with self._pandoc_slots:
+            process = await asyncio.create_subprocess_exec(
+                *rtf_to_markdown.pandoc_command(pandoc_path),
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            stdout, stderr = await process.communicate(data)
+        try:
+            text = rtf_to_markdown.pandoc_output(process.returncode, stdout, stderr)
+        except RuntimeError as e:
+            raise ConversionError(f"pypandoc: {e}") from e
+        return rtf_to_markdown.clean_markdown(text)
+
+    async def convert_rtf(self, source, converter='auto', pictures=None, header=True):
+        """
+        Convert an RTF document to Markdown; see convert_rtf.
+
+        Source may also be an asyncio.StreamReader. Returns the Markdown;
+        extracted pictures are added to `pictures` if given.
+        """
+        if converter not in RTF_CONVERTERS:
+            raise ValueError(f"unknown RTF converter: {converter}")
+        async with self._slots:
+            payload = await self._payload(source)
+            if converter == 'auto' or converter == 'pypandoc':
+                # Needs the bytes in this process: for the feature scan and for pandoc's stdin
+                if isinstance(payload, str):
+                    payload = await _read_in_thread(payload)
+                # The first call probes the toolchain, which may run pandoc
+                names = await asyncio.to_thread(rtf_to_markdown.select_converters,
+                                                io.BytesIO(payload), converter)
+            else:
+                names = [converter]
+            errors = []
+            for name in names:
+                try:
+                    if name == 'pypandoc':
+                        text = await self._pandoc(payload)
+                    else:
+                        text, found = await self._run(_rtf_worker, payload, name,
+                                                      pictures is not None)
+                        if found:
+                            pictures.update(found)
+                except ConversionError as e:
+                    errors.append(str(e))
+                    continue
+                return _rtf_document(name, text, header)
+        raise ConversionError("no RTF converter succeeded" + (f" ({'; '.join(errors)})" if errors else ""))
+
+    async def convert_code(self, source, filename=None, max_bytes=None, oversize='skip',
+                           outline=False, symbols=None):
+        """Convert a source file to Markdown; see convert_code. Returns the Markdown."""
+        async with self._slots:
+            payload = await self._payload(source)
+            markdown, found = await self._run(_code_worker, payload, filename, max_bytes,
+                                              oversize, outline)
+        if symbols is not None:
+            symbols.extend(found)
+        return markdown
+
+    async def convert_ppm(self, source, profile=ppm2png.DEFAULT_PROFILE):
+        """Convert a PGM/PPM image to PNG; see convert_ppm. Returns the PNG bytes."""
+        async with self._slots:
+            payload = await self._payload(source)
+            return await self._run(convert_ppm, payload, profile)
+
+    async def aclose(self):
+        """Shut down the process pool (if this converter started it)."""
+        if self._own_executor:
+            await asyncio.to_thread(self._executor.shutdown)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
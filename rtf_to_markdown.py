@@ -3,28 +3,88 @@
 RTF to Markdown Converter
 
 This script converts RTF (Rich Text Format) documents to Markdown format.
-It searches the current directory for .rtf files and converts them.
+It searches a directory tree (by default the script's own directory) for
+.rtf files and converts them, mirroring the tree in the output directory.
 Automatically installs required dependencies if missing.
 """
 
+import argparse
+import binascii
+import codecs
+import contextlib
+import hashlib
+import importlib.util
+import io
+import json
 import os
 import re
+import shutil
+import socket
 import subprocess
 import sys
+import time
 from pathlib import Path
 from datetime import datetime
 
-try:
-    from striprtf.striprtf import rtf_to_text
-    STRIPRTF_AVAILABLE = True
-except ImportError:
-    STRIPRTF_AVAILABLE = False
+from source_tree import (WATCH_INTERVAL, TreeWatcher, discover_in_background,
+                         iter_source_files)
 
 try:
-    import pypandoc
-    PYPANDOC_AVAILABLE = True
+    import stage_metrics
+    from stage_metrics import stage
 except ImportError:
-    PYPANDOC_AVAILABLE = False
+    # Without stage_metrics.py next to this script, stages are not measured
+    stage_metrics = None
+
+    def stage(name, item=None):
+        return contextlib.nullcontext()
+
+# Converter packages are located without importing them; the imports
+# themselves are deferred until a converter is actually used
+STRIPRTF_AVAILABLE = importlib.util.find_spec('striprtf') is not None
+PYPANDOC_AVAILABLE = importlib.util.find_spec('pypandoc') is not None
+rtf_to_text = None
+pypandoc = None
+
+# Control words that mark RTF documents containing tables or pictures
+RTF_FEATURE_PATTERN = re.compile(rb'\\(trowd|cell|row|pict)(?![a-zA-Z])')
+
+# How much of the file the feature pre-scan reads at a time
+RTF_SCAN_CHUNK_SIZE = 1024 * 1024
+
+# Converter selection modes accepted by convert_rtf_to_markdown
+CONVERTER_MODES = ('auto', 'both', 'pypandoc', 'striprtf', 'stream')
+
+# How pandoc is invoked: a new process per file, or one long-lived
+# ``pandoc server`` that every file is posted to
+PANDOC_BACKENDS = ('subprocess', 'server')
+
+# Arguments of every pandoc RTF to Markdown conversion
+PANDOC_ARGS = ('--from=rtf', '--to=markdown', '--wrap=none')
+
+# Per-request timeout, in seconds, for the pandoc server backend
+PANDOC_SERVER_TIMEOUT = 120
+
+# Result of the first ensure_pandoc_installed() call (None = not probed yet)
+_PANDOC_READY = None
+
+# Toolchain probe result for this process (see probe_toolchain)
+_TOOLCHAIN = None
+TOOLCHAIN_CACHE_VERSION = 1
+
+# Incremental conversion manifest kept in the output directory
+MANIFEST_NAME = '.rtf_manifest.json'
+MANIFEST_VERSION = 1
+
+# Converter name -> (header label, output filename suffix)
+CONVERTER_LABELS = {
+    'pypandoc': ('pypandoc (with table support)', 'pypandoc'),
+    'striprtf': ('striprtf (tables not preserved)', 'striprtf'),
+    'stream': ('built-in stream (tables not preserved, pictures extracted)', 'stream'),
+}
+
+# Bumped when the streaming converter's output changes
+STREAM_CONVERTER_VERSION = 1
 
 
 def install_packages():
@@ -67,78 +127,462 @@ def clean_markdown(text):
     return text
 
 
-def ensure_pandoc_installed():
-    """Ensure Pandoc is installed for pypandoc to use."""
+def _load_striprtf():
+    """Import striprtf on first use and return its rtf_to_text function."""
+    global rtf_to_text
+
+    if rtf_to_text is None:
+        from striprtf.striprtf import rtf_to_text as striprtf_rtf_to_text
+        rtf_to_text = striprtf_rtf_to_text
+    return rtf_to_text
+
+
+def _load_pypandoc():
+    """Import pypandoc on first use and return the module."""
+    global pypandoc
+
+    if pypandoc is None:
+        import pypandoc as pypandoc_module
+        pypandoc = pypandoc_module
+    return pypandoc
+
+
+def refresh_converter_packages():
+    """Re-check which converter packages are installed (e.g. after pip)."""
+    global STRIPRTF_AVAILABLE, PYPANDOC_AVAILABLE
+
+    importlib.invalidate_caches()
+    STRIPRTF_AVAILABLE = importlib.util.find_spec('striprtf') is not None
+    PYPANDOC_AVAILABLE = importlib.util.find_spec('pypandoc') is not None
+
+
+def _toolchain_cache_path():
+    """Return the path of the per-user toolchain probe cache."""
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME')
+    base = Path(base) if base else Path.home() / '.cache'
+    return base / 'rtf_to_markdown' / 'toolchain.json'
+
+
+def _mtime_ns(path):
+    """Return a path's mtime in nanoseconds, or None if it does not exist."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _toolchain_cache_key():
+    """
+    Key the probe cache on everything that can change its result.
+
+    Directory mtimes change when a program or package is installed into
+    them, so a new pandoc on PATH or a pip install invalidates the cache.
+    """
+    import site
+
+    path_dirs = [d for d in os.environ.get('PATH', '').split(os.pathsep) if d]
+    package_dirs = site.getsitepackages() + [site.getusersitepackages()]
+    key = {
+        'executable': sys.executable,
+        'version': sys.version,
+        'pypandoc_pandoc': os.environ.get('PYPANDOC_PANDOC', ''),
+        'path': [(d, _mtime_ns(d)) for d in path_dirs],
+        'site_packages': [(d, _mtime_ns(d)) for d in package_dirs],
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _find_pandoc():
+    """
+    Locate the pandoc executable and read its version.
+
+    Returns:
+        Tuple of (absolute path or None, version string or None)
+    """
+    path = os.environ.get('PYPANDOC_PANDOC') or shutil.which('pandoc')
+    if not path and PYPANDOC_AVAILABLE:
+        # pypandoc also knows its bundled and downloaded copies
+        try:
+            path = _load_pypandoc().get_pandoc_path()
+        except OSError:
+            path = None
+    if not path:
+        return None, None
+    path = shutil.which(path) or path
+
+    try:
+        result = subprocess.run(
+            [path, '--version'], capture_output=True, timeout=30, check=True
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None, None
+    first_line = result.stdout.decode('utf-8', errors='replace').partition('\n')[0]
+    version = first_line.split()[-1] if first_line.strip() else None
+    return os.path.abspath(path), version
+
+
+def _probe_toolchain_uncached():
+    """Probe converter packages and the pandoc executable."""
+    import importlib.metadata
+
+    striprtf_version = None
+    if STRIPRTF_AVAILABLE:
+        try:
+            striprtf_version = importlib.metadata.version('striprtf')
+        except importlib.metadata.PackageNotFoundError:
+            pass
+
+    pandoc_path, pandoc_version = _find_pandoc()
+    return {
+        'striprtf': STRIPRTF_AVAILABLE,
+        'striprtf_version': striprtf_version,
+        'pypandoc': PYPANDOC_AVAILABLE,
+        'pandoc_path': pandoc_path,
+        'pandoc_version': pandoc_version,
+        'pandoc_mtime_ns': _mtime_ns(pandoc_path) if pandoc_path else None,
+    }
+
+
+def probe_toolchain(refresh=False):
+    """
+    Return what the converters need from the environment.
+
+    Probing pandoc means running it, so the result is cached per user,
+    keyed on the interpreter, PATH and installed packages (see
+    _toolchain_cache_key), and reused for the life of the process.
+
+    Args:
+        refresh: Ignore cached results and probe again
+
+    Returns:
+        Dict with keys striprtf, striprtf_version, pypandoc, pandoc_path,
+        pandoc_version and pandoc_mtime_ns
+    """
+    global _TOOLCHAIN
+
+    if _TOOLCHAIN is not None and not refresh:
+        return _TOOLCHAIN
+
+    cache_path = _toolchain_cache_path()
+    key = _toolchain_cache_key()
+    toolchain = None
+    if not refresh:
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == TOOLCHAIN_CACHE_VERSION and data.get('key') == key:
+                toolchain = data['toolchain']
+        except (OSError, ValueError, KeyError):
+            pass
+        # pandoc upgraded or removed since it was probed
+        if toolchain and toolchain['pandoc_path'] and \
+                _mtime_ns(toolchain['pandoc_path']) != toolchain['pandoc_mtime_ns']:
+            toolchain = None
+
+    if toolchain is None:
+        toolchain = _probe_toolchain_uncached()
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = cache_path.with_suffix('.tmp')
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': TOOLCHAIN_CACHE_VERSION, 'key': key,
+                           'toolchain': toolchain}, f, indent=1)
+            os.replace(temp_path, cache_path)
+        except OSError:
+            pass
+
+    _TOOLCHAIN = toolchain
+    return toolchain
+
+
+def ensure_pandoc_installed(download=True):
+    """
+    Ensure the Pandoc executable is available.
+
+    The result is remembered for the life of the process, so retries after
+    a failed conversion do not spawn another pandoc just to probe it.
+
+    Args:
+        download: Try to download Pandoc with pypandoc if it is missing
+    """
+    global _PANDOC_READY
+
+    if _PANDOC_READY is None:
+        if probe_toolchain()['pandoc_path']:
+            _PANDOC_READY = True
+        elif download and _download_pandoc():
+            _PANDOC_READY = bool(probe_toolchain(refresh=True)['pandoc_path'])
+        else:
+            _PANDOC_READY = False
+    return _PANDOC_READY
+
+
+def _download_pandoc():
+    """Download the Pandoc executable with pypandoc."""
     if not PYPANDOC_AVAILABLE:
         return False
 
+    # Pandoc not found, try to download it
+    print("\n" + "="*50)
+    print("Pandoc executable not found.")
+    print("Attempting to download Pandoc...")
+    print("="*50)
     try:
-        # Try to get pandoc version to check if it's installed
-        import pypandoc as pd
-        pd.get_pandoc_version()
+        _load_pypandoc().download_pandoc()
+        print("\n" + "="*50)
+        print("✓ Pandoc downloaded successfully!")
+        print("="*50)
         return True
-    except OSError:
-        # Pandoc not found, try to download it
+    except Exception as e:
         print("\n" + "="*50)
-        print("Pandoc executable not found.")
-        print("Attempting to download Pandoc...")
+        print(f"✗ Failed to download Pandoc: {e}")
         print("="*50)
+        return False
+
+
+def _find_free_port():
+    """Ask the OS for a free local TCP port."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class PandocServer:
+    """
+    A long-lived ``pandoc server`` process that documents are posted to.
+
+    Starting pandoc once and sending every RTF to it over HTTP removes the
+    per-file process startup of pypandoc.convert_file. Each request is
+    still converted independently, so one bad document only fails its own
+    request. pandoc runs its server in sandboxed mode (no file access).
+
+    Usage:
+        with PandocServer(pandoc_path) as server:
+            text = convert_rtf_with_pandoc(path, server_url=server.url)
+    """
+
+    def __init__(self, pandoc_path='pandoc', port=None, timeout=PANDOC_SERVER_TIMEOUT):
+        self.pandoc_path = pandoc_path
+        self.port = port or _find_free_port()
+        self.timeout = timeout
+        self.process = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/"
+
+    def start(self, wait=10.0):
+        """
+        Start the server and wait until it accepts connections.
+
+        Raises:
+            OSError: If pandoc cannot be started or never starts listening
+        """
+        self.process = subprocess.Popen(
+            [self.pandoc_path, 'server',
+             '--port', str(self.port), '--timeout', str(self.timeout)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise OSError(f"pandoc server exited with code {self.process.returncode}")
+            try:
+                with socket.create_connection(('127.0.0.1', self.port), timeout=0.5):
+                    break
+            except OSError:
+                time.sleep(0.05)
+        else:
+            self.close()
+            raise OSError(f"pandoc server did not start within {wait} seconds")
+
+        # Some pandoc builds accept connections but cannot serve requests
+        # (e.g. built without the threaded runtime), so do one real conversion
         try:
-            import pypandoc as pd
-            pd.download_pandoc()
-            print("\n" + "="*50)
-            print("✓ Pandoc downloaded successfully!")
-            print("="*50)
-            return True
+            pandoc_server_convert(self.url, r'{\rtf1 ok}', timeout=wait)
         except Exception as e:
-            print("\n" + "="*50)
-            print(f"✗ Failed to download Pandoc: {e}")
-            print("="*50)
-            return False
+            self.close()
+            raise OSError(f"pandoc server is not usable: {e}")
+        return self
+
+    def close(self):
+        """Stop the server process."""
+        if self.process is None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
 
+    def __enter__(self):
+        if self.process is None:
+            self.start()
+        return self
 
-def convert_rtf_with_pandoc(rtf_file_path):
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def start_pandoc_server():
+    """
+    Start a PandocServer for the probed pandoc executable.
+
+    Returns:
+        The running PandocServer, or None if it could not be started
+    """
+    try:
+        return PandocServer(probe_toolchain()['pandoc_path']).start()
+    except Exception as e:
+        print(f"  Warning: Could not start pandoc server, using one process per file: {e}")
+        return None
+
+
+def pandoc_server_convert(server_url, rtf_content, timeout=PANDOC_SERVER_TIMEOUT):
+    """
+    Convert an RTF string to Markdown by posting it to a running pandoc server.
+
+    Args:
+        server_url: URL of the server (PandocServer.url)
+        rtf_content: RTF document text
+        timeout: Request timeout in seconds
+
+    Returns:
+        Converted markdown text
+
+    Raises:
+        OSError: If the server cannot be reached or drops the connection
+        ValueError: If pandoc reports a conversion error
+    """
+    # Imported here to keep them off the startup path
+    import http.client
+    import urllib.error
+    import urllib.request
+
+    payload = json.dumps({
+        'text': rtf_content,
+        'from': 'rtf',
+        'to': 'markdown',
+        'wrap': 'none',
+    }).encode('utf-8')
+    request = urllib.request.Request(
+        server_url,
+        data=payload,
+        headers={'Content-Type': 'application/json', 'Accept': 'application/json'},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            result = json.loads(response.read().decode('utf-8'))
+    except urllib.error.HTTPError as e:
+        raise ValueError(e.read().decode('utf-8', errors='replace').strip() or str(e))
+    except http.client.HTTPException as e:
+        raise OSError(f"bad response from pandoc server: {e!r}")
+
+    if 'error' in result:
+        raise ValueError(result['error'])
+    return result['output']
+
+
+def convert_rtf_with_pandoc(rtf_file_path, server_url=None):
     """
     Convert RTF to Markdown using pypandoc (preserves tables).
 
     Args:
         rtf_file_path: Path to the RTF file
+        server_url: Optional URL of a running PandocServer. If the server
+                    cannot be reached, a pandoc process is started for the
+                    file instead.
 
     Returns:
         Converted markdown text or None on error
     """
-    try:
-        # Use pypandoc to convert RTF to Markdown
-        markdown_text = pypandoc.convert_file(
-            str(rtf_file_path),
-            'markdown',
-            format='rtf',
-            extra_args=['--wrap=none']
-        )
-        return markdown_text
-    except OSError as e:
-        if "pandoc" in str(e).lower():
-            print(f"  Warning: Pandoc not available: {e}")
-            # Try to install pandoc
-            if ensure_pandoc_installed():
-                # Try conversion again
-                try:
-                    markdown_text = pypandoc.convert_file(
-                        str(rtf_file_path),
-                        'markdown',
-                        format='rtf',
-                        extra_args=['--wrap=none']
-                    )
-                    return markdown_text
-                except Exception as retry_error:
-                    print(f"  Warning: Retry failed: {retry_error}")
-                    return None
+    if server_url:
+        try:
+            with open(rtf_file_path, 'r', encoding='utf-8', errors='replace') as f:
+                rtf_content = f.read()
+        except OSError as e:
+            print(f"  Warning: pypandoc conversion failed: {e}")
+            return None
+        try:
+            return pandoc_server_convert(server_url, rtf_content)
+        except ValueError as e:
+            print(f"  Warning: pandoc server conversion failed: {e}")
+            return None
+        except OSError as e:
+            print(f"  Warning: pandoc server unavailable, starting pandoc directly: {e}")
+
+    if not ensure_pandoc_installed(download=False):
+        print("  Warning: Pandoc not available")
         return None
+
+    try:
+        return run_pandoc(rtf_file_path, probe_toolchain()['pandoc_path'])
     except Exception as e:
         print(f"  Warning: pypandoc conversion failed: {e}")
         return None
 
 
+def run_pandoc(rtf_file_path, pandoc_path):
+    """
+    Convert one RTF file to Markdown with a pandoc process.
+
+    pandoc is run directly with the probed path, the same way
+    pypandoc.convert_file would run it, so neither importing pypandoc nor
+    its own pandoc version probes are paid per process.
+
+    Args:
+        rtf_file_path: Path to the RTF file, or the document itself as
+                       bytes, which is then sent to pandoc on stdin
+        pandoc_path: The pandoc executable
+
+    Raises:
+        RuntimeError: If pandoc exits with an error
+    """
+    if isinstance(rtf_file_path, (bytes, bytearray, memoryview)):
+        result = subprocess.run(pandoc_command(pandoc_path), input=rtf_file_path,
+                                capture_output=True)
+    else:
+        result = subprocess.run(pandoc_command(pandoc_path, rtf_file_path), capture_output=True)
+    return pandoc_output(result.returncode, result.stdout, result.stderr)
+
+
+def pandoc_command(pandoc_path, rtf_file_path=None):
+    """Return the pandoc command line for a file, or for stdin if no file is given."""
+    command = [pandoc_path, *PANDOC_ARGS]
+    if rtf_file_path is not None:
+        command.append(str(rtf_file_path))
+    return command
+
+
+def pandoc_output(returncode, stdout, stderr):
+    """
+    Return the Markdown from a finished pandoc process.
+
+    Raises:
+        RuntimeError: If pandoc exited with an error
+    """
+    if returncode != 0:
+        error = stderr.decode('utf-8', errors='replace').strip()
+        raise RuntimeError(f"pandoc exited with code {returncode}: {error}")
+    return stdout.decode('utf-8').replace('\r\n', '\n')
+
+
+def striprtf_convert(rtf_content):
+    """
+    Convert an RTF document, as a string, to plain text with striprtf.
+
+    Raises:
+        ImportError: If striprtf is not installed
+    """
+    return _load_striprtf()(rtf_content)
+
+
 def convert_rtf_with_striprtf(rtf_file_path):
     """
     Convert RTF to plain text using striprtf (fallback, no table support).
@@ -152,105 +596,911 @@ def convert_rtf_with_striprtf(rtf_file_path):
     try:
         with open(rtf_file_path, 'r', encoding='utf-8', errors='ignore') as f:
             rtf_content = f.read()
-        plain_text = rtf_to_text(rtf_content)
-        return plain_text
+        return striprtf_convert(rtf_content)
     except Exception as e:
         print(f"  Warning: striprtf conversion failed: {e}")
         return None
 
 
-def convert_rtf_to_markdown(rtf_file_path, output_dir='markdown_output'):
+# Token types produced by RtfTokenizer, as (type, value, param) tuples
+TOKEN_GROUP_START = 'group_start'  # '{'
+TOKEN_GROUP_END = 'group_end'      # '}'
+TOKEN_WORD = 'word'                # control word: value = name, param = int or None
+TOKEN_SYMBOL = 'symbol'            # control symbol: value = character
+TOKEN_HEX = 'hex'                  # \'hh escape: value = byte value
+TOKEN_TEXT = 'text'                # run of plain bytes
+TOKEN_BINARY = 'binary'            # piece of a \binN payload
+
+_RTF_SPECIAL_BYTES = re.compile(rb'[\\{}\r\n]')
+_RTF_CONTROL_WORD = re.compile(rb'\\([a-zA-Z]{1,32})(-?[0-9]{1,10})? ?')
+
+# Longest possible control word: backslash, 32 letters, 11-char parameter, space
+_RTF_MAX_CONTROL_LENGTH = 45
+
+# Destinations whose content is never document text
+_RTF_SKIP_DESTINATIONS = frozenset({
+    'fonttbl', 'colortbl', 'stylesheet', 'info', 'listtable', 'listoverridetable',
+    'revtbl', 'rsidtbl', 'filetbl', 'generator', 'xmlnstbl', 'fldinst', 'themedata',
+    'colorschememapping', 'latentstyles', 'datastore', 'pgdsctbl', 'nonshppict',
+})
+
+# Ignorable (\*) destinations that still contain content we want
+_RTF_KEEP_IGNORABLE = frozenset({'shppict'})
+
+# Control words and symbols that produce text
+_RTF_WORD_TEXT = {
+    'par': '\n', 'line': '\n', 'sect': '\n\n', 'page': '\n\n', 'row': '\n',
+    'tab': '\t', 'cell': ' | ', 'emdash': '\u2014', 'endash': '\u2013',
+    'bullet': '\u2022', 'lquote': '\u2018', 'rquote': '\u2019',
+    'ldblquote': '\u201c', 'rdblquote': '\u201d',
+    'emspace': '\u2003', 'enspace': '\u2002', 'qmspace': '\u2005',
+}
+_RTF_SYMBOL_TEXT = {
+    '~': '\u00a0', '_': '\u2011', '-': '', '\\': '\\', '{': '{', '}': '}',
+}
+
+# Character set control words -> Python codec
+_RTF_CHARSETS = {'ansi': 'cp1252', 'mac': 'mac_roman', 'pc': 'cp437', 'pca': 'cp850'}
+
+# \pict picture type control words -> sidecar file extension
+_RTF_PICTURE_TYPES = {
+    'pngblip': 'png', 'jpegblip': 'jpg', 'emfblip': 'emf', 'wmetafile': 'wmf',
+    'macpict': 'pict', 'dibitmap': 'dib', 'wbitmap': 'bmp',
+}
+
+# How much of the file the streaming converter reads at a time
+RTF_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class RtfTokenizer:
     """
-    Convert an RTF file to markdown format using both converters.
+    Generator-based RTF tokenizer that reads its input in chunks.
+
+    Iterating yields (type, value, param) tuples (see the TOKEN_* constants).
+    Only the current chunk is held in memory; long text runs such as the
+    hex payload of a \\pict are yielded piece by piece, and \\binN payloads
+    are yielded as TOKEN_BINARY pieces without being buffered.
 
     Args:
-        rtf_file_path: Path to the RTF file
-        output_dir: Directory to save markdown files
+        stream: Binary file-like object to read from
+        chunk_size: Number of bytes to read at a time
     """
-    rtf_file_path = Path(rtf_file_path)
 
-    # Create output directory if it doesn't exist
-    output_path = Path(output_dir)
-    output_path.mkdir(exist_ok=True)
+    def __init__(self, stream, chunk_size=RTF_STREAM_CHUNK_SIZE):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._buffer = b''
+        self._pos = 0
+        self._eof = False
 
-    # Get current date and time
-    current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    def _available(self, count):
+        """Make at least `count` unread bytes available; False at end of input."""
+        while len(self._buffer) - self._pos < count:
+            if self._eof:
+                return False
+            chunk = self._stream.read(self._chunk_size)
+            if not chunk:
+                self._eof = True
+                return False
+            self._buffer = self._buffer[self._pos:] + chunk
+            self._pos = 0
+        return True
 
-    converted_files = []
+    def __iter__(self):
+        while self._available(1):
+            buffer, pos = self._buffer, self._pos
+            byte = buffer[pos]
+            if byte == 0x7B:  # {
+                self._pos = pos + 1
+                yield TOKEN_GROUP_START, None, None
+            elif byte == 0x7D:  # }
+                self._pos = pos + 1
+                yield TOKEN_GROUP_END, None, None
+            elif byte == 0x5C:  # backslash
+                yield from self._control()
+            elif byte in (0x0D, 0x0A):
+                # Bare line breaks are not content in RTF
+                self._pos = pos + 1
+            else:
+                match = _RTF_SPECIAL_BYTES.search(buffer, pos)
+                end = match.start() if match else len(buffer)
+                self._pos = end
+                yield TOKEN_TEXT, buffer[pos:end], None
 
-    # Try pypandoc conversion (best table support)
-    if PYPANDOC_AVAILABLE:
-        markdown_text = convert_rtf_with_pandoc(rtf_file_path)
-        if markdown_text is not None:
-            # Clean up the markdown
-            markdown_text = clean_markdown(markdown_text)
+    def _control(self):
+        """Tokenize the control word or symbol at the current position."""
+        self._available(_RTF_MAX_CONTROL_LENGTH + 1)
+        buffer, pos = self._buffer, self._pos
+        if pos + 1 >= len(buffer):
+            # Dangling backslash at end of input
+            self._pos = len(buffer)
+            return
 
-            # Create markdown content with pypandoc label
-            markdown_content = f"""**File Type:** RTF
-**Converted on:** {current_datetime}
-**Converter:** pypandoc (with table support)
+        following = buffer[pos + 1]
+        if 0x41 <= following <= 0x5A or 0x61 <= following <= 0x7A:
+            match = _RTF_CONTROL_WORD.match(buffer, pos)
+            self._pos = match.end()
+            word = match.group(1).decode('ascii')
+            param = int(match.group(2)) if match.group(2) else None
+            yield TOKEN_WORD, word, param
+            if word == 'bin' and param:
+                yield from self._binary(param)
+        elif following == 0x27:  # \'hh
+            self._pos = pos + 4
+            try:
+                yield TOKEN_HEX, int(buffer[pos + 2:pos + 4], 16), None
+            except ValueError:
+                pass
+        elif following in (0x0D, 0x0A):
+            # A backslash before a line break is an old spelling of \par
+            self._pos = pos + 2
+            yield TOKEN_WORD, 'par', None
+        else:
+            self._pos = pos + 2
+            yield TOKEN_SYMBOL, chr(following), None
 
----
+    def _binary(self, length):
+        """Yield the raw payload of a \\binN control word in pieces."""
+        remaining = length
+        while remaining > 0 and self._available(1):
+            end = min(len(self._buffer), self._pos + remaining)
+            piece = self._buffer[self._pos:end]
+            self._pos = end
+            remaining -= len(piece)
+            yield TOKEN_BINARY, piece, None
 
-{markdown_text}
-"""
 
-            # Create output filename with pypandoc suffix
-            output_file = output_path / f"{rtf_file_path.stem}_pypandoc.md"
+class _RtfPicture:
+    """A \\pict payload being written to a sidecar image file."""
 
-            # Write markdown file
-            try:
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    f.write(markdown_content)
-                print(f"✓ Converted with pypandoc: {rtf_file_path.name} -> {output_file.name}")
-                converted_files.append(output_file)
-            except Exception as e:
-                print(f"✗ Error writing pypandoc output {output_file}: {e}")
+    def __init__(self):
+        self.extension = 'bin'
+        self.path = None
+        self.file = None
+        self.carry = b''
+        self.failed = False
 
-    # Try striprtf conversion
-    if STRIPRTF_AVAILABLE:
-        plain_text = convert_rtf_with_striprtf(rtf_file_path)
-        if plain_text is not None:
-            # Clean up the text
-            plain_text = clean_markdown(plain_text)
 
-            # Create markdown content with striprtf label
-            markdown_content = f"""**File Type:** RTF
+class RtfStreamConverter:
+    """
+    Convert a stream of RtfTokenizer tokens into plain text.
+
+    convert() is a generator yielding text fragments as soon as they are
+    decoded. Picture payloads are hex-decoded and written straight to
+    numbered files in `image_dir` (or kept in the `pictures` dict), and a
+    Markdown image link is yielded in their place; with neither, pictures
+    are dropped. A picture that cannot be decoded or written is left out,
+    and a message saying why is added to `warnings`.
+
+    Args:
+        image_dir: Directory for extracted pictures, created on first use
+        image_link_prefix: Path prefix used in the Markdown image links
+        pictures: Dict that receives extracted pictures as name -> bytes,
+                  when there is no `image_dir`
+    """
+
+    def __init__(self, image_dir=None, image_link_prefix=None, pictures=None):
+        self.image_dir = Path(image_dir) if image_dir else None
+        self.image_link_prefix = image_link_prefix
+        self.pictures = pictures
+        self.images = []
+        self.warnings = []
+
+        # Group-scoped state, saved on '{' and restored on '}'
+        self._skip = False
+        self._uc = 1
+        self._picture = None
+        self._stack = []
+
+        self._ignorable = False
+        self._fallback = 0
+        self._high_surrogate = None
+        self._decoder = codecs.getincrementaldecoder('cp1252')(errors='replace')
+
+    def convert(self, tokens):
+        """Consume tokens and yield text fragments."""
+        try:
+            for kind, value, param in tokens:
+                if kind == TOKEN_TEXT:
+                    if self._picture is not None:
+                        self._picture_data(value, hex_encoded=True)
+                    elif not self._skip:
+                        if self._fallback:
+                            skipped = min(self._fallback, len(value))
+                            self._fallback -= skipped
+                            value = value[skipped:]
+                        text = self._decoder.decode(value)
+                        if text:
+                            yield text
+                elif kind == TOKEN_WORD:
+                    text = self._word(value, param)
+                    if text:
+                        yield text
+                elif kind == TOKEN_GROUP_START:
+                    self._stack.append((self._skip, self._uc, self._picture))
+                elif kind == TOKEN_GROUP_END:
+                    picture = self._picture
+                    if self._stack:
+                        self._skip, self._uc, self._picture = self._stack.pop()
+                    self._ignorable = False
+                    self._fallback = 0
+                    if picture is not None and self._picture is None:
+                        link = self._finish_picture(picture)
+                        if link:
+                            yield link
+                elif kind == TOKEN_HEX:
+                    if self._skip or self._picture is not None:
+                        continue
+                    if self._fallback:
+                        self._fallback -= 1
+                        continue
+                    text = self._decoder.decode(bytes((value,)))
+                    if text:
+                        yield text
+                elif kind == TOKEN_SYMBOL:
+                    if value == '*':
+                        self._ignorable = True
+                    elif not self._skip and self._picture is None:
+                        text = _RTF_SYMBOL_TEXT.get(value)
+                        if text:
+                            yield text
+                elif kind == TOKEN_BINARY:
+                    if self._picture is not None:
+                        self._picture_data(value, hex_encoded=False)
+        finally:
+            # Close any picture left open by a truncated document
+            if self._picture is not None:
+                self._finish_picture(self._picture)
+
+    def _word(self, word, param):
+        """Handle a control word, returning any text it produces."""
+        if self._ignorable:
+            self._ignorable = False
+            if word not in _RTF_KEEP_IGNORABLE:
+                self._skip = True
+        if self._skip:
+            return None
+        if word in _RTF_SKIP_DESTINATIONS:
+            self._skip = True
+            return None
+
+        if word == 'pict':
+            self._picture = _RtfPicture()
+            return None
+        if self._picture is not None:
+            extension = _RTF_PICTURE_TYPES.get(word)
+            if extension:
+                self._picture.extension = extension
+            return None
+
+        if word == 'u' and param is not None:
+            self._fallback = self._uc
+            return self._unicode(param)
+        if word == 'uc':
+            self._uc = param if param is not None else 1
+            return None
+        if word == 'ansicpg' and param:
+            self._set_codepage(f"cp{param}")
+            return None
+        if word in _RTF_CHARSETS:
+            self._set_codepage(_RTF_CHARSETS[word])
+            return None
+        return _RTF_WORD_TEXT.get(word)
+
+    def _unicode(self, value):
+        """Decode a \\uN parameter, pairing UTF-16 surrogates."""
+        if value < 0:
+            value += 0x10000
+        if 0xD800 <= value < 0xDC00:
+            self._high_surrogate = value
+            return None
+        if 0xDC00 <= value < 0xE000 and self._high_surrogate is not None:
+            value = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (value - 0xDC00)
+        self._high_surrogate = None
+        if 0xD800 <= value < 0xE000:
+            return '\ufffd'
+        return chr(value)
+
+    def _set_codepage(self, encoding):
+        """Switch the decoder used for 8-bit text, ignoring unknown code pages."""
+        try:
+            self._decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        except LookupError:
+            pass
+
+    def _picture_data(self, data, hex_encoded):
+        """Append payload data to the current picture's sidecar file."""
+        picture = self._picture
+        if picture.failed or self.image_dir is None and self.pictures is None:
+            return
+        try:
+            if hex_encoded:
+                digits = picture.carry + data.translate(None, b' \t')
+                if len(digits) % 2:
+                    picture.carry = digits[-1:]
+                    digits = digits[:-1]
+                else:
+                    picture.carry = b''
+                data = binascii.unhexlify(digits)
+            if picture.file is None:
+                name = f"image{len(self.images) + 1:03d}.{picture.extension}"
+                if self.image_dir is None:
+                    picture.path = Path(name)
+                    picture.file = io.BytesIO()
+                else:
+                    self.image_dir.mkdir(parents=True, exist_ok=True)
+                    picture.path = self.image_dir / name
+                    picture.file = open(picture.path, 'wb')
+                self.images.append(picture.path)
+            picture.file.write(data)
+        except (binascii.Error, OSError) as e:
+            self.warnings.append(f"could not extract picture: {e}")
+            picture.failed = True
+
+    def _finish_picture(self, picture):
+        """Close a picture's sidecar file and return its Markdown link."""
+        self._picture = None
+        if picture.file is None:
+            return None
+        if self.image_dir is None and not picture.failed:
+            self.pictures[picture.path.name] = picture.file.getvalue()
+        picture.file.close()
+        picture.file = None
+        if picture.failed:
+            return None
+        name = picture.path.name
+        link = f"{self.image_link_prefix}/{name}" if self.image_link_prefix else name
+        return f"\n\n![{picture.path.stem}]({link})\n\n"
+
+
+class _MarkdownTextSink:
+    """
+    Write streamed text to a file with the same cleanup as clean_markdown.
+
+    Leading and trailing whitespace is dropped and runs of more than two
+    newlines are collapsed, without holding more than the trailing
+    whitespace of the last fragment in memory.
+    """
+
+    def __init__(self, out):
+        self._out = out
+        self._pending = ''
+        self._started = False
+
+    def write(self, text):
+        text = self._pending + text
+        content = text.rstrip()
+        self._pending = text[len(content):]
+        if not content:
+            if not self._started:
+                self._pending = ''
+            return
+        if not self._started:
+            content = content.lstrip()
+            self._started = True
+        self._out.write(re.sub(r'\n{3,}', '\n\n', content))
+
+
+def convert_rtf_streaming(rtf_file_path, out, image_dir=None, image_link_prefix=None,
+                          chunk_size=RTF_STREAM_CHUNK_SIZE, pictures=None, warnings=None):
+    """
+    Convert an RTF file to text with the built-in streaming tokenizer.
+
+    Text is written to `out` as it is decoded and pictures are streamed to
+    `image_dir`, so memory use does not grow with the size of the document.
+
+    Args:
+        rtf_file_path: Path to the RTF file, or a binary file-like object
+                       to read it from
+        out: Text file-like object to write the converted text to
+        image_dir: Directory for extracted pictures (None = drop pictures)
+        image_link_prefix: Path prefix used in the Markdown image links
+        chunk_size: Number of bytes to read at a time
+        pictures: Dict that receives the pictures as name -> bytes instead,
+                  when there is no `image_dir`
+        warnings: List that receives a message for each picture that could
+                  not be extracted; without it the messages are printed
+
+    Returns:
+        List of extracted picture paths (bare names for `pictures`)
+    """
+    sink = _MarkdownTextSink(out)
+    converter = RtfStreamConverter(image_dir, image_link_prefix, pictures)
+    try:
+        with _open_rtf(rtf_file_path) as f:
+            for text in converter.convert(RtfTokenizer(f, chunk_size)):
+                sink.write(text)
+    finally:
+        if warnings is None:
+            for message in converter.warnings:
+                print(f"  Warning: {message}")
+        else:
+            warnings.extend(converter.warnings)
+    return converter.images
+
+
+def _open_rtf(rtf_file_path):
+    """Open a path for reading; a file-like object is used as it is, and left open."""
+    if hasattr(rtf_file_path, 'read'):
+        return contextlib.nullcontext(rtf_file_path)
+    return open(rtf_file_path, 'rb')
+
+
+def scan_rtf_features(rtf_file_path, chunk_size=RTF_SCAN_CHUNK_SIZE):
+    """
+    Check whether an RTF file contains tables or embedded pictures.
+
+    The file is scanned in binary chunks so large documents are never
+    loaded into memory in full.
+
+    Args:
+        rtf_file_path: Path to the RTF file, or a seekable binary file-like
+                       object, which is returned to its starting position
+        chunk_size: Number of bytes to read per chunk
+
+    Returns:
+        Set containing 'tables' if a table control word (\\trowd, \\cell,
+        \\row) is found and 'pictures' if a \\pict is found
+    """
+    features = set()
+    # Keep the tail of the previous chunk so control words split across
+    # a chunk boundary are still matched
+    overlap = 8
+    tail = b''
+    with _open_rtf(rtf_file_path) as f:
+        start = f.tell()
+        while len(features) < 2:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            data = tail + chunk
+            for match in RTF_FEATURE_PATTERN.finditer(data):
+                features.add('pictures' if match.group(1) == b'pict' else 'tables')
+            tail = data[-overlap:]
+        f.seek(start)
+    return features
+
+
+def select_converters(rtf_file_path, mode='auto'):
+    """
+    Decide which converters to run for an RTF file.
+
+    In 'auto' mode pandoc is only started for documents that contain
+    tables. Documents with embedded pictures go through the built-in
+    streaming converter, which extracts the pictures to sidecar files,
+    and everything else through the in-process striprtf converter. The
+    streaming converter is the fallback in every case.
+
+    Args:
+        rtf_file_path: Path to the RTF file, or a seekable binary file-like object
+        mode: One of CONVERTER_MODES
+
+    Returns:
+        List of converter names to try, in order
+    """
+    # Only these modes can use pandoc; the others never pay for the probe
+    pandoc_available = mode in ('auto', 'both', 'pypandoc') and bool(
+        probe_toolchain()['pandoc_path'])
+    if mode == 'both':
+        converters = ['pypandoc', 'striprtf']
+    elif mode == 'auto':
+        features = scan_rtf_features(rtf_file_path)
+        if pandoc_available and 'tables' in features:
+            converters = ['pypandoc', 'stream']
+        elif 'pictures' in features:
+            converters = ['stream']
+        else:
+            converters = ['striprtf', 'stream']
+    else:
+        converters = [mode]
+
+    available = {'pypandoc': pandoc_available, 'striprtf': STRIPRTF_AVAILABLE, 'stream': True}
+    return [name for name in converters if available[name]]
+
+
+def markdown_header(converter, current_datetime):
+    """Return the header written at the top of every markdown output."""
+    label = CONVERTER_LABELS[converter][0]
+    return f"""**File Type:** RTF
 **Converted on:** {current_datetime}
-**Converter:** striprtf (tables not preserved)
+**Converter:** {label}
 
 ---
 
-{plain_text}
 """
 
-            # Create output filename with striprtf suffix
-            output_file = output_path / f"{rtf_file_path.stem}_striprtf.md"
 
-            # Write markdown file
-            try:
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    f.write(markdown_content)
-                print(f"✓ Converted with striprtf: {rtf_file_path.name} -> {output_file.name}")
+def _write_markdown_output(rtf_file_path, output_path, text, converter, current_datetime):
+    """
+    Write converted text to a markdown file with the standard header.
+
+    Returns:
+        Path of the written file or None on error
+    """
+    suffix = CONVERTER_LABELS[converter][1]
+
+    # Clean up the markdown
+    with stage('clean', rtf_file_path):
+        text = clean_markdown(text)
+
+    # Create markdown content with converter label
+    markdown_content = f"{markdown_header(converter, current_datetime)}{text}\n"
+
+    # Create output filename with converter suffix
+    output_file = output_path / f"{rtf_file_path.stem}_{suffix}.md"
+
+    # Write markdown file
+    try:
+        with stage('write', output_file), open(output_file, 'w', encoding='utf-8') as f:
+            f.write(markdown_content)
+        print(f"✓ Converted with {converter}: {rtf_file_path.name} -> {output_file.name}")
+        return output_file
+    except Exception as e:
+        print(f"✗ Error writing {converter} output {output_file}: {e}")
+        return None
+
+
+def _write_streamed_markdown_output(rtf_file_path, output_path, current_datetime):
+    """
+    Convert an RTF file with the streaming converter straight into its
+    markdown file, extracting pictures to a sidecar directory.
+
+    Returns:
+        Path of the written file or None on error
+    """
+    suffix = CONVERTER_LABELS['stream'][1]
+    output_file = output_path / f"{rtf_file_path.stem}_{suffix}.md"
+    image_dir = image_dir_for(output_file)
+
+    # Pictures from a previous conversion may no longer exist in the source
+    shutil.rmtree(image_dir, ignore_errors=True)
+
+    try:
+        with stage('stream', rtf_file_path), open(output_file, 'w', encoding='utf-8') as f:
+            f.write(markdown_header('stream', current_datetime))
+            images = convert_rtf_streaming(rtf_file_path, f, image_dir, image_dir.name)
+            f.write('\n')
+    except Exception as e:
+        print(f"  Warning: streaming conversion failed: {e}")
+        output_file.unlink(missing_ok=True)
+        shutil.rmtree(image_dir, ignore_errors=True)
+        return None
+
+    extracted = f" (+{len(images)} picture(s))" if images else ""
+    print(f"✓ Converted with stream: {rtf_file_path.name} -> {output_file.name}{extracted}")
+    return output_file
+
+
+def image_dir_for(output_file):
+    """Return the sidecar picture directory belonging to a markdown output."""
+    output_file = Path(output_file)
+    return output_file.with_name(f"{output_file.stem}_images")
+
+
+def convert_rtf_to_markdown(rtf_file_path, output_dir='markdown_output', mode='auto',
+                            pandoc_url=None):
+    """
+    Convert an RTF file to markdown format.
+
+    Args:
+        rtf_file_path: Path to the RTF file
+        output_dir: Directory to save markdown files
+        mode: Converter selection, one of CONVERTER_MODES. 'both' runs
+              every available converter and writes one output each; the
+              other modes write a single output from the first converter
+              that succeeds.
+        pandoc_url: Optional URL of a running PandocServer to send
+                    pandoc conversions to
+
+    Returns:
+        List of written markdown files or None if every converter failed
+    """
+    rtf_file_path = Path(rtf_file_path)
+
+    # Create output directory if it doesn't exist
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    # Get current date and time
+    current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    converted_files = []
+
+    with stage('select', rtf_file_path):
+        converters = select_converters(rtf_file_path, mode)
+
+    for converter in converters:
+        if converter == 'stream':
+            output_file = _write_streamed_markdown_output(
+                rtf_file_path, output_path, current_datetime
+            )
+            if output_file is not None:
                 converted_files.append(output_file)
-            except Exception as e:
-                print(f"✗ Error writing striprtf output {output_file}: {e}")
+                break
+            continue
+
+        with stage(converter, rtf_file_path):
+            if converter == 'pypandoc':
+                text = convert_rtf_with_pandoc(rtf_file_path, pandoc_url)
+            else:
+                text = convert_rtf_with_striprtf(rtf_file_path)
+        if text is None:
+            continue
+
+        output_file = _write_markdown_output(
+            rtf_file_path, output_path, text, converter, current_datetime
+        )
+        if output_file is not None:
+            converted_files.append(output_file)
+            if mode != 'both':
+                break
 
     if not converted_files:
         print(f"✗ Failed to convert {rtf_file_path.name} with any converter")
         return None
 
+    if stage_metrics and stage_metrics.enabled():
+        stage_metrics.count('files')
+        stage_metrics.count('bytes', rtf_file_path.stat().st_size)
     return converted_files
 
 
-def find_and_convert_rtf_files():
+def file_sha256(path, chunk_size=RTF_SCAN_CHUNK_SIZE):
+    """Return the SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def converter_versions():
     """
-    Find all .rtf files in the current directory and convert them.
+    Return the versions of the available converters.
+
+    Stored in the manifest so that upgrading pandoc or striprtf
+    invalidates outputs produced by the old version.
     """
-    global STRIPRTF_AVAILABLE, PYPANDOC_AVAILABLE
+    toolchain = probe_toolchain()
+    versions = {}
+    if toolchain['pandoc_path']:
+        versions['pypandoc'] = f"pandoc {toolchain['pandoc_version']}"
+    if toolchain['striprtf']:
+        versions['striprtf'] = f"striprtf {toolchain['striprtf_version']}"
+    versions['stream'] = f"stream {STREAM_CONVERTER_VERSION}"
+    return versions
+
+
+def load_manifest(output_dir='markdown_output'):
+    """
+    Load the conversion manifest from the output directory.
+
+    Returns:
+        Dict mapping absolute source path -> manifest entry (empty if the
+        manifest is missing, unreadable or from another manifest version)
+    """
+    manifest_path = Path(output_dir) / MANIFEST_NAME
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get('version') != MANIFEST_VERSION:
+        return {}
+    return data.get('files', {})
+
+
+def save_manifest(entries, output_dir='markdown_output'):
+    """Atomically write the conversion manifest to the output directory."""
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_path / MANIFEST_NAME
+    temp_path = manifest_path.with_suffix('.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': MANIFEST_VERSION, 'files': entries}, f, indent=1, sort_keys=True)
+    os.replace(temp_path, manifest_path)
+
+
+def _converters_for_outputs(output_names):
+    """Map output file names back to the converters that wrote them."""
+    suffixes = {f"_{suffix}.md": name for name, (_, suffix) in CONVERTER_LABELS.items()}
+    converters = []
+    for output_name in output_names:
+        for suffix, name in suffixes.items():
+            if output_name.endswith(suffix):
+                converters.append(name)
+    return converters
+
+
+def is_up_to_date(entry, rtf_file_path, mode, versions, output_dir='markdown_output'):
+    """
+    Check whether a manifest entry still describes the current outputs.
+
+    Size and mtime are compared first; the file is only hashed when they
+    differ, so an unchanged archive is checked with one stat per file.
+    A file whose content is unchanged but whose mtime moved has its entry
+    refreshed in place.
+
+    Returns:
+        True if the file can be skipped
+    """
+    if not entry or entry.get('mode') != mode:
+        return False
+
+    output_path = Path(output_dir)
+    outputs = entry.get('outputs', [])
+    if not outputs or not all((output_path / name).exists() for name in outputs):
+        return False
+
+    for converter, version in entry.get('converters', {}).items():
+        if versions.get(converter) != version:
+            return False
+
+    stat = os.stat(rtf_file_path)
+    if stat.st_size != entry.get('size'):
+        return False
+    if stat.st_mtime_ns == entry.get('mtime_ns'):
+        return True
+
+    if file_sha256(rtf_file_path) != entry.get('sha256'):
+        return False
+    entry['mtime_ns'] = stat.st_mtime_ns
+    return True
+
+
+def record_conversion(entries, rtf_file_path, converted_files, mode, versions,
+                      output_dir='markdown_output'):
+    """
+    Record a successful conversion in the manifest.
+
+    Output paths are stored relative to `output_dir`, the output root.
+
+    Outputs from a previous conversion of the same file that were not
+    written this time (e.g. after switching --converter) are deleted.
+    """
+    key = os.path.abspath(rtf_file_path)
+    stat = os.stat(rtf_file_path)
+    output_names = [
+        Path(os.path.relpath(output_file, output_dir)).as_posix()
+        for output_file in converted_files
+    ]
+
+    previous = entries.get(key, {})
+    for name in previous.get('outputs', []):
+        if name not in output_names:
+            remove_output(Path(output_dir) / name)
+
+    entries[key] = {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': file_sha256(rtf_file_path),
+        'mode': mode,
+        'converters': {
+            name: versions.get(name) for name in _converters_for_outputs(output_names)
+        },
+        'outputs': output_names,
+    }
+
+
+def prune_manifest(entries, output_dir='markdown_output'):
+    """
+    Delete outputs whose source RTF no longer exists.
+
+    Returns:
+        Number of output files removed
+    """
+    removed = 0
+    for key in [key for key in entries if not os.path.exists(key)]:
+        for name in entries.pop(key).get('outputs', []):
+            if remove_output(Path(output_dir) / name):
+                removed += 1
+    return removed
+
+
+def remove_output(output_file):
+    """
+    Delete a markdown output and its sidecar picture directory.
+
+    Returns:
+        True if the markdown file existed
+    """
+    shutil.rmtree(image_dir_for(output_file), ignore_errors=True)
+    if not output_file.exists():
+        return False
+    output_file.unlink()
+    return True
+
+
+def _convert_rtf_worker(rtf_file_path, output_dir, mode, pandoc_url):
+    """
+    Process-pool entry point for convert_rtf_to_markdown.
+
+    Exceptions are caught and returned so that one bad file is reported
+    as a failure instead of propagating out of the pool.
+
+    Returns:
+        Tuple of (rtf_file_path, converted_files or None, error message or
+        None, stage totals for the parent or None)
+    """
+    metrics = stage_metrics.collect if stage_metrics else lambda: None
+    try:
+        result = convert_rtf_to_markdown(rtf_file_path, output_dir, mode, pandoc_url)
+        return rtf_file_path, result, None, metrics()
+    except Exception as e:
+        return rtf_file_path, None, f"{type(e).__name__}: {e}", metrics()
+
+
+def convert_rtf_files_parallel(tasks, jobs=None, mode='auto', pandoc_url=None):
+    """
+    Convert RTF files on a process pool, yielding results as they complete.
+
+    Tasks are submitted as they arrive from `tasks`, with at most a few per
+    worker in flight, so a lazily discovered file list is never held in
+    full and conversion starts with the first file.
+
+    Args:
+        tasks: Iterable of (rtf_file_path, output_dir) tuples
+        jobs: Number of worker processes (None = CPU count)
+        mode: Converter selection, one of CONVERTER_MODES
+        pandoc_url: Optional URL of a PandocServer shared by all workers
+
+    Yields:
+        Tuple of (rtf_file_path, converted_files or None, error message or None)
+        in completion order.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 
+    max_pending = (jobs or os.cpu_count() or 1) * 4
+
+    def collect(future):
+        try:
+            file_path, result, error, totals = future.result()
+        except Exception as e:
+            # The worker process itself died (e.g. BrokenProcessPool)
+            return futures[future], None, f"{type(e).__name__}: {e}"
+        if stage_metrics:
+            stage_metrics.merge(totals)
+        return file_path, result, error
+
+    pool_options = stage_metrics.pool_options() if stage_metrics else {}
+    with ProcessPoolExecutor(max_workers=jobs, **pool_options) as executor:
+        futures = {}
+        for file_path, output_dir in tasks:
+            future = executor.submit(_convert_rtf_worker, file_path, output_dir, mode, pandoc_url)
+            futures[future] = file_path
+            if len(futures) >= max_pending:
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    yield collect(future)
+                    del futures[future]
+        while futures:
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield collect(future)
+                del futures[future]
+
+
+def find_and_convert_rtf_files(root=None, output_dir=None, include=('*.rtf',), exclude=(),
+                               max_depth=None, jobs=1, mode='auto', pandoc_backend='subprocess',
+                               force=False, interactive=True):
+    """
+    Find all .rtf files under a directory tree and convert them.
+
+    Args:
+        root: Directory to search (default: the script's directory)
+        output_dir: Output directory (default: markdown_output under root);
+                    the source tree is mirrored inside it
+        include: Glob patterns of files to convert
+        exclude: Glob patterns of files and directories to skip
+        max_depth: Deepest directory level to search (0 = root only, None = all)
+        jobs: Number of worker processes; 1 converts serially in this process
+        mode: Converter selection, one of CONVERTER_MODES
+        pandoc_backend: One of PANDOC_BACKENDS
+        force: Reconvert every file even if the manifest says it is unchanged
+        interactive: Allow prompts and downloads; False for unattended runs
+    """
     # Check if pypandoc is available (preferred for table support)
-    if not PYPANDOC_AVAILABLE:
+    if not PYPANDOC_AVAILABLE and not probe_toolchain()['pandoc_path']:
         print("\n" + "="*50)
         print("NOTICE: 'pypandoc' is not installed.")
         print("This package is needed for proper table conversion.")
@@ -259,24 +1509,16 @@ def find_and_convert_rtf_files():
         print("="*50)
 
         # Ask user if they want to install pypandoc
-        response = input("\nWould you like to install pypandoc now? (y/n): ").strip().lower()
+        if interactive:
+            response = input("\nWould you like to install pypandoc now? (y/n): ").strip().lower()
+        else:
+            response = 'n'
 
         if response == 'y' or response == 'yes':
             if install_packages():
-                # Try importing again
-                try:
-                    from striprtf.striprtf import rtf_to_text
-                    STRIPRTF_AVAILABLE = True
-                    globals()['rtf_to_text'] = rtf_to_text
-                except ImportError:
-                    pass
-
-                try:
-                    import pypandoc
-                    PYPANDOC_AVAILABLE = True
-                    globals()['pypandoc'] = pypandoc
-                except ImportError:
-                    pass
+                # Check the packages again and re-probe the toolchain
+                refresh_converter_packages()
+                probe_toolchain(refresh=True)
 
                 if PYPANDOC_AVAILABLE:
                     print("\n" + "="*50)
@@ -285,81 +1527,297 @@ def find_and_convert_rtf_files():
                 else:
                     print("\n" + "="*50)
                     print("WARNING: pypandoc installation may have failed.")
-                    if STRIPRTF_AVAILABLE:
-                        print("Will use striprtf as fallback (tables may be broken).")
+                    print("Tables will not be preserved.")
                     print("="*50)
 
                 print("\nResuming conversion...\n")
             else:
-                if STRIPRTF_AVAILABLE:
-                    print("\nContinuing with striprtf (tables may be broken)...\n")
-                else:
-                    print("\nCannot proceed without any converter package.")
-                    return
+                print("\nContinuing without pandoc (tables may be broken)...\n")
         else:
-            if STRIPRTF_AVAILABLE:
-                print("\nContinuing with striprtf (tables may be broken)...\n")
-            else:
-                print("\nCannot proceed without any converter package.")
-                return
-
-    # Final check - make sure we have at least one converter
-    if not STRIPRTF_AVAILABLE and not PYPANDOC_AVAILABLE:
-        print("\n" + "="*50)
-        print("ERROR: No conversion package available.")
-        print("Please install at least one of: pypandoc, striprtf")
-        print("="*50)
-        return
+            print("\nContinuing without pandoc (tables may be broken)...\n")
 
     # If pypandoc is available, ensure Pandoc executable is installed
-    if PYPANDOC_AVAILABLE:
-        if not ensure_pandoc_installed():
+    if root is None:
+        root = Path(__file__).parent
+
+    if PYPANDOC_AVAILABLE and mode != 'striprtf':
+        if not ensure_pandoc_installed(download=interactive):
             print("\n" + "="*50)
-            print("WARNING: Pandoc executable could not be installed.")
-            if STRIPRTF_AVAILABLE:
-                print("Will use striprtf as fallback (tables may be broken).")
-            else:
-                print("Cannot proceed without a working converter.")
-                print("="*50)
-                return
+            print("WARNING: Pandoc executable could not be found.")
+            print("Tables will not be preserved.")
             print("="*50)
 
-    # Get the directory where this script is located
-    script_dir = Path(__file__).parent
-    os.chdir(script_dir)
+    source_root = Path(root).resolve()
+    output_root = Path(output_dir).resolve() if output_dir else source_root / 'markdown_output'
 
-    print(f"Searching for RTF files in: {script_dir}\n")
+    print(f"Searching for RTF files in: {source_root}\n")
 
-    # Find all RTF files
-    rtf_files = list(script_dir.glob('*.rtf'))
+    # Drop outputs of deleted sources before anything else
+    manifest = load_manifest(output_root)
+    pruned_count = prune_manifest(manifest, output_root)
+    if pruned_count:
+        save_manifest(manifest, output_root)
+        print(f"Removed {pruned_count} output file(s) of deleted RTF files.\n")
 
-    if not rtf_files:
-        print("No .rtf files found in the current directory.")
-        return
+    versions = converter_versions()
+    counts = {'found': 0, 'skipped': 0, 'queued': 0}
 
-    print(f"Found {len(rtf_files)} RTF file(s) to convert:\n")
+    def pending_conversions():
+        """Yield (file, mirrored output dir) for each file needing conversion."""
+        found_files = iter_source_files(
+            source_root, include, exclude, max_depth, skip_dirs=[output_root]
+        )
+        discovered = discover_in_background(found_files, name='rtf-discovery')
+        if stage_metrics:
+            discovered = stage_metrics.timed_iter('discover', discovered)
+        for file_path in discovered:
+            counts['found'] += 1
+            with stage('check', file_path):
+                unchanged = not force and is_up_to_date(manifest.get(str(file_path)), file_path,
+                                                        mode, versions, output_root)
+            if unchanged:
+                counts['skipped'] += 1
+                continue
+            counts['queued'] += 1
+            yield file_path, output_root / file_path.parent.relative_to(source_root)
+
+    # Start one long-lived pandoc for the whole batch if requested
+    pandoc_server = None
+    if pandoc_backend == 'server' and mode != 'striprtf' and ensure_pandoc_installed():
+        pandoc_server = start_pandoc_server()
+    pandoc_url = pandoc_server.url if pandoc_server else None
 
-    # Convert each file
+    # Convert each file as soon as it is discovered
     converted_count = 0
     total_output_files = 0
-    for file_path in sorted(rtf_files):
-        print(f"\nConverting: {file_path.name}")
-        result = convert_rtf_to_markdown(file_path)
-        if result:
-            converted_count += 1
-            total_output_files += len(result)
+    try:
+        if jobs == 1:
+            for file_path, file_output_dir in pending_conversions():
+                print(f"\nConverting: {file_path.relative_to(source_root)}")
+                try:
+                    result = convert_rtf_to_markdown(
+                        file_path, file_output_dir, mode=mode, pandoc_url=pandoc_url
+                    )
+                except Exception as e:
+                    # One bad file is reported, as the worker pool does
+                    print(f"✗ {file_path.relative_to(source_root)}: {type(e).__name__}: {e}")
+                    continue
+                if result:
+                    record_conversion(manifest, file_path, result, mode, versions, output_root)
+                    converted_count += 1
+                    total_output_files += len(result)
+        else:
+            print(f"Converting with {jobs or os.cpu_count()} worker process(es)...\n")
+            results = convert_rtf_files_parallel(
+                pending_conversions(), jobs=jobs, mode=mode, pandoc_url=pandoc_url
+            )
+            for done, (file_path, result, error) in enumerate(results, 1):
+                name = file_path.relative_to(source_root)
+                if error:
+                    print(f"✗ [{done}] {name}: {error}")
+                elif result:
+                    print(f"✓ [{done}] {name} -> {len(result)} output file(s)")
+                    record_conversion(manifest, file_path, result, mode, versions, output_root)
+                    converted_count += 1
+                    total_output_files += len(result)
+                else:
+                    print(f"✗ [{done}] {name}: no converter succeeded")
+    finally:
+        if pandoc_server:
+            pandoc_server.close()
+        save_manifest(manifest, output_root)
+
+    if not counts['found']:
+        print("No .rtf files found.")
+        return
 
     print(f"\n{'='*50}")
     print(f"Conversion complete!")
-    print(f"Source files processed: {converted_count}/{len(rtf_files)}")
+    print(f"Source files found: {counts['found']}")
+    print(f"Source files processed: {converted_count}/{counts['queued']}")
+    print(f"Skipped (unchanged): {counts['skipped']}")
     print(f"Output files created: {total_output_files}")
-    print(f"Output directory: {Path('markdown_output').absolute()}")
+    print(f"Output directory: {output_root}")
     print(f"{'='*50}")
 
 
+def watch_and_convert_rtf_files(root=None, output_dir=None, include=('*.rtf',), exclude=(),
+                                max_depth=None, jobs=1, mode='auto',
+                                pandoc_backend='subprocess', force=False,
+                                interactive=True, interval=WATCH_INTERVAL):
+    """
+    Convert a tree once, then keep its markdown up to date until Ctrl+C.
+
+    Changed files are reconverted in this process and recorded in the
+    manifest; the outputs of deleted files are removed. A file whose mtime
+    moved but whose content did not is only re-stamped, as in a normal run.
+
+    Args:
+        interval: Seconds between looks at the tree (see TreeWatcher)
+        Others as for find_and_convert_rtf_files
+    """
+    source_root = Path(root or Path(__file__).parent).resolve()
+    output_root = Path(output_dir).resolve() if output_dir else source_root / 'markdown_output'
+
+    # Snapshot before the first run so edits made during it are not missed
+    watcher = TreeWatcher(source_root, include, exclude, max_depth,
+                          skip_dirs=[output_root], interval=interval)
+    find_and_convert_rtf_files(
+        source_root, output_root, include, exclude, max_depth, jobs=jobs, mode=mode,
+        pandoc_backend=pandoc_backend, force=force, interactive=interactive
+    )
+
+    manifest = load_manifest(output_root)
+    versions = converter_versions()
+    pandoc_server = None
+    if pandoc_backend == 'server' and mode != 'striprtf' and ensure_pandoc_installed(download=False):
+        pandoc_server = start_pandoc_server()
+    pandoc_url = pandoc_server.url if pandoc_server else None
+
+    print(f"\nWatching {source_root} for changes ({watcher.backend}); press Ctrl+C to stop.")
+    try:
+        for changed, removed in watcher.batches():
+            start = time.perf_counter()
+            for path in removed:
+                for name in manifest.pop(os.path.abspath(path), {}).get('outputs', []):
+                    if remove_output(output_root / name):
+                        print(f"- Removed: {output_root / name}")
+
+            converted_count = 0
+            for path in changed:
+                if is_up_to_date(manifest.get(path), path, mode, versions, output_root):
+                    continue
+                file_path = Path(path)
+                print(f"\nConverting: {file_path.relative_to(source_root)}")
+                result = convert_rtf_to_markdown(
+                    file_path, output_root / file_path.parent.relative_to(source_root),
+                    mode=mode, pandoc_url=pandoc_url
+                )
+                if result:
+                    record_conversion(manifest, file_path, result, mode, versions, output_root)
+                    converted_count += 1
+
+            save_manifest(manifest, output_root)
+            elapsed = time.perf_counter() - start
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Updated {converted_count} "
+                  f"file(s), removed {len(removed)} in {elapsed * 1000:.0f} ms")
+    except KeyboardInterrupt:
+        print("\nWatch stopped.")
+    finally:
+        if pandoc_server:
+            pandoc_server.close()
+        save_manifest(manifest, output_root)
+
+
+def parse_args(argv=None):
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Convert RTF files to Markdown.")
+    parser.add_argument(
+        'root', nargs='?', default=None,
+        help="directory to search (default: the script's directory)"
+    )
+    parser.add_argument(
+        '-o', '--output-dir', default=None,
+        help="output directory; mirrors the source tree (default: ROOT/markdown_output)"
+    )
+    parser.add_argument(
+        '--include', action='append', default=None, metavar='GLOB',
+        help="glob of files to convert, matched against name or relative path; "
+             "repeatable (default: *.rtf)"
+    )
+    parser.add_argument(
+        '--exclude', action='append', default=[], metavar='GLOB',
+        help="glob of files or directories to skip; repeatable"
+    )
+    parser.add_argument(
+        '--max-depth', type=int, default=None,
+        help="deepest directory level to search (0 = ROOT only; default: unlimited)"
+    )
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help="number of worker processes (default: 1, 0 = one per CPU)"
+    )
+    parser.add_argument(
+        '-c', '--converter', choices=CONVERTER_MODES, default='auto',
+        help="'auto' runs pandoc only for files with tables and the built-in stream "
+             "converter for files with pictures; 'both' writes one output each for "
+             "pandoc and striprtf (default: auto)"
+    )
+    parser.add_argument(
+        '--pandoc-backend', choices=PANDOC_BACKENDS, default='subprocess',
+        help="'server' starts one pandoc server for the whole batch instead of "
+             "one pandoc process per file (default: subprocess)"
+    )
+    parser.add_argument(
+        '-f', '--force', action='store_true',
+        help="reconvert every file, ignoring the incremental manifest"
+    )
+    parser.add_argument(
+        '-n', '--non-interactive', action='store_true',
+        help="never prompt, download or wait for Enter (implied when stdin is not a terminal)"
+    )
+    parser.add_argument(
+        '-w', '--watch', action='store_true',
+        help="after converting, keep running and reconvert files as they change "
+             "(uses the 'watchdog' package if installed, otherwise polls)"
+    )
+    parser.add_argument(
+        '--watch-interval', type=float, default=WATCH_INTERVAL, metavar='SECONDS',
+        help=f"how often --watch looks for changes (default: {WATCH_INTERVAL})"
+    )
+    parser.add_argument(
+        '--refresh-probe', action='store_true',
+        help="ignore the cached toolchain probe and probe pandoc and packages again"
+    )
+    parser.add_argument(
+        '--check', action='store_true',
+        help="print the detected toolchain and exit"
+    )
+    if stage_metrics:
+        stage_metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+    args.interactive = not args.non_interactive and sys.stdin.isatty()
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 or greater")
+    args.jobs = args.jobs or None
+    return args
+
+
+def print_toolchain(toolchain):
+    """Print the result of probe_toolchain()."""
+    print(f"striprtf: {toolchain['striprtf_version'] or 'not installed'}")
+    print(f"pypandoc: {'installed' if toolchain['pypandoc'] else 'not installed'}")
+    if toolchain['pandoc_path']:
+        print(f"pandoc:   {toolchain['pandoc_version']} ({toolchain['pandoc_path']})")
+    else:
+        print("pandoc:   not found")
+    print(f"cache:    {_toolchain_cache_path()}")
+
+
 if __name__ == '__main__':
+    args = parse_args()
+    if args.refresh_probe:
+        probe_toolchain(refresh=True)
+    if args.check:
+        print_toolchain(probe_toolchain())
+        sys.exit(0)
+    if stage_metrics:
+        stage_metrics.enable_from_args('rtf_to_markdown', args)
     try:
-        find_and_convert_rtf_files()
+        if args.watch:
+            watch_and_convert_rtf_files(
+                root=args.root, output_dir=args.output_dir,
+                include=args.include or ['*.rtf'], exclude=args.exclude, max_depth=args.max_depth,
+                jobs=args.jobs, mode=args.converter, pandoc_backend=args.pandoc_backend,
+                force=args.force, interactive=args.interactive, interval=args.watch_interval
+            )
+        else:
+            find_and_convert_rtf_files(
+                root=args.root, output_dir=args.output_dir,
+                include=args.include or ['*.rtf'], exclude=args.exclude, max_depth=args.max_depth,
+                jobs=args.jobs, mode=args.converter, pandoc_backend=args.pandoc_backend,
+                force=args.force, interactive=args.interactive
+            )
     except Exception as e:
         print("\n" + "="*50)
         print(f"ERROR: An unexpected error occurred:")
@@ -368,5 +1826,8 @@ if __name__ == '__main__':
         import traceback
         traceback.print_exc()
     finally:
-        print("\nPress Enter to exit...")
-        input()
+        if stage_metrics:
+            stage_metrics.finish()
+        if args.interactive and not args.watch:
+            print("\nPress Enter to exit...")
+            input()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Source Tree
+
+Shared file discovery for the conversion scripts (rtf_to_markdown.py,
+code_to_markdown.py and PPM2PNG/ppm2png.py):
+
+- iter_source_files walks a tree with os.scandir and yields matching files
+  as they are found, honouring include/exclude globs, a depth limit and
+  directories to skip (such as an output directory inside the tree)
+- discover_in_background runs such a generator on a thread, feeding a
+  bounded queue, so conversion starts with the first file found
+- TreeWatcher reports debounced batches of files added, changed or
+  removed, for the scripts' --watch modes
+
+Each script passes its own file patterns; nothing here knows about RTF,
+source code or images.
+"""
+
+import fnmatch
+import importlib.util
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+# Maximum number of discovered files waiting to be converted
+DISCOVERY_QUEUE_SIZE = 256
+
+# Watch mode: seconds between looks at the source tree, quiet time after
+# the last change before a burst of changes is reported, and the backends
+WATCH_INTERVAL = 0.5
+WATCH_DEBOUNCE = 0.2
+WATCH_BACKENDS = ('watchdog', 'polling')
+
+
+def matches_any(relative_path, name, patterns):
+    """Check a file against glob patterns, by name or by relative path."""
+    return any(
+        fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relative_path, pattern)
+        for pattern in patterns
+    )
+
+
+def iter_source_files(root, include=('*',), exclude=(), max_depth=None, skip_dirs=(),
+                      accept=None):
+    """
+    Recursively find files under `root` with os.scandir.
+
+    Files are yielded as they are found, directory by directory in sorted
+    order, so callers can start work before the walk finishes.
+
+    Args:
+        root: Directory to search
+        include: Glob patterns a file must match (by name or relative path),
+                 or None to leave the decision to `accept`
+        exclude: Glob patterns for files and directories to leave out
+        max_depth: Deepest directory level to descend into (0 = root only,
+                   None = unlimited)
+        skip_dirs: Directories never to descend into (e.g. the output directory)
+        accept: Called with the path of each file when `include` is None;
+                the file is yielded if it returns True
+
+    Yields:
+        Path of each matching file
+    """
+    root = os.path.abspath(root)
+    skip_dirs = {os.path.abspath(directory) for directory in skip_dirs}
+    pending = [(root, 0)]
+    while pending:
+        directory, depth = pending.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            print(f"Warning: cannot read directory {directory}: {e}")
+            continue
+
+        subdirs = []
+        for entry in entries:
+            relative_path = os.path.relpath(entry.path, root).replace(os.sep, '/')
+            if matches_any(relative_path, entry.name, exclude):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if (max_depth is None or depth < max_depth) and entry.path not in skip_dirs:
+                        subdirs.append(entry.path)
+                elif entry.is_file() and (
+                        accept(entry.path) if include is None
+                        else matches_any(relative_path, entry.name, include)):
+                    yield Path(entry.path)
+            except OSError:
+                continue
+        pending.extend((subdir, depth + 1) for subdir in reversed(subdirs))
+
+
+def discover_in_background(items, maxsize=DISCOVERY_QUEUE_SIZE, name='discovery'):
+    """
+    Run a discovery generator on a thread, feeding a bounded queue.
+
+    The consumer gets the first item as soon as it is found, while the
+    walk continues in the background at most `maxsize` items ahead, so a
+    long listing is never held in full. Closing the consumer stops the
+    thread; an exception raised by `items` is re-raised to the consumer.
+
+    Args:
+        items: Iterable to consume on the thread
+        maxsize: Items to read ahead
+        name: Name of the thread
+
+    Yields:
+        The items produced by `items`
+    """
+    work = queue.Queue(maxsize)
+    stop = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for item in items:
+                while not stop.is_set():
+                    try:
+                        work.put((item, None), timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                if stop.is_set():
+                    return
+            work.put((done, None))
+        except BaseException as e:
+            work.put((done, e))
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = work.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+class TreeWatcher:
+    """
+    Report source files added, changed or removed under a directory tree.
+
+    Uses the optional 'watchdog' package (inotify, FSEvents,
+    ReadDirectoryChangesW) when it is installed, so a change is seen
+    without rescanning the tree; otherwise the tree is polled with
+    iter_source_files and compared by mtime and size. Bursts of changes
+    (an editor's write-rename, a git checkout) are debounced: a batch is
+    reported once the tree has been quiet for `debounce` seconds.
+
+    Files are selected as by iter_source_files, from the same `include`,
+    `exclude`, `max_depth`, `skip_dirs` and `accept` arguments. `backend`
+    forces one of WATCH_BACKENDS instead of picking watchdog when it is
+    installed.
+
+    The tree is snapshotted on construction, so create the watcher before
+    an initial full conversion and nothing changed during it is missed.
+
+    Usage:
+        watcher = TreeWatcher(root, ('*.rtf',), exclude, max_depth, skip_dirs)
+        for changed, removed in watcher.batches():
+            ...
+    """
+
+    def __init__(self, root, include=('*',), exclude=(), max_depth=None, skip_dirs=(),
+                 interval=WATCH_INTERVAL, debounce=WATCH_DEBOUNCE, accept=None, backend=None):
+        self.root = os.path.abspath(root)
+        self.include = include
+        self.accept = accept
+        self.exclude = exclude
+        self.max_depth = max_depth
+        self.skip_dirs = [os.path.abspath(directory) for directory in skip_dirs]
+        self.interval = interval
+        self.debounce = debounce
+        if backend is None:
+            backend = 'watchdog' if importlib.util.find_spec('watchdog') else 'polling'
+        if backend not in WATCH_BACKENDS:
+            raise ValueError(f"unknown watch backend: {backend}")
+        self.backend = backend
+        self.known = self._snapshot()
+        self._settling = False  # a burst is pending: look again after `debounce`
+
+    def _snapshot(self):
+        """Return {path: (mtime_ns, size)} for every watched file."""
+        snapshot = {}
+        for file_path in iter_source_files(self.root, self.include, self.exclude,
+                                           self.max_depth, self.skip_dirs, self.accept):
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            snapshot[str(file_path)] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def _accepts(self, path):
+        """Apply the discovery rules (skip dirs, depth, globs) to one path."""
+        if any(path == directory or path.startswith(directory + os.sep)
+               for directory in self.skip_dirs):
+            return False
+        relative_path = os.path.relpath(path, self.root).replace(os.sep, '/')
+        parts = relative_path.split('/')
+        if parts[0] == '..' or (self.max_depth is not None and len(parts) - 1 > self.max_depth):
+            return False
+        for i, part in enumerate(parts):
+            if matches_any('/'.join(parts[:i + 1]), part, self.exclude):
+                return False
+        if self.include is None:
+            return self.accept(path)
+        return matches_any(relative_path, parts[-1], self.include)
+
+    def _resolve(self, paths):
+        """
+        Turn raw event paths into (changed, removed) files and update the
+        snapshot. Directory events are expanded to the files below them.
+        """
+        changed, removed = set(), set()
+        for path in paths:
+            path = os.path.abspath(path)
+            if os.path.isdir(path):
+                for directory, _, names in os.walk(path):
+                    for name in names:
+                        self._check(os.path.join(directory, name), changed, removed)
+            elif os.path.exists(path):
+                self._check(path, changed, removed)
+            else:
+                prefix = path + os.sep
+                for known in [known for known in self.known
+                              if known == path or known.startswith(prefix)]:
+                    del self.known[known]
+                    removed.add(known)
+        return changed, removed
+
+    def _check(self, path, changed, removed):
+        """Compare one existing file with the snapshot."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        if not self._accepts(path):
+            return
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if self.known.get(path) != signature:
+            self.known[path] = signature
+            changed.add(path)
+
+    def _poll(self):
+        """Yield (changed, removed) sets from polling snapshots."""
+        while True:
+            time.sleep(self.debounce if self._settling else self.interval)
+            current = self._snapshot()
+            changed = {path for path, signature in current.items()
+                       if self.known.get(path) != signature}
+            removed = set(self.known) - set(current)
+            self.known = current
+            yield changed, removed
+
+    def _events(self):
+        """Yield (changed, removed) sets from filesystem events."""
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        events = queue.Queue()
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.event_type in ('opened', 'closed_no_write'):
+                    return
+                events.put(event.src_path)
+                if getattr(event, 'dest_path', ''):
+                    events.put(event.dest_path)
+
+        observer = Observer()
+        observer.schedule(Handler(), self.root, recursive=True)
+        observer.start()
+        try:
+            while True:
+                try:
+                    timeout = self.debounce if self._settling else self.interval
+                    paths = {events.get(timeout=timeout)}
+                except queue.Empty:
+                    yield set(), set()
+                    continue
+                while not events.empty():
+                    paths.add(events.get_nowait())
+                yield self._resolve(paths)
+        finally:
+            observer.stop()
+            observer.join()
+
+    def batches(self):
+        """
+        Yield debounced (changed, removed) batches of file paths, forever.
+
+        A file both changed and then removed within one burst is reported
+        as removed, and a removed file that reappears as changed.
+        """
+        source = self._events() if self.backend == 'watchdog' else self._poll()
+        pending_changed, pending_removed = set(), set()
+        last_change = None
+        for changed, removed in source:
+            now = time.monotonic()
+            if changed or removed:
+                pending_changed = (pending_changed - removed) | changed
+                pending_removed = (pending_removed - changed) | removed
+                last_change = now
+            elif last_change is not None and now - last_change >= self.debounce:
+                yield sorted(pending_changed), sorted(pending_removed)
+                pending_changed, pending_removed = set(), set()
+                last_change = None
+            self._settling = last_change is not None
@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+Stage Metrics
+
+Shared per-stage instrumentation for the conversion scripts
+(rtf_to_markdown.py, code_to_markdown.py, archiver.py and
+PPM2PNG/ppm2png.py). Each script wraps the stages of its work in
+
+    with stage('encode', item=path):
+        ...
+
+and nothing is measured until enable() is called, which the scripts do
+for --metrics, --cprofile and --trace-memory. Until then stage() returns
+one shared no-op context manager and timed_iter() returns its argument
+unchanged, so an instrumented loop pays a function call per stage.
+
+Once enabled, each stage is timed with time.perf_counter and added to
+per-stage totals (calls, seconds, longest call), which are printed as a
+summary when the run ends. The totals can also be written as:
+
+- JSON lines: one event per stage as it completes, then a summary line
+- a Prometheus textfile (for node_exporter's textfile collector)
+
+Process-pool workers measure their own stages: pools are started with
+pool_options(), workers return collect() alongside each result and the
+parent merge()s it. cProfile (--cprofile) and tracemalloc (--trace-memory)
+cover the main process.
+"""
+
+import json
+import os
+import threading
+import time
+
+# Output formats for --metrics; a .prom file defaults to prometheus
+METRICS_FORMATS = ('jsonl', 'prometheus')
+
+# Prefix of every Prometheus metric name
+PROMETHEUS_PREFIX = 'myscripts'
+
+# Allocation sites listed by --trace-memory
+TRACE_MEMORY_TOP = 10
+
+# The active recorder, or None while instrumentation is disabled, and what
+# else enable() started (see _Session)
+_recorder = None
+_session = None
+
+
+class _NullStage:
+    """Context manager that does nothing: what stage() returns when disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """Times one pass through a stage and reports it to the recorder."""
+
+    __slots__ = ('recorder', 'name', 'item', 'start')
+
+    def __init__(self, recorder, name, item):
+        self.recorder = recorder
+        self.name = name
+        self.item = item
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.recorder.record(self.name, time.perf_counter() - self.start, self.item,
+                             failed=exc_type is not None)
+        return False
+
+
+class Recorder:
+    """
+    Per-process stage totals and counters, plus the optional event stream.
+
+    Stages may be timed from several threads (e.g. the archiver's
+    compression pool), so updates are made under a lock.
+    """
+
+    def __init__(self, script, events_path=None):
+        self.script = script
+        self.events_path = events_path
+        # Line buffered, so nothing is pending when a pool forks
+        self.events = open(events_path, 'a', encoding='utf-8', buffering=1) if events_path else None
+        self.stages = {}    # name -> [calls, seconds, longest call]
+        self.counters = {}  # name -> value
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds, item=None, failed=False):
+        with self.lock:
+            totals = self.stages.get(name)
+            if totals is None:
+                totals = self.stages[name] = [0, 0.0, 0.0]
+            totals[0] += 1
+            totals[1] += seconds
+            if seconds > totals[2]:
+                totals[2] = seconds
+            if self.events is not None:
+                event = {'time': round(time.time(), 6), 'script': self.script,
+                         'pid': os.getpid(), 'stage': name, 'seconds': round(seconds, 6)}
+                if item is not None:
+                    event['item'] = str(item)
+                if failed:
+                    event['failed'] = True
+                self.events.write(json.dumps(event) + '\n')
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def take(self):
+        """Return the totals recorded so far and start again from zero."""
+        with self.lock:
+            totals = {'stages': self.stages, 'counters': self.counters}
+            self.stages = {}
+            self.counters = {}
+        return totals
+
+    def merge(self, totals):
+        """Add totals taken from another process."""
+        with self.lock:
+            for name, (calls, seconds, longest) in totals['stages'].items():
+                mine = self.stages.setdefault(name, [0, 0.0, 0.0])
+                mine[0] += calls
+                mine[1] += seconds
+                mine[2] = max(mine[2], longest)
+            for name, value in totals['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def close(self):
+        if self.events is not None:
+            self.events.close()
+            self.events = None
+
+
+def stage(name, item=None):
+    """
+    Return a context manager that times one pass through a stage.
+
+    Args:
+        name: Stage name, e.g. 'read', 'pandoc' or 'write'
+        item: Optional file or other item being worked on, shown in events
+
+    Returns:
+        A timing context manager, or a shared no-op one when disabled
+    """
+    recorder = _recorder
+    if recorder is None:
+        return _NULL_STAGE
+    return _Stage(recorder, name, item)
+
+
+def count(name, value=1):
+    """Add to a counter (e.g. 'files' or 'bytes'); does nothing when disabled."""
+    recorder = _recorder
+    if recorder is not None:
+        recorder.count(name, value)
+
+
+def timed_iter(name, iterable):
+    """
+    Time how long each item of `iterable` takes to arrive, as stage `name`.
+
+    Meant for lazily discovered inputs, so the time a run waits on
+    discovery shows up as a stage. Returns `iterable` itself when disabled.
+    """
+    if _recorder is None:
+        return iterable
+
+    def timed():
+        iterator = iter(iterable)
+        while True:
+            with stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+    return timed()
+
+
+def enabled():
+    """Return True while instrumentation is enabled."""
+    return _recorder is not None
+
+
+class _Session:
+    """What enable() started besides the recorder: output, profiler, tracemalloc."""
+
+    def __init__(self, output, fmt, profile, trace_memory):
+        self.output = output
+        self.format = fmt
+        self.profile_path = profile
+        self.profiler = None
+        self.trace_memory = trace_memory
+
+
+def enable(script, output=None, fmt=None, profile=None, trace_memory=False):
+    """
+    Start measuring stages in this process.
+
+    Args:
+        script: Name of the script, recorded with every metric
+        output: Optional file for the metrics (JSON lines are appended;
+                a Prometheus textfile is replaced at the end of the run)
+        fmt: One of METRICS_FORMATS (default: prometheus for a .prom
+             file, otherwise jsonl)
+        profile: Optional file to write cProfile statistics to
+        trace_memory: Trace allocations with tracemalloc and report the
+                      peak and the top allocation sites
+    """
+    global _recorder, _session
+    if fmt is None:
+        fmt = 'prometheus' if output and output.endswith('.prom') else 'jsonl'
+    if fmt not in METRICS_FORMATS:
+        raise ValueError(f"unknown metrics format: {fmt}")
+    _recorder = Recorder(script, output if output and fmt == 'jsonl' else None)
+    _session = _Session(output, fmt, profile, trace_memory)
+    if trace_memory:
+        import tracemalloc
+        tracemalloc.start()
+    if profile:
+        import cProfile
+        _session.profiler = cProfile.Profile()
+        _session.profiler.enable()
+
+
+def pool_options():
+    """
+    Return ProcessPoolExecutor keyword arguments that start each worker
+    with a fresh recorder of its own (empty when disabled).
+    """
+    if _recorder is None:
+        return {}
+    return {'initializer': _init_worker,
+            'initargs': (_recorder.script, _recorder.events_path)}
+
+
+def _init_worker(script, events_path):
+    """Pool initializer: record this worker's stages from zero."""
+    global _recorder, _session
+    # A forked worker inherits the parent's recorder and session
+    _session = None
+    _recorder = Recorder(script, events_path)
+
+
+def collect():
+    """In a worker, take its totals to return to the parent (None when disabled)."""
+    if _recorder is None:
+        return None
+    return _recorder.take()
+
+
+def merge(totals):
+    """In the parent, add totals returned by a worker's collect()."""
+    if _recorder is not None and totals:
+        _recorder.merge(totals)
+
+
+def summary():
+    """Return the totals so far as a JSON-ready dict (None when disabled)."""
+    if _recorder is None:
+        return None
+    with _recorder.lock:
+        return {
+            'script': _recorder.script,
+            'wall_seconds': round(time.perf_counter() - _recorder.started, 6),
+            'stages': {name: {'calls': calls, 'seconds': round(seconds, 6),
+                              'max_seconds': round(longest, 6)}
+                       for name, (calls, seconds, longest) in _recorder.stages.items()},
+            'counters': dict(_recorder.counters),
+        }
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_prometheus(totals):
+    """Render a summary() as Prometheus text exposition format."""
+    prefix = PROMETHEUS_PREFIX
+    script = _label(totals['script'])
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{prefix}_{name}{{{labels}}} {value}")
+
+    stages = sorted(totals['stages'].items())
+    metric('stage_seconds_total', 'counter', "Time spent in each stage.",
+           [(f'script="{script}",stage="{_label(name)}"', values['seconds'])
+            for name, values in stages])
+    metric('stage_calls_total', 'counter', "Passes through each stage.",
+           [(f'script="{script}",stage="{_label(name)}"', values['calls'])
+            for name, values in stages])
+    metric('stage_max_seconds', 'gauge', "Longest single pass through each stage.",
+           [(f'script="{script}",stage="{_label(name)}"', values['max_seconds'])
+            for name, values in stages])
+    for name, value in sorted(totals['counters'].items()):
+        metric(f'{name}_total', 'counter', f"Count of {name}.", [(f'script="{script}"', value)])
+    if 'peak_traced_bytes' in totals:
+        metric('peak_traced_bytes', 'gauge', "Peak memory traced by tracemalloc.",
+               [(f'script="{script}"', totals['peak_traced_bytes'])])
+    metric('run_seconds', 'gauge', "Wall time of the last run.",
+           [(f'script="{script}"', totals['wall_seconds'])])
+    metric('last_run_timestamp_seconds', 'gauge', "When the last run finished.",
+           [(f'script="{script}"', round(time.time(), 3))])
+    return '\n'.join(lines) + '\n'
+
+
+def print_summary(totals):
+    """Print a summary() as a table, slowest stage first."""
+    wall = max(totals['wall_seconds'], 1e-9)
+    print(f"\n{'='*50}")
+    print(f"Stage timings ({totals['script']}, {wall:.2f}s wall):")
+    print(f"  {'stage':<14}{'calls':>8}{'total s':>10}{'mean ms':>10}{'max ms':>10}{'share':>8}")
+    stages = sorted(totals['stages'].items(), key=lambda pair: -pair[1]['seconds'])
+    for name, values in stages:
+        mean = values['seconds'] / max(values['calls'], 1) * 1000
+        print(f"  {name:<14}{values['calls']:>8}{values['seconds']:>10.3f}{mean:>10.2f}"
+              f"{values['max_seconds'] * 1000:>10.2f}{values['seconds'] / wall:>8.1%}")
+    for name, value in sorted(totals['counters'].items()):
+        print(f"  {name}: {value}")
+    print("  (stages in parallel workers overlap, so shares can exceed 100%)")
+    print(f"{'='*50}")
+
+
+def finish():
+    """
+    Stop measuring, write the metrics and profiles, and print the summary.
+
+    Safe to call when instrumentation was never enabled.
+    """
+    global _recorder, _session
+    if _recorder is None:
+        return
+    session = _session
+    if session.profiler is not None:
+        session.profiler.disable()
+    totals = summary()
+
+    if session.trace_memory:
+        import tracemalloc
+        _, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics('lineno')[:TRACE_MEMORY_TOP]
+        tracemalloc.stop()
+        totals['peak_traced_bytes'] = peak
+        print(f"\nPeak traced memory: {peak / 1024 / 1024:.1f} MB; largest live allocations:")
+        for statistic in top:
+            print(f"  {statistic}")
+
+    if session.profiler is not None:
+        session.profiler.dump_stats(session.profile_path)
+        print(f"\nProfile written to {session.profile_path} "
+              f"(view with: python -m pstats {session.profile_path})")
+
+    try:
+        if session.output and session.format == 'jsonl':
+            _recorder.events.write(json.dumps({'time': round(time.time(), 6), 'summary': True,
+                                               **totals}) + '\n')
+        elif session.output:
+            temp_path = session.output + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8', newline='\n') as f:
+                f.write(format_prometheus(totals))
+            os.replace(temp_path, session.output)
+    except OSError as e:
+        print(f"Warning: could not write metrics to {session.output}: {e}")
+    finally:
+        _recorder.close()
+        _recorder = None
+        _session = None
+
+    print_summary(totals)
+    if session.output:
+        print(f"Metrics written to {session.output}")
+
+
+def add_arguments(parser):
+    """Add the --metrics, --metrics-format, --cprofile and --trace-memory options."""
+    group = parser.add_argument_group('instrumentation')
+    group.add_argument(
+        '--metrics', default=None, metavar='FILE',
+        help="time every stage and write the results to FILE: JSON lines (appended) "
+             "or, for a .prom file, a Prometheus textfile"
+    )
+    group.add_argument(
+        '--metrics-format', choices=METRICS_FORMATS, default=None,
+        help="format of --metrics (default: prometheus for .prom files, otherwise jsonl)"
+    )
+    group.add_argument(
+        '--cprofile', default=None, metavar='FILE',
+        help="run under cProfile and write the statistics to FILE (main process "
+             "only; use -j 1 to profile the conversions themselves)"
+    )
+    group.add_argument(
+        '--trace-memory', action='store_true',
+        help="trace allocations with tracemalloc and report the peak and top sites"
+    )
+
+
+def enable_from_args(script, args):
+    """
+    Enable instrumentation if any add_arguments() option was given.
+
+    A stage summary without an output file is printed for --cprofile and
+    --trace-memory too.
+
+    Returns:
+        True if instrumentation was enabled
+    """
+    if not (args.metrics or args.cprofile or args.trace_memory):
+        return False
+    enable(script, args.metrics, args.metrics_format, args.cprofile, args.trace_memory)
+    return True
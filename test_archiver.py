@@ -0,0 +1,568 @@
+"""
+Tests for the content-defined chunking and chunk store in archiver.py,
+for the parallel block compressor and single-file extraction from
+seekable archives, and for tar backup chains, verification and files
+that change while they are archived.
+
+Chunk boundaries are checked against a plain byte-by-byte gear hash, the
+definition the vectorised boundary search has to match exactly.
+
+Run with: python -m pytest test_archiver.py
+"""
+
+import gzip
+import hashlib
+import io
+import os
+import random
+import tarfile
+import zlib
+
+import pytest
+
+import archiver
+from archiver import CHUNK_MASK, CHUNK_MAX_SIZE, CHUNK_MIN_SIZE, GEAR
+
+
+def reference_boundary(data, start):
+    """find_chunk_boundary written out as the gear hash is defined."""
+    limit = min(len(data), start + CHUNK_MAX_SIZE)
+    position = start + CHUNK_MIN_SIZE
+    if position >= limit:
+        return limit
+    h = 0
+    for byte in data[position:limit]:
+        h = ((h << 1) + GEAR[byte]) & 0xFFFFFFFF
+        position += 1
+        if not h & CHUNK_MASK:
+            return position
+    return limit
+
+
+def reference_chunks(data):
+    chunks = []
+    start = 0
+    while start < len(data):
+        end = reference_boundary(data, start)
+        chunks.append(data[start:end])
+        start = end
+    return chunks
+
+
+def random_bytes(size, seed=0):
+    return random.Random(seed).randbytes(size)
+
+
+def low_entropy_bytes(size, seed=0):
+    """Text-like data: few distinct bytes, long repeats."""
+    rng = random.Random(seed)
+    words = [bytes(rng.choice(b'abc \n') for _ in range(rng.randint(1, 9))) for _ in range(50)]
+    data = bytearray()
+    while len(data) < size:
+        data += rng.choice(words)
+    return bytes(data[:size])
+
+
+CORPORA = {
+    'random': random_bytes(1_500_000, seed=1),
+    'text': low_entropy_bytes(900_000, seed=2),
+    'zeros': bytes(CHUNK_MAX_SIZE * 2 + 123),
+    'short': random_bytes(CHUNK_MIN_SIZE + 40, seed=3),
+    'tiny': b'abc',
+}
+
+
+@pytest.mark.parametrize('window_size,skip', [(1, 0), (31, 0), (32, 0), (100, 0), (100, 31),
+                                              (5000, 17)])
+def test_gear_hash_mask_bits_matches_the_rolling_hash(window_size, skip):
+    window = random_bytes(window_size, seed=window_size)
+    expected = bytearray()
+    h = 0
+    for byte in window:
+        h = ((h << 1) + GEAR[byte]) & 0xFFFFFFFF
+        expected.append(0 if not h & CHUNK_MASK else 1)
+    mask_bits = archiver.gear_hash_mask_bits(window, skip)
+    assert len(mask_bits) == window_size - skip
+    assert [bool(value) for value in mask_bits] == [bool(value) for value in expected[skip:]]
+
+
+@pytest.mark.parametrize('name', sorted(CORPORA))
+def test_boundaries_match_the_reference(name):
+    data = CORPORA[name]
+    start = 0
+    while start < len(data):
+        end = archiver.find_chunk_boundary(data, start)
+        assert end == reference_boundary(data, start)
+        start = end
+
+
+def test_boundary_from_an_offset_in_the_buffer():
+    data = CORPORA['random']
+    for start in (1, 31, 32, 4099, 500_000):
+        assert archiver.find_chunk_boundary(data, start) == reference_boundary(data, start)
+
+
+@pytest.mark.parametrize('name', sorted(CORPORA))
+def test_file_chunks_reassemble_and_respect_the_size_limits(name, monkeypatch):
+    data = CORPORA[name]
+    # Small reads make the chunker refill its buffer mid-file
+    monkeypatch.setattr(archiver, 'CHUNK_READ_SIZE', 100_003)
+    chunks = list(archiver.iter_file_chunks(io.BytesIO(data)))
+    assert b''.join(chunks) == data
+    assert chunks == reference_chunks(data)
+    assert all(len(chunk) <= CHUNK_MAX_SIZE for chunk in chunks)
+    assert all(len(chunk) >= CHUNK_MIN_SIZE for chunk in chunks[:-1])
+
+
+def test_insertion_only_changes_nearby_chunks():
+    data = CORPORA['random']
+    edited = data[:200_000] + b'inserted bytes' + data[200_000:]
+    before = list(archiver.iter_file_chunks(io.BytesIO(data)))
+    after = list(archiver.iter_file_chunks(io.BytesIO(edited)))
+    assert len(before) > 10
+    assert len(set(after) - set(before)) <= 2
+
+
+def test_chunk_store_dedupes_and_checks_chunks(tmp_path):
+    store = archiver.ChunkStore(str(tmp_path / 'chunks'))
+    chunk_id = store.put(b'hello')
+    assert chunk_id == hashlib.sha256(b'hello').hexdigest()
+    assert store.put(b'hello') == chunk_id
+    assert (store.new_chunks, store.reused_chunks) == (1, 1)
+    assert store.get(chunk_id) == b'hello'
+
+    # A store reopened on the same directory knows what is already there
+    reopened = archiver.ChunkStore(str(tmp_path / 'chunks'))
+    reopened.put(b'hello')
+    assert (reopened.new_chunks, reopened.reused_chunks) == (0, 1)
+
+    with pytest.raises(FileNotFoundError):
+        store.get(hashlib.sha256(b'missing').hexdigest())
+    other_id = store.put(b'other')
+    os.replace(store._path(other_id, 'gzip'), store._path(chunk_id, 'gzip'))
+    with pytest.raises(ValueError, match='corrupt'):
+        store.get(chunk_id)
+
+
+def make_tree(root):
+    """Write a small source tree; returns {relative path: contents}."""
+    contents = {
+        'big.bin': CORPORA['random'][:700_000],
+        'copy.bin': CORPORA['random'][:700_000],
+        'docs/notes.txt': CORPORA['text'][:50_000],
+        'docs/empty.txt': b'',
+    }
+    for relative_path, data in contents.items():
+        path = root / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    (root / 'empty_dir').mkdir()
+    return contents
+
+
+def read_tree(root):
+    return {path.relative_to(root).as_posix(): path.read_bytes()
+            for path in root.rglob('*') if path.is_file()}
+
+
+def test_chunk_backup_restores_every_snapshot(tmp_path):
+    src, dst = tmp_path / 'src', tmp_path / 'dst'
+    contents = make_tree(src)
+    archiver.create_chunk_backup(str(src), str(dst), 'first')
+    first = dict(contents)
+
+    # Edit one file in the middle and delete another
+    edited = contents['big.bin'][:300_000] + b'edit' + contents['big.bin'][300_000:]
+    (src / 'big.bin').write_bytes(edited)
+    (src / 'docs' / 'notes.txt').unlink()
+    index_path = archiver.create_chunk_backup(str(src), str(dst), 'second')
+
+    snapshots = {snapshot['name']: snapshot for snapshot in archiver.load_snapshots(str(dst))}
+    second = snapshots['second']
+    assert sorted(second['archived']) == ['big.bin']
+    assert second['deleted'] == ['docs/notes.txt']
+    assert second['files']['big.bin']['sha256'] == hashlib.sha256(edited).hexdigest()
+    assert os.path.exists(index_path)
+
+    for name, expected in (('first', first),
+                           ('second', {'big.bin': edited, 'copy.bin': contents['copy.bin'],
+                                       'docs/empty.txt': b''})):
+        target = tmp_path / f'restore-{name}'
+        assert archiver.restore_backup(str(dst), str(target), name) == len(expected)
+        assert read_tree(target) == expected
+        assert (target / 'empty_dir').is_dir()
+        assert (os.stat(target / 'big.bin').st_mtime_ns
+                == snapshots[name]['files']['big.bin']['mtime_ns'])
+
+
+def test_chunk_backup_stores_shared_chunks_once(tmp_path):
+    src, dst = tmp_path / 'src', tmp_path / 'dst'
+    make_tree(src)
+    archiver.create_chunk_backup(str(src), str(dst), 'first')
+    store = archiver.ChunkStore(str(dst / archiver.CHUNK_STORE_DIR))
+    # copy.bin is identical to big.bin, so it adds no chunks of its own
+    expected = {hashlib.sha256(chunk).hexdigest()
+                for name in ('big.bin', 'docs/notes.txt', 'docs/empty.txt')
+                for chunk in archiver.iter_file_chunks(io.BytesIO((src / name).read_bytes()))}
+    assert store.known == expected
+
+
+def test_dedup_ratio_counts_each_referenced_chunk_once(tmp_path, capsys):
+    src, dst = tmp_path / 'src', tmp_path / 'dst'
+    src.mkdir()
+    data = random_bytes(400_000, seed=9)  # incompressible: stored size ~ raw size
+    for name in ('a.bin', 'b.bin', 'c.bin'):
+        (src / name).write_bytes(data)
+    archiver.create_chunk_backup(str(src), str(dst), 'first')
+    first = capsys.readouterr().out
+
+    # A second, unchanged snapshot writes nothing but still uses every chunk
+    archiver.create_chunk_backup(str(src), str(dst), 'second')
+    second = capsys.readouterr().out
+
+    store = archiver.ChunkStore(str(dst / archiver.CHUNK_STORE_DIR))
+    stored = sum(store.stored_size(chunk_id) for chunk_id in store.known)
+    expected = f"Dedup ratio: {3 * len(data) / stored:.2f}x"
+    assert expected in first and expected in second
+    assert 2.9 < 3 * len(data) / stored <= 3.0
+    assert 'Chunked data: 0.0 MB new -> 0.0 MB stored, 0.0 MB reused' in second
+    with pytest.raises(FileNotFoundError):
+        store.stored_size('0' * 64)
+
+
+def test_restore_detects_a_corrupt_chunk(tmp_path):
+    src, dst = tmp_path / 'src', tmp_path / 'dst'
+    (src / 'docs').mkdir(parents=True)
+    (src / 'docs' / 'a.txt').write_bytes(b'first version')
+    archiver.create_chunk_backup(str(src), str(dst), 'first')
+    chunk_id = hashlib.sha256(b'first version').hexdigest()
+    store = archiver.ChunkStore(str(dst / archiver.CHUNK_STORE_DIR))
+    path = store._path(chunk_id, 'gzip')
+    with open(path, 'wb') as f:
+        f.write(zlib.compress(b'tampered data'))
+    with pytest.raises(ValueError, match='corrupt'):
+        archiver.restore_backup(str(dst), str(tmp_path / 'restore'))
+
+
+# --- Parallel block compression ---------------------------------------------
+
+AVAILABLE_COMPRESSIONS = ['gzip'] + (['zstd'] if archiver.zstd is not None else [])
+
+
+def decompress_stream(data, compression):
+    """Decompress every gzip member or zstd frame, as gzip/zstd readers do."""
+    if compression == 'zstd':
+        return archiver.zstd.decompress(data)
+    return gzip.decompress(data)
+
+
+def write_tar(fileobj):
+    """Write a small tar of mixed files to a file object."""
+    with tarfile.open(fileobj=fileobj, mode='w') as tar:
+        for name, data in (('random.bin', random_bytes(300_000, seed=8)),
+                           ('text.txt', CORPORA['text'][:200_000]),
+                           ('empty', b'')):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = 1_700_000_000
+            tar.addfile(info, io.BytesIO(data))
+
+
+@pytest.mark.parametrize('compression', AVAILABLE_COMPRESSIONS)
+@pytest.mark.parametrize('jobs', [2, 4])
+@pytest.mark.parametrize('block_size', [1000, 64 * 1024, archiver.BLOCK_SIZE])
+def test_parallel_writer_output_decompresses_to_the_tar_stream(compression, jobs, block_size):
+    expected = io.BytesIO()
+    write_tar(expected)
+    expected = expected.getvalue()
+    raw = io.BytesIO()
+    with archiver.ParallelCompressWriter(raw, compression, jobs=jobs,
+                                         block_size=block_size) as out:
+        write_tar(out)
+    data = raw.getvalue()
+
+    assert decompress_stream(data, compression) == expected
+    assert out.raw_size == len(expected)
+    assert sum(out.block_lengths) == len(data) == out.compressed_size
+    assert len(out.block_lengths) == -(-len(expected) // block_size)
+    # Every block is a complete member on its own
+    offset = 0
+    for i, length in enumerate(out.block_lengths):
+        assert (decompress_stream(data[offset:offset + length], compression)
+                == expected[i * block_size:(i + 1) * block_size])
+        offset += length
+
+
+@pytest.mark.parametrize('compression', AVAILABLE_COMPRESSIONS)
+def test_parallel_writer_empty_output_is_still_valid(compression):
+    raw = io.BytesIO()
+    archiver.ParallelCompressWriter(raw, compression, jobs=2).close()
+    assert raw.getvalue()
+    assert decompress_stream(raw.getvalue(), compression) == b''
+
+
+# --- Seekable archives ------------------------------------------------------
+
+# Small blocks so that files start mid-block and span several blocks
+SEEK_BLOCK_SIZE = 4096
+
+
+@pytest.fixture(params=AVAILABLE_COMPRESSIONS)
+def seekable_archive(request, tmp_path):
+    """A seekable archive of a small tree; returns (archive path, contents)."""
+    src = tmp_path / 'src'
+    contents = {
+        'empty.txt': b'',
+        'one.txt': b'x',
+        'block.bin': random_bytes(SEEK_BLOCK_SIZE, seed=4),
+        'docs/spans.bin': random_bytes(5 * SEEK_BLOCK_SIZE + 77, seed=5),
+        'docs/text.txt': CORPORA['text'][:30_000],
+        'last.bin': random_bytes(1234, seed=6),
+    }
+    for relative_path, data in contents.items():
+        path = src / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    archive_path = archiver.create_archive(str(src), str(tmp_path / 'dst'), 'seek',
+                                           compression=request.param, jobs=2,
+                                           block_size=SEEK_BLOCK_SIZE, seekable=True)
+    return archive_path, contents
+
+
+def test_extract_member_returns_every_file(seekable_archive):
+    archive_path, contents = seekable_archive
+    index = archiver.load_seek_index(archive_path)
+    assert sorted(index['members']) == sorted(contents)
+    assert len(index['blocks']) > 10
+    for relative_path, data in contents.items():
+        out = io.BytesIO()
+        assert archiver.extract_member(archive_path, relative_path, out, index) == len(data)
+        assert out.getvalue() == data
+
+
+def test_seek_index_agrees_with_the_tar(seekable_archive):
+    archive_path, contents = seekable_archive
+    assert archiver.verify_archive(archive_path)
+    index = archiver.load_seek_index(archive_path)
+    with archiver.tarfile.open(archive_path, 'r:*') as tar:
+        for member in tar:
+            if member.isreg() and member.name in contents:
+                entry = index['members'][member.name]
+                assert entry['block'] * SEEK_BLOCK_SIZE + entry['skip'] == member.offset_data
+                assert tar.extractfile(member).read() == contents[member.name]
+
+
+def test_extract_member_reads_only_the_blocks_it_spans(seekable_archive):
+    archive_path, contents = seekable_archive
+    index = archiver.load_seek_index(archive_path)
+    entry = index['members']['docs/spans.bin']
+    first = entry['block']
+    last = (entry['skip'] + entry['size'] - 1) // SEEK_BLOCK_SIZE + first
+    # Wreck every other block; the member must still come out intact
+    with open(archive_path, 'r+b') as f:
+        for block, (offset, length) in enumerate(index['blocks']):
+            if not first <= block <= last:
+                f.seek(offset)
+                f.write(bytes(length))
+    out = io.BytesIO()
+    archiver.extract_member(archive_path, 'docs/spans.bin', out, index)
+    assert out.getvalue() == contents['docs/spans.bin']
+
+
+def test_extract_member_checks_the_checksum(seekable_archive):
+    archive_path, _ = seekable_archive
+    index = archiver.load_seek_index(archive_path)
+    index['members']['one.txt']['sha256'] = hashlib.sha256(b'y').hexdigest()
+    with pytest.raises(ValueError, match='checksum'):
+        archiver.extract_member(archive_path, 'one.txt', io.BytesIO(), index)
+    with pytest.raises(KeyError):
+        archiver.extract_member(archive_path, 'missing.txt', io.BytesIO(), index)
+
+
+def test_extract_files_writes_requested_files_only(seekable_archive, tmp_path):
+    archive_path, contents = seekable_archive
+    out_dir = tmp_path / 'out'
+    paths = ['docs/spans.bin', 'empty.txt', 'missing.txt', '../escape.txt']
+    assert archiver.extract_files(archive_path, paths, str(out_dir)) == 2
+    assert read_tree(out_dir) == {'docs/spans.bin': contents['docs/spans.bin'],
+                                  'empty.txt': b''}
+    assert not (tmp_path / 'escape.txt').exists()
+
+
+def test_archive_without_seek_index(tmp_path):
+    src = tmp_path / 'src'
+    src.mkdir()
+    (src / 'a.txt').write_bytes(b'a')
+    archive_path = archiver.create_archive(str(src), str(tmp_path / 'dst'), 'plain', jobs=1)
+    with pytest.raises(FileNotFoundError):
+        archiver.load_seek_index(archive_path)
+    assert archiver.extract_files(archive_path, ['a.txt'], str(tmp_path / 'out')) is None
+    assert archiver.list_archive(archive_path) is None
+
+
+# --- Incremental and differential tar backups -------------------------------
+
+def tree_state(root):
+    """(files with contents, directories) under root."""
+    directories = sorted(path.relative_to(root).as_posix()
+                         for path in root.rglob('*') if path.is_dir())
+    return read_tree(root), directories
+
+
+def test_full_incremental_differential_restore_chain(tmp_path):
+    src, dst = tmp_path / 'src', tmp_path / 'dst'
+    for relative_path, data in {'a.txt': b'a', 'b.txt': b'b', 'c.txt': b'c',
+                                'gone/inner/x.txt': b'x'}.items():
+        path = src / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    archiver.create_archive(str(src), str(dst), 'full', jobs=1)
+    states = {'full': tree_state(src)}
+
+    (src / 'new.txt').write_bytes(b'added')
+    (src / 'a.txt').write_bytes(b'a, modified')
+    (src / 'c.txt').unlink()
+    (src / 'empty_new').mkdir()
+    (src / 'gone' / 'inner' / 'x.txt').unlink()
+    (src / 'gone' / 'inner').rmdir()
+    (src / 'gone').rmdir()
+    archiver.create_archive(str(src), str(dst), 'incr', jobs=2, mode='incremental')
+    states['incr'] = tree_state(src)
+
+    (src / 'b.txt').write_bytes(b'b, modified')
+    archiver.create_archive(str(src), str(dst), 'diff', compression='gzip', mode='differential')
+    states['diff'] = tree_state(src)
+
+    snapshots = {snapshot['name']: snapshot for snapshot in archiver.load_snapshots(str(dst))}
+    incr, diff = snapshots['incr'], snapshots['diff']
+    assert (incr['base'], diff['base']) == ('full', 'full')
+    assert sorted(incr['archived']) == ['a.txt', 'empty_new', 'new.txt']
+    assert incr['deleted'] == ['c.txt', 'gone/inner/x.txt']
+    assert incr['deleted_directories'] == ['gone', 'gone/inner']
+    assert sorted(diff['archived']) == ['a.txt', 'b.txt', 'empty_new', 'new.txt']
+    assert diff['deleted'] == incr['deleted']
+
+    for name, expected in states.items():
+        target = tmp_path / f'restore-{name}'
+        assert archiver.restore_backup(str(dst), str(target), name) == len(expected[0])
+        assert tree_state(target) == expected
+    assert tree_state(tmp_path / 'restore-incr')[1] == ['empty_new']
+
+
+def test_file_gone_before_it_is_archived_is_recorded_as_deleted(tmp_path, monkeypatch):
+    src, dst = tmp_path / 'src', tmp_path / 'dst'
+    src.mkdir()
+    (src / 'a.txt').write_bytes(b'a')
+    (src / 'b.txt').write_bytes(b'b')
+    archiver.create_archive(str(src), str(dst), 'full', jobs=1)
+
+    (src / 'b.txt').write_bytes(b'b, modified')
+    scan_source = archiver.scan_source
+
+    def scan_then_delete(*args, **kwargs):
+        result = scan_source(*args, **kwargs)
+        (src / 'b.txt').unlink()  # after the scan, before the archive is written
+        return result
+
+    monkeypatch.setattr(archiver, 'scan_source', scan_then_delete)
+    archiver.create_archive(str(src), str(dst), 'incr', jobs=1, mode='incremental')
+
+    incr = {snapshot['name']: snapshot for snapshot in archiver.load_snapshots(str(dst))}['incr']
+    assert (incr['archived'], incr['deleted'], list(incr['files'])) == ([], ['b.txt'], ['a.txt'])
+    # The copy of b.txt from the full backup is not restored as if current
+    target = tmp_path / 'restore'
+    archiver.restore_backup(str(dst), str(target))
+    assert read_tree(target) == {'a.txt': b'a'}
+
+
+# --- Verification and files changing during a backup ------------------------
+
+@pytest.fixture
+def verified_archive(tmp_path):
+    src = tmp_path / 'src'
+    (src / 'docs').mkdir(parents=True)
+    (src / 'a.bin').write_bytes(random_bytes(200_000, seed=7))
+    (src / 'docs' / 'b.txt').write_bytes(CORPORA['text'][:50_000])
+    return archiver.create_archive(str(src), str(tmp_path / 'dst'), 'verify', jobs=1)
+
+
+def test_verify_passes_on_a_fresh_archive(verified_archive, capsys):
+    assert archiver.verify_archive(verified_archive)
+    assert 'Verification passed!' in capsys.readouterr().out
+
+
+def test_verify_reports_a_flipped_byte(verified_archive, capsys):
+    # Flip a byte of a.bin's data in the uncompressed tar and recompress,
+    # so the gzip stream itself stays valid
+    with gzip.open(verified_archive, 'rb') as f:
+        data = bytearray(f.read())
+    with tarfile.open(fileobj=io.BytesIO(bytes(data))) as tar:
+        data[tar.getmember('a.bin').offset_data + 1000] ^= 0xFF
+    with gzip.open(verified_archive, 'wb') as f:
+        f.write(bytes(data))
+    assert not archiver.verify_archive(verified_archive)
+    out = capsys.readouterr().out
+    assert '✗ a.bin: checksum mismatch' in out
+    assert 'Verification failed!' in out
+
+
+def test_verify_reports_a_truncated_archive(verified_archive, capsys):
+    with open(verified_archive, 'r+b') as f:
+        f.truncate(os.path.getsize(verified_archive) // 2)
+    assert not archiver.verify_archive(verified_archive)
+    assert 'truncated or corrupt' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_file_that_shrinks_while_archived_is_skipped(tmp_path, monkeypatch, jobs):
+    src, dst = tmp_path / 'src', tmp_path / 'dst'
+    src.mkdir()
+    (src / 'a.txt').write_bytes(b'a' * 5000)
+    (src / 'shrinks.bin').write_bytes(b's' * 100_000)
+    (src / 'z.txt').write_bytes(b'z')
+    read = archiver.HashingReader.read
+
+    def read_then_truncate(self, size=-1):
+        data = read(self, size)
+        if self.fileobj.name.endswith('shrinks.bin') and self.size == len(data):
+            os.truncate(self.fileobj.name, 10)  # after the first read of the file
+        return data
+
+    monkeypatch.setattr(archiver.HashingReader, 'read', read_then_truncate)
+    archive_path = archiver.create_archive(str(src), str(dst), 'shrink', jobs=jobs)
+    monkeypatch.undo()
+
+    snapshot = archiver.load_snapshots(str(dst))[0]
+    assert sorted(snapshot['files']) == ['a.txt', 'z.txt']
+    assert 'shrinks.bin' not in snapshot['archived']
+    assert sorted(archiver.parse_manifest(
+        open(archiver.manifest_path_for(archive_path), 'rb').read())) == ['a.txt', 'z.txt']
+    with tarfile.open(archive_path, 'r:*') as tar:
+        assert sorted(tar.getnames()) == [archiver.MANIFEST_NAME, 'a.txt', 'z.txt']
+    assert archiver.verify_archive(archive_path)
+    assert sorted(os.listdir(dst)) == sorted([
+        os.path.basename(archive_path),
+        os.path.basename(archiver.manifest_path_for(archive_path)),
+        os.path.basename(archiver.snapshot_path_for(str(dst), 'shrink')),
+    ])
+
+
+def test_file_that_shrinks_after_the_scan_is_archived_as_it_is_now(tmp_path, monkeypatch):
+    src, dst = tmp_path / 'src', tmp_path / 'dst'
+    src.mkdir()
+    (src / 'a.txt').write_bytes(b'a' * 5000)
+    scan_source = archiver.scan_source
+
+    def scan_then_truncate(*args, **kwargs):
+        result = scan_source(*args, **kwargs)
+        os.truncate(src / 'a.txt', 3)
+        return result
+
+    monkeypatch.setattr(archiver, 'scan_source', scan_then_truncate)
+    archive_path = archiver.create_archive(str(src), str(dst), 'shrunk', jobs=1)
+    assert archiver.load_snapshots(str(dst))[0]['files']['a.txt']['size'] == 3
+    assert archiver.verify_archive(archive_path)
+    assert not os.path.exists(archive_path + '.tmp')
+    target = tmp_path / 'restore'
+    archiver.restore_backup(str(dst), str(target))
+    assert read_tree(target) == {'a.txt': b'aaa'}
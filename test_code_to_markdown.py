@@ -0,0 +1,465 @@
+"""
+Tests for SourceFile, the size-capped reader behind code_to_markdown.py,
+for the tree walk that feeds it, for bundle shards and their index, for
+the outline cache and its pruning, and for language detection and output
+names that differ only in case.
+
+The code fence must always be longer than any run of backticks in the
+file, including runs that straddle the COPY_CHUNK_SIZE boundary scan()
+reads across, and files of MMAP_THRESHOLD bytes or more that are
+memory-mapped rather than read.
+
+Run with: python -m pytest test_code_to_markdown.py
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+import pytest
+
+import code_to_markdown
+import source_tree
+from code_to_markdown import COPY_CHUNK_SIZE, MMAP_THRESHOLD, SourceFile
+
+
+def scanned(data, **kwargs):
+    """Scan in-memory contents; returns (scan result, SourceFile)."""
+    source = SourceFile('example.py', data=data, **kwargs)
+    return source.scan(), source
+
+
+@pytest.mark.parametrize('data,fence', [
+    (b'', '```'),
+    (b'print(1)\n', '```'),
+    (b'a `b` ``c``', '```'),
+    (b'```python\nx\n```\n', '````'),
+    (b'x = "`````"\n` ``` `\n', '``````'),
+    (b'``````', '```````'),
+])
+def test_fence_is_longer_than_the_longest_backtick_run(data, fence):
+    ok, source = scanned(data)
+    assert ok
+    assert source.fence == fence
+
+
+@pytest.mark.parametrize('before', [1, 3, 5])
+@pytest.mark.parametrize('after', [0, 1, 4])
+def test_backtick_run_straddling_a_chunk_boundary(before, after):
+    data = b'x' * (COPY_CHUNK_SIZE - before) + b'`' * (before + after) + b'\nend\n'
+    ok, source = scanned(data)
+    assert ok
+    assert source.fence == '`' * max(3, before + after + 1)
+
+
+def test_chunk_of_only_backticks_carries_the_run_through():
+    data = b'x' + b'`' * (2 * COPY_CHUNK_SIZE + 6) + b'x'
+    ok, source = scanned(data)
+    assert ok
+    assert len(source.fence) == 2 * COPY_CHUNK_SIZE + 7
+
+
+def test_runs_in_separate_chunks_are_not_joined():
+    data = b'`' * 4 + b'x' * (COPY_CHUNK_SIZE - 8) + b'````' + b'\n' + b'`' * 4
+    ok, source = scanned(data)
+    assert ok
+    assert source.fence == '`````'
+
+
+def test_memory_mapped_file_is_scanned_like_bytes(tmp_path):
+    data = (b'y' * (MMAP_THRESHOLD + 10) + b'\n') + b'`' * 9 + b'\n'
+    path = tmp_path / 'big.py'
+    path.write_bytes(data)
+    with SourceFile(path) as source:
+        assert source.skip_reason is None
+        assert source.scan()
+        assert source.fence == '`' * 10
+        assert source.length == len(data)
+        assert b''.join(source.chunks()) == data
+
+
+def test_fence_wraps_the_code_in_the_markdown():
+    _, source = scanned(b'````\n')
+    header, footer = code_to_markdown.code_markdown_parts(source, 'python')
+    assert header.endswith('`````python\n')
+    assert footer == '\n`````\n'
+
+
+def test_truncation_ignores_backticks_past_the_cap():
+    ok, source = scanned(b'short\n' + b'`' * 20 + b'\n', max_bytes=10, oversize='truncate')
+    assert ok
+    assert source.truncated
+    assert source.length == 6
+    assert source.fence == '```'
+    _, footer = code_to_markdown.code_markdown_parts(source, 'python')
+    assert 'first 6 of 27 bytes' in footer
+
+
+def test_truncation_without_a_newline_keeps_whole_characters():
+    data = 'a' + 'é' * 10
+    _, source = scanned(data.encode('utf-8'), max_bytes=4, oversize='truncate')
+    assert source.length == 3
+    assert source.text() == 'aé'
+
+
+def test_oversize_skip():
+    _, source = scanned(b'x' * 11, max_bytes=10)
+    assert source.skip_reason == '11 bytes is over the 10 byte limit'
+
+
+def test_binary_file_is_skipped():
+    source = SourceFile('example.bin', data=b'abc\0def')
+    assert source.skip_reason == 'binary file'
+
+
+def test_invalid_utf8_is_skipped_even_when_split_across_chunks():
+    data = b'x' * (COPY_CHUNK_SIZE - 1) + 'é'.encode('utf-8') + b'\xff'
+    ok, source = scanned(data)
+    assert not ok
+    assert source.skip_reason.startswith('not UTF-8 text')
+
+
+def test_multibyte_character_split_across_chunks_is_valid():
+    data = b'x' * (COPY_CHUNK_SIZE - 1) + 'é'.encode('utf-8')
+    ok, source = scanned(data)
+    assert ok
+    assert source.skip_reason is None
+
+
+def test_outputs_mirror_the_tree_and_are_not_rediscovered(tmp_path):
+    for relative_path in ('a.py', 'pkg/b.c', 'pkg/sub/c.go', 'vendor/d.py', 'deep/1/2/e.py'):
+        path = tmp_path / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text('x = 1\n', encoding='utf-8')
+
+    for _ in range(2):
+        # include='*' would pick up the .md outputs if the output dir were walked
+        outputs = code_to_markdown.find_and_convert_code_files(
+            tmp_path, include=('*',), exclude=('vendor',), max_depth=2)
+
+    output_root = tmp_path / 'markdown_output'
+    assert sorted(Path(output).relative_to(output_root).as_posix()
+                  for output in outputs.values()) == ['a.py.md', 'pkg/b.c.md', 'pkg/sub/c.go.md']
+    assert sorted(path.relative_to(output_root).as_posix()
+                  for path in output_root.rglob('*.md')) == ['a.py.md', 'pkg/b.c.md',
+                                                            'pkg/sub/c.go.md']
+
+
+def scripted_watcher(steps):
+    """
+    A polling TreeWatcher that makes one change before each batch, then
+    stops the watch loop as Ctrl+C would.
+    """
+    class ScriptedWatcher(source_tree.TreeWatcher):
+        def __init__(self, *args, **kwargs):
+            kwargs.update(interval=0.01, debounce=0.05, backend='polling')
+            super().__init__(*args, **kwargs)
+
+        def batches(self):
+            batches = super().batches()
+            for step in steps:
+                step()
+                yield next(batches)
+            raise KeyboardInterrupt
+
+    return ScriptedWatcher
+
+
+def test_watch_reconverts_each_change_once(tmp_path, monkeypatch):
+    (tmp_path / 'a.py').write_text('a = 1\n', encoding='utf-8')
+    new = tmp_path / 'pkg' / 'b.py'
+    converted = []
+    convert = code_to_markdown.convert_file_to_markdown
+
+    def spy(file_path, *args, **kwargs):
+        converted.append(Path(file_path).relative_to(tmp_path).as_posix())
+        return convert(file_path, *args, **kwargs)
+
+    def create():
+        new.parent.mkdir()
+        new.write_text('b = 1\n', encoding='utf-8')
+
+    # Conversions so far, recorded before each change and at the end
+    history = []
+
+    def then(change):
+        def step():
+            history.append(list(converted))
+            change()
+        return step
+
+    steps = [
+        then(create),
+        then(lambda: new.write_text('b = 2  # longer\n', encoding='utf-8')),
+        then(new.unlink),
+    ]
+    monkeypatch.setattr(code_to_markdown, 'convert_file_to_markdown', spy)
+    monkeypatch.setattr(code_to_markdown, 'TreeWatcher', scripted_watcher(steps))
+
+    code_to_markdown.watch_and_convert_code_files(tmp_path, include=('*.py',))
+    history.append(list(converted))
+
+    output = tmp_path / 'markdown_output' / 'pkg' / 'b.py.md'
+    assert history == [
+        ['a.py'],                                        # initial full run
+        ['a.py', 'pkg/b.py'],                            # create
+        ['a.py', 'pkg/b.py', 'pkg/b.py'],                # modify
+        ['a.py', 'pkg/b.py', 'pkg/b.py'],                # delete: nothing converted
+    ]
+    assert not output.exists()
+    assert (tmp_path / 'markdown_output' / 'a.py.md').exists()
+
+
+# --- Bundles -------------------------------------------------------------------
+
+def write_sources(root, sizes):
+    """Write one Python file per size, each line tagged with its file name."""
+    paths = []
+    for i, size in enumerate(sizes):
+        path = root / f'm{i:02d}.py'
+        line = f'x{i:02d} = 1  # {"`" * (i % 5)}\n'
+        path.write_text((line * (size // len(line) + 1))[:size], encoding='utf-8')
+        paths.append(path)
+    return paths
+
+
+def bundle(tmp_path, paths, bundle_format, **kwargs):
+    output_dir = tmp_path / 'bundle'
+    with code_to_markdown.BundleWriter(output_dir, bundle_format, **kwargs) as writer:
+        added = [writer.add_file(path, path.name) for path in paths]
+    index = [json.loads(line) for line in
+             writer.index_path.read_text(encoding='utf-8').splitlines()]
+    return writer, added, index
+
+
+@pytest.mark.parametrize('bundle_format', code_to_markdown.BUNDLE_FORMATS)
+def test_bundle_shards_roll_over_and_the_index_points_at_each_record(tmp_path, bundle_format):
+    paths = write_sources(tmp_path, [100, 250, 40, 900, 300, 10, 0, 500])
+    max_bytes = 1200
+    writer, added, index = bundle(tmp_path, paths, bundle_format, max_bytes=max_bytes)
+
+    assert all(added)
+    assert [record['path'] for record in index] == [path.name for path in paths]
+    assert len(writer.shards) > 2
+    shards = {path.name: path.read_bytes() for path in writer.shards}
+    by_shard = {}
+    for record, path in zip(index, paths):
+        by_shard.setdefault(record['shard'], []).append(record)
+        data = shards[record['shard']][record['offset']:record['offset'] + record['length']]
+        content = path.read_text(encoding='utf-8')
+        assert record['sha256'] == hashlib.sha256(content.encode('utf-8')).hexdigest()
+        assert record['size'] == len(content)
+        if bundle_format == 'jsonl':
+            entry = json.loads(data)
+            assert (entry['path'], entry['content'], entry['language']) == \
+                (path.name, content, 'python')
+        else:
+            text = data.decode('utf-8')
+            assert text.startswith(f'## {path.name}\n')
+            assert '\n' + content + '\n' in text
+
+    for name, records in by_shard.items():
+        # Records are back to back from the end of the header to the end of the shard
+        for previous, record in zip(records, records[1:]):
+            assert record['offset'] == previous['offset'] + previous['length']
+        assert records[-1]['offset'] + records[-1]['length'] == len(shards[name])
+        assert len(shards[name]) <= max_bytes or len(records) == 1
+    assert sorted(by_shard) == sorted(shards)
+
+
+def test_oversized_file_gets_a_shard_of_its_own(tmp_path):
+    paths = write_sources(tmp_path, [50, 5000, 50])
+    writer, _, index = bundle(tmp_path, paths, 'md', max_bytes=1000)
+    assert [record['shard'] for record in index] == ['bundle-00000.md', 'bundle-00001.md',
+                                                     'bundle-00002.md']
+    assert index[1]['offset'] == writer.shards[1].read_bytes().index(b'## m01.py')
+
+
+def test_token_budget_caps_the_shard_size(tmp_path):
+    paths = write_sources(tmp_path, [100] * 6)
+    writer, _, _ = bundle(tmp_path, paths, 'jsonl')
+    assert len(writer.shards) == 1
+    writer, _, _ = bundle(tmp_path, paths, 'jsonl', max_tokens=200)
+    assert writer.max_bytes == 200 * code_to_markdown.BYTES_PER_TOKEN
+    assert len(writer.shards) > 1
+    assert all(path.stat().st_size <= writer.max_bytes for path in writer.shards)
+
+
+def test_skipped_files_are_left_out_and_old_shards_removed(tmp_path):
+    paths = write_sources(tmp_path, [400] * 4)
+    writer, _, _ = bundle(tmp_path, paths, 'md', max_bytes=500)
+    assert len(writer.shards) == 4
+
+    binary = tmp_path / 'data.py'
+    binary.write_bytes(b'\0\1\2')
+    writer, added, index = bundle(tmp_path, paths[:1] + [binary], 'md', max_bytes=500)
+    assert added == [True, False]
+    assert [record['path'] for record in index] == ['m00.py']
+    assert sorted(path.name for path in (tmp_path / 'bundle').iterdir()) == [
+        'bundle-00000.md', 'bundle-index.jsonl']
+
+
+# --- Outline cache -------------------------------------------------------------
+
+@pytest.fixture
+def outliner_calls(monkeypatch):
+    """Count the parses the Python outliner does, with the outliner still run."""
+    calls = []
+    outliner = code_to_markdown.OUTLINERS['python']
+
+    def counted(text):
+        calls.append(text)
+        return outliner(text)
+
+    monkeypatch.setitem(code_to_markdown.OUTLINERS, 'python', counted)
+    return calls
+
+
+def outline(data, cache_dir, language_tag='python'):
+    ok, source = scanned(data)
+    assert ok
+    cache_keys = set()
+    symbols = code_to_markdown.get_outline(source, language_tag, cache_dir, cache_keys)
+    return symbols, cache_keys
+
+
+def test_outline_cache_hit_and_invalidation(tmp_path, outliner_calls):
+    first = b'def f():\n    pass\n'
+    second = b'def g():\n    pass\n'
+    first_hash = hashlib.sha256(first).hexdigest()
+
+    symbols, keys = outline(first, tmp_path)
+    assert [symbol['name'] for symbol in symbols] == ['f']
+    assert keys == {first_hash}
+    assert outline(first, tmp_path) == (symbols, keys)
+    assert len(outliner_calls) == 1
+
+    # New contents are a new key; the old entry stays until pruned
+    assert [symbol['name'] for symbol in outline(second, tmp_path)[0]] == ['g']
+    assert len(outliner_calls) == 2
+    assert code_to_markdown.outline_cache_path(tmp_path, first_hash).exists()
+
+    # Entries of another outliner version or language, or unreadable ones, are reparsed
+    cache_file = code_to_markdown.outline_cache_path(tmp_path, first_hash)
+    for stale in ({'version': code_to_markdown.OUTLINE_VERSION + 1, 'language': 'python',
+                   'symbols': []},
+                  {'version': code_to_markdown.OUTLINE_VERSION, 'language': 'java',
+                   'symbols': []}):
+        cache_file.write_text(json.dumps(stale), encoding='utf-8')
+        assert outline(first, tmp_path)[0] == symbols
+    cache_file.write_text('{"version": ', encoding='utf-8')
+    assert outline(first, tmp_path)[0] == symbols
+    assert len(outliner_calls) == 5
+
+    # No cache directory: always parsed, nothing recorded
+    assert outline(first, None) == (symbols, set())
+    assert len(outliner_calls) == 6
+
+
+def test_no_outline_for_unsupported_languages(tmp_path):
+    assert outline(b'fn main() {}\n', tmp_path, 'rust') == (None, set())
+    assert not any(tmp_path.iterdir())
+
+
+@pytest.mark.parametrize('mode', ['serial', 'parallel', 'bundle'])
+def test_outline_cache_keeps_only_entries_in_use(tmp_path, capsys, mode):
+    source_root = tmp_path / 'src'
+    source_root.mkdir()
+    (source_root / 'a.py').write_text('def a():\n    pass\n', encoding='utf-8')
+    (source_root / 'b.py').write_text('def b():\n    pass\n', encoding='utf-8')
+    (source_root / 'c.py').write_text('def a():\n    pass\n', encoding='utf-8')  # same as a.py
+    output_root = tmp_path / 'out'
+    cache_dir = output_root / code_to_markdown.OUTLINE_CACHE_DIR
+    options = {'serial': {'jobs': 1}, 'parallel': {'jobs': 2},
+               'bundle': {'bundle_format': 'md'}}[mode]
+
+    def run():
+        capsys.readouterr()
+        code_to_markdown.find_and_convert_code_files(source_root, output_root, outline=True,
+                                                     **options)
+        return capsys.readouterr().out
+
+    def cached():
+        return sorted(path.stem for path in cache_dir.rglob('*.json'))
+
+    def digest(name):
+        return hashlib.sha256((source_root / name).read_bytes()).hexdigest()
+
+    assert 'Stale outlines pruned' not in run()
+    assert cached() == sorted({digest('a.py'), digest('b.py')})
+
+    (source_root / 'a.py').write_text('def a2():\n    pass\n', encoding='utf-8')
+    (source_root / 'b.py').unlink()
+    leftover = code_to_markdown.outline_cache_path(cache_dir, digest('c.py'))
+    leftover.with_name(leftover.name + '.999.tmp').write_text('{', encoding='utf-8')
+
+    # b.py's entry and the temp file go; c.py still uses the entry a.py had
+    assert 'Stale outlines pruned: 2' in run()
+    assert cached() == sorted([digest('a.py'), digest('c.py')])
+    assert sorted(path.name for path in cache_dir.iterdir()) == sorted(
+        {digest('a.py')[:2], digest('c.py')[:2]})
+
+
+# --- Language registry and output names -------------------------------------
+
+@pytest.mark.parametrize('name,head,tag', [
+    ('main.py', b'', 'python'),
+    ('MAIN.PY', b'', 'python'),                                   # extensions ignore case
+    ('lib.hpp', b'', 'cpp'),
+    ('CMakeLists.txt', b'', 'cmake'),                              # exact names first
+    ('Makefile', b'', 'makefile'),
+    ('Dockerfile', b'', 'dockerfile'),
+    ('tool', b'#!/usr/bin/python3\n', 'python'),
+    ('tool', b'#!/usr/bin/env python3.12\nimport sys\n', 'python'),
+    ('tool', b'#!/usr/bin/env -S node --no-warnings\n', 'javascript'),
+    ('tool', b'#!/usr/bin/env LANG=C bash\n', 'bash'),
+    ('tool', b'#!/bin/sh\n', 'bash'),
+    ('tool', b'#! /usr/bin/ruby -w\n', 'ruby'),
+    ('run.py', b'#!/bin/bash\n', 'python'),                        # the extension wins
+    ('tool', b'#!/usr/bin/env\n', ''),
+    ('tool', b'#!/opt/bin/unknown\n', ''),
+    ('tool', b'print(1)\n', ''),
+    ('notes.txt', b'plain text\n', ''),
+])
+def test_detect_language(name, head, tag):
+    assert code_to_markdown.detect_language(name, head) == tag
+
+
+def test_registered_sources(tmp_path):
+    script = tmp_path / 'deploy'
+    script.write_bytes(b'#!/usr/bin/env bash\necho hi\n')
+    data = tmp_path / 'data'
+    data.write_bytes(b'1,2,3\n')
+    assert code_to_markdown.is_registered_source(str(script))
+    assert not code_to_markdown.is_registered_source(str(data))
+    assert code_to_markdown.is_registered_source(str(tmp_path / 'CMakeLists.txt'))
+    assert not code_to_markdown.is_registered_source(str(tmp_path / 'readme.txt'))
+    assert not code_to_markdown.is_registered_source(str(tmp_path / 'missing'))
+
+
+def test_later_registrations_win(monkeypatch):
+    for table in ('EXTENSION_TAGS', 'FILENAME_TAGS', 'INTERPRETER_TAGS'):
+        monkeypatch.setattr(code_to_markdown, table, dict(getattr(code_to_markdown, table)))
+    code_to_markdown.register_language('prolog', ('.pl',), ('BUILD.pl',), ('swipl',))
+    assert code_to_markdown.detect_language('x.pl') == 'prolog'
+    assert code_to_markdown.detect_language('BUILD.pl') == 'prolog'
+    assert code_to_markdown.detect_language('x', b'#!/usr/bin/swipl\n') == 'prolog'
+    assert code_to_markdown.detect_language('x.pm') == 'perl'
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_outputs_differing_only_in_case_are_not_overwritten(tmp_path, capsys, jobs):
+    for name in ('Util.c', 'util.c', 'util.h'):
+        (tmp_path / name).write_text(f'// {name}\n', encoding='utf-8')
+
+    outputs = code_to_markdown.find_and_convert_code_files(tmp_path, include=('*.c', '*.h'),
+                                                           jobs=jobs)
+
+    out = capsys.readouterr().out
+    output_root = tmp_path / 'markdown_output'
+    # Same name but for case: the first found keeps the output
+    assert {Path(source).name: Path(output).name for source, output in outputs.items()} == {
+        'Util.c': 'Util.c.md', 'util.h': 'util.h.md'}
+    assert '// Util.c' in (output_root / 'Util.c.md').read_text(encoding='utf-8')
+    assert 'util.c: output' in out and 'would overwrite the output of Util.c' in out
+    assert 'Not converted (output name collisions): 1' in out
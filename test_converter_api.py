@@ -0,0 +1,222 @@
+"""
+Tests for the importable converter API in converter_api.py.
+
+Each conversion is run through the synchronous function and through
+AsyncConverter (on a real process pool), and both must give the same
+result as the scripts.
+
+Run with: python -m pytest test_converter_api.py
+"""
+
+import asyncio
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import converter_api
+import rtf_to_markdown
+from converter_api import AsyncConverter, ConversionError
+
+PNG_BYTES = bytes.fromhex('89504e470d0a1a0a0000000d49484452')
+
+PICTURE_RTF = (rb"{\rtf1\ansi Before{\pict\pngblip " + PNG_BYTES.hex().encode()
+               + rb"}After\par end}")
+PLAIN_RTF = rb"{\rtf1\ansi Hello\par world}"
+
+PYTHON_SOURCE = b"class A:\n    def f(self):\n        return '```'\n\n\ndef g():\n    pass\n"
+
+
+@pytest.fixture(autouse=True)
+def isolated_toolchain(tmp_path, monkeypatch):
+    """Keep the toolchain probe cache out of the user's home directory."""
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    monkeypatch.setenv('LOCALAPPDATA', str(tmp_path / 'cache'))
+    monkeypatch.setattr(rtf_to_markdown, '_TOOLCHAIN', None)
+
+
+def run(coroutine_function, *args, **kwargs):
+    """Run one coroutine on a fresh AsyncConverter with two worker processes."""
+    async def main():
+        async with AsyncConverter(jobs=2) as converter:
+            return await coroutine_function(converter, *args, **kwargs)
+    return asyncio.run(main())
+
+
+def ppm_frame(width=5, height=3):
+    pixels = bytes((x * 40 + y * 7 + channel) % 256
+                   for y in range(height) for x in range(width) for channel in range(3))
+    return b'P6\n%d %d\n255\n' % (width, height) + pixels, pixels
+
+
+# --- RTF ----------------------------------------------------------------------
+
+@pytest.mark.parametrize('source_kind', ['bytes', 'path', 'file'])
+def test_rtf_stream_round_trip(tmp_path, source_kind):
+    path = tmp_path / 'doc.rtf'
+    path.write_bytes(PICTURE_RTF)
+    source = {'bytes': PICTURE_RTF, 'path': path, 'file': io.BytesIO(PICTURE_RTF)}[source_kind]
+    pictures = {}
+    markdown = converter_api.convert_rtf(source, 'stream', pictures, header=False)
+    assert markdown == "Before\n\n![image001](image001.png)\n\nAfter\nend\n"
+    assert pictures == {'image001.png': PNG_BYTES}
+
+
+def test_rtf_async_matches_sync(tmp_path):
+    path = tmp_path / 'doc.rtf'
+    path.write_bytes(PICTURE_RTF)
+
+    async def convert(converter):
+        pictures = {}
+        from_bytes = await converter.convert_rtf(PICTURE_RTF, 'stream', pictures, header=False)
+        from_path = await converter.convert_rtf(path, 'auto', {}, header=False)
+        plain = await converter.convert_rtf(PLAIN_RTF, 'striprtf', header=False)
+        return from_bytes, pictures, from_path, plain
+
+    from_bytes, pictures, from_path, plain = run(convert)
+    expected = {}
+    assert from_bytes == converter_api.convert_rtf(PICTURE_RTF, 'stream', expected, header=False)
+    assert pictures == expected
+    # 'auto' sends a document with pictures to the streaming converter
+    assert from_path == from_bytes
+    assert plain == converter_api.convert_rtf(PLAIN_RTF, 'striprtf', header=False)
+    assert 'Hello' in plain and 'world' in plain
+
+
+def test_rtf_header_and_out():
+    out = io.StringIO()
+    assert converter_api.convert_rtf(PLAIN_RTF, 'stream', out=out) is None
+    assert out.getvalue().startswith('**File Type:** RTF\n')
+    assert out.getvalue().endswith('---\n\nHello\nworld\n')
+
+
+def test_rtf_bad_picture_is_dropped_without_printing(capsys):
+    pictures = {}
+    markdown = converter_api.convert_rtf(rb"{\rtf1 a{\pict\pngblip zz}b}", 'stream', pictures,
+                                         header=False)
+    assert markdown == 'ab\n'
+    assert pictures == {}
+    assert capsys.readouterr().out == ''
+
+
+def test_rtf_converter_selection_runs_off_the_event_loop(monkeypatch):
+    threads = []
+    select = rtf_to_markdown.select_converters
+
+    def spy(*args):
+        threads.append(threading.current_thread())
+        return select(*args)
+
+    monkeypatch.setattr(rtf_to_markdown, 'select_converters', spy)
+
+    async def main():
+        converter = AsyncConverter(executor=ThreadPoolExecutor(2))
+        try:
+            return await converter.convert_rtf(PLAIN_RTF, 'auto', header=False)
+        finally:
+            await converter.aclose()
+
+    assert 'Hello' in asyncio.run(main())
+    assert threads and threads[0] is not threading.main_thread()
+
+
+# --- Code ---------------------------------------------------------------------
+
+def test_code_round_trip(tmp_path):
+    path = tmp_path / 'main.py'
+    path.write_bytes(PYTHON_SOURCE)
+    symbols = []
+    markdown = converter_api.convert_code(PYTHON_SOURCE, 'main.py', outline=True, symbols=symbols)
+    assert '**File Type:** Python' in markdown
+    assert '````python\n' + PYTHON_SOURCE.decode() + '\n````\n' in markdown
+    assert [symbol['name'] for symbol in symbols] == ['A', 'A.f', 'g']
+
+    assert converter_api.convert_code(path) == converter_api.convert_code(PYTHON_SOURCE, 'main.py')
+    out = io.StringIO()
+    assert converter_api.convert_code(io.BytesIO(PYTHON_SOURCE), 'main.py', out=out) is None
+    assert out.getvalue() == converter_api.convert_code(PYTHON_SOURCE, 'main.py')
+
+    async def convert(converter):
+        symbols = []
+        markdown = await converter.convert_code(PYTHON_SOURCE, 'main.py', outline=True,
+                                                symbols=symbols)
+        return markdown, symbols
+
+    async_markdown, async_symbols = run(convert)
+    assert async_markdown == markdown
+    assert async_symbols == symbols
+
+
+def test_code_detects_language_by_shebang():
+    markdown = converter_api.convert_code(b'#!/usr/bin/env node\nconsole.log(1)\n')
+    assert '```javascript\n' in markdown
+
+
+# --- PPM ----------------------------------------------------------------------
+
+def test_ppm_round_trip(tmp_path):
+    Image = pytest.importorskip('PIL.Image')
+    data, pixels = ppm_frame()
+    path = tmp_path / 'frame.ppm'
+    path.write_bytes(data)
+
+    png = converter_api.convert_ppm(data)
+    with Image.open(io.BytesIO(png)) as image:
+        assert (image.mode, image.size) == ('RGB', (5, 3))
+        assert image.tobytes() == pixels
+    assert converter_api.convert_ppm(path) == png
+    out = io.BytesIO()
+    assert converter_api.convert_ppm(io.BytesIO(data), out=out) is None
+    assert out.getvalue() == png
+
+    async def convert(converter):
+        return await asyncio.gather(converter.convert_ppm(data), converter.convert_ppm(path))
+
+    assert run(convert) == [png, png]
+
+
+# --- Errors -------------------------------------------------------------------
+
+@pytest.mark.parametrize('convert', [
+    lambda source: converter_api.convert_rtf(source, 'stream'),
+    converter_api.convert_code,
+    converter_api.convert_ppm,
+])
+def test_unreadable_input_raises_conversion_error(tmp_path, convert):
+    with pytest.raises(ConversionError, match='missing'):
+        convert(tmp_path / 'missing')
+    with pytest.raises(ConversionError):
+        convert(tmp_path)  # a directory
+
+
+@pytest.mark.parametrize('method,args', [
+    ('convert_rtf', ('auto',)),
+    ('convert_rtf', ('stream',)),
+    ('convert_code', ()),
+    ('convert_ppm', ()),
+])
+def test_async_unreadable_input_raises_conversion_error(tmp_path, method, args):
+    async def convert(converter):
+        return await getattr(converter, method)(tmp_path / 'missing', *args)
+
+    with pytest.raises(ConversionError):
+        run(convert)
+
+
+@pytest.mark.parametrize('convert,data', [
+    (converter_api.convert_code, b'\0binary'),
+    (converter_api.convert_code, b'\xff\xfe not utf-8'),
+    (converter_api.convert_ppm, b'P6\n2 2\n255\n\0'),
+    (converter_api.convert_ppm, b'not an image'),
+])
+def test_invalid_input_raises_conversion_error(convert, data):
+    with pytest.raises(ConversionError):
+        convert(data)
+
+
+def test_unknown_options_are_value_errors():
+    with pytest.raises(ValueError):
+        converter_api.convert_rtf(PLAIN_RTF, 'both')
+    with pytest.raises(ValueError):
+        converter_api.convert_ppm(b'', profile='tiny')
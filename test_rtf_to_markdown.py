@@ -0,0 +1,662 @@
+"""
+Tests for the streaming RTF tokenizer and converter in rtf_to_markdown.py,
+for the manifest that lets unchanged files be skipped, for converter
+selection, the pandoc backends and the toolchain probe cache (against a
+stand-in pandoc script), and for tree discovery, batch runs and watch
+mode.
+
+Every document is also run with tiny read sizes, so control words, \\binN
+payloads, hex escapes and picture data that straddle chunk boundaries are
+covered.
+
+Run with: python -m pytest test_rtf_to_markdown.py
+"""
+
+import io
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+import rtf_to_markdown
+import source_tree
+from rtf_to_markdown import (TOKEN_BINARY, TOKEN_GROUP_END, TOKEN_GROUP_START, TOKEN_HEX,
+                             TOKEN_SYMBOL, TOKEN_TEXT, TOKEN_WORD, RtfTokenizer)
+
+# Read sizes to run every document with: byte by byte, odd sizes that
+# split tokens in different places, and the default
+CHUNK_SIZES = [1, 2, 3, 7, 64, rtf_to_markdown.RTF_STREAM_CHUNK_SIZE]
+
+PNG_BYTES = bytes.fromhex('89504e470d0a1a0a0000000d49484452')
+
+
+def tokenize(data, chunk_size=rtf_to_markdown.RTF_STREAM_CHUNK_SIZE):
+    """Tokenize bytes, merging the text and binary pieces a chunk boundary splits."""
+    tokens = []
+    for kind, value, param in RtfTokenizer(io.BytesIO(data), chunk_size):
+        if kind in (TOKEN_TEXT, TOKEN_BINARY) and tokens and tokens[-1][0] == kind:
+            tokens[-1] = (kind, tokens[-1][1] + value, None)
+        else:
+            tokens.append((kind, value, param))
+    return tokens
+
+
+def convert(data, chunk_size=rtf_to_markdown.RTF_STREAM_CHUNK_SIZE):
+    """Convert bytes with the streaming converter; returns (text, pictures)."""
+    out = io.StringIO()
+    pictures = {}
+    rtf_to_markdown.convert_rtf_streaming(io.BytesIO(data), out, chunk_size=chunk_size,
+                                          pictures=pictures)
+    return out.getvalue(), pictures
+
+
+def test_control_words_symbols_and_hex():
+    assert tokenize(rb"{\rtf1\fs24 Hi\~\'e9\u-4064 x}") == [
+        (TOKEN_GROUP_START, None, None),
+        (TOKEN_WORD, 'rtf', 1),
+        (TOKEN_WORD, 'fs', 24),
+        (TOKEN_TEXT, b'Hi', None),
+        (TOKEN_SYMBOL, '~', None),
+        (TOKEN_HEX, 0xE9, None),
+        (TOKEN_WORD, 'u', -4064),
+        (TOKEN_TEXT, b'x', None),
+        (TOKEN_GROUP_END, None, None),
+    ]
+
+
+def test_bare_line_breaks_are_dropped_and_escaped_ones_are_paragraphs():
+    assert tokenize(b"a\r\nb\\\nc") == [
+        (TOKEN_TEXT, b'ab', None),
+        (TOKEN_WORD, 'par', None),
+        (TOKEN_TEXT, b'c', None),
+    ]
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_bin_payload_is_passed_through_untokenized(chunk_size):
+    payload = b'a{\\}\r\nb\x00'
+    tokens = tokenize(rb"{\pict\bin" + str(len(payload)).encode() + b" " + payload + b"}x",
+                      chunk_size)
+    assert tokens == [
+        (TOKEN_GROUP_START, None, None),
+        (TOKEN_WORD, 'pict', None),
+        (TOKEN_WORD, 'bin', len(payload)),
+        (TOKEN_BINARY, payload, None),
+        (TOKEN_GROUP_END, None, None),
+        (TOKEN_TEXT, b'x', None),
+    ]
+
+
+def u(value, fallback=b'?'):
+    """Spell a \\uN control word followed by its fallback."""
+    return b'\\u%d%s' % (value, fallback)
+
+
+DOCUMENT = (
+    rb"{\rtf1\ansi\ansicpg1252{\fonttbl{\f0 Arial;}}{\*\generator Writer;}"
+    rb"\uc1 Caf" + u(233, b'e') + rb" na\'efve\par "
+    rb"{\pict\pngblip " + PNG_BYTES[:5].hex().encode() + b"\r\n "
+    + PNG_BYTES[5:].hex().encode() + rb"}"
+    rb"{\pict\jpegblip\bin4 {}\\}"
+    + u(-10179) + u(-8704) + rb" end\tab x\emdash y}"
+)
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_tokens_do_not_depend_on_chunk_boundaries(chunk_size):
+    assert tokenize(DOCUMENT, chunk_size) == tokenize(DOCUMENT)
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_document_converts_the_same_at_every_chunk_size(chunk_size):
+    text, pictures = convert(DOCUMENT, chunk_size)
+    assert text == ("Caf\u00e9 na\u00efve\n\n![image001](image001.png)\n\n"
+                    "![image002](image002.jpg)\n\n\U0001F600 end\tx\u2014y")
+    assert pictures == {'image001.png': PNG_BYTES, 'image002.jpg': rb'{}\\'}
+
+
+@pytest.mark.parametrize('rtf,expected', [
+    (u(233, b'e'), '\u00e9'),                          # default \uc1: one fallback byte
+    (rb"\uc2" + u(233, b'ef!'), '\u00e9!'),            # two fallback bytes
+    (rb"\uc0" + u(233, b'e'), '\u00e9e'),              # no fallback
+    (u(233, rb"\'e9!"), '\u00e9!'),                    # fallback given as a hex escape
+    (rb"{\uc2" + u(233, b'ab}') + u(233, b'cd'), '\u00e9\u00e9d'),  # \uc is scoped to its group
+    (u(8212, rb"\'97x"), '\u2014x'),
+])
+def test_unicode_fallback_bytes_are_skipped(rtf, expected):
+    assert convert(rtf)[0] == expected
+
+
+@pytest.mark.parametrize('rtf,expected', [
+    (u(-10179) + u(-8704), '\U0001F600'),    # signed 16-bit surrogate pair
+    (u(55357) + u(56832), '\U0001F600'),     # unsigned spelling
+    (u(-8704, b'?x'), '\ufffdx'),           # lone low surrogate
+    (u(-10179) + u(233), '\u00e9'),         # lone high surrogate is dropped
+])
+def test_surrogate_pairs(rtf, expected):
+    assert convert(rtf)[0] == expected
+
+
+def test_code_page_switch():
+    assert convert(rb"{\rtf1\ansi\ansicpg1251 \'c0\'e1}")[0] == '\u0410\u0431'
+
+
+def test_skipped_destinations_produce_no_text():
+    rtf = rb"{\rtf1{\fonttbl{\f0 Arial;}}{\colortbl;\red0;}{\*\unknown junk}{\info{\title T}}Body}"
+    assert convert(rtf)[0] == 'Body'
+
+
+def test_truncated_picture_is_still_kept():
+    text, pictures = convert(rb"{\rtf1 a{\pict\pngblip " + PNG_BYTES.hex().encode())
+    assert text == 'a'
+    assert pictures == {'image001.png': PNG_BYTES}
+
+
+# --- Incremental conversion manifest ---------------------------------------
+
+VERSIONS = {'pypandoc': 'pandoc 3.1', 'striprtf': 'striprtf 0.0.26', 'stream': 'stream 1'}
+
+
+@pytest.fixture
+def converted(tmp_path):
+    """An RTF source with a recorded stream conversion; returns (entries, source, output_dir)."""
+    source = tmp_path / 'doc.rtf'
+    source.write_bytes(rb"{\rtf1 Hello}")
+    output_dir = tmp_path / 'out'
+    output_file = output_dir / 'doc_stream.md'
+    output_file.parent.mkdir()
+    output_file.write_text('Hello', encoding='utf-8')
+    entries = {}
+    rtf_to_markdown.record_conversion(entries, source, [output_file], 'stream', VERSIONS,
+                                      output_dir)
+    return entries, source, output_dir
+
+
+def entry_for(entries, source):
+    return entries[os.path.abspath(source)]
+
+
+def test_record_conversion_stores_relative_outputs_and_converter_versions(converted):
+    entries, source, _ = converted
+    entry = entry_for(entries, source)
+    assert entry['outputs'] == ['doc_stream.md']
+    assert entry['converters'] == {'stream': 'stream 1'}
+    assert entry['size'] == source.stat().st_size
+    assert entry['sha256'] == rtf_to_markdown.file_sha256(source)
+
+
+def test_unchanged_file_is_up_to_date(converted):
+    entries, source, output_dir = converted
+    assert rtf_to_markdown.is_up_to_date(entry_for(entries, source), source, 'stream',
+                                         VERSIONS, output_dir)
+
+
+def test_touched_file_is_rehashed_and_its_mtime_refreshed(converted):
+    entries, source, output_dir = converted
+    entry = entry_for(entries, source)
+    mtime_ns = entry['mtime_ns'] + 5 * 10**9
+    os.utime(source, ns=(mtime_ns, mtime_ns))
+    assert rtf_to_markdown.is_up_to_date(entry, source, 'stream', VERSIONS, output_dir)
+    assert entry['mtime_ns'] == mtime_ns
+
+
+@pytest.mark.parametrize('content', [rb"{\rtf1 Hello!}", rb"{\rtf1 Jello}"])
+def test_changed_content_is_not_up_to_date(converted, content):
+    entries, source, output_dir = converted
+    entry = entry_for(entries, source)
+    mtime_ns = entry['mtime_ns']
+    source.write_bytes(content)
+    os.utime(source, ns=(mtime_ns + 10**9, mtime_ns + 10**9))
+    assert not rtf_to_markdown.is_up_to_date(entry, source, 'stream', VERSIONS, output_dir)
+
+
+def test_other_mode_missing_output_or_new_converter_version_is_not_up_to_date(converted):
+    entries, source, output_dir = converted
+    entry = entry_for(entries, source)
+    assert not rtf_to_markdown.is_up_to_date(entry, source, 'both', VERSIONS, output_dir)
+    assert not rtf_to_markdown.is_up_to_date(entry, source, 'stream',
+                                             dict(VERSIONS, stream='stream 2'), output_dir)
+    # A version change in a converter this file was not converted with is irrelevant
+    assert rtf_to_markdown.is_up_to_date(entry, source, 'stream',
+                                         dict(VERSIONS, pypandoc='pandoc 9'), output_dir)
+    (output_dir / 'doc_stream.md').unlink()
+    assert not rtf_to_markdown.is_up_to_date(entry, source, 'stream', VERSIONS, output_dir)
+    assert not rtf_to_markdown.is_up_to_date(None, source, 'stream', VERSIONS, output_dir)
+
+
+def test_reconverting_with_another_converter_removes_stale_outputs(converted):
+    entries, source, output_dir = converted
+    images = rtf_to_markdown.image_dir_for(output_dir / 'doc_stream.md')
+    images.mkdir()
+    (images / 'image001.png').write_bytes(PNG_BYTES)
+    new_output = output_dir / 'doc_striprtf.md'
+    new_output.write_text('Hello', encoding='utf-8')
+
+    rtf_to_markdown.record_conversion(entries, source, [new_output], 'striprtf', VERSIONS,
+                                      output_dir)
+
+    assert entry_for(entries, source)['outputs'] == ['doc_striprtf.md']
+    assert entry_for(entries, source)['converters'] == {'striprtf': 'striprtf 0.0.26'}
+    assert not (output_dir / 'doc_stream.md').exists()
+    assert not images.exists()
+    assert new_output.exists()
+
+
+def test_prune_removes_outputs_of_deleted_sources_only(converted, tmp_path):
+    entries, source, output_dir = converted
+    kept = tmp_path / 'kept.rtf'
+    kept.write_bytes(rb"{\rtf1 Kept}")
+    kept_output = output_dir / 'kept_stream.md'
+    kept_output.write_text('Kept', encoding='utf-8')
+    rtf_to_markdown.record_conversion(entries, kept, [kept_output], 'stream', VERSIONS,
+                                      output_dir)
+
+    source.unlink()
+    assert rtf_to_markdown.prune_manifest(entries, output_dir) == 1
+    assert list(entries) == [os.path.abspath(kept)]
+    assert not (output_dir / 'doc_stream.md').exists()
+    assert kept_output.exists()
+    assert rtf_to_markdown.prune_manifest(entries, output_dir) == 0
+
+
+def test_manifest_round_trips_and_ignores_other_versions(converted):
+    entries, _, output_dir = converted
+    rtf_to_markdown.save_manifest(entries, output_dir)
+    assert rtf_to_markdown.load_manifest(output_dir) == entries
+
+    manifest_path = output_dir / rtf_to_markdown.MANIFEST_NAME
+    manifest_path.write_text(json.dumps({'version': -1, 'files': entries}), encoding='utf-8')
+    assert rtf_to_markdown.load_manifest(output_dir) == {}
+    manifest_path.write_text('{not json', encoding='utf-8')
+    assert rtf_to_markdown.load_manifest(output_dir) == {}
+
+
+# --- Converter selection -----------------------------------------------------
+
+FEATURE_DOCUMENTS = {
+    'plain': rb"{\rtf1 text}",
+    'tables': rb"{\rtf1 \trowd a\cell b\cell\row}",
+    'pictures': rb"{\rtf1 {\pict\pngblip 00}}",
+    'both': rb"{\rtf1 \trowd a\cell\row{\pict\pngblip 00}}",
+}
+
+
+@pytest.fixture
+def fake_toolchain(monkeypatch):
+    """Replace the toolchain probe; returns the list of probe calls."""
+    calls = []
+
+    def install(pandoc, striprtf=True):
+        def probe_toolchain(refresh=False):
+            calls.append(refresh)
+            return {'pandoc_path': '/usr/bin/pandoc' if pandoc else None}
+        monkeypatch.setattr(rtf_to_markdown, 'probe_toolchain', probe_toolchain)
+        monkeypatch.setattr(rtf_to_markdown, 'STRIPRTF_AVAILABLE', striprtf)
+        return calls
+    return install
+
+
+@pytest.mark.parametrize('mode,features,pandoc,expected', [
+    ('auto', 'plain', True, ['striprtf', 'stream']),
+    ('auto', 'tables', True, ['pypandoc', 'stream']),
+    ('auto', 'tables', False, ['striprtf', 'stream']),
+    ('auto', 'pictures', True, ['stream']),
+    ('auto', 'both', True, ['pypandoc', 'stream']),
+    ('auto', 'both', False, ['stream']),
+    ('both', 'plain', True, ['pypandoc', 'striprtf']),
+    ('both', 'tables', False, ['striprtf']),
+    ('pypandoc', 'plain', True, ['pypandoc']),
+    ('pypandoc', 'tables', False, []),
+])
+def test_converters_selected_for_each_feature_mix(fake_toolchain, mode, features, pandoc,
+                                                  expected):
+    calls = fake_toolchain(pandoc)
+    source = io.BytesIO(FEATURE_DOCUMENTS[features])
+    assert rtf_to_markdown.select_converters(source, mode) == expected
+    assert calls == [False]
+    assert source.tell() == 0
+
+
+@pytest.mark.parametrize('mode', ['striprtf', 'stream'])
+@pytest.mark.parametrize('features', sorted(FEATURE_DOCUMENTS))
+def test_in_process_converters_never_probe_the_toolchain(fake_toolchain, mode, features):
+    calls = fake_toolchain(pandoc=True)
+    source = io.BytesIO(FEATURE_DOCUMENTS[features])
+    assert rtf_to_markdown.select_converters(source, mode) == [mode]
+    assert calls == []
+
+
+def test_auto_falls_back_to_the_stream_converter_without_striprtf(fake_toolchain):
+    fake_toolchain(pandoc=False, striprtf=False)
+    source = io.BytesIO(FEATURE_DOCUMENTS['plain'])
+    assert rtf_to_markdown.select_converters(source, 'auto') == ['stream']
+    assert rtf_to_markdown.select_converters(source, 'striprtf') == []
+
+
+def test_feature_scan_finds_control_words_across_chunks():
+    data = rb"{\rtf1 " + b"x" * 100 + rb"\trowd " + b"y" * 100 + rb"\pict}"
+    # The first chunk ends between \t and rowd
+    assert rtf_to_markdown.scan_rtf_features(io.BytesIO(data), chunk_size=109) == {
+        'tables', 'pictures'}
+    # \rowd is not \row, and \pictures is not \pict
+    assert rtf_to_markdown.scan_rtf_features(io.BytesIO(rb"\rowd \pictures")) == set()
+
+
+# --- pandoc backends -----------------------------------------------------------
+
+# Stands in for pandoc: --version, a file conversion, and `pandoc server`
+# answering the JSON API. Output is tagged with how it was produced.
+FAKE_PANDOC = """\
+import json, sys
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+args = sys.argv[1:]
+if args == ['--version']:
+    print('pandoc 3.1.0')
+elif args[0] == 'server':
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            if 'fail' in request['text']:
+                body, status = b'pandoc could not parse the document', 400
+            else:
+                body, status = json.dumps({'output': 'served ' + request['text']}).encode(), 200
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    HTTPServer(('127.0.0.1', int(args[args.index('--port') + 1])), Handler).serve_forever()
+else:
+    with open(args[-1], encoding='utf-8') as f:
+        print('process ' + f.read(), end='')
+"""
+
+
+@pytest.fixture
+def fake_pandoc(tmp_path, monkeypatch, isolated_toolchain):
+    """Point the toolchain probe at FAKE_PANDOC; returns its path."""
+    path = tmp_path / 'bin' / 'pandoc'
+    path.parent.mkdir()
+    path.write_text(f"#!{sys.executable}\n" + FAKE_PANDOC, encoding='utf-8')
+    path.chmod(0o755)
+    monkeypatch.setenv('PYPANDOC_PANDOC', str(path))
+    assert rtf_to_markdown.probe_toolchain()['pandoc_version'] == '3.1.0'
+    return path
+
+
+def test_documents_are_posted_to_the_pandoc_server(fake_pandoc, tmp_path):
+    rtf_path = tmp_path / 'a.rtf'
+    rtf_path.write_text(r'{\rtf1 hello}', encoding='utf-8')
+    with rtf_to_markdown.start_pandoc_server() as server:
+        assert rtf_to_markdown.convert_rtf_with_pandoc(rtf_path, server.url) == \
+            r'served {\rtf1 hello}'
+
+
+def test_server_rejecting_a_document_fails_that_document_only(fake_pandoc, tmp_path, capsys):
+    rtf_path = tmp_path / 'a.rtf'
+    rtf_path.write_text(r'{\rtf1 fail}', encoding='utf-8')
+    with rtf_to_markdown.start_pandoc_server() as server:
+        assert rtf_to_markdown.convert_rtf_with_pandoc(rtf_path, server.url) is None
+        assert 'could not parse' in capsys.readouterr().out
+        rtf_path.write_text(r'{\rtf1 ok}', encoding='utf-8')
+        assert rtf_to_markdown.convert_rtf_with_pandoc(rtf_path, server.url) == \
+            r'served {\rtf1 ok}'
+
+
+def test_unreachable_server_falls_back_to_a_pandoc_process(fake_pandoc, tmp_path, capsys):
+    rtf_path = tmp_path / 'a.rtf'
+    rtf_path.write_text(r'{\rtf1 hello}', encoding='utf-8')
+    server = rtf_to_markdown.start_pandoc_server()
+    url = server.url
+    server.close()  # e.g. pandoc server crashed mid-batch
+    assert rtf_to_markdown.convert_rtf_with_pandoc(rtf_path, url) == r'process {\rtf1 hello}'
+    assert 'starting pandoc directly' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('backend,tag', [('server', 'served'), ('subprocess', 'process')])
+def test_batch_workers_share_the_pandoc_backend(fake_pandoc, tmp_path, backend, tag):
+    source = tmp_path / 'src'
+    for name in ('a', 'b', 'c'):
+        write_rtf(source / f'{name}.rtf', name)
+    rtf_to_markdown.find_and_convert_rtf_files(source, mode='pypandoc', jobs=2,
+                                               pandoc_backend=backend, interactive=False)
+    for name in ('a', 'b', 'c'):
+        markdown = (source / 'markdown_output' / f'{name}_pypandoc.md').read_text('utf-8')
+        assert markdown.endswith(tag + r' {\rtf1 ' + name + '}\n')
+
+
+def test_server_that_will_not_start_leaves_one_process_per_file(fake_pandoc, capsys):
+    # A pandoc without the server subcommand exits at once
+    fake_pandoc.write_text(f"#!{sys.executable}\nimport sys\nsys.exit(2)\n", encoding='utf-8')
+    assert rtf_to_markdown.start_pandoc_server() is None
+    assert 'one process per file' in capsys.readouterr().out
+
+
+# --- Toolchain probe cache -------------------------------------------------------
+
+@pytest.fixture
+def probes(fake_pandoc, monkeypatch):
+    """Count real toolchain probes; the cache is already warm from fake_pandoc."""
+    calls = []
+    probe = rtf_to_markdown._probe_toolchain_uncached
+
+    def counting_probe():
+        calls.append(1)
+        return probe()
+
+    monkeypatch.setattr(rtf_to_markdown, '_probe_toolchain_uncached', counting_probe)
+    return calls
+
+
+def new_process(monkeypatch):
+    """Forget the in-process result, as a fresh run of the script would."""
+    monkeypatch.setattr(rtf_to_markdown, '_TOOLCHAIN', None)
+    return rtf_to_markdown.probe_toolchain()
+
+
+def test_probe_result_is_reused_from_the_cache(probes, fake_pandoc, monkeypatch):
+    toolchain = new_process(monkeypatch)
+    assert rtf_to_markdown.probe_toolchain() is toolchain
+    assert probes == []
+    assert toolchain['pandoc_path'] == str(fake_pandoc)
+    cache = json.loads(rtf_to_markdown._toolchain_cache_path().read_text('utf-8'))
+    assert cache['toolchain'] == toolchain
+    assert cache['key'] == rtf_to_markdown._toolchain_cache_key()
+
+
+def test_refresh_probes_again(probes):
+    rtf_to_markdown.probe_toolchain(refresh=True)
+    assert probes == [1]
+
+
+def test_new_directory_on_path_invalidates_the_cache(probes, tmp_path, monkeypatch):
+    extra = tmp_path / 'extra-bin'
+    extra.mkdir()
+    monkeypatch.setenv('PATH', str(extra) + os.pathsep + os.environ.get('PATH', ''))
+    new_process(monkeypatch)
+    assert probes == [1]
+    new_process(monkeypatch)
+    assert probes == [1]
+
+    # Installing a program into a PATH directory changes its mtime
+    (extra / 'tool').write_text('', encoding='utf-8')
+    os.utime(extra, ns=(0, os.stat(extra).st_mtime_ns + 10**9))
+    new_process(monkeypatch)
+    assert probes == [1, 1]
+
+
+def test_other_pandoc_setting_invalidates_the_cache(probes, fake_pandoc, tmp_path, monkeypatch):
+    other = tmp_path / 'bin' / 'pandoc-3'
+    other.write_bytes(fake_pandoc.read_bytes())
+    other.chmod(0o755)
+    monkeypatch.setenv('PYPANDOC_PANDOC', str(other))
+    assert new_process(monkeypatch)['pandoc_path'] == str(other)
+    assert probes == [1]
+
+
+def test_upgraded_pandoc_invalidates_the_cache(probes, fake_pandoc, monkeypatch):
+    mtime_ns = os.stat(fake_pandoc).st_mtime_ns + 10**9
+    os.utime(fake_pandoc, ns=(mtime_ns, mtime_ns))
+    assert new_process(monkeypatch)['pandoc_mtime_ns'] == mtime_ns
+    assert probes == [1]
+    new_process(monkeypatch)
+    assert probes == [1]
+
+
+@pytest.mark.parametrize('contents', ['not json', '{}', json.dumps({'version': -1})])
+def test_unreadable_or_old_cache_is_replaced(probes, monkeypatch, contents):
+    rtf_to_markdown._toolchain_cache_path().write_text(contents, encoding='utf-8')
+    new_process(monkeypatch)
+    assert probes == [1]
+    cache = json.loads(rtf_to_markdown._toolchain_cache_path().read_text('utf-8'))
+    assert cache['version'] == rtf_to_markdown.TOOLCHAIN_CACHE_VERSION
+
+
+# --- Discovery and mirrored outputs -----------------------------------------
+
+@pytest.fixture
+def isolated_toolchain(tmp_path, monkeypatch):
+    """Keep the toolchain probe cache out of the user's home directory."""
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    monkeypatch.setenv('LOCALAPPDATA', str(tmp_path / 'cache'))
+    monkeypatch.setattr(rtf_to_markdown, '_TOOLCHAIN', None)
+    monkeypatch.setattr(rtf_to_markdown, '_PANDOC_READY', None)
+
+
+def write_rtf(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"{\\rtf1 " + text.encode('ascii') + b"}")
+
+
+def test_outputs_mirror_the_tree_and_are_not_rediscovered(tmp_path, isolated_toolchain):
+    source = tmp_path / 'src'
+    for relative_path in ('a.rtf', 'docs/b.rtf', 'docs/deep/c.rtf', 'skip/d.rtf'):
+        write_rtf(source / relative_path, relative_path)
+
+    for _ in range(2):
+        rtf_to_markdown.find_and_convert_rtf_files(source, mode='stream', exclude=('skip',),
+                                                   interactive=False, force=True)
+
+    output_root = source / 'markdown_output'
+    outputs = sorted(path.relative_to(output_root).as_posix()
+                     for path in output_root.rglob('*.md'))
+    assert outputs == ['a_stream.md', 'docs/b_stream.md', 'docs/deep/c_stream.md']
+    assert 'docs/deep/c.rtf' in (output_root / 'docs/deep/c_stream.md').read_text('utf-8')
+    assert not list(output_root.rglob('markdown_output'))
+
+
+def summary(out):
+    """The counts from find_and_convert_rtf_files' closing summary."""
+    return dict(line.split(': ', 1) for line in out.splitlines()
+                if line.startswith(('Source files', 'Skipped', 'Output files created')))
+
+
+@pytest.mark.parametrize('jobs', [1, 3])
+def test_parallel_results_are_aggregated_like_a_serial_run(tmp_path, capsys, isolated_toolchain,
+                                                           jobs):
+    source = tmp_path / 'src'
+    for relative_path in ('a.rtf', 'b.rtf', 'docs/c.rtf', 'docs/d.rtf', 'bad/e.rtf'):
+        write_rtf(source / relative_path, relative_path)
+    output_root = source / 'markdown_output'
+    output_root.mkdir()
+    # A file where bad/'s mirrored output directory should be: e.rtf fails
+    (output_root / 'bad').write_text('in the way', encoding='utf-8')
+
+    def run():
+        rtf_to_markdown.find_and_convert_rtf_files(source, mode='stream', jobs=jobs,
+                                                   interactive=False)
+        return capsys.readouterr().out
+
+    out = run()
+    assert summary(out) == {
+        'Source files found': '5',
+        'Source files processed': '4/5',
+        'Skipped (unchanged)': '0',
+        'Output files created': '4',
+    }
+    if jobs > 1:
+        assert sorted(line.split()[2] for line in out.splitlines()
+                      if line.startswith('✓ [')) == ['a.rtf', 'b.rtf', 'docs/c.rtf', 'docs/d.rtf']
+        assert any(line.startswith('✗ [') and 'bad/e.rtf' in line for line in out.splitlines())
+    manifest = rtf_to_markdown.load_manifest(output_root)
+    assert sorted(Path(path).relative_to(source).as_posix() for path in manifest) == [
+        'a.rtf', 'b.rtf', 'docs/c.rtf', 'docs/d.rtf']
+
+    # Only the failed file is tried again
+    (output_root / 'bad').unlink()
+    assert summary(run()) == {
+        'Source files found': '5',
+        'Source files processed': '1/1',
+        'Skipped (unchanged)': '4',
+        'Output files created': '1',
+    }
+    assert (output_root / 'bad' / 'e_stream.md').exists()
+
+
+def scripted_watcher(steps):
+    """
+    A polling TreeWatcher that makes one change before each batch, then
+    stops the watch loop as Ctrl+C would.
+    """
+    class ScriptedWatcher(source_tree.TreeWatcher):
+        def __init__(self, *args, **kwargs):
+            kwargs.update(interval=0.01, debounce=0.05, backend='polling')
+            super().__init__(*args, **kwargs)
+
+        def batches(self):
+            batches = super().batches()
+            for step in steps:
+                step()
+                yield next(batches)
+            raise KeyboardInterrupt
+
+    return ScriptedWatcher
+
+
+def test_watch_reconverts_each_change_once(tmp_path, monkeypatch, isolated_toolchain):
+    source = tmp_path / 'src'
+    write_rtf(source / 'a.rtf', 'a')
+    new = source / 'docs' / 'b.rtf'
+    converted = []
+    convert = rtf_to_markdown.convert_rtf_to_markdown
+
+    def spy(rtf_file_path, *args, **kwargs):
+        converted.append(Path(rtf_file_path).relative_to(source).as_posix())
+        return convert(rtf_file_path, *args, **kwargs)
+
+    # Conversions so far, recorded before each change and at the end
+    history = []
+
+    def then(change):
+        def step():
+            history.append(list(converted))
+            change()
+        return step
+
+    steps = [
+        then(lambda: write_rtf(new, 'b')),
+        then(lambda: write_rtf(new, 'b, edited')),
+        then(new.unlink),
+    ]
+    monkeypatch.setattr(rtf_to_markdown, 'convert_rtf_to_markdown', spy)
+    monkeypatch.setattr(rtf_to_markdown, 'TreeWatcher', scripted_watcher(steps))
+
+    rtf_to_markdown.watch_and_convert_rtf_files(source, mode='stream', interactive=False)
+    history.append(list(converted))
+
+    output_root = source / 'markdown_output'
+    assert history == [
+        ['a.rtf'],                                       # initial full run
+        ['a.rtf', 'docs/b.rtf'],                         # create
+        ['a.rtf', 'docs/b.rtf', 'docs/b.rtf'],           # modify
+        ['a.rtf', 'docs/b.rtf', 'docs/b.rtf'],           # delete: nothing converted
+    ]
+    assert not (output_root / 'docs' / 'b_stream.md').exists()
+    manifest = rtf_to_markdown.load_manifest(output_root)
+    assert list(manifest) == [str(source / 'a.rtf')]
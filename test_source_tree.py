@@ -0,0 +1,223 @@
+"""
+Tests for the shared directory walker, background discovery and watcher
+in source_tree.py. The watcher is driven with its polling backend.
+
+Run with: python -m pytest test_source_tree.py
+"""
+
+import os
+import shutil
+import threading
+import time
+
+import pytest
+
+import source_tree
+
+
+def make_tree(root, paths):
+    for relative_path in paths:
+        path = root / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(relative_path, encoding='utf-8')
+
+
+TREE = [
+    'a.rtf',
+    'b.txt',
+    'docs/c.rtf',
+    'docs/deep/d.rtf',
+    'docs/deep/deeper/e.rtf',
+    'build/f.rtf',
+    'notes/draft.rtf',
+    'notes/keep.rtf',
+]
+
+
+def found(root, **kwargs):
+    return [path.relative_to(root).as_posix()
+            for path in source_tree.iter_source_files(root, **kwargs)]
+
+
+def test_walk_is_sorted_and_depth_first(tmp_path):
+    make_tree(tmp_path, TREE)
+    assert found(tmp_path, include=('*.rtf',)) == [
+        'a.rtf', 'build/f.rtf', 'docs/c.rtf', 'docs/deep/d.rtf', 'docs/deep/deeper/e.rtf',
+        'notes/draft.rtf', 'notes/keep.rtf',
+    ]
+
+
+@pytest.mark.parametrize('max_depth,deepest', [(0, 0), (1, 1), (2, 2), (None, 3)])
+def test_max_depth(tmp_path, max_depth, deepest):
+    make_tree(tmp_path, TREE)
+    paths = found(tmp_path, include=('*.rtf',), max_depth=max_depth)
+    assert max(path.count('/') for path in paths) == deepest
+    assert 'a.rtf' in paths
+
+
+@pytest.mark.parametrize('exclude,missing', [
+    (('build',), ['build/f.rtf']),                              # a directory by name
+    (('docs/deep',), ['docs/deep/d.rtf', 'docs/deep/deeper/e.rtf']),  # by relative path
+    (('draft*',), ['notes/draft.rtf']),                         # a file by name
+    (('*/c.rtf', 'a.*'), ['docs/c.rtf', 'a.rtf']),
+])
+def test_exclude(tmp_path, exclude, missing):
+    make_tree(tmp_path, TREE)
+    everything = found(tmp_path, include=('*.rtf',))
+    assert found(tmp_path, include=('*.rtf',), exclude=exclude) == [
+        path for path in everything if path not in missing
+    ]
+
+
+def test_include_by_relative_path(tmp_path):
+    make_tree(tmp_path, TREE)
+    # fnmatch's * also matches '/', so docs/*.rtf covers the whole subtree
+    assert found(tmp_path, include=('docs/*.rtf', 'b.txt')) == [
+        'b.txt', 'docs/c.rtf', 'docs/deep/d.rtf', 'docs/deep/deeper/e.rtf',
+    ]
+
+
+def test_skip_dirs_leaves_out_an_output_directory_inside_the_tree(tmp_path):
+    make_tree(tmp_path, ['a.rtf', 'markdown_output/a.rtf', 'markdown_output/sub/b.rtf'])
+    assert found(tmp_path, include=('*.rtf',),
+                 skip_dirs=[tmp_path / 'markdown_output']) == ['a.rtf']
+
+
+def test_accept_decides_when_there_are_no_patterns(tmp_path):
+    make_tree(tmp_path, TREE)
+    assert found(tmp_path, include=None, accept=lambda path: path.endswith('.txt')) == ['b.txt']
+
+
+def test_unreadable_directory_is_reported_and_skipped(tmp_path, capsys):
+    make_tree(tmp_path, ['a.rtf'])
+    assert found(tmp_path / 'missing', include=('*',)) == []
+    assert 'cannot read directory' in capsys.readouterr().out
+
+
+def test_background_discovery_yields_everything_in_order():
+    assert list(source_tree.discover_in_background(iter(range(1000)), maxsize=3)) == \
+        list(range(1000))
+
+
+def test_background_discovery_reraises_errors():
+    def items():
+        yield 1
+        raise OSError('disk gone')
+
+    discovered = source_tree.discover_in_background(items())
+    assert next(discovered) == 1
+    with pytest.raises(OSError, match='disk gone'):
+        next(discovered)
+
+
+def test_background_discovery_stays_bounded_and_stops_when_closed():
+    produced = []
+    finished = threading.Event()
+
+    def items():
+        try:
+            for i in range(10_000):
+                produced.append(i)
+                yield i
+        finally:
+            finished.set()
+
+    discovered = source_tree.discover_in_background(items(), maxsize=4)
+    assert next(discovered) == 0
+    discovered.close()
+    assert finished.wait(5)
+    # The queue held at most `maxsize` items, plus one waiting to be put
+    assert len(produced) <= 4 + 2
+
+
+# --- TreeWatcher -------------------------------------------------------------
+
+def polling_watcher(root, **kwargs):
+    options = dict(include=('*.rtf',), interval=0.01, debounce=0.1, backend='polling')
+    options.update(kwargs)
+    return source_tree.TreeWatcher(root, **options)
+
+
+def names(paths, root):
+    return [os.path.relpath(path, root).replace(os.sep, '/') for path in paths]
+
+
+def test_create_modify_and_delete_are_each_one_batch(tmp_path):
+    make_tree(tmp_path, ['a.rtf'])
+    watcher = polling_watcher(tmp_path)
+    batches = watcher.batches()
+
+    (tmp_path / 'b.rtf').write_text('new', encoding='utf-8')
+    changed, removed = next(batches)
+    assert (names(changed, tmp_path), removed) == (['b.rtf'], [])
+
+    (tmp_path / 'a.rtf').write_text('modified and longer', encoding='utf-8')
+    changed, removed = next(batches)
+    assert (names(changed, tmp_path), removed) == (['a.rtf'], [])
+
+    (tmp_path / 'b.rtf').unlink()
+    changed, removed = next(batches)
+    assert (changed, names(removed, tmp_path)) == ([], ['b.rtf'])
+
+
+def test_a_burst_of_writes_is_debounced_into_one_batch(tmp_path):
+    watcher = polling_watcher(tmp_path, debounce=0.3)
+    batches = watcher.batches()
+
+    def burst():
+        for i in range(5):
+            (tmp_path / 'a.rtf').write_text('x' * (i + 1), encoding='utf-8')
+            (tmp_path / f'{i}.rtf').write_text('x', encoding='utf-8')
+            time.sleep(0.05)
+        (tmp_path / '0.rtf').unlink()
+
+    writer = threading.Thread(target=burst)
+    writer.start()
+    start = time.monotonic()
+    changed, removed = next(batches)
+    writer.join()
+    assert names(changed, tmp_path) == ['1.rtf', '2.rtf', '3.rtf', '4.rtf', 'a.rtf']
+    # Created and deleted inside the burst: never reported as changed
+    assert names(removed, tmp_path) == ['0.rtf']
+    assert time.monotonic() - start >= 0.2 + 0.3
+
+    # Nothing left over from the burst: the next batch is the next change
+    (tmp_path / 'a.rtf').unlink()
+    assert next(batches) == ([], [str(tmp_path / 'a.rtf')])
+
+
+def test_ignored_files_do_not_produce_batches(tmp_path):
+    make_tree(tmp_path, ['out/x.rtf'])
+    watcher = polling_watcher(tmp_path, exclude=('drafts',), max_depth=1,
+                              skip_dirs=[tmp_path / 'out'])
+    batches = watcher.batches()
+    make_tree(tmp_path, ['notes.txt', 'drafts/a.rtf', 'out/y.rtf', 'sub/deep/z.rtf'])
+    (tmp_path / 'out' / 'x.rtf').unlink()
+    (tmp_path / 'sub' / 'ok.rtf').write_text('ok', encoding='utf-8')
+    changed, removed = next(batches)
+    assert (names(changed, tmp_path), removed) == (['sub/ok.rtf'], [])
+
+
+def test_accept_selects_files_when_there_are_no_patterns(tmp_path):
+    watcher = polling_watcher(tmp_path, include=None, accept=lambda path: path.endswith('.py'))
+    batches = watcher.batches()
+    make_tree(tmp_path, ['a.py', 'a.rtf'])
+    changed, _ = next(batches)
+    assert names(changed, tmp_path) == ['a.py']
+
+
+def test_event_paths_are_resolved_like_a_poll(tmp_path):
+    make_tree(tmp_path, ['docs/a.rtf', 'docs/b.rtf', 'c.rtf'])
+    watcher = polling_watcher(tmp_path)
+    make_tree(tmp_path, ['new/d.rtf', 'new/e.txt'])
+    shutil.rmtree(tmp_path / 'docs')
+    # What watchdog reports: a created directory and a deleted one
+    changed, removed = watcher._resolve({str(tmp_path / 'new'), str(tmp_path / 'docs')})
+    assert names(changed, tmp_path) == ['new/d.rtf']
+    assert sorted(names(removed, tmp_path)) == ['docs/a.rtf', 'docs/b.rtf']
+    assert sorted(names(watcher.known, tmp_path)) == ['c.rtf', 'new/d.rtf']
+
+
+def test_unknown_backend_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match='backend'):
+        source_tree.TreeWatcher(tmp_path, backend='inotify')
@@ -0,0 +1,188 @@
+"""
+Tests for the shared stage instrumentation in stage_metrics.py: the no-op
+path while disabled, stage totals and events once enabled, merging the
+totals of process-pool workers, and the Prometheus textfile.
+
+Run with: python -m pytest test_stage_metrics.py
+"""
+
+import argparse
+import json
+import time
+
+import pytest
+
+import code_to_markdown
+import stage_metrics
+
+
+@pytest.fixture(autouse=True)
+def disabled(monkeypatch):
+    """Start every test disabled, and leave nothing enabled behind."""
+    monkeypatch.setattr(stage_metrics, '_recorder', None)
+    monkeypatch.setattr(stage_metrics, '_session', None)
+
+
+def totals_of(recorder):
+    return {'stages': {name: list(values) for name, values in recorder.stages.items()},
+            'counters': dict(recorder.counters)}
+
+
+# --- Disabled -----------------------------------------------------------------
+
+def test_everything_is_a_no_op_while_disabled(capsys):
+    assert not stage_metrics.enabled()
+    assert stage_metrics.stage('read') is stage_metrics.stage('write', item='x')
+    with stage_metrics.stage('read') as passed:
+        assert passed is stage_metrics._NULL_STAGE
+    with pytest.raises(KeyError):
+        with stage_metrics.stage('read'):
+            raise KeyError('not swallowed')
+
+    items = ['a', 'b']
+    assert stage_metrics.timed_iter('discover', items) is items
+    stage_metrics.count('files')
+    stage_metrics.merge({'stages': {'read': [1, 1.0, 1.0]}, 'counters': {'files': 1}})
+    assert stage_metrics.collect() is None
+    assert stage_metrics.summary() is None
+    assert stage_metrics.pool_options() == {}
+    stage_metrics.finish()
+    assert capsys.readouterr().out == ''
+    assert not stage_metrics.enabled()
+
+
+def test_no_options_leave_instrumentation_disabled():
+    parser = argparse.ArgumentParser()
+    stage_metrics.add_arguments(parser)
+    assert not stage_metrics.enable_from_args('test', parser.parse_args([]))
+    assert not stage_metrics.enabled()
+    assert stage_metrics.enable_from_args('test', parser.parse_args(['--trace-memory']))
+    assert stage_metrics.enabled()
+    stage_metrics.finish()
+    assert not stage_metrics.enabled()
+
+
+# --- Enabled ------------------------------------------------------------------
+
+def test_stages_counters_and_events(tmp_path, capsys):
+    events_path = tmp_path / 'metrics.jsonl'
+    stage_metrics.enable('test', str(events_path))
+    assert stage_metrics.enabled()
+
+    for _ in range(3):
+        with stage_metrics.stage('read', item=tmp_path / 'a.txt'):
+            pass
+    with pytest.raises(ValueError):
+        with stage_metrics.stage('write'):
+            raise ValueError('failed writes are timed too')
+    stage_metrics.count('files', 2)
+    stage_metrics.count('files')
+    assert list(stage_metrics.timed_iter('discover', iter('ab'))) == ['a', 'b']
+
+    totals = stage_metrics.summary()
+    assert {name: values['calls'] for name, values in totals['stages'].items()} == {
+        'read': 3, 'write': 1, 'discover': 3}  # the last wait ends the iteration
+    assert totals['counters'] == {'files': 3}
+    stage_metrics.finish()
+    assert not stage_metrics.enabled()
+    assert 'Stage timings (test' in capsys.readouterr().out
+
+    events = [json.loads(line) for line in events_path.read_text(encoding='utf-8').splitlines()]
+    assert [event.get('stage') for event in events] == (['read'] * 3 + ['write']
+                                                        + ['discover'] * 3 + [None])
+    assert events[0]['item'] == str(tmp_path / 'a.txt') and events[0]['script'] == 'test'
+    assert events[3]['failed'] is True
+    assert events[-1]['summary'] is True and events[-1]['counters'] == {'files': 3}
+
+
+def test_merge_adds_calls_and_seconds_and_keeps_the_longest_pass():
+    parent = stage_metrics.Recorder('test')
+    parent.record('read', 0.5)
+    parent.record('read', 0.25)
+    parent.count('files', 2)
+
+    worker = stage_metrics.Recorder('test')
+    worker.record('read', 1.0)
+    worker.record('encode', 0.125)
+    worker.count('files')
+    worker.count('bytes', 100)
+    taken = worker.take()
+    assert totals_of(worker) == {'stages': {}, 'counters': {}}
+
+    parent.merge(taken)
+    assert totals_of(parent) == {'stages': {'read': [3, 1.75, 1.0], 'encode': [1, 0.125, 0.125]},
+                                 'counters': {'files': 3, 'bytes': 100}}
+    parent.merge({'stages': {'read': [1, 0.5, 0.5]}, 'counters': {}})
+    assert parent.stages['read'] == [4, 2.25, 1.0]
+
+
+def test_worker_totals_reach_the_parent(tmp_path):
+    for i in range(5):
+        (tmp_path / f"m{i}.py").write_text(f"x = {i}\n", encoding='utf-8')
+    stage_metrics.enable('test')
+    try:
+        stage_metrics.merge(None)  # a worker that returned nothing
+        code_to_markdown.find_and_convert_code_files(tmp_path, include=('*.py',), jobs=2)
+        totals = stage_metrics.summary()
+    finally:
+        stage_metrics.finish()
+    assert totals['counters']['files'] == 5
+    assert totals['stages']['write']['calls'] == 5
+    assert totals['stages']['discover']['calls'] == 6
+
+
+# --- Prometheus textfile ------------------------------------------------------
+
+def test_format_prometheus():
+    totals = {
+        'script': 'say "hi"\\',
+        'wall_seconds': 2.5,
+        'stages': {'write': {'calls': 2, 'seconds': 0.5, 'max_seconds': 0.3},
+                   'read\n': {'calls': 4, 'seconds': 1.0, 'max_seconds': 0.4}},
+        'counters': {'files': 4},
+        'peak_traced_bytes': 1024,
+    }
+    lines = stage_metrics.format_prometheus(totals).splitlines()
+    script = 'script="say \\"hi\\"\\\\"'
+    assert '# TYPE myscripts_stage_seconds_total counter' in lines
+    assert [line for line in lines if line.startswith('myscripts_stage_')] == [
+        f'myscripts_stage_seconds_total{{{script},stage="read\\n"}} 1.0',
+        f'myscripts_stage_seconds_total{{{script},stage="write"}} 0.5',
+        f'myscripts_stage_calls_total{{{script},stage="read\\n"}} 4',
+        f'myscripts_stage_calls_total{{{script},stage="write"}} 2',
+        f'myscripts_stage_max_seconds{{{script},stage="read\\n"}} 0.4',
+        f'myscripts_stage_max_seconds{{{script},stage="write"}} 0.3',
+    ]
+    assert f'myscripts_files_total{{{script}}} 4' in lines
+    assert f'myscripts_peak_traced_bytes{{{script}}} 1024' in lines
+    assert f'myscripts_run_seconds{{{script}}} 2.5' in lines
+    timestamp = next(line for line in lines if line.startswith('myscripts_last_run_timestamp'))
+    assert abs(float(timestamp.rsplit(' ', 1)[1]) - time.time()) < 60
+
+    # Every sample follows the HELP and TYPE lines of its metric
+    for i, line in enumerate(lines):
+        if not line.startswith('#'):
+            name = line.split('{')[0]
+            assert any(previous.startswith(f'# TYPE {name} ') for previous in lines[:i])
+            assert any(previous.startswith(f'# HELP {name} ') for previous in lines[:i])
+
+
+def test_prometheus_textfile_is_replaced_at_the_end_of_a_run(tmp_path, capsys):
+    output = tmp_path / 'run.prom'
+    output.write_text('old\n', encoding='utf-8')
+    stage_metrics.enable('test', str(output))
+    with stage_metrics.stage('encode'):
+        pass
+    assert output.read_text(encoding='utf-8') == 'old\n'
+    stage_metrics.finish()
+
+    text = output.read_text(encoding='utf-8')
+    assert 'myscripts_stage_calls_total{script="test",stage="encode"} 1' in text
+    assert [path.name for path in tmp_path.iterdir()] == ['run.prom']
+    assert f"Metrics written to {output}" in capsys.readouterr().out
+
+
+def test_unknown_metrics_format_is_rejected():
+    with pytest.raises(ValueError):
+        stage_metrics.enable('test', 'metrics.txt', 'csv')
+    assert not stage_metrics.enabled()